@@ -0,0 +1,31 @@
+"""
+Authentication backends: Django's and allauth's, loading the session user
+with its Profile and InstructorProfile joined in the same query (see
+identity.py). Only get_user() changes; django.contrib.auth.get_user() keeps
+doing the session checks.
+"""
+from allauth.account.auth_backends import AuthenticationBackend as AllauthAuthenticationBackend
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend as DjangoModelBackend
+
+# Stock backend paths stored in sessions created before these backends
+LEGACY_BACKENDS = {
+    'django.contrib.auth.backends.ModelBackend': 'accounts.backends.ModelBackend',
+    'allauth.account.auth_backends.AuthenticationBackend': 'accounts.backends.AuthenticationBackend',
+}
+
+
+class JoinedProfilesMixin:
+    def get_user(self, user_id):
+        user = get_user_model()._default_manager.select_related(
+            'profile', 'instructor_profile',
+        ).filter(pk=user_id).first()
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+
+class ModelBackend(JoinedProfilesMixin, DjangoModelBackend):
+    pass
+
+
+class AuthenticationBackend(JoinedProfilesMixin, AllauthAuthenticationBackend):
+    pass
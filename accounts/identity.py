@@ -0,0 +1,74 @@
+"""
+Request-scoped identity, loaded once per request by
+core.middleware.IdentityMiddleware.
+
+request.user is loaded with its Profile and InstructorProfile joined in a
+single query, so every later `request.user.profile`,
+`request.user.instructor_profile` or `hasattr(request.user, ...)` in
+middleware, views and templates is served from memory. request.identity
+summarizes what the views usually ask about the visitor:
+
+    request.identity.role                    # RoleChoices value or None
+    request.identity.is_instructor / is_student / is_admin_support
+    request.identity.instructor_profile_id   # None when not an instructor
+    request.identity.can_receive_leads       # denormalized access (no query)
+"""
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user
+
+from .backends import LEGACY_BACKENDS
+from .models import RoleChoices
+
+
+def load_user(request):
+    """
+    django.contrib.auth.get_user() through our backends, which join the
+    profiles (accounts/backends.py). Sessions that name a stock backend are
+    moved to ours first, so nobody is logged out by the switch.
+    """
+    backend_path = request.session.get(BACKEND_SESSION_KEY)
+    if backend_path in LEGACY_BACKENDS:
+        request.session[BACKEND_SESSION_KEY] = LEGACY_BACKENDS[backend_path]
+    return get_user(request)
+
+
+class RequestIdentity:
+    def __init__(self, user):
+        self.user = user
+        self.is_authenticated = user.is_authenticated
+        self.profile = getattr(user, 'profile', None) if self.is_authenticated else None
+        self.instructor_profile = getattr(user, 'instructor_profile', None) if self.is_authenticated else None
+
+    def __repr__(self):
+        return f'<RequestIdentity {self.user} role={self.role}>'
+
+    @property
+    def role(self):
+        return self.profile.role if self.profile else None
+
+    @property
+    def is_instructor(self):
+        return self.role == RoleChoices.INSTRUCTOR
+
+    @property
+    def is_student(self):
+        return self.role == RoleChoices.STUDENT
+
+    @property
+    def is_admin_support(self):
+        return self.role == RoleChoices.ADMIN_SUPPORT
+
+    @property
+    def instructor_profile_id(self):
+        return self.instructor_profile.pk if self.instructor_profile else None
+
+    @property
+    def can_receive_leads(self):
+        return bool(self.instructor_profile and self.instructor_profile.can_receive_leads())
+
+
+def get_identity(request):
+    """request.identity, or one built on the spot (requests not passed through the middleware)."""
+    identity = getattr(request, 'identity', None)
+    if identity is None:
+        identity = request.identity = RequestIdentity(request.user)
+    return identity
@@ -17,6 +17,7 @@ from django.urls import reverse_lazy, reverse
 from django_ratelimit.decorators import ratelimit
 from .forms import UserRegistrationForm, CustomLoginForm, ProfileEditForm, CompleteProfileForm, StudentDataForm, CustomPasswordResetForm
 from .models import Profile, RoleChoices
+from .identity import get_identity
 
 logger = logging.getLogger(__name__)
 
@@ -65,7 +66,7 @@ def register_view(request):
 
             # Auto login after registration
             # Pass explicit backend — required when multiple auth backends are configured (allauth + ModelBackend)
-            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+            login(request, user, backend='accounts.backends.ModelBackend')
             
             # Different messages based on role
             if user.profile.is_instructor:
@@ -232,10 +233,8 @@ def dashboard_view(request):
     For students: redirect to cities_list (all instructors)
     For instructors: redirect to my_leads (contacts received)
     """
-    profile = request.user.profile
-    
     # Instructors go to my_leads
-    if profile.is_instructor:
+    if get_identity(request).is_instructor:
         return redirect('marketplace:my_leads')
     
     # Students go to cities_list using absolute path
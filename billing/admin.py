@@ -1,10 +1,11 @@
 """
 Admin configuration for billing app.
 """
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import Plan, Subscription, Payment, Highlight
+from marketplace.lead_access import refresh_lead_access
+from .models import Plan, Subscription, Payment, Highlight, WebhookEvent, WebhookEventStatus
 
 
 @admin.register(Plan)
@@ -57,11 +58,14 @@ class SubscriptionAdmin(admin.ModelAdmin):
     
     def activate_subscriptions(self, request, queryset):
         updated = queryset.update(status='ACTIVE')
+        # queryset.update() skips signals: refresh the instructors' lead access
+        refresh_lead_access(queryset.values_list('instructor_id', flat=True))
         self.message_user(request, f'{updated} assinatura(s) ativada(s).')
     activate_subscriptions.short_description = 'Ativar assinaturas'
     
     def pause_subscriptions(self, request, queryset):
         updated = queryset.update(status='PAUSED')
+        refresh_lead_access(queryset.values_list('instructor_id', flat=True))
         self.message_user(request, f'{updated} assinatura(s) pausada(s).')
     pause_subscriptions.short_description = 'Pausar assinaturas'
 
@@ -105,6 +109,27 @@ class PaymentAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    """Admin for the Mercado Pago webhook inbox"""
+    list_display = ('topic', 'resource_id', 'status', 'attempts', 'deliveries', 'result', 'last_error', 'received_at', 'processed_at')
+    list_filter = ('status', 'topic')
+    search_fields = ('resource_id',)
+    readonly_fields = ('topic', 'resource_id', 'payload', 'attempts', 'deliveries', 'result', 'last_error', 'received_at', 'updated_at', 'processed_at')
+    actions = ['requeue_events']
+
+    def requeue_events(self, request, queryset):
+        queued = queryset.exclude(status=WebhookEventStatus.PENDING).update(
+            status=WebhookEventStatus.PENDING, attempts=0, run_after=timezone.now(), last_error='',
+        )
+        self.message_user(request, f"{queued} notificação(ões) reenfileirada(s).", messages.SUCCESS)
+    requeue_events.short_description = "Reprocessar notificações selecionadas"
+
+    def has_add_permission(self, request):
+        # Events are created by the webhook
+        return False
+
+
 @admin.register(Highlight)
 class HighlightAdmin(admin.ModelAdmin):
     """Admin for Highlight model"""
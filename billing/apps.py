@@ -5,3 +5,7 @@ class BillingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'billing'
     verbose_name = 'Planos e Destaques'
+    
+    def ready(self):
+        """Import signals when app is ready"""
+        import billing.signals  # noqa
@@ -0,0 +1,173 @@
+"""
+Checkout preferences kept on the pending Payment, so checkout_view renders
+without calling Mercado Pago.
+
+A preference is stored with its init_point, the end of its reuse window
+(now + PREFERENCE_TTL) and the plan price it was made for
+(Payment.init_point / preference_expires_at / preference_price). Later
+checkouts reuse it while the window is open and the price is the same.
+
+Outside the request, refresh_stale_preferences() (run by the
+process_webhooks worker when the inbox is idle, or by its --once cron run)
+replaces the preferences of recent checkouts whose window ends within
+REFRESH_BEFORE or whose plan price changed, so the next visit still finds
+a usable one. A checkout that finds none creates it during the request.
+
+The window is ours only: no expiration is set at Mercado Pago, so a
+payment link the payer already opened keeps working as before.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.locks import advisory_lock
+from .gateway import GatewayError, GatewayUnavailable, get_gateway
+from .models import Payment, PaymentMethodChoices, PaymentStatusChoices
+
+logger = logging.getLogger(__name__)
+
+PREFERENCE_TTL = timedelta(days=3)
+REFRESH_BEFORE = timedelta(hours=12)
+# Checkouts older than this are not kept warm; their next visit creates a new preference
+REFRESH_MAX_AGE = timedelta(days=30)
+REFRESH_BATCH = 50
+REFRESH_LOCK_NAME = 'checkout_preferences'
+
+
+def preference_data(subscription, user):
+    """Mercado Pago preference for one month of `subscription`."""
+    # Ensure user has email
+    user_email = user.email or f"{user.username}@treinacnh.com.br"
+    return {
+        "items": [
+            {
+                "title": f"{subscription.plan.name} - TreinaCNH",
+                "quantity": 1,
+                "unit_price": float(subscription.plan.price_monthly),
+                "currency_id": "BRL",
+                "description": f"Renovação de assinatura - {subscription.plan.name}"
+            }
+        ],
+        "payer": {
+            "name": user.first_name or "Instrutor",
+            "surname": user.last_name or "TreinaCNH",
+            "email": user_email,
+        },
+        "payment_methods": {
+            "excluded_payment_methods": [],
+            "excluded_payment_types": [],
+            "installments": 12,  # Permite parcelamento em até 12x
+            "default_installments": 1
+        },
+        "back_urls": {
+            "success": f"{settings.SITE_URL}/planos/pagamento/sucesso/",
+            "failure": f"{settings.SITE_URL}/planos/pagamento/falha/",
+            "pending": f"{settings.SITE_URL}/planos/pagamento/pendente/"
+        },
+        "auto_return": "approved",
+        "notification_url": f"{settings.SITE_URL}/webhook/mercadopago/",
+        "external_reference": f"subscription_{subscription.id}",
+        "statement_descriptor": "TREINACNH",
+    }
+
+
+def is_reusable(payment, price, now=None):
+    """The stored preference can be reused for `price`."""
+    now = now or timezone.now()
+    return bool(
+        payment.preference_id
+        and payment.init_point
+        and payment.preference_expires_at
+        and payment.preference_expires_at > now
+        and payment.preference_price == price
+    )
+
+
+def create_preference(payment, user):
+    """Create a preference for the pending `payment` (saved). Raises GatewayError."""
+    subscription = payment.subscription
+    price = subscription.plan.price_monthly
+    # Raises GatewayError unless Mercado Pago answers 201
+    preference = get_gateway().create_preference(preference_data(subscription, user))
+
+    payment.preference_id = preference["id"]
+    payment.init_point = preference["init_point"]  # Get redirect URL
+    payment.preference_expires_at = timezone.now() + PREFERENCE_TTL
+    payment.preference_price = price
+    payment.amount = price
+    if payment.pk:
+        payment.save(update_fields=[
+            'preference_id', 'init_point', 'preference_expires_at', 'preference_price', 'amount', 'updated_at',
+        ])
+    else:
+        payment.save()
+    logger.info(f"Preference created: {payment.preference_id} for subscription {subscription.id}")
+    return payment
+
+
+def checkout_payment(subscription, user):
+    """
+    The pending Payment of `subscription` with a usable preference
+    (preference_id, init_point), creating one only when needed.
+    Raises GatewayError when Mercado Pago cannot create it.
+    """
+    now = timezone.now()
+    price = subscription.plan.price_monthly
+    payment = subscription.payments.filter(status=PaymentStatusChoices.PENDING).order_by('-created_at').first()
+
+    if payment is not None and is_reusable(payment, price, now):
+        logger.info(f"Reusing preference {payment.preference_id} for subscription {subscription.id}")
+        return payment
+
+    if payment is None:
+        payment = Payment(
+            subscription=subscription,
+            amount=price,
+            payment_method=PaymentMethodChoices.PIX,
+            status=PaymentStatusChoices.PENDING,
+            external_id=f"pending_{subscription.id}_{now.timestamp()}",
+        )
+    return create_preference(payment, user)
+
+
+def stale_preferences(now=None):
+    """Pending payments of recent checkouts whose preference is ending soon or repriced."""
+    now = now or timezone.now()
+    return Payment.objects.filter(
+        status=PaymentStatusChoices.PENDING,
+        created_at__gte=now - REFRESH_MAX_AGE,
+    ).exclude(preference_id='').filter(
+        Q(preference_expires_at__lt=now + REFRESH_BEFORE)
+        | ~Q(preference_price=F('subscription__plan__price_monthly'))
+    )
+
+
+def refresh_stale_preferences(now=None, limit=REFRESH_BATCH):
+    """
+    Replace up to `limit` stale preferences (stale_preferences), oldest
+    window first. Returns {'refreshed': n, 'errors': n}; stops at the first
+    Mercado Pago outage, the rest waits for the next run.
+    """
+    stats = {'refreshed': 0, 'errors': 0}
+    with advisory_lock(REFRESH_LOCK_NAME) as acquired:
+        if not acquired:
+            return stats
+        payments = stale_preferences(now).select_related(
+            'subscription__plan', 'subscription__instructor__user',
+        ).order_by('preference_expires_at')[:limit]
+        for payment in payments:
+            try:
+                create_preference(payment, payment.subscription.instructor.user)
+            except GatewayError as exc:
+                stats['errors'] += 1
+                logger.warning(f"Preference refresh failed for payment {payment.pk}: {exc}")
+                if isinstance(exc, GatewayUnavailable):
+                    break
+            else:
+                stats['refreshed'] += 1
+    if stats['refreshed'] or stats['errors']:
+        logger.info(f"Preference refresh: {stats}")
+    return stats
@@ -0,0 +1,343 @@
+"""
+Mercado Pago gateway: the one place billing talks to Mercado Pago.
+
+    from billing.gateway import get_gateway
+
+    payment = get_gateway().get_payment('123')            # the API "response" dict
+    preference = get_gateway().create_preference({...})
+
+get_gateway() returns one gateway per process (settings.MERCADOPAGO_GATEWAY),
+built on one mercadopago.SDK whose HTTP client keeps a requests.Session:
+
+- connections are kept alive and pooled (POOL_SIZE per host) instead of a
+  new TLS handshake per call;
+- every call has a (CONNECT_TIMEOUT, READ_TIMEOUT) timeout; reads (GET) are
+  retried on 429/5xx up to MAX_RETRIES times, writes never (a preference
+  must not be created twice);
+- a circuit breaker: after BREAKER_FAILURES consecutive failures (network
+  error, timeout, 429/5xx) calls fail fast with GatewayUnavailable for
+  BREAKER_RESET seconds, then one trial call decides whether it closes;
+- per operation counters (ok / error / unavailable / rejected) and total
+  latency are kept in the shared cache; see `manage.py mercadopago_stats`.
+
+Errors: GatewayError when Mercado Pago answers with an error status
+(.status, .response), GatewayUnavailable (a GatewayError) when it could not
+be reached, answered 429/5xx or the circuit is open.
+
+FakeGateway answers from in-memory payments/preferences, through the same
+breaker and metrics, for tests (set_gateway()) and load benchmarks
+(MERCADOPAGO_GATEWAY=billing.gateway.FakeGateway).
+"""
+import logging
+import threading
+import time
+import uuid
+
+import mercadopago
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+from mercadopago.config import RequestOptions
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from core.cache import CacheNamespace
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+POOL_SIZE = 10
+MAX_RETRIES = 2
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+BREAKER_FAILURES = 5
+BREAKER_RESET = 30  # seconds
+
+OUTCOMES = ('ok', 'error', 'unavailable', 'rejected')
+metrics_cache = CacheNamespace('mercadopago_metrics', timeout=None)
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+class GatewayError(Exception):
+    """Mercado Pago answered with an error status."""
+
+    def __init__(self, message, status=None, response=None):
+        super().__init__(message)
+        self.status = status
+        self.response = response or {}
+
+
+class GatewayUnavailable(GatewayError):
+    """Mercado Pago could not be reached, is overloaded, or the circuit is open."""
+
+
+class PooledHttpClient(HttpClient):
+    """mercadopago HttpClient on one shared requests.Session (keep-alive pool)."""
+
+    def __init__(self, pool_size=POOL_SIZE, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), max_retries=MAX_RETRIES):
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=max_retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({'GET'}),
+            backoff_factor=0.2,
+            raise_on_status=False,
+        )
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+
+    def request(self, method, url, maxretries=None, **kwargs):
+        kwargs['timeout'] = self.timeout  # the SDK only knows one float for both phases
+        api_result = self.session.request(method, url, **kwargs)
+        try:
+            body = api_result.json()
+        except ValueError:
+            body = {'message': api_result.text[:200]}
+        return {'status': api_result.status_code, 'response': body}
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker (closed -> open -> half-open), per process."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.max_failures = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_after else 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.max_failures:
+                if self.opened_at is None:
+                    logger.error(f"Mercado Pago circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+class MercadoPagoGateway:
+    """Mercado Pago calls used by billing, through the breaker and the metrics."""
+
+    def __init__(self, access_token=None):
+        self.breaker = CircuitBreaker()
+        self.sdk = self.build_sdk(settings.MERCADOPAGO_ACCESS_TOKEN if access_token is None else access_token)
+
+    def build_sdk(self, access_token):
+        return mercadopago.SDK(
+            access_token,
+            http_client=PooledHttpClient(),
+            request_options=RequestOptions(connection_timeout=float(READ_TIMEOUT), max_retries=MAX_RETRIES),
+        )
+
+    def get_payment(self, payment_id):
+        return self._call('payment.get', lambda sdk: sdk.payment().get(payment_id))
+
+    def search_payments(self, filters):
+        return self._call('payment.search', lambda sdk: sdk.payment().search(filters))
+
+    def get_preference(self, preference_id):
+        return self._call('preference.get', lambda sdk: sdk.preference().get(preference_id))
+
+    def create_preference(self, preference_data):
+        return self._call('preference.create', lambda sdk: sdk.preference().create(preference_data), expected_status=201)
+
+    def _call(self, operation, call, expected_status=200):
+        if not self.breaker.allow():
+            record_call(operation, 'rejected')
+            raise GatewayUnavailable('Mercado Pago indisponível (circuito aberto)')
+
+        started = time.perf_counter()
+        try:
+            result = call(self.sdk)
+        except Exception as exc:  # connection errors, timeouts, invalid answers
+            self.breaker.record_failure()
+            record_call(operation, 'unavailable', started)
+            raise GatewayUnavailable(f'Erro ao consultar o Mercado Pago: {exc}') from exc
+
+        status = result.get('status')
+        response = result.get('response') or {}
+        if status == expected_status:
+            self.breaker.record_success()
+            record_call(operation, 'ok', started)
+            return response
+
+        message = response.get('message', 'Erro desconhecido') if isinstance(response, dict) else 'Erro desconhecido'
+        error = f'Mercado Pago retornou status {status}: {message}'
+        if status in RETRY_STATUSES or not isinstance(status, int) or status >= 500:
+            self.breaker.record_failure()
+            record_call(operation, 'unavailable', started)
+            raise GatewayUnavailable(error, status, response)
+        self.breaker.record_success()  # Mercado Pago is up, the request was refused
+        record_call(operation, 'error', started)
+        raise GatewayError(error, status, response)
+
+
+class _FakeResource:
+    def __init__(self, gateway, kind):
+        self.gateway = gateway
+        self.kind = kind
+
+    def _answer(self, answer):
+        if self.gateway.latency:
+            time.sleep(self.gateway.latency)
+        if self.gateway.outage is not None:
+            raise self.gateway.outage
+        return answer
+
+    def get(self, resource_id):
+        self.gateway.calls.append((f'{self.kind}.get', str(resource_id)))
+        store = self.gateway.payments if self.kind == 'payment' else self.gateway.preferences
+        return self._answer(store.get(str(resource_id), {'status': 404, 'response': {'message': 'not found'}}))
+
+    def search(self, filters=None):
+        filters = filters or {}
+        self.gateway.calls.append((f'{self.kind}.search', filters))
+        results = [
+            answer['response'] for answer in self.gateway.payments.values()
+            if answer.get('status') == 200 and all(
+                str(answer['response'].get(field)) == str(value)
+                for field, value in filters.items()
+                if field not in ('limit', 'offset', 'sort', 'criteria', 'range', 'begin_date', 'end_date')
+            )
+        ]
+        if filters.get('range'):
+            begin, end = parse_datetime(filters['begin_date']), parse_datetime(filters['end_date'])
+            results = [
+                data for data in results
+                if begin <= parse_datetime(data.get(filters['range']) or filters['begin_date']) <= end
+            ]
+        if filters.get('sort'):
+            results.sort(key=lambda data: str(data.get(filters['sort'])), reverse=filters.get('criteria') == 'desc')
+        offset = int(filters.get('offset', 0))
+        limit = int(filters.get('limit', 30))
+        return self._answer({'status': 200, 'response': {
+            'results': results[offset:offset + limit],
+            'paging': {'total': len(results), 'offset': offset, 'limit': limit},
+        }})
+
+    def create(self, data):
+        self.gateway.calls.append((f'{self.kind}.create', data))
+        preference_id = f'fake-{uuid.uuid4().hex[:12]}'
+        response = {
+            'id': preference_id,
+            'init_point': f'https://www.mercadopago.com.br/checkout/v1/redirect?pref_id={preference_id}',
+            **data,
+        }
+        self.gateway.preferences[preference_id] = {'status': 200, 'response': response}
+        return self._answer({'status': 201, 'response': response})
+
+
+class _FakeSDK:
+    def __init__(self, gateway):
+        self.gateway = gateway
+
+    def payment(self):
+        return _FakeResource(self.gateway, 'payment')
+
+    def preference(self):
+        return _FakeResource(self.gateway, 'preference')
+
+
+class FakeGateway(MercadoPagoGateway):
+    """
+    Local stand-in for Mercado Pago. Answers are raw API results
+    ({'status': ..., 'response': {...}}):
+
+        gateway.add_payment({'status': 200, 'response': {'id': 1, 'status': 'approved', ...}})
+        gateway.payments['2'] = {'status': 500, 'response': {}}
+        gateway.outage = ConnectionError('timeout')   # every call raises
+
+    `calls` lists (operation, argument) of every call; `latency` (seconds) is
+    added to each one for load benchmarks.
+    """
+
+    def __init__(self, access_token=None, latency=0.0):
+        self.payments = {}
+        self.preferences = {}
+        self.calls = []
+        self.latency = latency
+        self.outage = None
+        super().__init__(access_token)
+
+    def build_sdk(self, access_token):
+        return _FakeSDK(self)
+
+    def add_payment(self, answer):
+        self.payments[str(answer['response']['id'])] = answer
+
+
+def record_call(operation, outcome, started=None):
+    metrics_cache.incr(f'{operation}:{outcome}')
+    if started is not None:
+        metrics_cache.incr(f'{operation}:ms', int((time.perf_counter() - started) * 1000))
+
+
+def gateway_stats(operations=('payment.get', 'payment.search', 'preference.get', 'preference.create')):
+    """{operation: {ok, error, unavailable, rejected, avg_ms}} since the last reset."""
+    keys = [f'{operation}:{suffix}' for operation in operations for suffix in OUTCOMES + ('ms',)]
+    values = metrics_cache.get_many(keys)
+    stats = {}
+    for operation in operations:
+        counts = {outcome: values.get(f'{operation}:{outcome}', 0) for outcome in OUTCOMES}
+        timed = counts['ok'] + counts['error'] + counts['unavailable']
+        counts['avg_ms'] = values.get(f'{operation}:ms', 0) / timed if timed else 0.0
+        stats[operation] = counts
+    return stats
+
+
+def reset_gateway_stats(operations=('payment.get', 'payment.search', 'preference.get', 'preference.create')):
+    metrics_cache.delete_many([f'{operation}:{suffix}' for operation in operations for suffix in OUTCOMES + ('ms',)])
+
+
+def get_gateway():
+    """The process-wide gateway (settings.MERCADOPAGO_GATEWAY)."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = import_string(settings.MERCADOPAGO_GATEWAY)()
+    return _gateway
+
+
+def set_gateway(gateway):
+    """Install `gateway` (tests); returns the previous one."""
+    global _gateway
+    previous, _gateway = _gateway, gateway
+    return previous
+
+
+@receiver(setting_changed)
+def _reset_gateway(setting, **kwargs):
+    if setting == 'MERCADOPAGO_GATEWAY':
+        set_gateway(None)
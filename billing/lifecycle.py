@@ -0,0 +1,198 @@
+"""
+Subscription and trial lifecycle sweep (`manage.py run_lifecycle`, cron).
+
+A run covers the STEPS it is given (all by default):
+
+- "subscriptions": ACTIVE subscriptions whose end_date passed are PAUSED,
+  and those ending in EXPIRING_DAYS days are listed;
+- "trials": trials whose trial_end_date passed are ended (profile hidden),
+  and trials ending in 7, 3 and 1 days get their warning flag set and
+  e-mail.
+
+Each step has its own advisory lock ("<LOCK_NAME>:<step>"), so overlapping
+cron ticks sharing a step skip, while the legacy single-step commands
+(validate_subscriptions, check_trial_periods) can run side by side.
+
+Each step reads the affected ids once (values_list) and changes them with
+UPDATEs of BATCH_SIZE ids that repeat the step's filter, so a row renewed
+in the meantime is left alone. The flags and statuses written are the
+filters of the next run, which makes the sweep idempotent: rerunning it
+changes nothing and sends nothing twice.
+
+UPDATE skips save() and the signals, so afterwards the lead access of the
+affected instructors is refreshed in bulk, and the map markers and cached
+cards of the hidden ones. The trial e-mails go out last, over one mail
+connection. Every run logs one summary line (run["stats"]).
+"""
+import logging
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.utils import timezone
+
+from core.locks import advisory_lock
+from marketplace.card_cache import bump_card_version
+from marketplace.lead_access import access_date, refresh_lead_access
+from marketplace.map_markers import refresh_instructor_markers
+from marketplace.models import InstructorProfile
+from marketplace.trial_emails import send_trial_expired_email, send_trial_warning_email
+from .models import Subscription, SubscriptionStatusChoices
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'billing_lifecycle'
+STEPS = ('subscriptions', 'trials')
+BATCH_SIZE = 1000
+EXPIRING_DAYS = 3
+
+# Days before the trial ends → flag of the warning already sent
+TRIAL_WARNINGS = {
+    7: 'trial_expiration_notified_7d',
+    3: 'trial_expiration_notified_3d',
+    1: 'trial_expiration_notified_1d',
+}
+
+
+def _batches(ids, size=BATCH_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _update(queryset, ids, **values):
+    """UPDATE the rows of `ids` still matching `queryset`. Returns the row count."""
+    return sum(queryset.filter(pk__in=batch).update(**values) for batch in _batches(ids))
+
+
+def expired_subscriptions(today):
+    return Subscription.objects.filter(status=SubscriptionStatusChoices.ACTIVE, end_date__lt=today)
+
+
+def expiring_subscriptions(today, days=EXPIRING_DAYS):
+    return Subscription.objects.filter(status=SubscriptionStatusChoices.ACTIVE, end_date=today + timedelta(days=days))
+
+
+def expired_trials(now):
+    return InstructorProfile.objects.filter(is_trial_active=True, trial_end_date__lte=now)
+
+
+def trial_warnings(now, days):
+    """Active trials ending in `days` days (as (trial_end_date - now).days) not warned yet."""
+    return InstructorProfile.objects.filter(
+        is_trial_active=True,
+        trial_end_date__gte=now + timedelta(days=days),
+        trial_end_date__lt=now + timedelta(days=days + 1),
+        **{TRIAL_WARNINGS[days]: False},
+    )
+
+
+def pause_expired_subscriptions(today, dry_run=False):
+    """Pause the expired subscriptions. Returns (subscription ids, instructor ids)."""
+    queryset = expired_subscriptions(today)
+    rows = list(queryset.values_list('pk', 'instructor_id'))
+    subscription_ids = [pk for pk, _ in rows]
+    if not dry_run:
+        _update(queryset, subscription_ids, status=SubscriptionStatusChoices.PAUSED, updated_at=timezone.now())
+    return subscription_ids, sorted({instructor_id for _, instructor_id in rows})
+
+
+def end_expired_trials(now, dry_run=False):
+    """
+    End and hide the expired trials. Returns (instructor ids, ids to notify);
+    instructors already notified by an earlier run are not notified again.
+    """
+    queryset = expired_trials(now)
+    rows = list(queryset.values_list('pk', 'trial_blocked_notified'))
+    instructor_ids = [pk for pk, _ in rows]
+    if not dry_run:
+        _update(queryset, instructor_ids, is_trial_active=False, is_visible=False, trial_blocked_notified=True)
+    return instructor_ids, [pk for pk, notified in rows if not notified]
+
+
+def flag_trial_warnings(now, dry_run=False):
+    """Set the 7/3/1-day warning flags. Returns {days: instructor ids}."""
+    warned = {}
+    for days, flag in TRIAL_WARNINGS.items():
+        queryset = trial_warnings(now, days)
+        warned[days] = list(queryset.values_list('pk', flat=True))
+        if not dry_run:
+            _update(queryset, warned[days], **{flag: True})
+    return warned
+
+
+def _sync_instructors(access_ids, hidden_ids):
+    """What save() and the signals would have done for the UPDATEd rows."""
+    changed = refresh_lead_access(access_ids, batch_size=BATCH_SIZE)
+    for batch in _batches(hidden_ids):
+        refresh_instructor_markers(batch)
+        bump_card_version(*batch)
+    return changed
+
+
+def _send_trial_emails(ended_ids, warned):
+    sent = failed = 0
+    connection = get_connection()
+    jobs = [(ended_ids, None)] + [(ids, days) for days, ids in warned.items()]
+    for ids, days in jobs:
+        for batch in _batches(ids):
+            instructors = InstructorProfile.objects.filter(pk__in=batch).select_related('user').only(
+                'pk', 'trial_end_date', 'user__first_name', 'user__email',
+            )
+            for instructor in instructors:
+                if days is None:
+                    ok = send_trial_expired_email(instructor, connection=connection)
+                else:
+                    ok = send_trial_warning_email(instructor, days, connection=connection)
+                sent, failed = sent + ok, failed + (not ok)
+    return sent, failed
+
+
+def step_lock_name(step):
+    return f'{LOCK_NAME}:{step}'
+
+
+def run_lifecycle(now=None, dry_run=False, notify=True, steps=STEPS):
+    """
+    Run the `steps` of the sweep once. Returns {"acquired", "ids", "stats"}:
+    the ids affected per step and the counts logged for the run. "acquired"
+    is False (and nothing is done) when another run holds one of the locks.
+    """
+    started = time.perf_counter()
+    now = now or timezone.now()
+    today = access_date(now)
+    run = {'acquired': False, 'ids': {}, 'stats': {'dry_run': dry_run}}
+
+    with ExitStack() as locks:
+        if not all(locks.enter_context(advisory_lock(step_lock_name(step))) for step in steps):
+            logger.warning(f"Lifecycle sweep {'/'.join(steps)} skipped: another run holds the lock")
+            return run
+        run['acquired'] = True
+
+        paused_instructor_ids, ended_ids, ended_notify_ids, warned = [], [], [], {}
+        if 'subscriptions' in steps:
+            paused_ids, paused_instructor_ids = pause_expired_subscriptions(today, dry_run)
+            run['ids'].update(
+                paused_subscriptions=paused_ids,
+                expiring_subscriptions=list(expiring_subscriptions(today).values_list('pk', flat=True)),
+            )
+        if 'trials' in steps:
+            ended_ids, ended_notify_ids = end_expired_trials(now, dry_run)
+            warned = flag_trial_warnings(now, dry_run)
+            run['ids'].update(
+                ended_trials=ended_ids,
+                ended_trials_to_notify=ended_notify_ids,
+                **{f'trial_warning_{days}d': ids for days, ids in warned.items()},
+            )
+
+        stats = run['stats']
+        stats.update({name: len(ids) for name, ids in run['ids'].items()})
+        stats.update(lead_access_changed=0, emails_sent=0, email_errors=0)
+        if not dry_run:
+            stats['lead_access_changed'] = _sync_instructors(sorted({*paused_instructor_ids, *ended_ids}), ended_ids)
+            if notify and 'trials' in steps:
+                stats['emails_sent'], stats['email_errors'] = _send_trial_emails(ended_notify_ids, warned)
+
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(f"Lifecycle sweep: {stats}")
+    return run
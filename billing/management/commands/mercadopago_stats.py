@@ -0,0 +1,29 @@
+"""
+Management command to show the Mercado Pago call counters and latency
+(see billing/gateway.py).
+
+Usage:
+    python manage.py mercadopago_stats
+    python manage.py mercadopago_stats --reset
+"""
+from django.core.management.base import BaseCommand
+
+from billing.gateway import gateway_stats, reset_gateway_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the Mercado Pago call counters (ok/error/unavailable/rejected) and average latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zera os contadores após exibir')
+
+    def handle(self, *args, **options):
+        for operation, stats in gateway_stats().items():
+            self.stdout.write(
+                f"{operation:<18} ok: {stats['ok']}  erro: {stats['error']}  "
+                f"indisponível: {stats['unavailable']}  circuito aberto: {stats['rejected']}  "
+                f"média: {stats['avg_ms']:.0f}ms"
+            )
+        if options['reset']:
+            reset_gateway_stats()
+            self.stdout.write(self.style.SUCCESS('✓ Contadores zerados'))
@@ -0,0 +1,71 @@
+"""
+Management command that works through the Mercado Pago webhook inbox
+(billing/webhooks.py). Run it as a long-lived worker (supervisor/systemd)
+or from cron with --once. When the inbox is empty it also renews the
+checkout preferences about to leave their reuse window (at most every
+--refresh-interval seconds; billing/checkout.py).
+
+Usage:
+    python manage.py process_webhooks                  # worker: waits for new notifications
+    python manage.py process_webhooks --once           # process the due notifications and exit
+    python manage.py process_webhooks --max-events 100
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from billing.checkout import refresh_stale_preferences
+from billing.models import WebhookEventStatus
+from billing.webhooks import inbox_counts, run_due_events
+
+
+class Command(BaseCommand):
+    help = 'Process the Mercado Pago notifications stored by the webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the due notifications and exit')
+        parser.add_argument('--max-events', type=int, default=None, help='Stop after this many notifications')
+        parser.add_argument('--idle-sleep', type=float, default=2.0, help='Seconds to wait when the inbox is empty')
+        parser.add_argument(
+            '--refresh-interval',
+            type=float,
+            default=300.0,
+            help='Seconds between checkout preference refreshes while idle',
+        )
+
+    def handle(self, *args, **options):
+        totals = dict.fromkeys(WebhookEventStatus.values, 0)
+        refreshed = {'refreshed': 0, 'errors': 0}
+        remaining = options['max_events']
+        next_refresh = time.monotonic()
+        try:
+            while remaining is None or remaining > 0:
+                stats = run_due_events(max_events=remaining)
+                processed = sum(stats.values())
+                for status, count in stats.items():
+                    totals[status] += count
+                if remaining is not None:
+                    remaining -= processed
+                if not processed:
+                    if time.monotonic() >= next_refresh:
+                        for name, count in refresh_stale_preferences().items():
+                            refreshed[name] += count
+                        next_refresh = time.monotonic() + options['refresh_interval']
+                    if options['once']:
+                        break
+                    time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write('Interrompido.')
+
+        pending = inbox_counts()[WebhookEventStatus.PENDING]
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Webhooks: {totals[WebhookEventStatus.PROCESSED]} processado(s), "
+            f"{totals[WebhookEventStatus.IGNORED]} ignorado(s), "
+            f"{totals[WebhookEventStatus.PENDING]} reagendado(s), "
+            f"{totals[WebhookEventStatus.FAILED]} falha(s); {pending} pendente(s)"
+        ))
+        if refreshed['refreshed'] or refreshed['errors']:
+            self.stdout.write(
+                f"  Preferências de checkout renovadas: {refreshed['refreshed']} "
+                f"({refreshed['errors']} erro(s))"
+            )
@@ -0,0 +1,52 @@
+"""
+Management command that runs the subscription and trial lifecycle sweep
+(billing/lifecycle.py): pauses expired subscriptions, ends expired trials
+and sends the trial e-mails. Safe to run from several cron entries: a run
+that finds the lock taken does nothing.
+
+Usage:
+    python manage.py run_lifecycle             # daily via cron
+    python manage.py run_lifecycle --dry-run   # show what would change
+    python manage.py run_lifecycle --no-email
+"""
+from django.core.management.base import BaseCommand
+
+from billing.lifecycle import EXPIRING_DAYS, STEPS, run_lifecycle
+
+
+class Command(BaseCommand):
+    help = 'Pause expired subscriptions, end expired trials and send the trial e-mails'
+    steps = STEPS
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Show what would be done without making changes')
+        parser.add_argument('--no-email', action='store_true', help='Update statuses and flags without sending e-mails')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        run = run_lifecycle(dry_run=dry_run, notify=not options['no_email'], steps=self.steps)
+        if not run['acquired']:
+            self.stdout.write(self.style.WARNING('Outra execução em andamento; nada feito.'))
+            return
+
+        stats = run['stats']
+        done = []
+        if 'subscriptions' in self.steps:
+            done += [
+                f"{stats['paused_subscriptions']} assinatura(s) pausada(s)",
+                f"{stats['expiring_subscriptions']} vencendo em {EXPIRING_DAYS} dias",
+            ]
+        if 'trials' in self.steps:
+            done += [
+                f"{stats['ended_trials']} trial(s) encerrado(s)",
+                f"avisos de trial 7d/3d/1d: {stats['trial_warning_7d']}/{stats['trial_warning_3d']}/{stats['trial_warning_1d']}",
+            ]
+        self.stdout.write(self.style.SUCCESS(f"✓ Ciclo de vida{' (dry run)' if dry_run else ''}: {', '.join(done)}"))
+        self.stdout.write(
+            f"  {stats['emails_sent']} e-mail(s) enviado(s), {stats['email_errors']} erro(s); "
+            f"acesso a leads atualizado para {stats['lead_access_changed']} instrutor(es) "
+            f"em {stats['seconds']}s"
+        )
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:50
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_payment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=50, verbose_name='Tipo')),
+                ('resource_id', models.CharField(max_length=64, verbose_name='ID do Recurso')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='Notificação')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendente'), ('RUNNING', 'Em execução'), ('PROCESSED', 'Processado'), ('IGNORED', 'Ignorado'), ('FAILED', 'Falhou')], default='PENDING', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('deliveries', models.PositiveIntegerField(default=1, help_text='Quantas vezes o Mercado Pago enviou esta notificação', verbose_name='Recebimentos')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Próxima tentativa (backoff) ou fim da reserva de um evento em execução', verbose_name='Executar após')),
+                ('result', models.CharField(blank=True, max_length=255, verbose_name='Resultado')),
+                ('last_error', models.CharField(blank=True, max_length=255, verbose_name='Último erro')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Recebido em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Processado em')),
+            ],
+            options={
+                'verbose_name': 'Notificação (Webhook)',
+                'verbose_name_plural': 'Notificações (Webhook)',
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='billing_web_status_91b33a_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='webhookevent',
+            constraint=models.UniqueConstraint(fields=('topic', 'resource_id'), name='unique_webhook_event'),
+        ),
+    ]
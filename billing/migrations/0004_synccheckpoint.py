@@ -0,0 +1,27 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_webhookevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Nome')),
+                ('position', models.DateTimeField(blank=True, null=True, verbose_name='Posição')),
+                ('last_run', models.JSONField(blank=True, default=dict, verbose_name='Última execução')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Checkpoint de Sincronização',
+                'verbose_name_plural': 'Checkpoints de Sincronização',
+            },
+        ),
+    ]
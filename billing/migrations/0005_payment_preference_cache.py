@@ -0,0 +1,28 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_synccheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='init_point',
+            field=models.URLField(blank=True, max_length=500, verbose_name='Link de Pagamento'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='preference_expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Preferência expira em'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='preference_price',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Preço do plano quando a preferência foi criada', max_digits=8, null=True, verbose_name='Preço da Preferência'),
+        ),
+    ]
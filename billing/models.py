@@ -1,5 +1,5 @@
 """
-Models for billing app - Plans, Subscriptions, Payments and Highlights.
+Models for billing app - Plans, Subscriptions, Payments, Webhook events and Highlights.
 """
 from django.db import models
 from django.utils import timezone
@@ -145,6 +145,17 @@ class Payment(models.Model):
         blank=True,
         help_text='ID da preferência criada no Mercado Pago'
     )
+    # Checkout preference kept locally (see billing/checkout.py)
+    init_point = models.URLField('Link de Pagamento', max_length=500, blank=True)
+    preference_expires_at = models.DateTimeField('Preferência expira em', null=True, blank=True)
+    preference_price = models.DecimalField(
+        'Preço da Preferência',
+        max_digits=8,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text='Preço do plano quando a preferência foi criada'
+    )
     
     # Timestamps
     paid_at = models.DateTimeField('Pago em', null=True, blank=True)
@@ -180,6 +191,80 @@ class Payment(models.Model):
         return self.status == PaymentStatusChoices.APPROVED and self.paid_at is not None
 
 
+class WebhookEventStatus(models.TextChoices):
+    PENDING = 'PENDING', 'Pendente'
+    RUNNING = 'RUNNING', 'Em execução'
+    PROCESSED = 'PROCESSED', 'Processado'
+    IGNORED = 'IGNORED', 'Ignorado'
+    FAILED = 'FAILED', 'Falhou'
+
+
+class WebhookEvent(models.Model):
+    """
+    Inbox of Mercado Pago notifications (see billing/webhooks.py): the
+    webhook view only stores them, one row per (topic, resource_id);
+    `manage.py process_webhooks` fetches and applies them.
+    """
+    topic = models.CharField('Tipo', max_length=50)
+    resource_id = models.CharField('ID do Recurso', max_length=64)
+    payload = models.JSONField('Notificação', default=dict, blank=True)
+    status = models.CharField(
+        'Status',
+        max_length=10,
+        choices=WebhookEventStatus.choices,
+        default=WebhookEventStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField('Tentativas', default=0)
+    deliveries = models.PositiveIntegerField(
+        'Recebimentos',
+        default=1,
+        help_text='Quantas vezes o Mercado Pago enviou esta notificação',
+    )
+    run_after = models.DateTimeField(
+        'Executar após',
+        default=timezone.now,
+        help_text='Próxima tentativa (backoff) ou fim da reserva de um evento em execução',
+    )
+    result = models.CharField('Resultado', max_length=255, blank=True)
+    last_error = models.CharField('Último erro', max_length=255, blank=True)
+    received_at = models.DateTimeField('Recebido em', auto_now_add=True)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+    processed_at = models.DateTimeField('Processado em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Notificação (Webhook)'
+        verbose_name_plural = 'Notificações (Webhook)'
+        ordering = ['-received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['topic', 'resource_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            # Covers the worker claim: WHERE status IN (...) AND run_after <= now ORDER BY run_after
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.resource_id} ({self.get_status_display()})"
+
+
+class SyncCheckpoint(models.Model):
+    """
+    Where a periodic Mercado Pago sync stopped (see billing/reconciliation.py),
+    so the next run resumes from there.
+    """
+    name = models.CharField('Nome', max_length=50, unique=True)
+    position = models.DateTimeField('Posição', null=True, blank=True)
+    last_run = models.JSONField('Última execução', default=dict, blank=True)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Checkpoint de Sincronização'
+        verbose_name_plural = 'Checkpoints de Sincronização'
+
+    def __str__(self):
+        return f"{self.name} ({self.position})"
+
+
 class Highlight(models.Model):
     """
     Highlighted/featured instructors in specific cities.
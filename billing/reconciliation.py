@@ -0,0 +1,228 @@
+"""
+Reconciliation of pending payments with Mercado Pago, for notifications the
+webhook missed (`manage.py check_pending_payments`, cron).
+
+Instead of one GET per pending payment, the payments Mercado Pago updated
+since the checkpoint are listed with the payment search
+(range=date_last_updated, PAGE_SIZE per page, oldest first). Pages are read
+by keyset, not by offset: each page starts at the last date_last_updated
+of the previous one (results seen twice at that boundary are dropped by
+id), so deep scans never hit the search's offset cap and payments updated
+during the run cannot shift the pages. Only when a whole page shares one
+timestamp does the offset advance, within that timestamp. A background
+thread fetches the next page while the current one is applied. Results whose
+external_reference is a subscription with a pending Payment go through the
+webhook validation rules (webhooks.check_payment), and each page is applied
+in one transaction: payments and subscriptions with bulk_update, lead
+access refreshed once for the instructors involved.
+
+A Mercado Pago payment updates the local row with its id or, when the
+webhook never saw it, the checkout placeholder ("pending_<subscription>_...")
+of its subscription.
+
+The checkpoint (SyncCheckpoint CHECKPOINT_NAME) moves after every applied
+page, so a run stopped by --max-pages, a Mercado Pago outage or a kill
+resumes there; runs overlap by CHECKPOINT_OVERLAP since applying is
+idempotent.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from marketplace.lead_access import refresh_lead_access
+from .gateway import GatewayError, get_gateway
+from .models import (
+    Payment,
+    PaymentStatusChoices,
+    Plan,
+    Subscription,
+    SubscriptionStatusChoices,
+    SyncCheckpoint,
+)
+from .webhooks import MP_STATUS_MAP, check_payment, extended_end_date, is_truly_approved, payment_method_from_mp
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'pending_payments'
+CHECKPOINT_OVERLAP = timedelta(minutes=5)
+PAGE_SIZE = 100
+
+PAYMENT_FIELDS = ['external_id', 'amount', 'payment_method', 'status', 'payment_details', 'paid_at', 'updated_at']
+
+
+def _mp_date(value):
+    return value.isoformat(timespec='milliseconds')
+
+
+def _subscription_id(payment_data):
+    external_ref = payment_data.get('external_reference') or ''
+    subscription_id = external_ref.replace('subscription_', '', 1)
+    if external_ref.startswith('subscription_') and subscription_id.isdigit():
+        return int(subscription_id)
+    return None
+
+
+def search_page(gateway, begin, end, offset=0, page_size=PAGE_SIZE):
+    return gateway.search_payments({
+        'range': 'date_last_updated',
+        'begin_date': _mp_date(begin),
+        'end_date': _mp_date(end),
+        'sort': 'date_last_updated',
+        'criteria': 'asc',
+        'limit': page_size,
+        'offset': offset,
+    })
+
+
+def apply_page(results, pending_subscription_ids, stats, dry_run=False):
+    """Apply the settled payments of one search page (one transaction)."""
+    stats['scanned'] += len(results)
+    candidates = [
+        data for data in results
+        if _subscription_id(data) in pending_subscription_ids
+        and MP_STATUS_MAP.get(data.get('status'), PaymentStatusChoices.PENDING) != PaymentStatusChoices.PENDING
+    ]
+    if not candidates:
+        return
+    stats['matched'] += len(candidates)
+
+    with transaction.atomic():
+        subscriptions = Subscription.objects.select_for_update().in_bulk(
+            {_subscription_id(data) for data in candidates}
+        )
+        plans = Plan.objects.in_bulk({subscription.plan_id for subscription in subscriptions.values()})
+        for subscription in subscriptions.values():
+            subscription.plan = plans[subscription.plan_id]
+        existing = {
+            payment.external_id: payment
+            for payment in Payment.objects.select_for_update().filter(
+                external_id__in=[str(data['id']) for data in candidates],
+            )
+        }
+        placeholders = {}
+        for payment in Payment.objects.select_for_update().filter(
+            subscription_id__in=subscriptions,
+            status=PaymentStatusChoices.PENDING,
+            external_id__startswith='pending_',
+        ).order_by('created_at'):
+            placeholders.setdefault(payment.subscription_id, []).append(payment)
+
+        now = timezone.now()
+        today = now.date()
+        updated, created, extended = [], [], {}
+        for data in candidates:
+            mp_id = str(data['id'])
+            payment = existing.get(mp_id)
+            if payment is not None and payment.status != PaymentStatusChoices.PENDING:
+                continue  # the webhook got there first
+            subscription, reason = check_payment(mp_id, data, subscriptions)
+            if subscription is None:
+                stats['ignored'] += 1
+                continue
+            if payment is None:
+                queue = placeholders.get(subscription.id)
+                payment = queue.pop(0) if queue else Payment(subscription=subscription)
+                payment.external_id = mp_id
+
+            approved = is_truly_approved(data)
+            payment.amount = Decimal(str(data.get('transaction_amount', 0)))
+            payment.payment_method = payment_method_from_mp(data.get('payment_method_id'))
+            payment.status = MP_STATUS_MAP[data['status']]
+            payment.payment_details = data
+            payment.paid_at = now if approved else None
+            payment.updated_at = now
+            (updated if payment.pk else created).append(payment)
+            logger.info(f"Reconciled payment {mp_id}: {data['status']} ({data.get('status_detail')}) for subscription {subscription.id}")
+
+            if approved:
+                subscription.end_date = extended_end_date(subscription.end_date, today)
+                subscription.status = SubscriptionStatusChoices.ACTIVE
+                subscription.updated_at = now
+                extended[subscription.id] = subscription
+                stats['approved'] += 1
+
+        stats['updated'] += len(updated) + len(created)
+        if dry_run:
+            transaction.set_rollback(True)
+            return
+        Payment.objects.bulk_update(updated, PAYMENT_FIELDS)
+        Payment.objects.bulk_create(created)
+        Subscription.objects.bulk_update(extended.values(), ['end_date', 'status', 'updated_at'])
+        instructor_ids = {subscriptions[payment.subscription_id].instructor_id for payment in updated + created}
+        if instructor_ids:
+            transaction.on_commit(lambda: refresh_lead_access(instructor_ids))
+
+
+def reconcile(days=7, page_size=PAGE_SIZE, max_pages=None, dry_run=False, full=False):
+    """
+    Sync the payments pending for the last `days` days. `full` ignores the
+    checkpoint. Returns the run stats (pages, scanned, matched, updated,
+    approved, ignored, error, complete, seconds, per_second).
+    """
+    started = time.perf_counter()
+    now = timezone.now()
+    since = now - timedelta(days=days)
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    begin = since
+    if checkpoint.position and not full:
+        begin = max(since, checkpoint.position - CHECKPOINT_OVERLAP)
+
+    stats = dict.fromkeys(('pages', 'scanned', 'matched', 'updated', 'approved', 'ignored'), 0)
+    stats.update(error='', complete=False, begin=begin.isoformat())
+    pending_subscription_ids = set(Payment.objects.filter(
+        status=PaymentStatusChoices.PENDING,
+        created_at__gte=since,
+    ).values_list('subscription_id', flat=True))
+
+    position = begin
+    if pending_subscription_ids:
+        gateway = get_gateway()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mp-reconcile')
+        cursor, offset, seen = begin, 0, set()
+        try:
+            page = executor.submit(search_page, gateway, cursor, now, offset, page_size)
+            while page is not None:
+                results = page.result().get('results', [])
+                stamps = [parse_datetime(data.get('date_last_updated') or '') for data in results]
+                stamps = [stamp for stamp in stamps if stamp]
+                page = None
+                if len(results) < page_size:
+                    stats['complete'] = True
+                elif max_pages is None or stats['pages'] + 1 < max_pages:
+                    # Keyset: the next page starts where this one ended
+                    if stamps and max(stamps) > cursor:
+                        cursor, offset = max(stamps), 0
+                    else:
+                        offset += page_size  # a full page within one timestamp
+                    page = executor.submit(search_page, gateway, cursor, now, offset, page_size)
+
+                fresh = [data for data in results if data.get('id') not in seen]
+                seen.update(data.get('id') for data in fresh)
+                apply_page(fresh, pending_subscription_ids, stats, dry_run)
+                stats['pages'] += 1
+                if stamps:
+                    position = max(position, *stamps)
+                    if not dry_run:
+                        SyncCheckpoint.objects.filter(pk=checkpoint.pk).update(position=min(position, now))
+        except GatewayError as exc:
+            stats['error'] = str(exc)[:255]
+            logger.error(f"Reconciliation stopped at {position}: {exc}")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    else:
+        stats['complete'] = True
+
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    stats['per_second'] = round(stats['scanned'] / stats['seconds'], 1) if stats['seconds'] else 0.0
+    if not dry_run:
+        checkpoint.position = now if stats['complete'] else min(position, now)
+        checkpoint.last_run = stats
+        checkpoint.save(update_fields=['position', 'last_run', 'updated_at'])
+    logger.info(f"Reconciliation: {stats}")
+    return stats
@@ -0,0 +1,24 @@
+"""
+Signals for billing app.
+Keeps the instructor's denormalized lead access in sync with subscriptions
+and payments (see marketplace/lead_access.py).
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from marketplace.lead_access import refresh_lead_access
+from .models import Subscription, Payment
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def refresh_lead_access_on_subscription_change(sender, instance, **kwargs):
+    refresh_lead_access([instance.instructor_id])
+
+
+@receiver(post_save, sender=Payment)
+def refresh_lead_access_on_payment_change(sender, instance, **kwargs):
+    """Approved payments usually extend the subscription; re-check just in case."""
+    if instance.subscription_id:
+        refresh_lead_access(
+            Subscription.objects.filter(pk=instance.subscription_id).values_list('instructor_id', flat=True)
+        )
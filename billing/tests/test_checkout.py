@@ -0,0 +1,145 @@
+"""
+Testes da preferência de checkout guardada no Payment (billing/checkout.py).
+
+Cobertura:
+  1. Primeiro checkout cria a preferência (sem expiração no Mercado Pago) e
+     guarda init_point/validade/preço
+  2. Checkouts seguintes não chamam o Mercado Pago, até o fim da validade
+  3. Preço do plano mudou ou validade passou → nova preferência no request
+  4. Mercado Pago fora do ar no primeiro checkout → volta aos planos com erro
+  5. Fora do request (process_webhooks ocioso): preferência perto do fim da janela ou com
+     preço antigo é renovada; a recente fica, checkout antigo não é mantido; o próximo
+     checkout não chama o Mercado Pago
+  6. Mercado Pago fora do ar na renovação → erro contado, preferência atual mantida
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Profile
+from billing import checkout
+from billing.gateway import FakeGateway, set_gateway
+from billing.models import Payment, PaymentStatusChoices, Plan
+from billing.tests.factories import make_instructor_user, make_plan, make_subscription
+
+
+@override_settings(MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token", MERCADOPAGO_PUBLIC_KEY="TEST-public-key")
+class CheckoutPreferenceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user, instructor = make_instructor_user("inst_checkout", "inst_checkout@test.com")
+        Profile.objects.filter(user=user).update(is_profile_complete=True)
+        cls.user = User.objects.get(pk=user.pk)  # no stale cached profile
+        cls.plan = make_plan("Plano Checkout", price=49.99)
+        cls.sub = make_subscription(instructor, cls.plan)
+
+    def setUp(self):
+        cache.clear()
+        self.gateway = FakeGateway()
+        self.addCleanup(set_gateway, set_gateway(self.gateway))
+        self.client.force_login(self.user)
+        self.url = reverse("billing:checkout", args=[self.sub.id])
+
+    def _creates(self):
+        return [call for call in self.gateway.calls if call[0] == "preference.create"]
+
+    def test_first_checkout_stores_preference(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        payment = Payment.objects.get(subscription=self.sub, status=PaymentStatusChoices.PENDING)
+        self.assertContains(response, payment.init_point)
+        self.assertEqual(payment.preference_price, Decimal("49.99"))
+        self.assertGreater(payment.preference_expires_at, timezone.now() + timedelta(days=2))
+        self.assertNotIn("expires", self._creates()[0][1])
+        self.assertNotIn("expiration_date_to", self._creates()[0][1])
+
+    def test_repeat_checkout_makes_no_external_call(self):
+        self.client.get(self.url)
+        self.gateway.calls.clear()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.gateway.calls, [])
+        self.assertEqual(Payment.objects.filter(subscription=self.sub).count(), 1)
+
+    def test_price_change_or_expiry_creates_new_preference(self):
+        self.client.get(self.url)
+        first = Payment.objects.get(subscription=self.sub)
+
+        Plan.objects.filter(pk=self.plan.pk).update(price_monthly=Decimal("59.99"))
+        self.client.get(self.url)
+        payment = Payment.objects.get(subscription=self.sub)
+        self.assertNotEqual(payment.preference_id, first.preference_id)
+        self.assertEqual(payment.preference_price, Decimal("59.99"))
+        self.assertEqual(payment.amount, Decimal("59.99"))
+
+        Payment.objects.filter(pk=payment.pk).update(preference_expires_at=timezone.now() - timedelta(minutes=1))
+        self.client.get(self.url)
+        self.assertEqual(len(self._creates()), 3)
+        self.assertEqual(Payment.objects.filter(subscription=self.sub).count(), 1)
+
+    def test_reused_until_the_window_ends(self):
+        self.client.get(self.url)
+        payment = Payment.objects.get(subscription=self.sub)
+        Payment.objects.filter(pk=payment.pk).update(preference_expires_at=timezone.now() + timedelta(minutes=1))
+        self.gateway.calls.clear()
+
+        response = self.client.get(self.url)
+
+        self.assertContains(response, payment.init_point)
+        self.assertEqual(self.gateway.calls, [])
+
+    def test_gateway_down_on_first_checkout(self):
+        self.gateway.outage = ConnectionError("timeout")
+
+        response = self.client.get(self.url)
+
+        self.assertRedirects(response, reverse("billing:plans"), fetch_redirect_response=False)
+        self.assertFalse(Payment.objects.filter(subscription=self.sub).exists())
+
+    def test_stale_preferences_renewed_outside_the_request(self):
+        self.client.get(self.url)
+        payment = Payment.objects.get(subscription=self.sub)
+        ending = timezone.now() + checkout.REFRESH_BEFORE - timedelta(minutes=1)
+        Payment.objects.filter(pk=payment.pk).update(preference_expires_at=ending)
+        self.gateway.calls.clear()
+
+        out = StringIO()
+        call_command("process_webhooks", "--once", stdout=out)
+
+        self.assertIn("Preferências de checkout renovadas: 1", out.getvalue())
+        renewed = Payment.objects.get(pk=payment.pk)
+        self.assertNotEqual(renewed.preference_id, payment.preference_id)
+        self.assertGreater(renewed.preference_expires_at, timezone.now() + timedelta(days=2))
+        self.gateway.calls.clear()
+        self.assertContains(self.client.get(self.url), renewed.init_point)
+        self.assertEqual(self.gateway.calls, [])
+
+        # Fresh: kept. Repriced: renewed. Old checkout: left for its next visit.
+        self.assertEqual(checkout.refresh_stale_preferences()["refreshed"], 0)
+        Plan.objects.filter(pk=self.plan.pk).update(price_monthly=Decimal("59.99"))
+        self.assertEqual(checkout.refresh_stale_preferences()["refreshed"], 1)
+        self.assertEqual(Payment.objects.get(pk=payment.pk).preference_price, Decimal("59.99"))
+        Payment.objects.filter(pk=payment.pk).update(
+            preference_expires_at=ending, created_at=timezone.now() - checkout.REFRESH_MAX_AGE - timedelta(days=1),
+        )
+        self.assertEqual(checkout.refresh_stale_preferences()["refreshed"], 0)
+
+    def test_refresh_during_outage_keeps_preference(self):
+        self.client.get(self.url)
+        payment = Payment.objects.get(subscription=self.sub)
+        Payment.objects.filter(pk=payment.pk).update(preference_expires_at=timezone.now() + timedelta(hours=1))
+        self.gateway.outage = ConnectionError("timeout")
+
+        self.assertEqual(checkout.refresh_stale_preferences(), {"refreshed": 0, "errors": 1})
+        self.assertEqual(Payment.objects.get(pk=payment.pk).preference_id, payment.preference_id)
@@ -0,0 +1,138 @@
+"""
+Testes do gateway do Mercado Pago (billing/gateway.py).
+
+Cobertura:
+  1. get_payment devolve o "response"; 404 → GatewayError (não abre o circuito)
+  2. BREAKER_FAILURES falhas seguidas → circuito aberto, chamadas falham sem rede
+  3. Após BREAKER_RESET uma chamada de teste fecha (ou reabre) o circuito
+  4. Métricas por operação (ok / erro / indisponível / circuito aberto)
+  5. PooledHttpClient: uma sessão por processo e timeout (connect, read)
+  6. get_gateway() único por processo, trocado por MERCADOPAGO_GATEWAY
+"""
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from billing import gateway as gateway_module
+from billing.gateway import (
+    FakeGateway, GatewayError, GatewayUnavailable, PooledHttpClient,
+    gateway_stats, get_gateway, set_gateway,
+)
+from billing.tests.factories import mp_payment_response
+
+
+class GatewayCallTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.gateway = FakeGateway()
+
+    def test_get_payment_returns_response(self):
+        self.gateway.add_payment(mp_payment_response(payment_id=1, status="approved"))
+
+        payment = self.gateway.get_payment(1)
+
+        self.assertEqual(payment["status"], "approved")
+        self.assertEqual(self.gateway.calls, [("payment.get", "1")])
+
+    def test_not_found_is_an_error_but_keeps_circuit_closed(self):
+        for _ in range(gateway_module.BREAKER_FAILURES + 1):
+            with self.assertRaises(GatewayError) as raised:
+                self.gateway.get_payment(404)
+            self.assertNotIsInstance(raised.exception, GatewayUnavailable)
+            self.assertEqual(raised.exception.status, 404)
+        self.assertEqual(self.gateway.breaker.state, "closed")
+
+    def test_create_preference_expects_201(self):
+        preference = self.gateway.create_preference({"items": []})
+
+        self.assertTrue(preference["init_point"].startswith("https://"))
+        self.assertEqual(self.gateway.get_preference(preference["id"])["id"], preference["id"])
+
+    def test_circuit_opens_and_fails_fast(self):
+        self.gateway.outage = ConnectionError("timeout")
+        for _ in range(gateway_module.BREAKER_FAILURES):
+            with self.assertRaises(GatewayUnavailable):
+                self.gateway.get_payment(1)
+        self.assertEqual(self.gateway.breaker.state, "open")
+
+        calls = len(self.gateway.calls)
+        with self.assertRaisesMessage(GatewayUnavailable, "circuito aberto"):
+            self.gateway.get_payment(1)
+        self.assertEqual(len(self.gateway.calls), calls)  # no request made
+
+    def test_server_errors_open_the_circuit(self):
+        self.gateway.payments["1"] = {"status": 503, "response": {"message": "unavailable"}}
+        for _ in range(gateway_module.BREAKER_FAILURES):
+            with self.assertRaises(GatewayUnavailable):
+                self.gateway.get_payment(1)
+        self.assertEqual(self.gateway.breaker.state, "open")
+
+    def test_half_open_trial_closes_or_reopens(self):
+        self.gateway.outage = ConnectionError("timeout")
+        for _ in range(gateway_module.BREAKER_FAILURES):
+            with self.assertRaises(GatewayUnavailable):
+                self.gateway.get_payment(1)
+
+        self.gateway.breaker.opened_at -= gateway_module.BREAKER_RESET
+        self.assertEqual(self.gateway.breaker.state, "half-open")
+        with self.assertRaises(GatewayUnavailable):
+            self.gateway.get_payment(1)  # trial fails
+        self.assertEqual(self.gateway.breaker.state, "open")
+
+        self.gateway.breaker.opened_at -= gateway_module.BREAKER_RESET
+        self.gateway.outage = None
+        self.gateway.add_payment(mp_payment_response(payment_id=1))
+        self.gateway.get_payment(1)
+        self.assertEqual(self.gateway.breaker.state, "closed")
+
+    def test_metrics_per_operation(self):
+        self.gateway.add_payment(mp_payment_response(payment_id=1))
+        self.gateway.get_payment(1)
+        with self.assertRaises(GatewayError):
+            self.gateway.get_payment(2)
+        self.gateway.outage = ConnectionError("timeout")
+        for _ in range(gateway_module.BREAKER_FAILURES + 1):
+            with self.assertRaises(GatewayUnavailable):
+                self.gateway.get_payment(1)
+
+        stats = gateway_stats()["payment.get"]
+        self.assertEqual(stats["ok"], 1)
+        self.assertEqual(stats["error"], 1)
+        self.assertEqual(stats["unavailable"], gateway_module.BREAKER_FAILURES)
+        self.assertEqual(stats["rejected"], 1)
+
+
+class PooledHttpClientTests(SimpleTestCase):
+    def test_session_is_reused_with_split_timeout(self):
+        client = PooledHttpClient(timeout=(1, 5))
+        answer = MagicMock(status_code=200)
+        answer.json.return_value = {"id": 1}
+        with patch.object(client.session, "request", return_value=answer) as request:
+            first = client.get("https://api.mercadopago.com/v1/payments/1", headers={}, timeout=60.0)
+            client.get("https://api.mercadopago.com/v1/payments/2", headers={}, timeout=60.0)
+
+        self.assertEqual(first, {"status": 200, "response": {"id": 1}})
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(request.call_args.kwargs["timeout"], (1, 5))
+
+    def test_non_json_answer(self):
+        client = PooledHttpClient()
+        answer = MagicMock(status_code=502, text="<html>Bad Gateway</html>")
+        answer.json.side_effect = ValueError
+        with patch.object(client.session, "request", return_value=answer):
+            result = client.get("https://api.mercadopago.com/v1/payments/1", headers={})
+        self.assertEqual(result["status"], 502)
+        self.assertIn("Bad Gateway", result["response"]["message"])
+
+
+class GetGatewayTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(set_gateway, set_gateway(None))
+
+    def test_one_gateway_per_process(self):
+        with override_settings(MERCADOPAGO_GATEWAY="billing.gateway.FakeGateway"):
+            gateway = get_gateway()
+            self.assertIsInstance(gateway, FakeGateway)
+            self.assertIs(get_gateway(), gateway)
+        self.assertNotIsInstance(get_gateway(), FakeGateway)
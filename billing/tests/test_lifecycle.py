@@ -0,0 +1,175 @@
+"""
+Testes do ciclo de vida de assinaturas e trials (billing/lifecycle.py,
+manage.py run_lifecycle).
+
+Cobertura:
+  1. Assinatura ACTIVE vencida → PAUSED com um UPDATE; acesso a leads recalculado
+  2. Trial vencido → encerrado, perfil oculto, e-mail enviado uma vez
+  3. Trial a 7/3/1 dias do fim → flag marcada e aviso enviado
+  4. Segunda execução não muda nada nem reenvia e-mails (idempotente)
+  5. --dry-run → nada muda; lock da etapa ocupado → execução pulada, a outra etapa roda
+  6. Comandos antigos só fazem a sua etapa: validate_subscriptions (e
+     validate_subscription_status) pausa assinaturas, check_trial_periods cuida dos trials
+  7. check_expiring_subscriptions → só relatório (nome, e-mail, plano), nada muda
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from billing import lifecycle
+from billing.models import Subscription, SubscriptionStatusChoices
+from billing.tests.factories import make_instructor_user, make_plan, make_subscription
+from billing.views import validate_subscription_status
+from core.locks import advisory_lock
+from marketplace.lead_access import access_date
+from marketplace.models import AccessStateChoices, InstructorProfile
+
+
+class LifecycleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.plan = make_plan("Plano Ciclo", price=49.99)
+        cls.instructors = [
+            make_instructor_user(f"inst_cycle{index}", f"inst_cycle{index}@test.com")[1]
+            for index in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+
+    def _trial(self, instructor, ends_in):
+        InstructorProfile.objects.filter(pk=instructor.pk).update(
+            is_trial_active=True,
+            is_visible=True,
+            trial_start_date=self.now + ends_in - timedelta(days=14),
+            trial_end_date=self.now + ends_in,
+        )
+
+    def test_expired_subscriptions_paused_in_one_update(self):
+        expired = [make_subscription(instructor, self.plan, days_from_now=-1) for instructor in self.instructors[:3]]
+        current = make_subscription(self.instructors[3], self.plan, days_from_now=10)
+        # Access computed while the subscriptions were still running
+        InstructorProfile.objects.filter(pk=self.instructors[0].pk).update(
+            access_state=AccessStateChoices.SUBSCRIPTION_ACTIVE, lead_access_until=None,
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            run = lifecycle.run_lifecycle(now=self.now)
+
+        self.assertEqual(sorted(run["ids"]["paused_subscriptions"]), sorted(sub.pk for sub in expired))
+        self.assertEqual(
+            set(Subscription.objects.filter(status=SubscriptionStatusChoices.PAUSED).values_list("pk", flat=True)),
+            {sub.pk for sub in expired},
+        )
+        self.assertEqual(Subscription.objects.get(pk=current.pk).status, SubscriptionStatusChoices.ACTIVE)
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "billing_subscription"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(InstructorProfile.objects.get(pk=self.instructors[0].pk).access_state, AccessStateChoices.NO_ACCESS)
+        self.assertEqual(run["stats"]["lead_access_changed"], 1)
+
+    def test_trials_ended_and_warned(self):
+        ended, warn7, warn3, warn1, quiet = self.instructors
+        self._trial(ended, -timedelta(hours=1))
+        self._trial(warn7, timedelta(days=7, hours=1))
+        self._trial(warn3, timedelta(days=3, hours=1))
+        self._trial(warn1, timedelta(days=1, hours=1))
+        self._trial(quiet, timedelta(days=5))
+
+        run = lifecycle.run_lifecycle(now=self.now)
+
+        ended.refresh_from_db()
+        self.assertFalse(ended.is_trial_active)
+        self.assertFalse(ended.is_visible)
+        self.assertTrue(ended.trial_blocked_notified)
+        self.assertFalse(ended.can_receive_leads())
+        self.assertEqual(run["ids"]["ended_trials"], [ended.pk])
+        self.assertEqual(run["ids"]["trial_warning_7d"], [warn7.pk])
+        self.assertEqual(run["ids"]["trial_warning_3d"], [warn3.pk])
+        self.assertEqual(run["ids"]["trial_warning_1d"], [warn1.pk])
+        self.assertTrue(InstructorProfile.objects.get(pk=warn7.pk).trial_expiration_notified_7d)
+        self.assertTrue(InstructorProfile.objects.get(pk=quiet.pk).is_trial_active)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [
+            "inst_cycle0@test.com", "inst_cycle1@test.com", "inst_cycle2@test.com", "inst_cycle3@test.com",
+        ])
+        self.assertIn("expirou", mail.outbox[0].subject)
+
+    def test_second_run_changes_nothing(self):
+        make_subscription(self.instructors[0], self.plan, days_from_now=-1)
+        self._trial(self.instructors[1], -timedelta(hours=1))
+        self._trial(self.instructors[2], timedelta(days=3, hours=1))
+        lifecycle.run_lifecycle(now=self.now)
+        mail.outbox.clear()
+
+        run = lifecycle.run_lifecycle(now=self.now)
+
+        counts = {name: count for name, count in run["stats"].items() if name not in ("dry_run", "seconds")}
+        self.assertEqual(set(counts.values()), {0})
+        self.assertEqual(mail.outbox, [])
+
+    def test_dry_run_and_lock(self):
+        sub = make_subscription(self.instructors[0], self.plan, days_from_now=-1)
+        self._trial(self.instructors[1], -timedelta(hours=1))
+
+        out = StringIO()
+        call_command("run_lifecycle", "--dry-run", stdout=out)
+        self.assertIn("1 assinatura(s) pausada(s)", out.getvalue())
+        self.assertIn("1 trial(s) encerrado(s)", out.getvalue())
+        self.assertEqual(Subscription.objects.get(pk=sub.pk).status, SubscriptionStatusChoices.ACTIVE)
+        self.assertTrue(InstructorProfile.objects.get(pk=self.instructors[1].pk).is_trial_active)
+        self.assertEqual(mail.outbox, [])
+
+        with advisory_lock(lifecycle.step_lock_name("subscriptions")):
+            run = lifecycle.run_lifecycle(now=self.now)
+            self.assertFalse(run["acquired"])
+            self.assertEqual(Subscription.objects.get(pk=sub.pk).status, SubscriptionStatusChoices.ACTIVE)
+            # The trial step has its own lock
+            run = lifecycle.run_lifecycle(now=self.now, steps=("trials",))
+        self.assertTrue(run["acquired"])
+        self.assertEqual(run["ids"]["ended_trials"], [self.instructors[1].pk])
+
+    def test_old_commands_run_their_own_step(self):
+        sub = make_subscription(self.instructors[0], self.plan, days_from_now=-1)
+        self._trial(self.instructors[1], -timedelta(hours=1))
+
+        out = StringIO()
+        call_command("validate_subscriptions", stdout=out)
+        self.assertEqual(Subscription.objects.get(pk=sub.pk).status, SubscriptionStatusChoices.PAUSED)
+        self.assertTrue(InstructorProfile.objects.get(pk=self.instructors[1].pk).is_trial_active)
+        self.assertNotIn("trial", out.getvalue())
+        self.assertEqual(mail.outbox, [])
+
+        out = StringIO()
+        call_command("check_trial_periods", stdout=out)
+        self.assertFalse(InstructorProfile.objects.get(pk=self.instructors[1].pk).is_trial_active)
+        self.assertIn("1 trial(s) encerrado(s)", out.getvalue())
+        self.assertNotIn("assinatura", out.getvalue())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_validate_subscription_status_pauses_only(self):
+        sub = make_subscription(self.instructors[0], self.plan, days_from_now=-1)
+        self._trial(self.instructors[1], -timedelta(hours=1))
+
+        self.assertEqual(validate_subscription_status(), 1)
+        self.assertEqual(Subscription.objects.get(pk=sub.pk).status, SubscriptionStatusChoices.PAUSED)
+        self.assertTrue(InstructorProfile.objects.get(pk=self.instructors[1].pk).is_trial_active)
+
+    def test_expiring_report_changes_nothing(self):
+        expired = make_subscription(self.instructors[0], self.plan, days_from_now=-1)
+        expiring = make_subscription(self.instructors[1], self.plan, days_from_now=0)
+        Subscription.objects.filter(pk=expiring.pk).update(end_date=access_date() + timedelta(days=lifecycle.EXPIRING_DAYS))
+
+        out = StringIO()
+        call_command("check_expiring_subscriptions", stdout=out)
+
+        self.assertIn("(inst_cycle1@test.com) - Plano Ciclo", out.getvalue())
+        self.assertIn("(inst_cycle0@test.com) - Plano Ciclo - Expired on", out.getvalue())
+        self.assertIn("Expiring in 3 days: 1", out.getvalue())
+        self.assertEqual(Subscription.objects.get(pk=expired.pk).status, SubscriptionStatusChoices.ACTIVE)
@@ -0,0 +1,167 @@
+"""
+Testes da conciliação de pagamentos pendentes (billing/reconciliation.py,
+manage.py check_pending_payments).
+
+Cobertura:
+  1. Placeholder do checkout + pagamento aprovado no MP → atualiza e estende assinatura
+  2. Uma busca por página cobre vários pagamentos (sem GET por pagamento); páginas por
+     keyset: cada busca começa no último date_last_updated da anterior, sem offset
+  3. Página inteira com o mesmo date_last_updated → offset avança dentro dele; repetidos
+     descartados pelo id
+  4. Regra de validação (collector_id) → ignorado, continua pendente
+  5. Pagamento já aprovado pelo webhook → não estende de novo
+  6. --dry-run → nada muda, checkpoint não anda
+  7. --max-pages → checkpoint na última página aplicada; próxima execução continua dali
+  8. Mercado Pago indisponível → erro registrado, checkpoint preservado
+"""
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from billing import reconciliation
+from billing.gateway import FakeGateway, set_gateway
+from billing.models import Payment, PaymentStatusChoices, SubscriptionStatusChoices, SyncCheckpoint
+from billing.tests.factories import (
+    make_instructor_user, make_payment, make_plan, make_subscription, mp_payment_response,
+)
+
+COLLECTOR_ID = 3161194628
+
+
+@override_settings(
+    MERCADOPAGO_COLLECTOR_ID=str(COLLECTOR_ID),
+    DEBUG=True,
+    MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
+)
+class ReconciliationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.plan = make_plan("Plano Conciliação", price=49.99)
+        cls.subs = []
+        for index in range(5):
+            _, instructor = make_instructor_user(f"inst_rec{index}", f"inst_rec{index}@test.com")
+            sub = make_subscription(instructor, cls.plan, days_from_now=5)
+            make_payment(sub, external_id=f"pending_{sub.id}_{index}")
+            cls.subs.append(sub)
+
+    def setUp(self):
+        self.gateway = FakeGateway()
+        self.addCleanup(set_gateway, set_gateway(self.gateway))
+
+    def _mp_payment(self, payment_id, sub, minutes_ago=60, **kwargs):
+        answer = mp_payment_response(
+            payment_id=payment_id,
+            collector_id=kwargs.pop("collector_id", COLLECTOR_ID),
+            external_reference=f"subscription_{sub.id}",
+            **kwargs,
+        )
+        answer["response"]["date_last_updated"] = (timezone.now() - timedelta(minutes=minutes_ago)).isoformat()
+        self.gateway.add_payment(answer)
+
+    def test_placeholder_updated_and_subscription_extended(self):
+        sub = self.subs[0]
+        self._mp_payment(7001, sub)
+
+        stats = reconciliation.reconcile()
+
+        payment = Payment.objects.get(subscription=sub)
+        self.assertEqual(payment.external_id, "7001")
+        self.assertEqual(payment.status, PaymentStatusChoices.APPROVED)
+        self.assertIsNotNone(payment.paid_at)
+        sub.refresh_from_db()
+        self.assertEqual(sub.status, SubscriptionStatusChoices.ACTIVE)
+        self.assertEqual(sub.end_date, date.today() + timedelta(days=35))
+        self.assertEqual((stats["updated"], stats["approved"]), (1, 1))
+        self.assertTrue(stats["complete"])
+
+    def test_one_search_per_page(self):
+        for index, sub in enumerate(self.subs):
+            self._mp_payment(7100 + index, sub, minutes_ago=60 - index)
+
+        stats = reconciliation.reconcile(page_size=2)
+
+        # Each page starts at the last payment of the previous one (read again, dropped by id)
+        self.assertEqual(stats["pages"], 5)
+        self.assertEqual((stats["scanned"], stats["approved"]), (5, 5))
+        self.assertEqual([operation for operation, _ in self.gateway.calls], ["payment.search"] * 5)
+        searches = [filters for _, filters in self.gateway.calls]
+        self.assertEqual({filters["offset"] for filters in searches}, {0})
+        for previous, current in zip(searches, searches[1:]):
+            self.assertGreater(current["begin_date"], previous["begin_date"])
+        self.assertEqual(Payment.objects.filter(status=PaymentStatusChoices.APPROVED).count(), 5)
+
+    def test_page_within_one_timestamp_moves_by_offset(self):
+        for index, sub in enumerate(self.subs[:3]):
+            self._mp_payment(7150 + index, sub)
+        stamp = timezone.now() - timedelta(minutes=60)
+        for answer in self.gateway.payments.values():
+            answer["response"]["date_last_updated"] = stamp.isoformat()
+
+        stats = reconciliation.reconcile(page_size=2)
+
+        self.assertEqual([filters["offset"] for _, filters in self.gateway.calls], [0, 0, 2])
+        self.assertEqual((stats["scanned"], stats["approved"]), (3, 3))
+        self.assertTrue(stats["complete"])
+
+    def test_validation_rules_apply(self):
+        sub = self.subs[0]
+        self._mp_payment(7201, sub, collector_id=999999999)
+
+        stats = reconciliation.reconcile()
+
+        self.assertEqual(stats["ignored"], 1)
+        self.assertEqual(Payment.objects.get(subscription=sub).status, PaymentStatusChoices.PENDING)
+
+    def test_payment_approved_by_webhook_is_left_alone(self):
+        sub = self.subs[0]
+        make_payment(sub, external_id="7301", status=PaymentStatusChoices.APPROVED)
+        self._mp_payment(7301, sub)
+        original_end = sub.end_date
+
+        stats = reconciliation.reconcile()
+
+        self.assertEqual(stats["updated"], 0)
+        sub.refresh_from_db()
+        self.assertEqual(sub.end_date, original_end)
+
+    def test_dry_run_changes_nothing(self):
+        self._mp_payment(7401, self.subs[0])
+
+        out = StringIO()
+        call_command("check_pending_payments", "--dry-run", stdout=out)
+
+        self.assertIn("Would update 1 payment(s)", out.getvalue())
+        self.assertFalse(Payment.objects.filter(status=PaymentStatusChoices.APPROVED).exists())
+        self.assertIsNone(SyncCheckpoint.objects.get(name=reconciliation.CHECKPOINT_NAME).position)
+
+    def test_checkpoint_resumes_after_max_pages(self):
+        for index, sub in enumerate(self.subs[:4]):
+            self._mp_payment(7500 + index, sub, minutes_ago=60 - index)
+
+        stats = reconciliation.reconcile(page_size=2, max_pages=1)
+
+        self.assertFalse(stats["complete"])
+        self.assertEqual(stats["approved"], 2)
+        checkpoint = SyncCheckpoint.objects.get(name=reconciliation.CHECKPOINT_NAME)
+        last_applied_update = Payment.objects.get(external_id="7501").payment_details["date_last_updated"]
+        self.assertEqual(checkpoint.position.isoformat(), last_applied_update)
+
+        stats = reconciliation.reconcile(page_size=2)
+        self.assertEqual(stats["begin"], (checkpoint.position - reconciliation.CHECKPOINT_OVERLAP).isoformat())
+        self.assertTrue(stats["complete"])
+        self.assertEqual(Payment.objects.filter(status=PaymentStatusChoices.APPROVED).count(), 4)
+
+    def test_gateway_outage_keeps_checkpoint(self):
+        self._mp_payment(7601, self.subs[0])
+        self.gateway.outage = ConnectionError("timeout")
+
+        out = StringIO()
+        call_command("check_pending_payments", stdout=out)
+
+        self.assertIn("Interrompido", out.getvalue())
+        checkpoint = SyncCheckpoint.objects.get(name=reconciliation.CHECKPOINT_NAME)
+        self.assertEqual(checkpoint.position.isoformat(), checkpoint.last_run["begin"])
+        self.assertTrue(checkpoint.last_run["error"])
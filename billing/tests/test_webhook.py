@@ -12,6 +12,15 @@ Cobertura:
   8. status=approved mas status_detail≠accredited               → NÃO ativa assinatura
   9. payment_success_view com params válidos                    → ativa sem duplicar
  10. payment_success_view com payment_id já aprovado (idem.)   → não duplica extends
+ 11. webhook só grava a notificação e responde 200               → SDK não é chamado na request
+ 12. notificações repetidas (type, data.id)                    → um único evento
+ 13. falha ao consultar o MP                                   → reagenda com backoff, depois aplica
+ 14. falhas até MAX_ATTEMPTS                                   → evento FAILED
+ 15. payment_success_view com MP fora do ar ou pagamento não
+     aprovado no MP (status=approved só na URL)                → não ativa; fica para o webhook
+
+O webhook apenas grava a notificação (billing/webhooks.py); _post_webhook
+roda o worker logo em seguida, como `manage.py process_webhooks` faria.
 
 Como rodar:
     # Todos os testes de billing
@@ -23,48 +32,61 @@ Como rodar:
 
 import json
 from datetime import date, timedelta
-from unittest.mock import patch, MagicMock
 
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
+from accounts.models import Profile
+from billing import webhooks
+from billing.gateway import FakeGateway, set_gateway
 from billing.models import (
     Payment, PaymentStatusChoices, PaymentMethodChoices,
-    Subscription, SubscriptionStatusChoices,
+    Subscription, SubscriptionStatusChoices, WebhookEvent, WebhookEventStatus,
 )
 from billing.tests.factories import (
     make_instructor_user, make_plan, make_subscription, make_payment,
     mp_webhook_payload, mp_payment_response,
 )
+from billing.webhooks import run_due_events
 
 WEBHOOK_URL = "/webhook/mercadopago/"
 COLLECTOR_ID = 3161194628
 
 
-def _post_webhook(client, payment_id=9999001):
-    """Helper: envia o payload de webhook como o MP enviaria."""
-    return client.post(
+def _post_webhook(client, payment_id=9999001, process=True):
+    """
+    Helper: envia o payload de webhook como o MP enviaria e, com process=True,
+    roda o worker (manage.py process_webhooks) sobre a notificação gravada.
+    """
+    response = client.post(
         WEBHOOK_URL,
         data=json.dumps(mp_webhook_payload(payment_id)),
         content_type="application/json",
         REMOTE_ADDR="127.0.0.1",
         HTTP_X_FORWARDED_FOR="127.0.0.1",
     )
+    if process:
+        run_due_events()
+    return response
+
 
+class GatewayTestCase(TestCase):
+    """Mercado Pago respondido pelo FakeGateway (self.gateway)."""
 
-def _mock_sdk(payment_response: dict):
-    """Helper: cria mock do SDK do MercadoPago que retorna payment_response."""
-    mock_sdk = MagicMock()
-    mock_sdk.payment.return_value.get.return_value = payment_response
-    return mock_sdk
+    def setUp(self):
+        self.gateway = FakeGateway()
+        self.addCleanup(set_gateway, set_gateway(self.gateway))
 
 
 # ===========================================================================
 # 1. Pagamento aprovado → assinatura ativada
 # ===========================================================================
-class WebhookApprovalTests(TestCase):
+class WebhookApprovalTests(GatewayTestCase):
     def setUp(self):
+        super().setUp()
         self.client = Client(enforce_csrf_checks=False)
         _, self.instructor = make_instructor_user("inst_approval", "inst_approval@test.com")
         self.plan = make_plan("Plano Aprovação", price=49.99)
@@ -75,11 +97,10 @@ class WebhookApprovalTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_approved_payment_activates_subscription(self, mock_sdk_class):
+    def test_approved_payment_activates_subscription(self):
         """payment.created + consulta approved/accredited deve ativar assinatura."""
         payment_id = 9001001
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             status="approved",
             status_detail="accredited",
@@ -111,11 +132,10 @@ class WebhookApprovalTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_correct_payment_method_stored(self, mock_sdk_class):
+    def test_correct_payment_method_stored(self):
         """Método de pagamento PIX deve ser armazenado corretamente."""
         payment_id = 9001002
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             payment_method_id="pix",
             external_reference=f"subscription_{self.sub.id}",
@@ -131,8 +151,9 @@ class WebhookApprovalTests(TestCase):
 # ===========================================================================
 # 2. Valor divergente do plano → rejeita silenciosamente
 # ===========================================================================
-class WebhookAmountValidationTests(TestCase):
+class WebhookAmountValidationTests(GatewayTestCase):
     def setUp(self):
+        super().setUp()
         self.client = Client(enforce_csrf_checks=False)
         _, self.instructor = make_instructor_user("inst_amount", "inst_amount@test.com")
         self.plan = make_plan("Plano Valor", price=49.99)
@@ -143,11 +164,10 @@ class WebhookAmountValidationTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_lower_amount_rejected(self, mock_sdk_class):
+    def test_lower_amount_rejected(self):
         """transaction_amount < plan.price_monthly deve ser rejeitado sem ativar."""
         payment_id = 9002001
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             status="approved",
             status_detail="accredited",
@@ -171,11 +191,10 @@ class WebhookAmountValidationTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_exact_amount_accepted(self, mock_sdk_class):
+    def test_exact_amount_accepted(self):
         """transaction_amount == plan.price_monthly deve ser aceito."""
         payment_id = 9002002
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             amount=49.99,
             collector_id=COLLECTOR_ID,
@@ -189,8 +208,9 @@ class WebhookAmountValidationTests(TestCase):
 # ===========================================================================
 # 3. Idempotência — payment_id duplicado não reprocessa
 # ===========================================================================
-class WebhookIdempotencyTests(TestCase):
+class WebhookIdempotencyTests(GatewayTestCase):
     def setUp(self):
+        super().setUp()
         self.client = Client(enforce_csrf_checks=False)
         _, self.instructor = make_instructor_user("inst_idemp", "inst_idemp@test.com")
         self.plan = make_plan("Plano Idemp", price=49.99)
@@ -201,8 +221,7 @@ class WebhookIdempotencyTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_duplicate_payment_id_not_reprocessed(self, mock_sdk_class):
+    def test_duplicate_payment_id_not_reprocessed(self):
         """Mesmo payment_id já APPROVED não deve ativar assinatura novamente."""
         payment_id = 9003001
         # Cria payment já aprovado no banco
@@ -216,7 +235,7 @@ class WebhookIdempotencyTests(TestCase):
         response = _post_webhook(self.client, payment_id)
 
         # SDK não deve ter sido chamado (early return por idempotência)
-        mock_sdk_class.assert_not_called()
+        self.assertEqual(self.gateway.calls, [])
         self.assertEqual(response.status_code, 200)
 
         # Assinatura não foi modificada
@@ -228,8 +247,7 @@ class WebhookIdempotencyTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_pending_payment_can_be_updated(self, mock_sdk_class):
+    def test_pending_payment_can_be_updated(self):
         """Payment PENDING com mesmo external_id pode ser atualizado para APPROVED."""
         payment_id = 9003002
         make_payment(
@@ -237,7 +255,7 @@ class WebhookIdempotencyTests(TestCase):
             external_id=str(payment_id),
             status=PaymentStatusChoices.PENDING,
         )
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             status="approved",
             status_detail="accredited",
@@ -249,7 +267,7 @@ class WebhookIdempotencyTests(TestCase):
         _post_webhook(self.client, payment_id)
 
         # SDK foi chamado pois era PENDING
-        mock_sdk_class.assert_called_once()
+        self.assertEqual(len(self.gateway.calls), 1)
         payment = Payment.objects.get(external_id=str(payment_id))
         self.assertEqual(payment.status, PaymentStatusChoices.APPROVED)
 
@@ -257,8 +275,9 @@ class WebhookIdempotencyTests(TestCase):
 # ===========================================================================
 # 4. collector_id inválido → rejeita
 # ===========================================================================
-class WebhookCollectorIdTests(TestCase):
+class WebhookCollectorIdTests(GatewayTestCase):
     def setUp(self):
+        super().setUp()
         self.client = Client(enforce_csrf_checks=False)
         _, self.instructor = make_instructor_user("inst_collector", "inst_collector@test.com")
         self.plan = make_plan("Plano Collector", price=49.99)
@@ -269,11 +288,10 @@ class WebhookCollectorIdTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_wrong_collector_id_rejected(self, mock_sdk_class):
+    def test_wrong_collector_id_rejected(self):
         """collector_id de outra conta MP deve ser rejeitado sem ativar."""
         payment_id = 9004001
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             collector_id=999999999,  # ID de outra conta
             external_reference=f"subscription_{self.sub.id}",
@@ -294,11 +312,10 @@ class WebhookCollectorIdTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_no_collector_id_configured_skips_check(self, mock_sdk_class):
+    def test_no_collector_id_configured_skips_check(self):
         """Se MERCADOPAGO_COLLECTOR_ID não estiver configurado, aceita qualquer collector."""
         payment_id = 9004002
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             collector_id=999999999,
             external_reference=f"subscription_{self.sub.id}",
@@ -314,8 +331,9 @@ class WebhookCollectorIdTests(TestCase):
 # ===========================================================================
 # 5 & 6. live_mode — teste vs produção
 # ===========================================================================
-class WebhookLiveModeTests(TestCase):
+class WebhookLiveModeTests(GatewayTestCase):
     def setUp(self):
+        super().setUp()
         self.client = Client(enforce_csrf_checks=False)
         _, self.instructor = make_instructor_user("inst_livemode", "inst_livemode@test.com")
         self.plan = make_plan("Plano LiveMode", price=49.99)
@@ -326,11 +344,10 @@ class WebhookLiveModeTests(TestCase):
         DEBUG=True,  # ambiente de desenvolvimento
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_live_payment_rejected_in_debug_mode(self, mock_sdk_class):
+    def test_live_payment_rejected_in_debug_mode(self):
         """live_mode=True em DEBUG=True deve ser rejeitado (pagamento real em dev)."""
         payment_id = 9005001
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             live_mode=True,  # pagamento real
             collector_id=COLLECTOR_ID,
@@ -348,11 +365,10 @@ class WebhookLiveModeTests(TestCase):
         DEBUG=False,  # ambiente de produção
         MERCADOPAGO_ACCESS_TOKEN="APP_USR-fake-production-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_test_payment_rejected_in_production(self, mock_sdk_class):
+    def test_test_payment_rejected_in_production(self):
         """live_mode=False em DEBUG=False deve ser rejeitado (pagamento de teste em produção)."""
         payment_id = 9005002
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             live_mode=False,  # pagamento de teste
             collector_id=COLLECTOR_ID,
@@ -370,11 +386,10 @@ class WebhookLiveModeTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_test_payment_accepted_in_debug_mode(self, mock_sdk_class):
+    def test_test_payment_accepted_in_debug_mode(self):
         """live_mode=False em DEBUG=True deve ser aceito."""
         payment_id = 9005003
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             live_mode=False,
             collector_id=COLLECTOR_ID,
@@ -389,8 +404,9 @@ class WebhookLiveModeTests(TestCase):
 # ===========================================================================
 # 7. status=rejected → NÃO ativa assinatura
 # ===========================================================================
-class WebhookStatusTests(TestCase):
+class WebhookStatusTests(GatewayTestCase):
     def setUp(self):
+        super().setUp()
         self.client = Client(enforce_csrf_checks=False)
         _, self.instructor = make_instructor_user("inst_status", "inst_status@test.com")
         self.plan = make_plan("Plano Status", price=49.99)
@@ -401,12 +417,11 @@ class WebhookStatusTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_rejected_payment_does_not_activate(self, mock_sdk_class):
+    def test_rejected_payment_does_not_activate(self):
         """Pagamento rejected não deve ativar ou estender assinatura."""
         payment_id = 9007001
         original_end = self.sub.end_date
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             status="rejected",
             status_detail="cc_rejected_insufficient_amount",
@@ -429,12 +444,11 @@ class WebhookStatusTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_pending_payment_does_not_activate(self, mock_sdk_class):
+    def test_pending_payment_does_not_activate(self):
         """Pagamento pending (ex: boleto aguardando) não deve ativar assinatura."""
         payment_id = 9007002
         original_end = self.sub.end_date
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             status="pending",
             status_detail="pending_waiting_payment",
@@ -455,8 +469,9 @@ class WebhookStatusTests(TestCase):
 # ===========================================================================
 # 8. approved mas status_detail ≠ accredited → NÃO ativa
 # ===========================================================================
-class WebhookStatusDetailTests(TestCase):
+class WebhookStatusDetailTests(GatewayTestCase):
     def setUp(self):
+        super().setUp()
         self.client = Client(enforce_csrf_checks=False)
         _, self.instructor = make_instructor_user("inst_detail", "inst_detail@test.com")
         self.plan = make_plan("Plano Detail", price=49.99)
@@ -467,12 +482,11 @@ class WebhookStatusDetailTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_approved_pending_contingency_does_not_activate(self, mock_sdk_class):
+    def test_approved_pending_contingency_does_not_activate(self):
         """approved/pending_contingency (em análise) não deve ativar assinatura."""
         payment_id = 9008001
         original_end = self.sub.end_date
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             status="approved",
             status_detail="pending_contingency",  # não é 'accredited'
@@ -496,11 +510,10 @@ class WebhookStatusDetailTests(TestCase):
         DEBUG=True,
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_approved_accredited_with_partial_refund_activates(self, mock_sdk_class):
+    def test_approved_accredited_with_partial_refund_activates(self):
         """approved/partially_refunded (reembolso parcial) ainda deve ativar."""
         payment_id = 9008002
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             status="approved",
             status_detail="partially_refunded",
@@ -518,26 +531,165 @@ class WebhookStatusDetailTests(TestCase):
         self.assertGreater(self.sub.end_date, date.today() + timedelta(days=10))
 
 
+# ===========================================================================
+# 11-14. Inbox: gravação imediata, deduplicação e retentativas
+# ===========================================================================
+@override_settings(
+    MERCADOPAGO_COLLECTOR_ID=str(COLLECTOR_ID),
+    DEBUG=True,
+    MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
+)
+class WebhookInboxTests(GatewayTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client(enforce_csrf_checks=False)
+        _, self.instructor = make_instructor_user("inst_inbox", "inst_inbox@test.com")
+        self.plan = make_plan("Plano Inbox", price=49.99)
+        self.sub = make_subscription(self.instructor, self.plan, days_from_now=5)
+
+    def _approved(self, payment_id):
+        return mp_payment_response(
+            payment_id=payment_id,
+            collector_id=COLLECTOR_ID,
+            external_reference=f"subscription_{self.sub.id}",
+        )
+
+    def test_webhook_only_records_notification(self):
+        """A request só grava o evento; o MP é consultado pelo worker."""
+        response = _post_webhook(self.client, 9011001, process=False)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.gateway.calls, [])
+        event = WebhookEvent.objects.get(topic="payment", resource_id="9011001")
+        self.assertEqual(event.status, WebhookEventStatus.PENDING)
+        self.assertEqual(event.payload["action"], "payment.created")
+
+    def test_invalid_body_is_not_recorded(self):
+        """JSON inválido ou sem data.id → 200 sem gravar nada."""
+        for body in ("not json", json.dumps({"type": "payment"}), json.dumps([1, 2])):
+            response = self.client.post(WEBHOOK_URL, data=body, content_type="application/json")
+            self.assertEqual(response.status_code, 200)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_repeated_notifications_are_deduplicated(self):
+        """O MP reenvia a mesma notificação: um evento, processado uma vez."""
+        self.gateway.add_payment(self._approved(9012001))
+        for _ in range(3):
+            _post_webhook(self.client, 9012001, process=False)
+
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.deliveries, 3)
+        stats = run_due_events()
+        self.assertEqual(stats[WebhookEventStatus.PROCESSED], 1)
+        self.assertEqual(self.gateway.calls, [("payment.get", "9012001")])
+
+    def test_notification_after_processing_rearms_event(self):
+        """Nova notificação de um evento já processado (mudança de status) é reprocessada."""
+        self.gateway.add_payment(mp_payment_response(
+            payment_id=9012002,
+            status="pending",
+            status_detail="pending_waiting_payment",
+            collector_id=COLLECTOR_ID,
+            external_reference=f"subscription_{self.sub.id}",
+        ))
+        _post_webhook(self.client, 9012002)
+        self.assertEqual(Payment.objects.get(external_id="9012002").status, PaymentStatusChoices.PENDING)
+
+        self.gateway.add_payment(self._approved(9012002))
+        _post_webhook(self.client, 9012002)
+
+        self.assertEqual(Payment.objects.get(external_id="9012002").status, PaymentStatusChoices.APPROVED)
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookEventStatus.PROCESSED)
+        self.assertEqual(event.deliveries, 2)
+
+    def test_fetch_failure_is_retried_with_backoff(self):
+        """MP indisponível → evento reagendado; aplicado quando o MP responde."""
+        self.gateway.payments["9013001"] = {"status": 500, "response": {}}
+        _post_webhook(self.client, 9013001)
+
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookEventStatus.PENDING)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("500", event.last_error)
+        self.assertGreater(event.run_after, timezone.now() + webhooks.RETRY_BASE_DELAY / 2)
+        self.assertFalse(Payment.objects.filter(external_id="9013001").exists())
+
+        # Not due yet
+        self.assertEqual(sum(run_due_events().values()), 0)
+
+        WebhookEvent.objects.update(run_after=timezone.now())
+        self.gateway.add_payment(self._approved(9013001))
+        self.assertEqual(run_due_events()[WebhookEventStatus.PROCESSED], 1)
+        self.assertTrue(Payment.objects.filter(external_id="9013001", status=PaymentStatusChoices.APPROVED).exists())
+
+    def test_event_fails_after_max_attempts(self):
+        """Após MAX_ATTEMPTS falhas o evento fica FAILED."""
+        self.gateway.outage = ConnectionError("timeout")
+        _post_webhook(self.client, 9014001, process=False)
+
+        for _ in range(webhooks.MAX_ATTEMPTS):
+            WebhookEvent.objects.update(run_after=timezone.now())
+            run_due_events()
+
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookEventStatus.FAILED)
+        self.assertEqual(event.attempts, webhooks.MAX_ATTEMPTS)
+        self.assertIsNotNone(event.processed_at)
+
+    def test_rejected_notification_is_ignored(self):
+        """Regra de validação rejeitou → IGNORED com o motivo, sem retentar."""
+        self.gateway.add_payment(mp_payment_response(
+            payment_id=9014002,
+            collector_id=999999999,
+            external_reference=f"subscription_{self.sub.id}",
+        ))
+        _post_webhook(self.client, 9014002)
+
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookEventStatus.IGNORED)
+        self.assertIn("collector_id", event.result)
+
+
 # ===========================================================================
 # 9 & 10. payment_success_view — retorno do MP após pagamento
 # ===========================================================================
-class PaymentSuccessViewTests(TestCase):
+class PaymentSuccessViewTests(GatewayTestCase):
     def setUp(self):
+        super().setUp()
         self.client = Client(enforce_csrf_checks=False)
-        self.user, self.instructor = make_instructor_user("inst_success", "inst_success@test.com")
+        user, self.instructor = make_instructor_user("inst_success", "inst_success@test.com")
+        Profile.objects.filter(user=user).update(is_profile_complete=True)
+        self.user = User.objects.get(pk=user.pk)  # no stale cached profile
         self.plan = make_plan("Plano Success", price=49.99)
         self.sub = make_subscription(self.instructor, self.plan, days_from_now=0)
         self.client.force_login(self.user)
 
+    def _return(self, payment_id):
+        return self.client.get(
+            reverse("billing:payment_success"),
+            {
+                "payment_id": str(payment_id),
+                "status": "approved",
+                "external_reference": f"subscription_{self.sub.id}",
+            },
+        )
+
+    def _assert_not_activated(self, response, payment_id):
+        self.assertEqual(response.status_code, 302)
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.end_date, date.today())
+        self.assertFalse(Payment.objects.filter(external_id=str(payment_id), status=PaymentStatusChoices.APPROVED).exists())
+        self.assertIn("será ativada em instantes", str(list(get_messages(response.wsgi_request))[0]))
+
     @override_settings(
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
         DEBUG=True,
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_success_view_activates_subscription(self, mock_sdk_class):
+    def test_success_view_activates_subscription(self):
         """back_url com params approved → ativa assinatura."""
         payment_id = 9009001
-        mock_sdk_class.return_value = _mock_sdk(mp_payment_response(
+        self.gateway.add_payment(mp_payment_response(
             payment_id=payment_id,
             status="approved",
             status_detail="accredited",
@@ -563,8 +715,7 @@ class PaymentSuccessViewTests(TestCase):
         MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
         DEBUG=True,
     )
-    @patch("billing.views.mercadopago.SDK")
-    def test_success_view_does_not_duplicate_if_already_approved(self, mock_sdk_class):
+    def test_success_view_does_not_duplicate_if_already_approved(self):
         """Se webhook já aprovou o pagamento, success_view não deve estender assinatura de novo."""
         payment_id = 9010001
         original_end = date.today() + timedelta(days=45)
@@ -588,13 +739,46 @@ class PaymentSuccessViewTests(TestCase):
         )
 
         # SDK não deve ser chamado (já aprovado, idempotência)
-        mock_sdk_class.assert_not_called()
+        self.assertEqual(self.gateway.calls, [])
         self.assertEqual(response.status_code, 302)
 
         # end_date não mudou
         self.sub.refresh_from_db()
         self.assertEqual(self.sub.end_date, original_end)
 
+    @override_settings(
+        MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
+        DEBUG=True,
+    )
+    def test_success_view_gateway_down_grants_nothing(self):
+        """MP fora do ar: status=approved da URL não ativa nada; a notificação fica para o worker."""
+        payment_id = 9011001
+        self.gateway.outage = ConnectionError("timeout")
+
+        response = self._return(payment_id)
+
+        self._assert_not_activated(response, payment_id)
+        event = WebhookEvent.objects.get(topic="payment", resource_id=str(payment_id))
+        self.assertEqual(event.status, WebhookEventStatus.PENDING)
+
+    @override_settings(
+        MERCADOPAGO_ACCESS_TOKEN="TEST-fake-token",
+        DEBUG=True,
+    )
+    def test_success_view_unapproved_payment_grants_nothing(self):
+        """URL diz approved, mas o MP diz pending → não ativa."""
+        payment_id = 9012001
+        self.gateway.add_payment(mp_payment_response(
+            payment_id=payment_id,
+            status="pending",
+            status_detail="pending_waiting_payment",
+            external_reference=f"subscription_{self.sub.id}",
+        ))
+
+        response = self._return(payment_id)
+
+        self._assert_not_activated(response, payment_id)
+
     def test_success_view_requires_login(self):
         """Usuário sem login deve ser redirecionado."""
         self.client.logout()
@@ -0,0 +1,335 @@
+"""
+Mercado Pago webhook inbox.
+
+billing.views.mercadopago_webhook only stores the notification and answers
+200 right away:
+
+    record_notification({'type': 'payment', 'data': {'id': '123'}})
+
+Events live in WebhookEvent, one row per (topic, resource_id): Mercado Pago
+delivers the same notification several times, and each delivery only bumps
+`deliveries` and makes the event due again (a payment that changed status
+is notified again with the same id, so a finished event is re-armed too).
+`manage.py process_webhooks` claims the due events one at a time
+(SELECT ... FOR UPDATE SKIP LOCKED, so several workers never take the same
+event), fetches the payment from Mercado Pago and applies it with the
+validation rules below (live_mode, collector_id, external_reference,
+amount, status_detail).
+
+A payment Mercado Pago could not return is retried with exponential backoff
+(RETRY_BASE_DELAY, doubled per attempt) up to MAX_ATTEMPTS; a notification
+the rules reject is marked ignored with the reason. A running event's
+run_after is its lease: if the worker dies, the event becomes due again
+after EVENT_LEASE.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from .gateway import GatewayError, get_gateway
+from .models import (
+    Payment,
+    PaymentMethodChoices,
+    PaymentStatusChoices,
+    Subscription,
+    SubscriptionStatusChoices,
+    WebhookEvent,
+    WebhookEventStatus,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = timedelta(seconds=30)
+RETRY_MAX_DELAY = timedelta(hours=1)
+EVENT_LEASE = timedelta(minutes=5)
+
+MP_STATUS_MAP = {
+    'pending': PaymentStatusChoices.PENDING,
+    'approved': PaymentStatusChoices.APPROVED,
+    'authorized': PaymentStatusChoices.APPROVED,
+    'in_process': PaymentStatusChoices.PENDING,
+    'in_mediation': PaymentStatusChoices.PENDING,
+    'rejected': PaymentStatusChoices.REJECTED,
+    'cancelled': PaymentStatusChoices.CANCELLED,
+    'refunded': PaymentStatusChoices.REFUNDED,
+    'charged_back': PaymentStatusChoices.REFUNDED,
+}
+
+
+class PaymentFetchError(Exception):
+    """Mercado Pago did not return the payment; the event is retried."""
+
+
+def record_notification(data):
+    """
+    Store a notification (the parsed webhook body). Returns the WebhookEvent,
+    or None when the body has no type/data.id.
+    """
+    topic = str(data.get('type') or '')[:50]
+    resource = data.get('data')
+    resource_id = str(resource.get('id') or '')[:64] if isinstance(resource, dict) else ''
+    if not topic or not resource_id:
+        return None
+
+    now = timezone.now()
+    event, created = WebhookEvent.objects.get_or_create(
+        topic=topic,
+        resource_id=resource_id,
+        defaults={'payload': data, 'run_after': now},
+    )
+    if not created:
+        # Due again; a worker holding it sees `deliveries` move and leaves it pending
+        WebhookEvent.objects.filter(pk=event.pk).update(
+            payload=data,
+            status=WebhookEventStatus.PENDING,
+            attempts=0,
+            deliveries=models.F('deliveries') + 1,
+            run_after=now,
+            updated_at=now,
+        )
+    return event
+
+
+def claim_next_event():
+    """Take the next due event (pending, or running with an expired lease), or None."""
+    now = timezone.now()
+    with transaction.atomic():
+        event = WebhookEvent.objects.select_for_update(skip_locked=True).filter(
+            status__in=(WebhookEventStatus.PENDING, WebhookEventStatus.RUNNING),
+            run_after__lte=now,
+        ).order_by('run_after', 'id').first()
+        if event is None:
+            return None
+        event.status = WebhookEventStatus.RUNNING
+        event.attempts += 1
+        event.run_after = now + EVENT_LEASE
+        event.save(update_fields=['status', 'attempts', 'run_after', 'updated_at'])
+    return event
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def fetch_payment(payment_id):
+    """Payment data from Mercado Pago; PaymentFetchError when unavailable."""
+    try:
+        return get_gateway().get_payment(payment_id)
+    except GatewayError as exc:
+        raise PaymentFetchError(str(exc)) from exc
+
+
+def payment_method_from_mp(payment_method_id):
+    """Map MP payment_method_id to our enum."""
+    mp_method = (payment_method_id or 'unknown').upper()
+    if 'PIX' in mp_method:
+        return PaymentMethodChoices.PIX
+    if 'BOLETO' in mp_method or 'BOLBRADESCO' in mp_method:
+        return PaymentMethodChoices.BOLETO
+    if 'CREDIT' in mp_method or any(card in mp_method for card in ['VISA', 'MASTER', 'AMEX', 'ELO']):
+        return PaymentMethodChoices.CREDIT_CARD
+    if 'DEBIT' in mp_method or 'DEBITO' in mp_method:
+        return PaymentMethodChoices.DEBIT_CARD
+    return PaymentMethodChoices.CREDIT_CARD  # Fallback seguro
+
+
+def check_payment(payment_id, payment_data, subscriptions=None):
+    """
+    Validation rules of a Mercado Pago payment. Returns (subscription, None),
+    or (None, reason) when it must not be applied. `subscriptions`
+    ({id: Subscription}, plan selected) spares the query in batch use.
+    """
+    # -------------------------------------------------------
+    # VALIDAÇÃO 1: live_mode deve bater com o ambiente configurado
+    # Só rejeita se AMBOS: produção E credencial for LIVE (não TEST)
+    # -------------------------------------------------------
+    is_production = not settings.DEBUG
+    payment_live_mode = payment_data.get('live_mode', False)
+    using_test_credentials = settings.MERCADOPAGO_ACCESS_TOKEN.startswith('TEST-')
+    # Apenas bloquear se: produção com credencial LIVE recebendo pagamento de teste
+    # Não bloquear enquanto credenciais TEST estiverem em uso
+    if is_production and not using_test_credentials and not payment_live_mode:
+        logger.warning(f"Rejected test payment {payment_id} in production environment with live credentials")
+        return None, 'Pagamento de teste em produção'
+
+    # -------------------------------------------------------
+    # VALIDAÇÃO 2: collector_id deve ser nossa conta MP
+    # -------------------------------------------------------
+    expected_collector_id = getattr(settings, 'MERCADOPAGO_COLLECTOR_ID', None)
+    actual_collector_id = payment_data.get('collector_id')
+    if expected_collector_id and str(actual_collector_id) != str(expected_collector_id):
+        logger.error(f"collector_id mismatch: expected {expected_collector_id}, got {actual_collector_id} for payment {payment_id}")
+        return None, f'collector_id divergente: {actual_collector_id}'
+
+    # Get subscription from external_reference
+    external_ref = payment_data.get('external_reference') or ''
+    if not external_ref.startswith('subscription_'):
+        logger.warning(f"Invalid external reference: {external_ref}")
+        return None, f'external_reference inválida: {external_ref}'[:255]
+
+    subscription_id = external_ref.replace('subscription_', '')
+    if subscriptions is not None:
+        subscription = subscriptions.get(int(subscription_id)) if subscription_id.isdigit() else None
+    else:
+        subscription = Subscription.objects.select_related('instructor', 'plan').filter(
+            id=subscription_id,
+        ).first() if subscription_id.isdigit() else None
+    if subscription is None:
+        logger.error(f"Subscription not found: {subscription_id}")
+        return None, f'Assinatura não encontrada: {subscription_id}'[:255]
+
+    # -------------------------------------------------------
+    # VALIDAÇÃO 3: valor pago deve ser >= preço do plano
+    # -------------------------------------------------------
+    transaction_amount = float(payment_data.get('transaction_amount', 0))
+    expected_amount = float(subscription.plan.price_monthly)
+    if transaction_amount < expected_amount:
+        logger.error(
+            f"Amount mismatch for payment {payment_id}: "
+            f"received R${transaction_amount:.2f}, expected R${expected_amount:.2f} "
+            f"for plan '{subscription.plan.name}'"
+        )
+        return None, f'Valor R${transaction_amount:.2f} abaixo do plano (R${expected_amount:.2f})'
+    return subscription, None
+
+
+def is_truly_approved(payment_data):
+    # -------------------------------------------------------
+    # VALIDAÇÃO 4: status + status_detail para aprovação real
+    # Apenas status=approved E status_detail=accredited ativa assinatura
+    # -------------------------------------------------------
+    return (
+        payment_data.get('status') == 'approved' and
+        payment_data.get('status_detail') in ('accredited', 'partially_refunded')  # accredited = pago e creditado
+    )
+
+
+def extended_end_date(end_date, today):
+    """End date after one more paid month."""
+    if end_date and end_date >= today:
+        return end_date + timedelta(days=30)
+    return today + timedelta(days=30)
+
+
+def apply_payment(payment_id):
+    """
+    Fetch a notified payment and apply it. Returns (status, result), status
+    being PROCESSED or IGNORED (rejected by a validation rule). Raises
+    PaymentFetchError when Mercado Pago must be asked again later.
+    """
+    # -------------------------------------------------------
+    # IDEMPOTÊNCIA: ignorar se já aprovado (evita reprocessamento)
+    # -------------------------------------------------------
+    existing_payment = Payment.objects.filter(external_id=str(payment_id)).first()
+    if existing_payment and existing_payment.status == PaymentStatusChoices.APPROVED:
+        logger.info(f"Payment {payment_id} already processed and approved - skipping")
+        return WebhookEventStatus.IGNORED, 'Pagamento já aprovado'
+
+    payment_data = fetch_payment(payment_id)
+    logger.info(f"Payment data retrieved: ID={payment_id}, Status={payment_data.get('status')}, Detail={payment_data.get('status_detail')}")
+
+    subscription, reason = check_payment(payment_id, payment_data)
+    if subscription is None:
+        return WebhookEventStatus.IGNORED, reason
+
+    transaction_amount = float(payment_data.get('transaction_amount', 0))
+    mp_status = payment_data.get('status', 'pending')
+    mp_status_detail = payment_data.get('status_detail', '')
+    approved = is_truly_approved(payment_data)
+    payment_status = MP_STATUS_MAP.get(mp_status, PaymentStatusChoices.PENDING)
+
+    with transaction.atomic():
+        # The back_url (payment_success_view) applies payments too: lock the
+        # subscription and check again, so a payment never extends it twice
+        subscription = Subscription.objects.select_for_update().select_related('plan').get(pk=subscription.pk)
+        if Payment.objects.filter(external_id=str(payment_id), status=PaymentStatusChoices.APPROVED).exists():
+            return WebhookEventStatus.IGNORED, 'Pagamento já aprovado'
+
+        payment, created = Payment.objects.update_or_create(
+            external_id=str(payment_id),
+            defaults={
+                'subscription': subscription,
+                'amount': transaction_amount,
+                'payment_method': payment_method_from_mp(payment_data.get('payment_method_id')),
+                'status': payment_status,
+                'payment_details': payment_data,
+                'paid_at': timezone.now() if approved else None,
+            }
+        )
+        action = "Created" if created else "Updated"
+        logger.info(f"{action} payment {payment.id}: status={mp_status} detail={mp_status_detail} for subscription {subscription.id}")
+
+        # Activate/extend subscription only when truly approved + accredited
+        if approved:
+            old_end_date = subscription.end_date
+            new_end_date = extended_end_date(subscription.end_date, timezone.now().date())
+
+            subscription.end_date = new_end_date
+            subscription.status = SubscriptionStatusChoices.ACTIVE
+            subscription.save()
+            logger.info(f"Subscription {subscription.id} extended: {old_end_date} -> {new_end_date}")
+            # TODO: Send confirmation email
+            return WebhookEventStatus.PROCESSED, f'Aprovado; assinatura {subscription.id} até {new_end_date}'
+
+    if payment_status == PaymentStatusChoices.REJECTED:
+        logger.warning(f"Payment {payment_id} rejected (detail={mp_status_detail}) for subscription {subscription.id}")
+        # TODO: send_payment_rejection_email(subscription, payment)
+    return WebhookEventStatus.PROCESSED, f'Pagamento {mp_status} ({mp_status_detail})'[:255]
+
+
+def run_event(event):
+    """Apply a claimed event. Returns its new status."""
+    now = timezone.now()
+    fields = {'last_error': '', 'result': ''}
+    try:
+        if event.topic != 'payment':
+            # merchant_order etc.: the payment notifications carry everything we use
+            logger.info(f"Unhandled notification type: {event.topic}")
+            status, fields['result'] = WebhookEventStatus.IGNORED, 'Tipo de notificação não tratado'
+        else:
+            status, fields['result'] = apply_payment(event.resource_id)
+    except Exception as exc:
+        fields['last_error'] = str(exc)[:255]
+        if event.attempts < MAX_ATTEMPTS:
+            status = WebhookEventStatus.PENDING
+            fields['run_after'] = now + retry_delay(event.attempts)
+            logger.warning(f"Webhook {event.topic} {event.resource_id} failed (attempt {event.attempts}), retrying at {fields['run_after']}: {exc}")
+        else:
+            status = WebhookEventStatus.FAILED
+            logger.error(f"Webhook {event.topic} {event.resource_id} failed after {event.attempts} attempts: {exc}")
+    if status != WebhookEventStatus.PENDING:
+        fields['processed_at'] = now
+
+    # A new delivery while we worked re-armed the event: leave it pending
+    updated = WebhookEvent.objects.filter(pk=event.pk, deliveries=event.deliveries).update(
+        status=status, updated_at=now, **fields,
+    )
+    if not updated:
+        return WebhookEventStatus.PENDING
+    event.status = status
+    return status
+
+
+def run_due_events(max_events=None):
+    """Process due events until none is left (or max_events). Returns {status: count}."""
+    stats = {status: 0 for status in WebhookEventStatus.values}
+    processed = 0
+    while max_events is None or processed < max_events:
+        event = claim_next_event()
+        if event is None:
+            break
+        stats[run_event(event)] += 1
+        processed += 1
+    return stats
+
+
+def inbox_counts():
+    """{status: count} of the whole inbox."""
+    counts = dict.fromkeys(WebhookEventStatus.values, 0)
+    for row in WebhookEvent.objects.order_by().values('status').annotate(total=models.Count('id')):
+        counts[row['status']] = row['total']
+    return counts
@@ -3,6 +3,7 @@ Django settings for TREINACNH project.
 Production-ready configuration with security best practices.
 """
 import os
+import warnings
 from pathlib import Path
 from decouple import config, Csv
 
@@ -71,19 +72,29 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # Blocklists and rate limiting run before sessions/auth touch the database
+    'core.middleware.SecurityMiddleware',  # Custom security middleware
+    # request.path_class: health checks and webhooks skip session/auth/profile work below
+    'core.middleware.PathClassMiddleware',
+    'core.middleware.SessionMiddleware',  # django's, without session for machine paths
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.AuthenticationMiddleware',  # django's, anonymous on machine paths
+    'core.middleware.IdentityMiddleware',  # request.user with profile joined + request.identity
     'core.middleware.ProfileCompletionMiddleware',  # Force role selection after Google login
     'core.middleware.StudentRedirectMiddleware',  # Redirect students from home/plans
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_ratelimit.middleware.RatelimitMiddleware',  # Rate limiting
     'allauth.account.middleware.AccountMiddleware',  # django-allauth
-    'core.middleware.SecurityMiddleware',  # Custom security middleware
 ]
 
+# Per-middleware timings in a Server-Timing header (see core/middleware_timing.py)
+MIDDLEWARE_TIMING = config('MIDDLEWARE_TIMING', default=False, cast=bool)
+if MIDDLEWARE_TIMING:
+    from core.middleware_timing import timed
+    MIDDLEWARE = [timed(path) for path in MIDDLEWARE]
+
 # Django Debug Toolbar Middleware (comentado para produção)
 # if DEBUG:
 #     MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
@@ -165,6 +176,8 @@ MEDIA_ROOT = BASE_DIR / 'media'
 SITE_NAME = 'TreinaCNH'
 SITE_LOGO = 'images/logos/logotipoTreinaCNH-640w.avif'  # Path relativo a STATIC_URL
 SITE_URL = config('SITE_URL', default='http://localhost:8000')
+# Precomputed sitemap files (manage.py build_sitemaps, see core/sitemap_files.py)
+SITEMAP_DIR = config('SITEMAP_DIR', default=str(BASE_DIR / 'sitemaps'))
 
 # Mercado Pago Configuration
 MERCADOPAGO_PUBLIC_KEY = config('MERCADOPAGO_PUBLIC_KEY', default='')
@@ -172,6 +185,9 @@ MERCADOPAGO_ACCESS_TOKEN = config('MERCADOPAGO_ACCESS_TOKEN', default='')
 # ID do collector (recebedor) da conta MP - usado para validar webhooks
 # Encontre em: curl https://api.mercadopago.com/users/me -H "Authorization: Bearer SEU_TOKEN"
 MERCADOPAGO_COLLECTOR_ID = config('MERCADOPAGO_COLLECTOR_ID', default='')
+# Client used for every Mercado Pago call (see billing/gateway.py);
+# billing.gateway.FakeGateway answers locally (load benchmarks)
+MERCADOPAGO_GATEWAY = config('MERCADOPAGO_GATEWAY', default='billing.gateway.MercadoPagoGateway')
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -229,16 +245,76 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 FILE_UPLOAD_PERMISSIONS = 0o644  # Secure file permissions
 ALLOWED_FILE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.pdf', '.doc', '.docx']
 
-# Cache Configuration (for rate limiting and performance)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'treinacnh-cache',
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000
+# Cache Configuration (rate limiting, fragment/data caches - see core/cache.py)
+# Gunicorn runs several workers: rate limits and caches only agree across
+# workers with a shared store.
+#   CACHE_BACKEND=redis  → REDIS_URL (e.g. redis://127.0.0.1:6379/1), needs the `redis` package
+#   CACHE_BACKEND=file   → CACHE_DIR on local disk, shared by the workers of one host
+#                          (DEBUG only: rate limiting needs Redis in production, see below)
+#   CACHE_BACKEND=locmem → per-process; development and tests (config/test_settings.py)
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_BACKEND = config(
+    'CACHE_BACKEND',
+    default='redis' if REDIS_URL else ('locmem' if DEBUG else 'file'),
+)
+
+_CACHE_COMMON = {
+    'KEY_PREFIX': 'treinacnh',
+    # Bump CACHE_VERSION to drop every cached entry at once (e.g. on deploy)
+    'VERSION': config('CACHE_VERSION', default=1, cast=int),
+    'TIMEOUT': 300,
+}
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL or 'redis://127.0.0.1:6379/1',
+            **_CACHE_COMMON,
         }
     }
-}
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / 'cache')),
+            'OPTIONS': {
+                # The file backend counts its files on every write; keep it bounded
+                'MAX_ENTRIES': 10000,
+                'CULL_FREQUENCY': 4,
+            },
+            **_CACHE_COMMON,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'treinacnh-cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 10000
+            },
+            **_CACHE_COMMON,
+        }
+    }
+
+# Rate limit counters (core/ratelimit.py) are hit on every request and must be
+# shared by the workers, or every budget is multiplied by their number. That
+# takes Redis: the file backend costs milliseconds per write, so without Redis
+# the counters fall back to process memory (per worker) and we say so loudly.
+if CACHE_BACKEND == 'redis':
+    CACHES['ratelimit'] = CACHES['default']
+else:
+    if not DEBUG:
+        warnings.warn(
+            'CACHE_BACKEND is not redis: rate limit counters are kept per process, so '
+            'each gunicorn worker allows the full budget. Set REDIS_URL to share them.',
+            RuntimeWarning,
+        )
+    CACHES['ratelimit'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'treinacnh-ratelimit',
+        **_CACHE_COMMON,
+    }
 
 # Logging
 LOGGING = {
@@ -320,8 +396,9 @@ SITE_ID = 1
 
 # Authentication Backends
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',  # Django padrão
-    'allauth.account.auth_backends.AuthenticationBackend',  # Allauth
+    # Django's and allauth's, loading the user with its profiles (accounts/backends.py)
+    'accounts.backends.ModelBackend',  # Django padrão
+    'accounts.backends.AuthenticationBackend',  # Allauth
 ]
 
 # Allauth Settings
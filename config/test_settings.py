@@ -0,0 +1,31 @@
+"""
+Settings for the test suite:
+
+    python manage.py test --settings=config.test_settings
+
+Every cache is pinned to process memory, so tests never read or write the
+file/Redis cache of a deployment, whatever CACHE_BACKEND the environment
+sets. The runner still turns DEBUG off for each test.
+"""
+import os
+
+# Before importing settings: a DEBUG=False environment without Redis would
+# warn about per-process rate limiting on every run
+os.environ['DEBUG'] = 'True'
+os.environ['CACHE_BACKEND'] = 'locmem'
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import _CACHE_COMMON  # noqa: E402
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'treinacnh-test',
+        **_CACHE_COMMON,
+    },
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'treinacnh-test-ratelimit',
+        **_CACHE_COMMON,
+    },
+}
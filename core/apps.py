@@ -5,3 +5,7 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'Core (Páginas Públicas)'
+    
+    def ready(self):
+        """Import signals when app is ready"""
+        import core.signals  # noqa
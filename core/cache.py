@@ -0,0 +1,101 @@
+"""
+Namespaced, versioned access to the shared cache.
+
+Every caching feature gets its own CacheNamespace, so its keys never clash
+with another feature's and the whole namespace can be dropped at once:
+
+    map_cache = CacheNamespace('map_cities', timeout=60 * 30)
+    data = map_cache.get_or_set('data', build_map_cities)
+    map_cache.invalidate()
+
+Keys are stored as "<namespace>:<version>:<key>"; invalidate() bumps the
+namespace version, so old entries are never read again and simply expire.
+The backend itself (Redis, file or local memory) is chosen in settings
+(CACHE_BACKEND) and is shared by all gunicorn workers except for locmem.
+"""
+import time
+
+from django.core.cache import caches
+
+
+class CacheNamespace:
+    def __init__(self, name, timeout=300, alias='default'):
+        self.name = name
+        self.timeout = timeout
+        self.alias = alias
+
+    def __repr__(self):
+        return f'<CacheNamespace {self.name}>'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def _version_key(self):
+        return f'ns:{self.name}'
+
+    def version(self):
+        version = self.cache.get(self._version_key)
+        if version is None:
+            # Time-based start: an evicted version never reuses an old number
+            self.cache.add(self._version_key, time.time_ns(), None)
+            version = self.cache.get(self._version_key)
+        return version
+
+    def invalidate(self):
+        """Drop every entry of the namespace."""
+        try:
+            self.cache.incr(self._version_key)
+        except ValueError:
+            self.cache.set(self._version_key, time.time_ns(), None)
+
+    def _key(self, key, version):
+        return f'{self.name}:{version}:{key}'
+
+    def get(self, key, default=None):
+        return self.cache.get(self._key(key, self.version()), default)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(self._key(key, self.version()), value, self.timeout if timeout is None else timeout)
+
+    def add(self, key, value, timeout=None):
+        return self.cache.add(self._key(key, self.version()), value, self.timeout if timeout is None else timeout)
+
+    def delete(self, key):
+        self.cache.delete(self._key(key, self.version()))
+
+    def get_or_set(self, key, default, timeout=None):
+        """Cached value of `key`; `default` (a callable) fills it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = default()
+            self.set(key, value, timeout)
+        return value
+
+    def get_many(self, keys):
+        """{key: value} for the keys found (one round trip plus the version)."""
+        version = self.version()
+        full_keys = {self._key(key, version): key for key in keys}
+        found = self.cache.get_many(full_keys)
+        return {full_keys[full_key]: value for full_key, value in found.items()}
+
+    def set_many(self, mapping, timeout=None):
+        version = self.version()
+        self.cache.set_many(
+            {self._key(key, version): value for key, value in mapping.items()},
+            self.timeout if timeout is None else timeout,
+        )
+
+    def delete_many(self, keys):
+        version = self.version()
+        self.cache.delete_many([self._key(key, version) for key in keys])
+
+    def incr(self, key, delta=1, timeout=None):
+        """Increment a counter, creating it at 0 when missing."""
+        full_key = self._key(key, self.version())
+        try:
+            return self.cache.incr(full_key, delta)
+        except ValueError:
+            self.cache.add(full_key, 0, self.timeout if timeout is None else timeout)
+            return self.cache.incr(full_key, delta)
@@ -0,0 +1,132 @@
+"""
+Precomputed homepage statistics.
+
+The snapshot (instructors and students per state, active cities, totals)
+lives in the shared cache in two parts:
+
+- "students": StudentLead counts per state plus portal student profiles.
+  Kept current incrementally by the signals in core/signals.py (±1 per
+  lead or student profile created, moved or deleted).
+- "instructors": visible instructors per state, verified total and active
+  cities. Dropped by the signals when a relevant instructor/city field
+  changes and rebuilt on the next read (three aggregate queries).
+
+Bulk imports bypass signals and concurrent deltas may race, so
+`manage.py reconcile_home_stats` rebuilds both parts from the database
+(run it periodically via cron) and reports any drift it corrected.
+"""
+import logging
+
+from django.db.models import Count, Q
+
+from accounts.models import Profile, RoleChoices
+from marketplace.models import City, InstructorProfile, StudentLead
+from .cache import CacheNamespace
+
+logger = logging.getLogger(__name__)
+
+HOME_STATS_TIMEOUT = 60 * 60 * 6  # safety net; signals and the reconcile command keep it current
+TOP_STATES = 10
+home_stats_cache = CacheNamespace('home_stats', timeout=HOME_STATS_TIMEOUT)
+
+
+def build_instructor_stats():
+    by_state = dict(
+        InstructorProfile.objects.filter(is_visible=True)
+        .values_list('city__state__code')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    totals = InstructorProfile.objects.aggregate(
+        verified=Count('id', filter=Q(is_visible=True, is_verified=True)),
+    )
+    active_cities = City.objects.filter(
+        is_active=True, instructors__is_visible=True,
+    ).values('pk').distinct().count()
+    return {
+        'by_state': by_state,
+        'total_verified': totals['verified'],
+        'active_cities': active_cities,
+    }
+
+
+def build_student_stats():
+    rows = StudentLead.objects.values_list('state__code', 'state__name').annotate(total=Count('id')).order_by()
+    return {
+        'by_state': {code: total for code, _, total in rows},
+        'state_names': {code: name for code, name, _ in rows},
+        'portal_students': Profile.objects.filter(role=RoleChoices.STUDENT).count(),
+    }
+
+
+def get_home_stats():
+    """
+    {'instructors_by_state', 'students_by_state', 'total_instructors',
+     'total_students', 'total_cities', 'top_student_states'}
+    """
+    parts = home_stats_cache.get_many(['instructors', 'students'])
+    missing = {}
+    for name, builder in (('instructors', build_instructor_stats), ('students', build_student_stats)):
+        if name not in parts:
+            parts[name] = missing[name] = builder()
+    if missing:
+        home_stats_cache.set_many(missing)
+    instructors, students = parts['instructors'], parts['students']
+
+    top = sorted(students['by_state'].items(), key=lambda item: -item[1])[:TOP_STATES]
+    return {
+        'instructors_by_state': instructors['by_state'],
+        'students_by_state': students['by_state'],
+        'total_instructors': instructors['total_verified'],
+        'total_students': sum(students['by_state'].values()) + students['portal_students'],
+        'total_cities': instructors['active_cities'],
+        'top_student_states': [
+            {'state__code': code, 'state__name': students['state_names'].get(code, code), 'total': total}
+            for code, total in top
+        ],
+    }
+
+
+def invalidate_instructor_stats():
+    home_stats_cache.delete('instructors')
+
+
+def apply_student_delta(state=None, delta=0, portal_delta=0):
+    """
+    Adjust the cached student counters. `state` is a State (or None for
+    portal-only changes). Nothing to do when the part is not cached yet:
+    the next read builds it from the database.
+    """
+    students = home_stats_cache.get('students')
+    if students is None:
+        return
+    if state is not None and delta:
+        count = students['by_state'].get(state.code, 0) + delta
+        if count > 0:
+            students['by_state'][state.code] = count
+            students['state_names'][state.code] = state.name
+        else:
+            students['by_state'].pop(state.code, None)
+    students['portal_students'] = max(0, students['portal_students'] + portal_delta)
+    home_stats_cache.set('students', students)
+
+
+def reconcile_home_stats():
+    """
+    Rebuild the snapshot from the database. Returns the list of
+    (part, key) entries that had drifted from the cached values.
+    """
+    fresh = {'instructors': build_instructor_stats(), 'students': build_student_stats()}
+    cached = home_stats_cache.get_many(fresh.keys())
+    drift = []
+    for name, part in fresh.items():
+        old = cached.get(name)
+        if old is None:
+            continue
+        for key, value in part.items():
+            if old.get(key) != value:
+                drift.append((name, key))
+    home_stats_cache.set_many(fresh)
+    if drift:
+        logger.info('Home stats reconciled; drift in %s', ', '.join(f'{p}.{k}' for p, k in drift))
+    return drift
@@ -0,0 +1,61 @@
+"""
+Named locks for jobs that must not overlap (cron sweeps).
+
+    with advisory_lock('billing_lifecycle') as acquired:
+        if not acquired:
+            return  # another run holds it
+
+On MySQL this is a server advisory lock (GET_LOCK / RELEASE_LOCK): it
+belongs to the connection, so MySQL releases it if the process dies. Those
+locks are server-wide, so the name is prefixed with the database name:
+two sites (or staging and production) sharing a MySQL server don't block
+each other.
+Other databases (SQLite in development and tests) use a cache key instead,
+which expires after `timeout` seconds if the holder dies.
+"""
+import hashlib
+import uuid
+from contextlib import contextmanager
+
+from django.db import connection
+
+from .cache import CacheNamespace
+
+LOCK_TIMEOUT = 60 * 30
+MYSQL_LOCK_NAME_MAX = 64
+
+lock_cache = CacheNamespace('locks', timeout=LOCK_TIMEOUT)
+
+
+def mysql_lock_name(name):
+    """`name` scoped to the current database, within MySQL's 64-character limit."""
+    scoped = f"{connection.settings_dict['NAME']}:{name}"
+    if len(scoped) > MYSQL_LOCK_NAME_MAX:
+        scoped = hashlib.sha1(scoped.encode()).hexdigest()
+    return scoped
+
+
+@contextmanager
+def advisory_lock(name, timeout=LOCK_TIMEOUT):
+    """Try to take lock `name` without waiting; yields True when acquired."""
+    if connection.vendor == 'mysql':
+        lock_name = mysql_lock_name(name)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT GET_LOCK(%s, 0)', [lock_name])
+            acquired = cursor.fetchone()[0] == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT RELEASE_LOCK(%s)', [lock_name])
+        return
+
+    token = uuid.uuid4().hex
+    acquired = lock_cache.add(name, token, timeout)
+    try:
+        yield acquired
+    finally:
+        # Only the holder releases it (not after it expired and was retaken)
+        if acquired and lock_cache.get(name) == token:
+            lock_cache.delete(name)
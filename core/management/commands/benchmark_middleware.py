@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of the per-request overhead of core.middleware.SecurityMiddleware
+(blocklists + rate limiter) against the configured cache backend.
+
+The wrapped view is a no-op, so the timings are the middleware's own cost.
+Each simulated request comes from a different IP so none is rate limited.
+
+Usage:
+    python manage.py benchmark_middleware
+    python manage.py benchmark_middleware --requests 50000
+"""
+import logging
+import statistics
+import time
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from core.middleware import SecurityMiddleware
+
+PATHS = [
+    '/', '/instrutores/cidades/', '/instrutores/SP/sao-paulo/', '/instrutores/api/map/markers/',
+    '/static/css/style.css', '/contas/entrar/', '/webhook/mercadopago/', '/healthcheck/',
+]
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36'
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-request overhead of SecurityMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Requisições simuladas por caminho')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        middleware = SecurityMiddleware(lambda request: HttpResponse())
+        factory = RequestFactory()
+
+        self.stdout.write(f'Cache de rate limit: {caches["ratelimit"].__class__.__name__}')
+        self.stdout.write(f'{"caminho":<34}{"µs/req p50":>12}{"µs/req média":>14}')
+        for path in PATHS:
+            requests = [
+                factory.get(path, HTTP_USER_AGENT=USER_AGENT, REMOTE_ADDR=f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}')
+                for i in range(total)
+            ]
+            timings = []
+            for request in requests:
+                started = time.perf_counter()
+                middleware(request)
+                timings.append((time.perf_counter() - started) * 1e6)
+            self.stdout.write(
+                f'{path:<34}{statistics.median(timings):>12.1f}{statistics.fmean(timings):>14.1f}'
+            )
+
+        blocked = factory.get('/wp-login.php', HTTP_USER_AGENT=USER_AGENT)
+        middleware_logger = logging.getLogger('core.middleware')
+        middleware_logger.disabled = True  # one warning per blocked request otherwise
+        try:
+            started = time.perf_counter()
+            for _ in range(total):
+                middleware(blocked)
+            per_request = (time.perf_counter() - started) / total * 1e6
+        finally:
+            middleware_logger.disabled = False
+        self.stdout.write(f'{"/wp-login.php (bloqueado)":<34}{per_request:>26.1f}')
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark concluído'))
@@ -0,0 +1,29 @@
+"""
+Write the sitemap index and the pre-gzipped sitemap chunks served at
+/sitemap.xml (see core/sitemap_files.py). Only chunks whose objects changed
+since the last run are rendered again; run it from cron.
+
+Usage:
+    python manage.py build_sitemaps
+    python manage.py build_sitemaps --full
+"""
+from django.core.management.base import BaseCommand
+from core.sitemap_files import build_sitemaps, sitemap_dir
+
+
+class Command(BaseCommand):
+    help = 'Build the sitemap index and its gzipped chunks incrementally'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Reescreve todos os arquivos')
+
+    def handle(self, *args, **options):
+        result = build_sitemaps(full=options['full'])
+        for filename in result['written']:
+            self.stdout.write(f'  escrito: {filename}')
+        for filename in result['removed']:
+            self.stdout.write(f'  removido: {filename}')
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Sitemaps em {sitemap_dir()}: {len(result['written'])} escrito(s), "
+            f"{result['unchanged']} inalterado(s), {len(result['removed'])} removido(s)"
+        ))
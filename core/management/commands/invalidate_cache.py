@@ -0,0 +1,29 @@
+"""
+Drop cached entries from the shared cache (see core/cache.py).
+
+Usage:
+    python manage.py invalidate_cache instructor_cards map_cities
+    python manage.py invalidate_cache --all
+"""
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from core.cache import CacheNamespace
+
+
+class Command(BaseCommand):
+    help = 'Invalidate cache namespaces (or the whole cache with --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('namespaces', nargs='*', help='Ex.: instructor_cards map_cities map_markers listing_counts page_cache')
+        parser.add_argument('--all', action='store_true', help='Limpa o cache inteiro')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS('✓ Cache inteiro limpo'))
+            return
+        if not options['namespaces']:
+            raise CommandError('Informe ao menos um namespace ou use --all.')
+        for name in options['namespaces']:
+            CacheNamespace(name).invalidate()
+            self.stdout.write(self.style.SUCCESS(f'✓ Namespace "{name}" invalidado'))
@@ -0,0 +1,28 @@
+"""
+Management command to show the counters of the anonymous page cache
+(see core/page_cache.py).
+
+Usage:
+    python manage.py page_cache_stats
+    python manage.py page_cache_stats --reset
+"""
+from django.core.management.base import BaseCommand
+from core.page_cache import page_cache_stats, reset_page_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the hit ratio and render time saved by the page cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zera os contadores após exibir')
+
+    def handle(self, *args, **options):
+        stats = page_cache_stats()
+        self.stdout.write(
+            f"Hits: {stats['hits']}  Misses: {stats['misses']}  "
+            f"Taxa de acerto: {stats['hit_ratio']:.1%}  "
+            f"Tempo de renderização economizado: {stats['saved_ms'] / 1000:.1f}s"
+        )
+        if options['reset']:
+            reset_page_cache_stats()
+            self.stdout.write(self.style.SUCCESS('✓ Contadores zerados'))
@@ -0,0 +1,25 @@
+"""
+Management command to rebuild the homepage statistics snapshot from the
+database (see core/home_stats.py). Signals keep it current between runs;
+this catches bulk imports and any drift.
+Should be run periodically via cron (e.g. hourly).
+
+Usage:
+    python manage.py reconcile_home_stats
+"""
+from django.core.management.base import BaseCommand
+from core.home_stats import get_home_stats, reconcile_home_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached homepage statistics from the database'
+
+    def handle(self, *args, **options):
+        drift = reconcile_home_stats()
+        for part, key in drift:
+            self.stdout.write(self.style.WARNING(f'  divergência corrigida: {part}.{key}'))
+        stats = get_home_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Estatísticas da home atualizadas: {stats['total_instructors']} instrutores, "
+            f"{stats['total_students']} alunos, {stats['total_cities']} cidades ativas"
+        ))
@@ -2,13 +2,119 @@
 Security middleware for additional protection.
 """
 import logging
-from django.http import HttpResponseForbidden
-from django.core.cache import cache
+from django.contrib.auth.middleware import AuthenticationMiddleware as DjangoAuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import redirect
-from django.urls import resolve, reverse
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from accounts.identity import RequestIdentity, get_identity, load_user
+from .ratelimit import (
+    DEFAULT_BUDGET, RATE_LIMIT_EXEMPT_PREFIXES, ROUTE_BUDGETS,
+    PrefixMatcher, SlidingWindowLimiter, compile_substring_blocklist,
+)
 
 logger = logging.getLogger(__name__)
 
+# Path classes (request.path_class), decided once per request by PathClassMiddleware
+PATH_PAGE = 'page'
+PATH_STATIC = 'static'
+PATH_HEALTH = 'health'
+PATH_WEBHOOK = 'webhook'
+
+PATH_CLASSES = {
+    '/static/': PATH_STATIC,
+    '/media/': PATH_STATIC,
+    '/favicon': PATH_STATIC,
+    '/healthcheck/': PATH_HEALTH,
+    '/webhook/': PATH_WEBHOOK,
+}
+# Machine endpoints: no session, authentication or profile work
+MACHINE_PATH_CLASSES = (PATH_HEALTH, PATH_WEBHOOK)
+
+
+def path_class(request):
+    """Class of the request path; PATH_PAGE when not classified (e.g. RequestFactory)."""
+    return getattr(request, 'path_class', PATH_PAGE)
+
+
+def is_machine_path(request):
+    return path_class(request) in MACHINE_PATH_CLASSES
+
+
+class PathClassMiddleware:
+    """
+    Classifies the path once (precompiled longest-prefix match) into
+    request.path_class, so the rest of the chain can skip work that does not
+    apply to it:
+
+    - health checks and payment webhooks (is_machine_path()) get an empty
+      session that is never read nor saved, an anonymous user and no
+      profile lookups (SessionMiddleware, AuthenticationMiddleware and
+      IdentityMiddleware below);
+    - static/media paths skip the profile lookups (see path_class()).
+
+    The view is still dispatched by Django's handler. Goes right after
+    core.middleware.SecurityMiddleware, so blocklists and rate limits still
+    apply to every path.
+    """
+
+    _classes = PrefixMatcher(PATH_CLASSES)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.path_class = self._classes.match(request.path_info, PATH_PAGE)
+        return self.get_response(request)
+
+
+class SessionMiddleware(DjangoSessionMiddleware):
+    """
+    Django's SessionMiddleware. Machine endpoints get an empty session that
+    is not loaded from the cookie nor saved (no session query, no Set-Cookie).
+    """
+
+    def process_request(self, request):
+        if is_machine_path(request):
+            request.session = self.SessionStore()
+            return
+        super().process_request(request)
+
+    def process_response(self, request, response):
+        if is_machine_path(request):
+            return response
+        return super().process_response(request, response)
+
+
+class AuthenticationMiddleware(DjangoAuthenticationMiddleware):
+    """Django's AuthenticationMiddleware; machine endpoints are anonymous."""
+
+    def process_request(self, request):
+        if is_machine_path(request):
+            request.user = AnonymousUser()
+            return
+        super().process_request(request)
+
+
+class IdentityMiddleware:
+    """
+    Goes right after AuthenticationMiddleware and replaces its lazy
+    request.user with one loaded together with the profile and the
+    instructor profile (one joined query, on first access). Also sets the
+    lazy request.identity (see accounts/identity.py).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_machine_path(request):
+            request.user = SimpleLazyObject(lambda: load_user(request))
+        request.identity = SimpleLazyObject(lambda: RequestIdentity(request.user))
+        return self.get_response(request)
+
 
 class ProfileCompletionMiddleware:
     """
@@ -38,10 +144,10 @@ class ProfileCompletionMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.user.is_authenticated:
+        if path_class(request) == PATH_PAGE and request.user.is_authenticated:
             path = request.path_info
             if not any(path.startswith(p) for p in self.EXEMPT_PREFIXES):
-                profile = getattr(request.user, 'profile', None)
+                profile = get_identity(request).profile
                 if profile is not None and not profile.is_profile_complete:
                     complete_url = reverse('accounts:complete_profile')
                     if path != complete_url:
@@ -53,22 +159,23 @@ class ProfileCompletionMiddleware:
 class StudentRedirectMiddleware:
     """Redirect logged-in students from home/plans to their leads page"""
     
+    REDIRECTED_URL_NAMES = ('core:home', 'billing:plans')
+    
     def __init__(self, get_response):
         self.get_response = get_response
+        self._redirected_paths = None
+    
+    def _is_redirected_path(self, path):
+        # Reversed once instead of resolve() on every request
+        if self._redirected_paths is None:
+            self._redirected_paths = frozenset(reverse(name) for name in self.REDIRECTED_URL_NAMES)
+        return path in self._redirected_paths
     
     def __call__(self, request):
-        # Check if user is authenticated and is a student
-        if request.user.is_authenticated:
-            if hasattr(request.user, 'profile') and request.user.profile.role == 'STUDENT':
-                try:
-                    # Get current URL name
-                    current_url = resolve(request.path_info).url_name
-                    
-                    # Redirect from home or plans to student's sent leads page
-                    if current_url in ['home', 'plans']:
-                        return redirect('marketplace:my_leads')
-                except:
-                    pass
+        # Only home/plans are affected: check the path before touching the user
+        if path_class(request) == PATH_PAGE and self._is_redirected_path(request.path_info):
+            if get_identity(request).is_student:
+                return redirect('marketplace:my_leads')
         
         response = self.get_response(request)
         return response
@@ -77,6 +184,8 @@ class StudentRedirectMiddleware:
 class SecurityMiddleware:
     """
     Custom security middleware for additional protection against attacks.
+    Blocks scanner user agents and probe paths, and rate limits each IP
+    with a per-route budget (see core/ratelimit.py).
     """
     
     # Suspicious patterns in user agent
@@ -94,35 +203,45 @@ class SecurityMiddleware:
         '<script', 'javascript:', 'onerror='
     ]
     
+    # Precompiled once: a single regex search per check
+    _user_agent_blocklist = compile_substring_blocklist(SUSPICIOUS_USER_AGENTS)
+    _path_blocklist = compile_substring_blocklist(SUSPICIOUS_PATHS)
+    _route_budgets = PrefixMatcher(ROUTE_BUDGETS)
+    _exempt_paths = PrefixMatcher({prefix: True for prefix in RATE_LIMIT_EXEMPT_PREFIXES})
+    
     def __init__(self, get_response):
         self.get_response = get_response
+        self.limiter = SlidingWindowLimiter()
     
     def __call__(self, request):
         # Check for suspicious user agents
-        user_agent = request.META.get('HTTP_USER_AGENT', '').lower()
-        for suspicious in self.SUSPICIOUS_USER_AGENTS:
-            if suspicious in user_agent:
-                logger.warning(
-                    f"Suspicious user agent blocked: {user_agent} "
-                    f"from IP: {self.get_client_ip(request)}"
-                )
-                return HttpResponseForbidden("Access Denied")
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        if self._user_agent_blocklist.search(user_agent):
+            logger.warning(
+                f"Suspicious user agent blocked: {user_agent.lower()} "
+                f"from IP: {self.get_client_ip(request)}"
+            )
+            return HttpResponseForbidden("Access Denied")
         
         # Check for suspicious paths
-        path = request.path.lower()
-        for suspicious in self.SUSPICIOUS_PATHS:
-            if suspicious in path:
-                logger.warning(
-                    f"Suspicious path blocked: {path} "
-                    f"from IP: {self.get_client_ip(request)}"
-                )
-                return HttpResponseForbidden("Access Denied")
+        path = request.path
+        if self._path_blocklist.search(path):
+            logger.warning(
+                f"Suspicious path blocked: {path.lower()} "
+                f"from IP: {self.get_client_ip(request)}"
+            )
+            return HttpResponseForbidden("Access Denied")
         
         # Check for excessive requests from single IP
-        ip = self.get_client_ip(request)
-        if self.is_rate_limited(ip):
-            logger.warning(f"Rate limit exceeded for IP: {ip}")
-            return HttpResponseForbidden("Too Many Requests")
+        if not self._exempt_paths.match(path, False):
+            ip = self.get_client_ip(request)
+            budget = self._route_budgets.match(path, DEFAULT_BUDGET)
+            allowed, retry_after = self.limiter.hit(ip, budget)
+            if not allowed:
+                logger.warning(f"Rate limit exceeded for IP: {ip} ({budget.name})")
+                response = HttpResponse("Too Many Requests", status=429)
+                response['Retry-After'] = str(retry_after)
+                return response
         
         response = self.get_response(request)
         
@@ -131,7 +250,7 @@ class SecurityMiddleware:
         response['X-Frame-Options'] = 'DENY'
         response['X-XSS-Protection'] = '1; mode=block'
         response['Referrer-Policy'] = 'same-origin'
-        response['Permissions-Policy'] = 'geolocation=(), microphone=(), camera=()'
+        response['Permissions-Policy'] = 'geolocation=(self), microphone=(), camera=()'
         
         return response
     
@@ -143,14 +262,3 @@ class SecurityMiddleware:
         else:
             ip = request.META.get('REMOTE_ADDR')
         return ip
-    
-    def is_rate_limited(self, ip):
-        """Check if IP has exceeded rate limit"""
-        cache_key = f'rate_limit_{ip}'
-        requests = cache.get(cache_key, 0)
-        
-        if requests > 100:  # Max 100 requests per minute
-            return True
-        
-        cache.set(cache_key, requests + 1, 60)  # 60 seconds
-        return False
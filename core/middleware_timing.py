@@ -0,0 +1,89 @@
+"""
+Opt-in per-middleware timing (MIDDLEWARE_TIMING=True in the environment).
+
+settings.py wraps every MIDDLEWARE entry with timed(), which returns the
+dotted path of a generated wrapper class defined in this module:
+
+    'django.middleware.csrf.CsrfViewMiddleware'
+        -> 'core.middleware_timing.Timed_django_middleware_csrf_CsrfViewMiddleware'
+
+Each wrapper measures the time spent inside its middleware and the time
+spent in the rest of the chain below it; the difference is the
+middleware's own cost. The outermost wrapper reports every middleware's
+own cost plus the view (what the innermost one spent below itself):
+
+- as a Server-Timing header (visible in the browser devtools);
+- as one DEBUG line per request on the "core.middleware_timing" logger.
+
+process_view/process_exception/process_template_response hooks are
+forwarded unchanged and are not timed. allauth checks that its middleware
+is listed verbatim, so it is left unwrapped (being last, its time shows up
+as part of "view").
+"""
+import logging
+import re
+import time
+
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+FORWARDED_HOOKS = ('process_view', 'process_exception', 'process_template_response')
+UNWRAPPED = ('allauth.account.middleware.AccountMiddleware',)
+
+
+class TimedMiddleware:
+    dotted_path = None  # set on the generated subclasses
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        # "django.SecurityMiddleware" vs "core.SecurityMiddleware"
+        self.label = f"{self.dotted_path.split('.', 1)[0]}.{self.dotted_path.rsplit('.', 1)[-1]}"
+        self.get_response = get_response
+        self.inner = import_string(self.dotted_path)(self._call_next)
+        for hook in FORWARDED_HOOKS:
+            if hasattr(self.inner, hook):
+                setattr(self, hook, getattr(self.inner, hook))
+
+    def _call_next(self, request):
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            request._middleware_timings[self.label][1] += time.perf_counter() - started
+
+    def __call__(self, request):
+        timings = getattr(request, '_middleware_timings', None)
+        outermost = timings is None
+        if outermost:
+            timings = request._middleware_timings = {}
+        entry = timings[self.label] = [0.0, 0.0]  # [total, time spent below]
+
+        started = time.perf_counter()
+        response = self.inner(request)
+        entry[0] = time.perf_counter() - started
+
+        if outermost:
+            self._report(request, response, timings)
+        return response
+
+    @staticmethod
+    def _report(request, response, timings):
+        own = [(label, (total - below) * 1000) for label, (total, below) in timings.items()]
+        # What the innermost middleware spent below itself is the view
+        own.append(('view', list(timings.values())[-1][1] * 1000))
+        response['Server-Timing'] = ', '.join(
+            f'{re.sub(r"[^A-Za-z0-9_.-]", "-", label)};dur={ms:.2f}' for label, ms in own
+        )
+        logger.debug('%s %s: %s', request.method, request.path, ', '.join(f'{label}={ms:.2f}ms' for label, ms in own))
+
+
+def timed(dotted_path):
+    """Dotted path of a TimedMiddleware wrapping `dotted_path`."""
+    if dotted_path in UNWRAPPED:
+        return dotted_path
+    name = 'Timed_' + re.sub(r'\W', '_', dotted_path)
+    if name not in globals():
+        globals()[name] = type(name, (TimedMiddleware,), {'dotted_path': dotted_path})
+    return f'{__name__}.{name}'
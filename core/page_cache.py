@@ -0,0 +1,136 @@
+"""
+Full-page cache for the public pages, anonymous visitors only.
+
+    @anonymous_page_cache
+    def about_view(request): ...
+
+A rendered GET response is stored under
+
+    page_cache:<namespace version>:<md5(path?query)>:<device class>
+
+and replayed for the next anonymous request of the same URL and device
+class (mobile/desktop, from the User-Agent). Nothing is cached or served
+from the cache when:
+
+- the user is authenticated;
+- the request carries flash messages (they are part of the page);
+- the page used a CSRF token (forms) or set a cookie;
+- the response is not a plain 200.
+
+The signals in core/signals.py drop the whole namespace when the content
+behind these pages changes (news, FAQ, static pages, banners, homepage
+counters). Hits, misses and the render time saved are counted in the
+cache; see `manage.py page_cache_stats`.
+"""
+import hashlib
+import re
+import time
+from functools import wraps
+
+from django.http import HttpResponse
+
+from .cache import CacheNamespace
+
+PAGE_CACHE_TIMEOUT = 60 * 10  # safety net; signals invalidate on content changes
+STATS_HITS_KEY = 'stats:hits'
+STATS_MISSES_KEY = 'stats:misses'
+STATS_SAVED_KEY = 'stats:saved_ms'
+page_cache = CacheNamespace('page_cache', timeout=PAGE_CACHE_TIMEOUT)
+# Counters survive invalidate_page_cache()
+stats_cache = CacheNamespace('page_cache_stats', timeout=None)
+
+MOBILE_USER_AGENT = re.compile(r'Mobi|Android|iPhone|iPad|iPod|Opera Mini|IEMobile', re.IGNORECASE)
+REPLAYED_HEADERS = ('Content-Type', 'Content-Language', 'X-Robots-Tag', 'Last-Modified')
+
+
+def device_class(request):
+    return 'mobile' if MOBILE_USER_AGENT.search(request.META.get('HTTP_USER_AGENT', '')) else 'desktop'
+
+
+def page_cache_key(request):
+    url = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'{url}:{device_class(request)}'
+
+
+def _has_messages(request):
+    storage = getattr(request, '_messages', None)
+    return storage is not None and len(storage) > 0
+
+
+def _is_cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not _has_messages(request)
+    )
+
+
+def _is_storable(request, response):
+    return (
+        request.method == 'GET'
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and not _has_messages(request)
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+def anonymous_page_cache(view_func):
+    """Serve the view's response from the page cache for anonymous visitors."""
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view_func(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        entry = page_cache.get(key)
+        if entry is not None:
+            stats_cache.incr(STATS_HITS_KEY)
+            stats_cache.incr(STATS_SAVED_KEY, entry['render_ms'])
+            response = HttpResponse(entry['content'], status=entry['status'])
+            for header, value in entry['headers'].items():
+                response[header] = value
+            return response
+
+        started = time.perf_counter()
+        response = view_func(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()  # TemplateResponse (e.g. the sitemap view)
+        render_ms = round((time.perf_counter() - started) * 1000)
+        stats_cache.incr(STATS_MISSES_KEY)
+
+        if _is_storable(request, response):
+            page_cache.set(key, {
+                'content': response.content,
+                'status': response.status_code,
+                'headers': {h: response[h] for h in REPLAYED_HEADERS if h in response},
+                'render_ms': render_ms,
+            })
+        return response
+
+    return wrapper
+
+
+def invalidate_page_cache():
+    page_cache.invalidate()
+
+
+def page_cache_stats():
+    """{'hits', 'misses', 'hit_ratio', 'saved_ms'} since the last reset."""
+    values = stats_cache.get_many([STATS_HITS_KEY, STATS_MISSES_KEY, STATS_SAVED_KEY])
+    hits = values.get(STATS_HITS_KEY, 0)
+    misses = values.get(STATS_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+        'saved_ms': values.get(STATS_SAVED_KEY, 0),
+    }
+
+
+def reset_page_cache_stats():
+    stats_cache.delete_many([STATS_HITS_KEY, STATS_MISSES_KEY, STATS_SAVED_KEY])
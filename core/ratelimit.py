@@ -0,0 +1,124 @@
+"""
+Per-IP rate limiting for core.middleware.SecurityMiddleware.
+
+Sliding-window counter: each (budget, IP) pair has one counter per fixed
+window, created with add() and bumped with an atomic incr() in the shared
+cache. The rate is estimated as
+
+    current window + previous window × (share of the previous window still inside the sliding window)
+
+which smooths the burst allowed at window boundaries. A closed window never
+changes, so its count is memoized per process: a request normally costs a
+single cache round trip (the incr).
+
+Counters live in the "ratelimit" cache alias: the default cache when it is
+Redis (atomic incr across workers), else process memory, per worker (settings
+warn about it when DEBUG=False).
+
+Budgets are chosen per path prefix (ROUTE_BUDGETS, longest prefix wins);
+RATE_LIMIT_EXEMPT_PREFIXES (health checks, robots) are never counted.
+"""
+import math
+import re
+import time
+from typing import NamedTuple
+
+from django.core.cache import caches
+
+
+class Budget(NamedTuple):
+    name: str
+    limit: int      # requests allowed...
+    window: int     # ...per this many seconds
+
+
+DEFAULT_BUDGET = Budget('default', 100, 60)
+
+# Stricter for authentication and payment callbacks, looser for assets and map APIs
+ROUTE_BUDGETS = {
+    '/contas/entrar/': Budget('login', 20, 60),
+    '/contas/registrar/': Budget('register', 20, 60),
+    '/admin/login/': Budget('admin_login', 20, 60),
+    '/webhook/': Budget('webhook', 60, 60),
+    '/static/': Budget('static', 600, 60),
+    '/media/': Budget('media', 600, 60),
+    '/instrutores/api/': Budget('api', 300, 60),
+}
+
+RATE_LIMIT_EXEMPT_PREFIXES = ('/healthcheck/', '/robots.txt', '/favicon')
+
+CLOSED_WINDOW_MEMO_SIZE = 10000
+
+
+class PrefixMatcher:
+    """
+    Precompiled longest-prefix lookup: one regex match per path instead of a
+    Python loop over the prefixes.
+    """
+
+    def __init__(self, mapping):
+        prefixes = sorted(mapping, key=len, reverse=True)
+        self._values = {f'p{i}': mapping[prefix] for i, prefix in enumerate(prefixes)}
+        self._regex = re.compile('|'.join(
+            f'(?P<p{i}>{re.escape(prefix)})' for i, prefix in enumerate(prefixes)
+        )) if prefixes else None
+
+    def match(self, path, default=None):
+        match = self._regex.match(path) if self._regex else None
+        return self._values[match.lastgroup] if match else default
+
+
+def compile_substring_blocklist(patterns):
+    """Case-insensitive regex matching any of the substrings."""
+    return re.compile('|'.join(re.escape(p) for p in patterns), re.IGNORECASE)
+
+
+class SlidingWindowLimiter:
+    def __init__(self, cache_alias='ratelimit', key_prefix='ratelimit'):
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+        self._closed_windows = {}
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _incr(self, key, timeout):
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            if self.cache.add(key, 1, timeout):
+                return 1
+            return self.cache.incr(key)  # created meanwhile by another worker
+
+    def _closed_count(self, key):
+        count = self._closed_windows.get(key)
+        if count is None:
+            if len(self._closed_windows) >= CLOSED_WINDOW_MEMO_SIZE:
+                self._closed_windows.clear()
+            count = self._closed_windows[key] = self.cache.get(key, 0)
+        return count
+
+    def hit(self, identity, budget, now=None):
+        """
+        Count one request of `identity` against `budget`.
+        Returns (allowed, retry_after_seconds).
+        """
+        now = time.time() if now is None else now
+        index, offset = divmod(now, budget.window)
+        index = int(index)
+        base = f'{self.key_prefix}:{budget.name}:{identity}'
+
+        current = self._incr(f'{base}:{index}', budget.window * 2)
+        if current > budget.limit:
+            return False, max(1, math.ceil(budget.window - offset))
+
+        previous = self._closed_count(f'{base}:{index - 1}')
+        remaining_share = 1 - offset / budget.window
+        if current + previous * remaining_share <= budget.limit:
+            return True, 0
+
+        # Wait until enough of the previous window has slid out
+        needed_share = (budget.limit - current) / previous
+        retry_after = (remaining_share - needed_share) * budget.window
+        return False, max(1, math.ceil(round(retry_after, 6)))
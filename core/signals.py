@@ -0,0 +1,98 @@
+"""
+Signals that keep the homepage statistics (core/home_stats.py) and the
+anonymous page cache (core/page_cache.py) current.
+"""
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from accounts.models import Profile, RoleChoices
+from marketplace.models import City, InstructorProfile, State, StudentLead
+from .home_stats import apply_student_delta, invalidate_instructor_stats
+from .models import FAQEntry, HomeBanner, NewsArticle, StaticPage
+from .page_cache import invalidate_page_cache
+
+# InstructorProfile fields that feed the homepage counters
+INSTRUCTOR_STATS_FIELDS = ('is_visible', 'is_verified', 'city_id')
+
+
+def _loaded(instance, fields):
+    # __dict__ only: deferred fields are not loaded (None when deferred)
+    return tuple(instance.__dict__.get(field) for field in fields)
+
+
+@receiver(post_init, sender=InstructorProfile)
+def remember_instructor_stats_fields(sender, instance, **kwargs):
+    instance._home_stats_fields = _loaded(instance, INSTRUCTOR_STATS_FIELDS)
+
+
+@receiver(post_save, sender=InstructorProfile)
+def update_stats_on_instructor_save(sender, instance, created, **kwargs):
+    current = _loaded(instance, INSTRUCTOR_STATS_FIELDS)
+    if created or current != instance._home_stats_fields:
+        instance._home_stats_fields = current
+        invalidate_instructor_stats()
+        invalidate_page_cache()
+
+
+@receiver(post_delete, sender=InstructorProfile)
+def update_stats_on_instructor_delete(sender, instance, **kwargs):
+    invalidate_instructor_stats()
+    invalidate_page_cache()
+
+
+@receiver(post_save, sender=City)
+def update_stats_on_city_save(sender, instance, created, **kwargs):
+    """Cities switched on/off change the active city count."""
+    if not created:
+        invalidate_instructor_stats()
+        invalidate_page_cache()
+
+
+@receiver(post_init, sender=StudentLead)
+def remember_student_lead_state(sender, instance, **kwargs):
+    instance._home_stats_state_id = instance.__dict__.get('state_id')
+
+
+@receiver(post_save, sender=StudentLead)
+def update_stats_on_student_lead_save(sender, instance, created, **kwargs):
+    if created:
+        apply_student_delta(instance.state, +1)
+    elif instance.state_id != instance._home_stats_state_id and instance._home_stats_state_id:
+        old_state = State.objects.filter(pk=instance._home_stats_state_id).first()
+        if old_state:
+            apply_student_delta(old_state, -1)
+        apply_student_delta(instance.state, +1)
+    instance._home_stats_state_id = instance.state_id
+
+
+@receiver(post_delete, sender=StudentLead)
+def update_stats_on_student_lead_delete(sender, instance, **kwargs):
+    apply_student_delta(instance.state, -1)
+
+
+@receiver(post_init, sender=Profile)
+def remember_profile_role(sender, instance, **kwargs):
+    instance._home_stats_role = instance.__dict__.get('role')
+
+
+@receiver(post_save, sender=Profile)
+def update_stats_on_profile_save(sender, instance, created, **kwargs):
+    """Portal students (every User save also saves the profile)."""
+    was_student = not created and instance._home_stats_role == RoleChoices.STUDENT
+    is_student = instance.role == RoleChoices.STUDENT
+    if was_student != is_student:
+        apply_student_delta(portal_delta=1 if is_student else -1)
+    instance._home_stats_role = instance.role
+
+
+@receiver(post_delete, sender=Profile)
+def update_stats_on_profile_delete(sender, instance, **kwargs):
+    if instance.role == RoleChoices.STUDENT:
+        apply_student_delta(portal_delta=-1)
+
+
+@receiver([post_save, post_delete], sender=NewsArticle)
+@receiver([post_save, post_delete], sender=FAQEntry)
+@receiver([post_save, post_delete], sender=StaticPage)
+@receiver([post_save, post_delete], sender=HomeBanner)
+def invalidate_pages_on_content_change(sender, **kwargs):
+    invalidate_page_cache()
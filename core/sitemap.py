@@ -57,13 +57,24 @@ class StaticPageSitemap(Sitemap):
 class InstructorSitemap(Sitemap):
     priority = 0.8
     changefreq = 'monthly'
+    _location_pattern = None
 
     def items(self):
-        return InstructorProfile.objects.filter(is_visible=True, is_verified=True)
+        return InstructorProfile.objects.filter(
+            is_visible=True, is_verified=True,
+        ).only('pk', 'updated_at').order_by('pk')
 
     def lastmod(self, obj):
         return getattr(obj, 'updated_at', timezone.now())
 
+    def location(self, obj):
+        # reverse() once per process instead of once per instructor
+        if InstructorSitemap._location_pattern is None:
+            InstructorSitemap._location_pattern = reverse(
+                'marketplace:instructor_detail', kwargs={'pk': 0},
+            ).replace('/0/', '/{}/')
+        return self._location_pattern.format(obj.pk)
+
 
 class NewsSitemap(Sitemap):
     """Sitemap para notícias/blog (NewsArticle)"""
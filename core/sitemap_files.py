@@ -0,0 +1,153 @@
+"""
+Precomputed sitemap files, written by `manage.py build_sitemaps` (cron) and
+served as static files by core.views.sitemap_index_view / sitemap_chunk_view.
+
+SITEMAP_DIR holds:
+
+    sitemap.xml                          the index, one <sitemap> per chunk
+    sitemap-<section>-<chunk>.xml.gz     pre-gzipped urlsets
+    manifest.json                        signature of every chunk
+
+Sections are the entries of core.sitemap.sitemaps. Sections backed by a
+queryset are split in chunks by primary key range (CHUNK_SIZE ids each),
+so an object always stays in the same chunk. A chunk's signature is
+(count, sum of ids, latest updated_at), read with one two-column query per
+section: only chunks whose signature changed since the last run are
+rendered again (new/edited objects move updated_at, deleted or hidden ones
+change count and id sum). Sections with a fixed list of URLs are one chunk.
+"""
+import gzip
+import hashlib
+import json
+import os
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .sitemap import sitemaps
+
+CHUNK_SIZE = 5000  # ids per chunk; a chunk never exceeds the 50,000 URL limit
+INDEX_FILENAME = 'sitemap.xml'
+MANIFEST_FILENAME = 'manifest.json'
+
+
+def sitemap_dir():
+    return str(settings.SITEMAP_DIR)
+
+
+def chunk_filename(section, chunk):
+    return f'sitemap-{section}-{chunk}.xml.gz'
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, path)
+
+
+def _load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILENAME)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+
+def _site():
+    url = urlsplit(settings.SITE_URL)
+    return url.scheme or 'https', SimpleNamespace(domain=url.netloc)
+
+
+def _chunk_signatures(queryset):
+    """{chunk: [count, id_sum, latest updated_at iso]} from (pk, updated_at) only."""
+    signatures = {}
+    for pk, updated_at in queryset.order_by().values_list('pk', 'updated_at').iterator():
+        signature = signatures.setdefault(str(pk // CHUNK_SIZE), [0, 0, None])
+        signature[0] += 1
+        signature[1] += pk
+        stamp = updated_at.isoformat() if updated_at else None
+        if stamp and (signature[2] is None or stamp > signature[2]):
+            signature[2] = stamp
+    return signatures
+
+
+def _render_chunk(sitemap_class, items, protocol, site):
+    sitemap = sitemap_class()
+    sitemap.items = lambda: items
+    urls = sitemap.get_urls(site=site, protocol=protocol)
+    xml = render_to_string('sitemap.xml', {'urlset': urls})
+    return gzip.compress(xml.encode('utf-8'), mtime=0)
+
+
+def build_sitemaps(full=False):
+    """
+    Write the changed chunks and the index. Returns
+    {'written': [...], 'unchanged': n, 'removed': [...]}.
+    """
+    directory = sitemap_dir()
+    os.makedirs(directory, exist_ok=True)
+    old_manifest = _load_manifest(directory).get('chunks', {})
+    protocol, site = _site()
+    now = timezone.now().isoformat()
+
+    chunks = {}
+    written = []
+    for section, sitemap_class in sitemaps.items():
+        items = sitemap_class().items()
+        if isinstance(items, QuerySet):
+            signatures = _chunk_signatures(items)
+        else:
+            items = list(items)
+            digest = hashlib.md5(json.dumps(items, sort_keys=True, default=str).encode()).hexdigest()
+            signatures = {'0': [len(items), digest, None]}
+
+        for chunk, signature in signatures.items():
+            filename = chunk_filename(section, chunk)
+            previous = old_manifest.get(filename)
+            unchanged = (
+                not full
+                and previous is not None
+                and previous['signature'] == signature
+                and os.path.exists(os.path.join(directory, filename))
+            )
+            if unchanged:
+                chunks[filename] = previous
+                continue
+            if isinstance(items, QuerySet):
+                start = int(chunk) * CHUNK_SIZE
+                chunk_items = list(items.filter(pk__gte=start, pk__lt=start + CHUNK_SIZE).order_by('pk'))
+            else:
+                chunk_items = items
+            _write_atomic(
+                os.path.join(directory, filename),
+                _render_chunk(sitemap_class, chunk_items, protocol, site),
+            )
+            chunks[filename] = {'signature': signature, 'lastmod': signature[2] or now}
+            written.append(filename)
+
+    removed = [filename for filename in old_manifest if filename not in chunks]
+    for filename in removed:
+        try:
+            os.remove(os.path.join(directory, filename))
+        except FileNotFoundError:
+            pass
+
+    if written or removed or not os.path.exists(os.path.join(directory, INDEX_FILENAME)):
+        index = render_to_string('sitemap_index.xml', {
+            'sitemaps': [
+                {'location': f'{protocol}://{site.domain}/{filename}', 'last_mod': parse_datetime(entry['lastmod'])}
+                for filename, entry in chunks.items()
+            ],
+        })
+        _write_atomic(os.path.join(directory, INDEX_FILENAME), index.encode('utf-8'))
+    _write_atomic(
+        os.path.join(directory, MANIFEST_FILENAME),
+        json.dumps({'built_at': now, 'chunks': chunks}).encode('utf-8'),
+    )
+    return {'written': written, 'unchanged': len(chunks) - len(written), 'removed': removed}
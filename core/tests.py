@@ -0,0 +1,494 @@
+"""
+Tests for the shared cache helpers (core/cache.py).
+
+Casos cobertos:
+1. Namespaces não colidem entre si.
+2. invalidate() descarta todas as chaves do namespace.
+3. get_many/set_many/incr/get_or_set.
+4. Backend em arquivo: dois "workers" enxergam o mesmo valor e a mesma invalidação.
+5. Comando invalidate_cache.
+6. Rate limiter: janela deslizante, Retry-After, orçamentos por rota e isenção do healthcheck.
+7. Bloqueio de user agents/caminhos suspeitos com regex pré-compilada.
+8. Estatísticas da home: snapshot em cache, deltas por sinal, invalidação e reconciliação.
+9. Cache de página anônimo: hit sem queries, chave por dispositivo, usuários logados e
+   mensagens fora do cache, invalidação por conteúdo e contadores.
+10. Classificação de caminhos: healthcheck/webhook sem sessão, usuário anônimo, view
+    despachada pelo handler do Django;
+    redirecionamento de alunos sem resolve(); timing por middleware.
+11. Identidade da requisição: usuário + perfil + perfil de instrutor em uma query;
+    número de queries das páginas autenticadas mais comuns; sessões dos backends
+    padrão continuam logadas.
+12. Sitemaps pré-gerados: índice + chunks gzip, reescrita incremental, Last-Modified/304
+    e fallback dinâmico antes do primeiro build.
+13. Advisory lock: nome prefixado com o banco (GET_LOCK é global no servidor MySQL),
+    dentro do limite de 64 caracteres; segunda tentativa com o lock tomado falha.
+"""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.test import RequestFactory, SimpleTestCase, TestCase, modify_settings, override_settings
+
+from accounts.models import RoleChoices
+from core.cache import CacheNamespace
+from core.locks import MYSQL_LOCK_NAME_MAX, advisory_lock, mysql_lock_name
+from core.home_stats import get_home_stats
+from billing.tests.factories import make_instructor_user
+from core.models import FAQEntry
+from core.page_cache import anonymous_page_cache, page_cache_stats
+from core.sitemap_files import build_sitemaps
+from core.middleware import PATH_HEALTH, PATH_PAGE, PATH_STATIC, PATH_WEBHOOK, PathClassMiddleware, SecurityMiddleware
+from core.middleware_timing import timed
+from core.ratelimit import Budget, PrefixMatcher, SlidingWindowLimiter
+from marketplace.models import City, InstructorProfile, State, StudentLead
+
+
+class CacheNamespaceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.cards = CacheNamespace('cards', timeout=60)
+        self.maps = CacheNamespace('maps', timeout=60)
+
+    def test_namespaces_do_not_collide(self):
+        self.cards.set('x', 1)
+        self.maps.set('x', 2)
+        self.assertEqual(self.cards.get('x'), 1)
+        self.assertEqual(self.maps.get('x'), 2)
+
+    def test_invalidate_drops_only_its_namespace(self):
+        self.cards.set_many({'a': 1, 'b': 2})
+        self.maps.set('a', 3)
+        self.cards.invalidate()
+        self.assertEqual(self.cards.get_many(['a', 'b']), {})
+        self.assertEqual(self.maps.get('a'), 3)
+
+    def test_helpers(self):
+        self.cards.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.cards.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.assertEqual(self.cards.incr('hits'), 1)
+        self.assertEqual(self.cards.incr('hits', 5), 6)
+        calls = []
+        for _ in range(2):
+            self.assertEqual(self.cards.get_or_set('built', lambda: calls.append(1) or 'ok'), 'ok')
+        self.assertEqual(len(calls), 1)
+
+    def test_file_backend_is_shared_between_workers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_cache = {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory,
+        }
+        with override_settings(CACHES={'default': file_cache, 'worker2': file_cache}):
+            worker1 = CacheNamespace('shared')
+            worker2 = CacheNamespace('shared', alias='worker2')
+            worker1.set('k', 'v')
+            self.assertEqual(worker2.get('k'), 'v')
+            worker2.invalidate()
+            self.assertIsNone(worker1.get('k'))
+
+    def test_invalidate_cache_command(self):
+        self.cards.set('a', 1)
+        out = StringIO()
+        call_command('invalidate_cache', 'cards', stdout=out)
+        self.assertIsNone(self.cards.get('a'))
+        self.assertIn('cards', out.getvalue())
+
+
+class SlidingWindowLimiterTests(SimpleTestCase):
+    def setUp(self):
+        caches['ratelimit'].clear()
+        self.limiter = SlidingWindowLimiter()
+        self.budget = Budget('test', 10, 60)
+
+    def test_blocks_after_limit_within_window(self):
+        for _ in range(10):
+            self.assertEqual(self.limiter.hit('1.2.3.4', self.budget, now=6000), (True, 0))
+        allowed, retry_after = self.limiter.hit('1.2.3.4', self.budget, now=6015)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 45)
+        # Other identities and budgets are independent
+        self.assertTrue(self.limiter.hit('5.6.7.8', self.budget, now=6015)[0])
+        self.assertTrue(self.limiter.hit('1.2.3.4', Budget('other', 10, 60), now=6015)[0])
+
+    def test_previous_window_slides_out(self):
+        for _ in range(10):
+            self.limiter.hit('ip', self.budget, now=6000)
+        # 15 s into the next window, 3/4 of the previous one still counts: 7.5 + 2 > 10
+        self.assertTrue(self.limiter.hit('ip', self.budget, now=6075)[0])
+        self.assertTrue(self.limiter.hit('ip', self.budget, now=6075)[0])
+        allowed, retry_after = self.limiter.hit('ip', self.budget, now=6075)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 3)
+        # Once the previous window has slid out, the budget is available again
+        self.assertTrue(self.limiter.hit('ip', self.budget, now=6119)[0])
+
+    def test_prefix_matcher_prefers_longest_prefix(self):
+        matcher = PrefixMatcher({'/a/': 'short', '/a/b/': 'long'})
+        self.assertEqual(matcher.match('/a/b/c'), 'long')
+        self.assertEqual(matcher.match('/a/x'), 'short')
+        self.assertIsNone(matcher.match('/b/'))
+
+
+class SecurityMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        caches['ratelimit'].clear()
+        self.factory = RequestFactory()
+        self.middleware = SecurityMiddleware(lambda request: HttpResponse('ok'))
+
+    def _get(self, path, **extra):
+        return self.middleware(self.factory.get(path, REMOTE_ADDR='10.0.0.1', **extra))
+
+    def test_login_budget_is_stricter(self):
+        for _ in range(20):
+            self.assertEqual(self._get('/contas/entrar/').status_code, 200)
+        response = self._get('/contas/entrar/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # The default budget of the same IP is untouched
+        self.assertEqual(self._get('/').status_code, 200)
+
+    def test_healthcheck_is_never_limited(self):
+        for _ in range(150):
+            response = self._get('/healthcheck/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_blocklists(self):
+        with self.assertLogs('core.middleware', 'WARNING'):
+            self.assertEqual(self._get('/', HTTP_USER_AGENT='sqlmap/1.7').status_code, 403)
+            self.assertEqual(self._get('/admin/phpMyAdmin/index.php').status_code, 403)
+            self.assertEqual(self._get('/static/.ENV').status_code, 403)
+        response = self._get('/', HTTP_USER_AGENT='Mozilla/5.0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+
+
+class HomeStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sp = State.objects.create(code='SP', name='São Paulo')
+        cls.rj = State.objects.create(code='RJ', name='Rio de Janeiro')
+        cls.santos = City.objects.create(state=cls.sp, name='Santos', slug='santos')
+        cls.niteroi = City.objects.create(state=cls.rj, name='Niterói', slug='niteroi')
+        user = User.objects.create(username='inst')
+        user.profile.role = RoleChoices.INSTRUCTOR
+        user.profile.save()
+        cls.instructor = InstructorProfile.objects.create(
+            user=user, city=cls.santos, is_visible=True, is_verified=True,
+        )
+        for i in range(3):
+            cls._lead(i, cls.sp, cls.santos)
+        cls._lead(3, cls.rj, cls.niteroi)
+
+    @staticmethod
+    def _lead(i, state, city):
+        return StudentLead.objects.create(
+            name=f'Aluno {i}', phone='11999990000', email=f'aluno{i}@example.com', state=state, city=city,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot(self):
+        stats = get_home_stats()
+        self.assertEqual(stats['instructors_by_state'], {'SP': 1})
+        self.assertEqual(stats['students_by_state'], {'SP': 3, 'RJ': 1})
+        self.assertEqual(stats['total_instructors'], 1)
+        self.assertEqual(stats['total_students'], 4)
+        self.assertEqual(stats['total_cities'], 1)
+        self.assertEqual(stats['top_student_states'][0], {'state__code': 'SP', 'state__name': 'São Paulo', 'total': 3})
+        with self.assertNumQueries(0):
+            get_home_stats()
+
+    def test_student_deltas_without_rebuild(self):
+        get_home_stats()
+        lead = self._lead(10, self.rj, self.niteroi)
+        student = User.objects.create(username='aluno')
+        student.profile.role = RoleChoices.STUDENT
+        student.profile.save()
+        with self.assertNumQueries(0):
+            stats = get_home_stats()
+        self.assertEqual(stats['students_by_state'], {'SP': 3, 'RJ': 2})
+        self.assertEqual(stats['total_students'], 6)
+
+        lead.state, lead.city = self.sp, self.santos
+        lead.save()
+        self.assertEqual(get_home_stats()['students_by_state'], {'SP': 4, 'RJ': 1})
+        lead.delete()
+        student.save(update_fields=['last_login'])  # saves the profile again: no double count
+        self.assertEqual(get_home_stats()['total_students'], 5)
+
+    def test_instructor_changes_invalidate(self):
+        get_home_stats()
+        self.instructor.bio = 'Nova bio'
+        self.instructor.save()
+        with self.assertNumQueries(0):
+            get_home_stats()
+        self.instructor.is_visible = False
+        self.instructor.save()
+        stats = get_home_stats()
+        self.assertEqual(stats['instructors_by_state'], {})
+        self.assertEqual(stats['total_cities'], 0)
+
+    def test_reconcile_fixes_bulk_import_drift(self):
+        get_home_stats()
+        StudentLead.objects.bulk_create([
+            StudentLead(name='Bulk', phone='1', email='bulk@example.com', state=self.rj, city=self.niteroi),
+        ])
+        self.assertEqual(get_home_stats()['students_by_state']['RJ'], 1)
+        out = StringIO()
+        call_command('reconcile_home_stats', stdout=out)
+        self.assertIn('students.by_state', out.getvalue())
+        self.assertEqual(get_home_stats()['students_by_state']['RJ'], 2)
+
+    def test_home_view_uses_snapshot(self):
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_students'], 4)
+        self.assertEqual(response.context['top_student_states'][0]['total'], 3)
+
+
+class PageCacheTests(TestCase):
+    MOBILE = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148'
+
+    @classmethod
+    def setUpTestData(cls):
+        FAQEntry.objects.create(question='Como funciona?', answer='Simples.')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_hit_skips_the_view(self):
+        first = self.client.get('/faq/')
+        self.assertContains(first, 'Como funciona?')
+        with self.assertNumQueries(0):
+            second = self.client.get('/faq/')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+        stats = page_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_key_varies_by_device_and_query(self):
+        self.client.get('/faq/')
+        self.client.get('/faq/', HTTP_USER_AGENT=self.MOBILE)
+        self.client.get('/faq/?utm=x')
+        self.assertEqual(page_cache_stats()['misses'], 3)
+
+    def test_content_change_invalidates(self):
+        self.client.get('/faq/')
+        FAQEntry.objects.create(question='Quanto custa?', answer='Depende.')
+        self.assertContains(self.client.get('/faq/'), 'Quanto custa?')
+
+    def test_authenticated_users_bypass_the_cache(self):
+        self.client.get('/faq/')
+        user = User.objects.create_user('visitante', password='x')
+        user.profile.role = RoleChoices.INSTRUCTOR
+        user.profile.is_profile_complete = True
+        user.profile.save()
+        self.client.force_login(user)
+        self.client.get('/faq/')
+        self.assertEqual(page_cache_stats()['hits'], 0)
+
+    def test_pages_with_messages_are_not_stored(self):
+        @anonymous_page_cache
+        def view(request):
+            messages.success(request, 'Você saiu da conta.')
+            return HttpResponse('ok')
+
+        for _ in range(2):
+            request = RequestFactory().get('/pagina/')
+            request.user = AnonymousUser()
+            request._messages = CookieStorage(request)
+            view(request)
+        self.assertEqual(page_cache_stats()['hits'], 0)
+
+    def test_stats_command(self):
+        self.client.get('/faq/')
+        self.client.get('/faq/')
+        out = StringIO()
+        call_command('page_cache_stats', '--reset', stdout=out)
+        self.assertIn('Taxa de acerto: 50.0%', out.getvalue())
+        self.assertEqual(page_cache_stats()['hits'], 0)
+
+
+class PathClassTests(TestCase):
+    def test_path_is_classified_and_chain_continues(self):
+        chain = []
+        middleware = PathClassMiddleware(lambda request: chain.append(request.path_class) or HttpResponse())
+        factory = RequestFactory()
+
+        for path in ('/healthcheck/', '/static/css/style.css', '/webhook/mercadopago/', '/faq/'):
+            middleware(factory.get(path))
+        self.assertEqual(chain, [PATH_HEALTH, PATH_STATIC, PATH_WEBHOOK, PATH_PAGE])
+
+    def test_healthcheck_does_not_load_the_session(self):
+        self.client.cookies['sessionid'] = 'abc'
+        with self.assertNumQueries(1):  # SELECT 1 of the health check itself
+            response = self.client.get('/healthcheck/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.resolver_match.url_name, 'healthcheck')
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_webhook_goes_through_the_handler(self):
+        self.client.cookies['sessionid'] = 'abc'
+        response = self.client.post('/webhook/mercadopago/', 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.resolver_match.url_name, 'mercadopago_webhook')
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_student_redirect_only_on_home_and_plans(self):
+        student = User.objects.create_user('aluno', password='x')
+        student.profile.role = RoleChoices.STUDENT
+        student.profile.is_profile_complete = True
+        student.profile.save()
+        self.client.force_login(student)
+        self.assertRedirects(self.client.get('/'), '/instrutores/meus-leads/', fetch_redirect_response=False)
+        self.assertEqual(self.client.get('/faq/').status_code, 200)
+
+    def test_timing_wrappers_report_each_middleware(self):
+        wrapped = [timed(path) for path in (
+            'core.middleware.PathClassMiddleware',
+            'core.middleware.SessionMiddleware',
+        )]
+        with modify_settings(MIDDLEWARE={'prepend': wrapped}):
+            server_timing = self.client.get('/healthcheck/')['Server-Timing']
+        labels = [part.split(';')[0] for part in server_timing.split(', ')]
+        self.assertEqual(labels, ['core.PathClassMiddleware', 'core.SessionMiddleware', 'view'])
+
+
+class RequestIdentityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user, cls.instructor = make_instructor_user()
+        cls.user = User.objects.get(pk=user.pk)  # drop the stale profile cached by the factory
+        cls.user.profile.is_profile_complete = True
+        cls.user.profile.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_identity_is_loaded_with_one_joined_query(self):
+        response = self.client.get('/contas/painel/')
+        self.assertRedirects(response, '/instrutores/meus-leads/', fetch_redirect_response=False)
+        identity = response.wsgi_request.identity
+        self.assertTrue(identity.is_instructor)
+        self.assertEqual(identity.instructor_profile_id, self.instructor.pk)
+        self.assertFalse(identity.can_receive_leads)
+
+    def test_query_count_of_authenticated_pages(self):
+        # session + user (with profile and instructor profile joined) + the page's own queries
+        for url, queries in (
+            ('/contas/painel/', 2),
+            ('/faq/', 3),                       # + FAQ entries
+            ('/planos/', 4),                    # + subscription, plans
+            ('/instrutores/meus-leads/', 5),    # + categories, lead count, leads
+        ):
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                self.client.get(url)
+
+    def test_logged_out_when_password_changes(self):
+        self.user.set_password('nova-senha-123')
+        self.user.save()
+        response = self.client.get('/faq/')
+        self.assertFalse(response.wsgi_request.identity.is_authenticated)
+
+    def test_session_of_the_stock_backend_stays_logged_in(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get('/faq/')
+        self.assertTrue(response.wsgi_request.identity.is_instructor)
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'accounts.backends.ModelBackend')
+
+
+class SitemapFilesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.instructor = make_instructor_user()
+        cls.instructor.is_verified = True
+        cls.instructor.save()
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(SITEMAP_DIR=directory, SITE_URL='https://treinacnh.com.br')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = directory
+
+    def _chunk(self, filename):
+        with gzip.open(os.path.join(self.directory, filename)) as chunk:
+            return chunk.read().decode()
+
+    def test_builds_index_and_gzipped_chunks(self):
+        result = build_sitemaps()
+        self.assertIn('sitemap-instrutores-0.xml.gz', result['written'])
+        self.assertIn(
+            f'https://treinacnh.com.br/instrutores/instrutor/{self.instructor.pk}/',
+            self._chunk('sitemap-instrutores-0.xml.gz'),
+        )
+        with open(os.path.join(self.directory, 'sitemap.xml')) as index:
+            self.assertIn('https://treinacnh.com.br/sitemap-instrutores-0.xml.gz', index.read())
+
+    def test_only_changed_chunks_are_rewritten(self):
+        build_sitemaps()
+        self.assertEqual(build_sitemaps()['written'], [])
+
+        self.instructor.is_visible = False
+        self.instructor.save()
+        result = build_sitemaps()
+        self.assertEqual(result['written'], [])
+        self.assertEqual(result['removed'], ['sitemap-instrutores-0.xml.gz'])
+
+        self.instructor.is_visible = True
+        self.instructor.save()
+        self.assertEqual(build_sitemaps()['written'], ['sitemap-instrutores-0.xml.gz'])
+
+    def test_served_from_disk_with_last_modified(self):
+        call_command('build_sitemaps', stdout=StringIO())
+        with self.assertNumQueries(0):
+            response = self.client.get('/sitemap.xml')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<sitemapindex', b''.join(response.streaming_content))
+        last_modified = response['Last-Modified']
+        self.assertEqual(self.client.get('/sitemap.xml', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        chunk = self.client.get('/sitemap-instrutores-0.xml.gz')
+        self.assertEqual(chunk['Content-Type'], 'application/x-gzip')
+        self.assertEqual(self.client.get('/sitemap-desconhecido-0.xml.gz').status_code, 404)
+
+    def test_falls_back_to_dynamic_sitemap_before_first_build(self):
+        response = self.client.get('/sitemap.xml')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'/instrutores/instrutor/{self.instructor.pk}/')
+
+
+class AdvisoryLockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_mysql_name_is_scoped_to_the_database(self):
+        self.assertEqual(mysql_lock_name('billing_lifecycle'), f"{connection.settings_dict['NAME']}:billing_lifecycle")
+        long_name = mysql_lock_name('x' * 80)
+        self.assertLessEqual(len(long_name), MYSQL_LOCK_NAME_MAX)
+        self.assertNotEqual(long_name, mysql_lock_name('y' * 80))
+
+    def test_second_holder_is_refused(self):
+        with advisory_lock('job') as first:
+            with advisory_lock('job') as second:
+                self.assertEqual((first, second), (True, False))
+        with advisory_lock('job') as again:
+            self.assertTrue(again)
@@ -3,8 +3,6 @@ URL Configuration for core app.
 """
 from django.urls import path
 from . import views
-from django.contrib.sitemaps.views import sitemap
-from .sitemap import sitemaps
 
 app_name = 'core'
 
@@ -22,5 +20,6 @@ urlpatterns = [
     path('mobile-lcp-test/', views.mobile_lcp_test_view, name='mobile_lcp_test'),
     path('robots.txt', views.robots_txt, name='robots_txt'),
     path('google8a3de9cf5898f665.html', views.google_site_verification, name='google_site_verification'),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap.xml', views.sitemap_index_view, name='django.contrib.sitemaps.views.sitemap'),
+    path('sitemap-<slug:section>-<int:chunk>.xml.gz', views.sitemap_chunk_view, name='sitemap_chunk'),
 ]
@@ -1,14 +1,18 @@
 """
 Views for core app - Public pages.
 """
+import os
+from datetime import datetime, timezone as dt_timezone
+
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Count, Q, OuterRef, Subquery
-from marketplace.models import State, City, InstructorProfile
+from marketplace.map_cities import can_view_student_details
 from .models import StaticPage, FAQEntry, HomeBanner, NewsArticle
-from accounts.models import Profile
 from .seo import get_page_seo, build_seo
-from django.http import HttpResponse
-from django.views.decorators.http import require_GET
+from .home_stats import get_home_stats
+from .page_cache import anonymous_page_cache
+from accounts.identity import get_identity
+from django.http import FileResponse, Http404, HttpResponse
+from django.views.decorators.http import condition, require_GET
 
 @require_GET
 def google_site_verification(request):
@@ -19,6 +23,7 @@ def google_site_verification(request):
 
 
 @require_GET
+@anonymous_page_cache
 def robots_txt(request):
     from django.conf import settings
     site_url = getattr(settings, 'SITE_URL', '').rstrip('/')
@@ -40,155 +45,82 @@ def robots_txt(request):
     ]
     return HttpResponse("\n".join(lines), content_type="text/plain")
 
+def _sitemap_file(filename):
+    from .sitemap_files import sitemap_dir
+    return os.path.join(sitemap_dir(), filename)
+
+
+def _sitemap_chunk_filename(section, chunk):
+    from .sitemap import sitemaps
+    from .sitemap_files import chunk_filename
+    if section not in sitemaps:
+        raise Http404
+    return chunk_filename(section, chunk)
+
+
+def _file_last_modified(path):
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(path), tz=dt_timezone.utc)
+    except OSError:
+        return None
+
+
+def _sitemap_index_last_modified(request):
+    from .sitemap_files import INDEX_FILENAME
+    return _file_last_modified(_sitemap_file(INDEX_FILENAME))
+
+
+def _sitemap_chunk_last_modified(request, section, chunk):
+    return _file_last_modified(_sitemap_file(_sitemap_chunk_filename(section, chunk)))
+
+
+@require_GET
+@condition(last_modified_func=_sitemap_index_last_modified)
+def sitemap_index_view(request):
+    """
+    Sitemap index written by `manage.py build_sitemaps`. Until the first
+    build, falls back to the sitemap rendered from the database.
+    """
+    from .sitemap_files import INDEX_FILENAME
+    try:
+        return FileResponse(open(_sitemap_file(INDEX_FILENAME), 'rb'), content_type='application/xml')
+    except FileNotFoundError:
+        from django.contrib.sitemaps.views import sitemap
+        from .sitemap import sitemaps
+        return anonymous_page_cache(sitemap)(request, sitemaps=sitemaps)
+
+
+@require_GET
+@condition(last_modified_func=_sitemap_chunk_last_modified)
+def sitemap_chunk_view(request, section, chunk):
+    """Pre-gzipped sitemap chunk listed in the index."""
+    try:
+        return FileResponse(
+            open(_sitemap_file(_sitemap_chunk_filename(section, chunk)), 'rb'),
+            content_type='application/x-gzip',
+        )
+    except FileNotFoundError:
+        raise Http404
+
+
+@anonymous_page_cache
 def home_view(request):
     """Homepage with search, featured instructors and interactive map"""
+    identity = get_identity(request)
     # Redirect logged-in students to marketplace
-    if request.user.is_authenticated:
-        if hasattr(request.user, 'profile') and request.user.profile.role == 'STUDENT':
-            return redirect('marketplace:instructors_map')
+    if identity.is_student:
+        return redirect('marketplace:instructors_map')
     
     import json
-    from marketplace.models import StudentLead
     
-    # Get instructor count per state
-    instructor_counts = InstructorProfile.objects.filter(
-        is_visible=True,
-        city__state=OuterRef('pk')
-    ).values('city__state').annotate(
-        total=Count('id')
-    ).values('total')
-    
-    # Get student lead count per state
-    student_counts = StudentLead.objects.filter(
-        state=OuterRef('pk')
-    ).values('state').annotate(
-        total=Count('id')
-    ).values('total')
-    
-    # Get states for search dropdown with instructor and student counts
-    states = State.objects.annotate(
-        instructor_count=Subquery(instructor_counts),
-        student_count=Subquery(student_counts)
-    ).order_by('code')
-    
-    # Featured/new instructors
-    from django.utils import timezone
-    from datetime import timedelta
-    featured_instructors = InstructorProfile.objects.filter(
-        is_visible=True,
-        is_verified=True
-    ).select_related('user', 'user__profile', 'city', 'city__state').order_by('-created_at')[:6]
-    
-    # Stats
-    total_instructors = InstructorProfile.objects.filter(is_visible=True, is_verified=True).count()
-    # Soma: leads antigos importados + alunos novos cadastrados no portal
-    total_students = StudentLead.objects.count() + Profile.objects.filter(role='STUDENT').count()
-    total_cities = City.objects.filter(is_active=True).annotate(
-        instructor_count=Count('instructors', filter=Q(instructors__is_visible=True))
-    ).filter(instructor_count__gt=0).count()
-    
-    # Top states with students
-    top_student_states = StudentLead.objects.values('state__code', 'state__name').annotate(
-        total=Count('id')
-    ).order_by('-total')[:10]
-    
-    # Get all students with state coordinates for map (grouped by city name)
-    students_with_location = StudentLead.objects.filter(
-        city__isnull=False,
-        state__latitude__isnull=False,
-        state__longitude__isnull=False
-    ).select_related('state', 'city').prefetch_related('categories')
-    
-    # Group students by city name (using state coordinates)
-    from collections import defaultdict
-    students_by_city = defaultdict(lambda: {
-        'students': [],
-        'city_name': '',
-        'state_code': '',
-        'state_name': '',
-        'latitude': 0,
-        'longitude': 0,
-        'count': 0
-    })
-    
-    for student in students_with_location:
-        # Use city name as key for grouping
-        city_key = f"{student.city.name}_{student.state.code}"
-        city_data = students_by_city[city_key]
-        
-        # Set city info if not set (using state coordinates as cities don't have them)
-        if not city_data['city_name']:
-            city_data['city_name'] = student.city.name
-            city_data['state_code'] = student.state.code
-            city_data['state_name'] = student.state.name
-            # Use state coordinates since City model doesn't have lat/lng
-            city_data['latitude'] = float(student.state.latitude)
-            city_data['longitude'] = float(student.state.longitude)
-        
-        # Get categories as comma-separated string
-        categories_str = ', '.join([cat.code for cat in student.categories.all()]) if student.categories.exists() else 'N/A'
-        
-        city_data['students'].append({
-            'id': student.id,
-            'name': student.name,
-            'category': categories_str,
-            'has_theory': student.has_theory,
-        })
-        city_data['count'] += 1
-    
-    # Convert to list for JSON
-    students_data = [
-        {
-            'city_name': data['city_name'],
-            'state_code': data['state_code'],
-            'state_name': data['state_name'],
-            'latitude': data['latitude'],
-            'longitude': data['longitude'],
-            'count': data['count'],
-            'students': data['students']
-        }
-        for data in students_by_city.values()
-    ]
+    # Counters come precomputed (see home_stats.py). The student map layer is
+    # loaded by the page from api/map/cities/ (aggregated per city); per-student
+    # detail is only served on demand to staff (api/map/students/).
+    stats = get_home_stats()
     
     # Banners
     banners = HomeBanner.objects.filter(is_active=True).order_by('order')[:3]
     
-    # Get all instructors with coordinates for map markers
-    instructors_with_location = InstructorProfile.objects.filter(
-        is_visible=True,
-        latitude__isnull=False,
-        longitude__isnull=False
-    ).select_related('user', 'city', 'city__state')
-    
-    # Convert to list with float coordinates
-    instructors_data = []
-    for inst in instructors_with_location:
-        instructors_data.append({
-            'id': inst.id,
-            'user__first_name': inst.user.first_name,
-            'user__last_name': inst.user.last_name,
-            'latitude': float(inst.latitude),
-            'longitude': float(inst.longitude),
-            'city__name': inst.city.name,
-            'city__state__code': inst.city.state.code,
-            'city__state__name': inst.city.state.name
-        })
-    
-    # Prepare data for map
-    states_data = []
-    for state in states:
-        coords = None
-        if state.latitude and state.longitude:
-            coords = [float(state.latitude), float(state.longitude)]
-        
-        states_data.append({
-            'code': state.code,
-            'name': state.name,
-            'instructors': state.instructor_count or 0,
-            'students': state.student_count or 0,
-            'coordinates': coords
-        })
-    
     # FAQs para Schema.org FAQPage (dinâmico a partir do banco)
     faqs_for_schema = list(
         FAQEntry.objects.filter(is_active=True)
@@ -212,24 +144,21 @@ def home_view(request):
     }, ensure_ascii=False, indent=2)
 
     context = {
-        'states': states,
-        'states_json': json.dumps(states_data),
-        'instructors_json': json.dumps(instructors_data),
-        'students_json': json.dumps(students_data),
-        'featured_instructors': featured_instructors,
-        'total_instructors': total_instructors,
-        'total_students': total_students,
-        'total_cities': total_cities,
-        'top_student_states': top_student_states,
+        'total_instructors': stats['total_instructors'],
+        'total_students': stats['total_students'],
+        'total_cities': stats['total_cities'],
+        'top_student_states': stats['top_student_states'],
         'banners': banners,
         **get_page_seo('core:home'),
-        'is_instructor': request.user.is_authenticated and hasattr(request.user, 'instructor_profile'),
+        'is_instructor': identity.instructor_profile_id is not None,
         'user_authenticated': request.user.is_authenticated,
+        'can_view_students': can_view_student_details(request.user),
         'faq_schema_json': faq_schema_json,
     }
     return render(request, 'core/home.html', context)
 
 
+@anonymous_page_cache
 def about_view(request):
     """About us page"""
     context = get_page_seo('core:about')
@@ -290,6 +219,7 @@ Esta mensagem foi enviada através do formulário de contato do site.
     return render(request, 'core/contact.html', context)
 
 
+@anonymous_page_cache
 def faq_view(request):
     """FAQ page"""
     faqs = FAQEntry.objects.filter(is_active=True).order_by('category', 'order')
@@ -307,6 +237,7 @@ def faq_view(request):
     return render(request, 'core/faq.html', context)
 
 
+@anonymous_page_cache
 def static_page_view(request, slug):
     """Generic static page view"""
     page = get_object_or_404(StaticPage, slug=slug, is_active=True)
@@ -341,6 +272,7 @@ def healthcheck_view(request):
 from django.db import models
 
 
+@anonymous_page_cache
 def news_list_view(request):
     """Lista de notícias sobre DETRAN e trânsito"""
     category = request.GET.get('category', '')
@@ -373,6 +305,7 @@ def news_list_view(request):
     return render(request, 'core/news_list.html', context)
 
 
+@anonymous_page_cache
 def news_detail_view(request, slug):
     """Detalhes de uma notícia"""
     news = get_object_or_404(NewsArticle, slug=slug, is_active=True)
@@ -405,14 +338,11 @@ def city_students_view(request, state_code, city_name):
     from marketplace.models import InstructorProfile, City, State
     from django.contrib import messages
     
+    identity = get_identity(request)
     # Bloquear acesso de instrutores
-    if request.user.is_authenticated:
-        try:
-            instructor_profile = request.user.instructor_profile
-            messages.error(request, 'Instrutores não podem visualizar esta página. Aguarde os alunos entrarem em contato com você.')
-            return redirect('marketplace:cities_list')
-        except:
-            pass  # User is not an instructor, continue
+    if identity.instructor_profile_id:
+        messages.error(request, 'Instrutores não podem visualizar esta página. Aguarde os alunos entrarem em contato com você.')
+        return redirect('marketplace:cities_list')
     
     # Get city
     try:
@@ -430,7 +360,7 @@ def city_students_view(request, state_code, city_name):
     ).select_related('user', 'user__profile', 'city', 'city__state').order_by('-created_at')
     
     # Check if user is logged in student
-    is_student = request.user.is_authenticated and not hasattr(request.user, 'instructor_profile')
+    is_student = identity.is_authenticated and not identity.instructor_profile_id
     
     context = {
         'city': city,
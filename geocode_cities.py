@@ -133,7 +133,7 @@ def main():
     
     # Batch geocode
     logger.info("Starting batch geocoding...")
-    stats = GeocodingService.batch_geocode_cities(cities_to_geocode, delay=1.5)
+    stats = GeocodingService.batch_geocode_cities(cities_to_geocode)
     
     logger.info("\n" + "="*60)
     logger.info("GEOCODING COMPLETED")
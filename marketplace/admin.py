@@ -12,10 +12,9 @@ from datetime import timedelta
 import csv
 from .models import (
     State, City, CategoryCNH, InstructorProfile, Lead, StudentLead,
-    InstructorAvailability, Appointment, CityGeoCache
+    InstructorAvailability, Appointment, CityGeoCache, GeocodingJob, AddressGeoCache, AddressGeocodingJob
 )
-from .geocoding_service import GeocodingService
-import threading
+from .geocoding_queue import enqueue_address, enqueue_cities
 
 
 @admin.register(State)
@@ -55,18 +54,12 @@ class CityAdmin(admin.ModelAdmin):
     geocoded_status.short_description = 'Geocoding'
     
     def geocode_selected_cities(self, request, queryset):
-        """Action to geocode selected cities"""
-        def geocode_cities():
-            for city in queryset:
-                GeocodingService.get_city_latlng(city.name, city.state.code)
-        
-        thread = threading.Thread(target=geocode_cities)
-        thread.daemon = True
-        thread.start()
-        
+        """Action to queue the selected cities for geocoding"""
+        queued = enqueue_cities(queryset.values_list('name', 'state__code'))
         self.message_user(
             request,
-            f"Iniciado geocoding de {queryset.count()} cidades em background.",
+            f"{queued} cidade(s) enfileirada(s) para geocoding "
+            f"(as demais já estão geocodificadas ou na fila).",
             messages.SUCCESS
         )
     geocode_selected_cities.short_description = "Geocodificar cidades selecionadas"
@@ -82,27 +75,60 @@ class CityGeoCacheAdmin(admin.ModelAdmin):
     actions = ['retry_failed_geocoding']
     
     def retry_failed_geocoding(self, request, queryset):
-        """Retry geocoding for failed entries"""
-        def retry_geocode():
-            for cache in queryset.filter(failed=True):
-                # Reset failed status
-                cache.failed = False
-                cache.save()
-                # Try again
-                GeocodingService.get_city_latlng(cache.city_name, cache.state_code)
-        
-        thread = threading.Thread(target=retry_geocode)
-        thread.daemon = True
-        thread.start()
-        
+        """Queue failed entries for geocoding again"""
+        failed = queryset.filter(failed=True)
+        queued = enqueue_cities(failed.values_list('city_name', 'state_code'), force=True)
+        failed.update(failed=False)
         self.message_user(
             request,
-            f"Iniciado retry de geocoding para {queryset.filter(failed=True).count()} cidades.",
+            f"{queued} cidade(s) enfileirada(s) para nova tentativa de geocoding.",
             messages.SUCCESS
         )
     retry_failed_geocoding.short_description = "Tentar geocodificar novamente"
 
 
+@admin.register(AddressGeoCache)
+class AddressGeoCacheAdmin(admin.ModelAdmin):
+    """Admin for the instructor address coordinate cache"""
+    list_display = ('address', 'geocoded', 'latitude', 'longitude', 'updated_at')
+    list_filter = ('geocoded',)
+    search_fields = ('address',)
+    readonly_fields = ('address_key', 'created_at', 'updated_at')
+
+
+@admin.register(GeocodingJob)
+class GeocodingJobAdmin(admin.ModelAdmin):
+    """Admin for the geocoding queue"""
+    list_display = ('city_name', 'state_code', 'status', 'attempts', 'run_after', 'last_error', 'updated_at')
+    list_filter = ('status', 'state_code')
+    search_fields = ('city_name', 'city_key')
+    readonly_fields = ('city_key', 'attempts', 'last_error', 'created_at', 'updated_at')
+    actions = ['requeue_jobs']
+
+    def requeue_jobs(self, request, queryset):
+        queued = enqueue_cities(queryset.values_list('city_name', 'state_code'), force=True)
+        self.message_user(request, f"{queued} job(s) reenfileirado(s).", messages.SUCCESS)
+    requeue_jobs.short_description = "Reenfileirar jobs selecionados"
+
+
+@admin.register(AddressGeocodingJob)
+class AddressGeocodingJobAdmin(admin.ModelAdmin):
+    """Admin for the address geocoding queue"""
+    list_display = ('instructor', 'status', 'attempts', 'run_after', 'last_error', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('instructor__user__first_name', 'instructor__user__last_name', 'instructor__user__email')
+    raw_id_fields = ('instructor',)
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'updated_at')
+    actions = ['requeue_jobs']
+
+    def requeue_jobs(self, request, queryset):
+        instructor_ids = list(queryset.values_list('instructor_id', flat=True))
+        for instructor_id in instructor_ids:
+            enqueue_address(instructor_id)
+        self.message_user(request, f"{len(instructor_ids)} job(s) reenfileirado(s).", messages.SUCCESS)
+    requeue_jobs.short_description = "Reenfileirar jobs selecionados"
+
+
 @admin.register(CategoryCNH)
 class CategoryCNHAdmin(admin.ModelAdmin):
     """Admin for CategoryCNH model"""
@@ -2,8 +2,17 @@
 API views for AJAX requests
 """
 from django.http import JsonResponse
-from django.db.models import Count
-from .models import City, CityGeoCache, StudentLead
+from django.utils.cache import patch_cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET
+from .models import City
+from .map_cities import (
+    CITY_STUDENTS_PAGE_SIZE, can_view_student_details, get_city_students, get_map_cities_data,
+)
+from .map_markers import (
+    CLUSTER_MAX_ZOOM, MARKER_FIELDS, cluster_markers, marker_rows,
+    markers_in_bbox, markers_stamp, markers_version,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -35,6 +44,7 @@ def get_map_cities(request):
             {
                 "city": "São Paulo",
                 "uf": "SP",
+                "city_ids": [3550308],
                 "lat": -23.5505,
                 "lng": -46.6333,
                 "count": 42,
@@ -49,82 +59,132 @@ def get_map_cities(request):
             "cities_without_coords": 5
         }
     }
-    """
-    from collections import defaultdict
-    
-    # Get all students with city and state
-    students = StudentLead.objects.filter(
-        city__isnull=False,
-        state__isnull=False
-    ).select_related('city', 'state').prefetch_related('categories')
-    
-    # Group by city
-    cities_data = defaultdict(lambda: {
-        'city': '',
-        'uf': '',
-        'lat': None,
-        'lng': None,
-        'count': 0,
-        'categories': defaultdict(int),
-        'with_theory': 0,
-        'students': []
-    })
-    
-    for student in students:
-        # Normalize city key
-        city_key = CityGeoCache.normalize_city_key(student.city.name, student.state.code)
-        city_data = cities_data[city_key]
-        
-        # Set city info
-        if not city_data['city']:
-            city_data['city'] = student.city.name
-            city_data['uf'] = student.state.code
-            
-            # Get coordinates from cache
-            try:
-                cache = CityGeoCache.objects.get(city_key=city_key)
-                if cache.geocoded and cache.latitude and cache.longitude:
-                    city_data['lat'] = float(cache.latitude)
-                    city_data['lng'] = float(cache.longitude)
-            except CityGeoCache.DoesNotExist:
-                logger.warning(f"No geocode cache for {student.city.name}/{student.state.code}")
-        
-        # Count student
-        city_data['count'] += 1
-        
-        # Count categories
-        for cat in student.categories.all():
-            city_data['categories'][cat.code] += 1
-        
-        # Count theory
-        if student.has_theory:
-            city_data['with_theory'] += 1
-    
-    # Convert to list and filter cities without coordinates
-    cities_list = []
-    cities_without_coords = 0
     
-    for city_data in cities_data.values():
-        if city_data['lat'] and city_data['lng']:
-            # Convert categories defaultdict to regular dict
-            city_data['categories'] = dict(city_data['categories'])
-            # Remove students list (not needed in response)
-            del city_data['students']
-            cities_list.append(city_data)
-        else:
-            cities_without_coords += 1
-            logger.warning(f"City without coordinates: {city_data['city']}/{city_data['uf']}")
-    
-    # Calculate stats
-    total_students = sum(c['count'] for c in cities_list)
-    
-    stats = {
-        'total_cities': len(cities_list),
-        'total_students': total_students,
-        'cities_without_coords': cities_without_coords
+    Aggregated in the database and cached (see map_cities.py).
+    """
+    return JsonResponse(get_map_cities_data())
+
+
+@require_GET
+def get_map_students(request):
+    """
+    Individual leads of one map entry, loaded on demand by staff/support.
+
+    Query params:
+        city_ids - comma-separated ids (the entry's "city_ids")
+        after    - cursor from a previous page ("next")
+
+    Returns JSON:
+    {
+        "students": [{"id": 1, "name": "Ana", "categories": ["A", "B"], "has_theory": true}, ...],
+        "next": 51
     }
-    
-    return JsonResponse({
-        'cities': cities_list,
-        'stats': stats
-    })
+    """
+    if not can_view_student_details(request.user):
+        return JsonResponse({'error': 'Acesso negado'}, status=403)
+    try:
+        city_ids = [int(value) for value in request.GET.get('city_ids', '').split(',') if value]
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetros inválidos'}, status=400)
+    if not city_ids:
+        return JsonResponse({'error': 'Parâmetros inválidos'}, status=400)
+
+    students, next_cursor = get_city_students(city_ids, after, CITY_STUDENTS_PAGE_SIZE)
+    response = JsonResponse({'students': students, 'next': next_cursor})
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+# Viewport marker API
+MARKERS_PAGE_SIZE = 500
+MARKERS_MAX_PAGE_SIZE = 2000
+MARKERS_MAX_AGE = 60  # seconds; ETag revalidation covers anything newer
+BRAZIL_BBOX = (-74.0, -34.0, -34.0, 5.5)  # west, south, east, north
+
+
+def _request_markers_stamp(request):
+    """Marker table stamp, computed once per request (ETag + Last-Modified)."""
+    if not hasattr(request, '_markers_stamp'):
+        request._markers_stamp = markers_stamp()
+    return request._markers_stamp
+
+
+def _markers_etag(request):
+    return markers_version(_request_markers_stamp(request))
+
+
+def _markers_last_modified(request):
+    return _request_markers_stamp(request)[1]
+
+
+def _parse_bbox(value):
+    """Parse "west,south,east,north" (Leaflet's toBBoxString order)."""
+    if not value:
+        return BRAZIL_BBOX
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox must have 4 values')
+    west, south, east, north = parts
+    if west > east or south > north:
+        raise ValueError('bbox corners out of order')
+    return west, south, east, north
+
+
+@require_GET
+@gzip_page
+@condition(etag_func=_markers_etag, last_modified_func=_markers_last_modified)
+def get_map_markers(request):
+    """
+    API endpoint for the instructor map markers inside a viewport.
+
+    Query params:
+        bbox  - "west,south,east,north" (defaults to Brazil)
+        zoom  - map zoom level; at CLUSTER_MAX_ZOOM or below markers are
+                grouped on a grid and returned as clusters
+        after - cursor from a previous page ("next")
+        limit - page size (default 500, max 2000)
+
+    Returns JSON with rows as arrays in the order given by "fields":
+    {
+        "v": "42-1700000000000",
+        "fields": ["id", "lat", "lng", "first_name", "last_name", "city", "uf", "state"],
+        "markers": [[7, -23.55, -46.63, "Ana", "Souza", "São Paulo", "SP", "São Paulo"], ...],
+        "clusters": [[-22.9, -43.2, 15], ...],
+        "next": 123
+    }
+    """
+    try:
+        west, south, east, north = _parse_bbox(request.GET.get('bbox'))
+        zoom = int(request.GET.get('zoom', CLUSTER_MAX_ZOOM + 1))
+        after = int(request.GET.get('after', 0))
+        limit = min(int(request.GET.get('limit', MARKERS_PAGE_SIZE)), MARKERS_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'Parâmetros inválidos'}, status=400)
+    limit = max(limit, 1)
+
+    queryset = markers_in_bbox(west, south, east, north)
+    clusters = []
+    next_cursor = None
+
+    if zoom <= CLUSTER_MAX_ZOOM:
+        # Clusters are bounded by the grid, so this branch is never paginated
+        clusters, single_ids = cluster_markers(queryset, max(zoom, 0))
+        markers = marker_rows(queryset.filter(instructor_id__in=single_ids).order_by('instructor_id'))
+    else:
+        page = marker_rows(
+            queryset.filter(instructor_id__gt=after).order_by('instructor_id')[:limit + 1]
+        )
+        markers = page[:limit]
+        if len(page) > limit:
+            next_cursor = markers[-1][0]
+
+    response = JsonResponse({
+        'v': _markers_etag(request),
+        'fields': MARKER_FIELDS,
+        'markers': markers,
+        'clusters': clusters,
+        'next': next_cursor,
+    }, json_dumps_params={'separators': (',', ':'), 'ensure_ascii': False})
+    patch_cache_control(response, public=True, max_age=MARKERS_MAX_AGE)
+    return response
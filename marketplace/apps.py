@@ -10,3 +10,6 @@ class MarketplaceConfig(AppConfig):
         """Import signals when app is ready"""
         import marketplace.signals  # noqa
         import marketplace.signals_geocoding  # Auto-geocoding signals
+        import marketplace.signals_map_markers  # Precomputed map markers
+        import marketplace.signals_search  # Instructor search index
+        import marketplace.signals_cards  # Instructor card fragment cache
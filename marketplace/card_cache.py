@@ -0,0 +1,105 @@
+"""
+Fragment cache for the instructor cards of the listing pages.
+
+Each card is rendered once and cached under
+
+    instructor_cards:<namespace version>:<template>:<instructor id>:<version>
+
+The per-instructor version lives in the cache too and is bumped by the
+signals in signals_cards.py (instructor, profile, user, categories and
+reviews), so a stale card is simply never looked up again. A page costs
+two get_many() round trips however many cards it shows.
+
+Hit/miss counters are kept in the cache; see `manage.py card_cache_stats`.
+After a deploy that changes the card templates, drop every card with
+`manage.py invalidate_cache instructor_cards`.
+"""
+import time
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.cache import CacheNamespace
+
+CARD_CACHE_TIMEOUT = 60 * 60  # also bounds how long the time-based "Novo" badge can lag
+VERSION_TIMEOUT = 60 * 60 * 24 * 7
+STATS_HITS_KEY = 'stats:hits'
+STATS_MISSES_KEY = 'stats:misses'
+card_cache = CacheNamespace('instructor_cards', timeout=CARD_CACHE_TIMEOUT)
+# Counters survive invalidate_cache instructor_cards
+stats_cache = CacheNamespace('instructor_card_stats', timeout=None)
+
+
+def _version_key(pk):
+    return f'v:{pk}'
+
+
+def _fragment_key(template_name, pk, version):
+    return f'{template_name}:{pk}:{version}'
+
+
+def _new_version():
+    # Time-based: a version evicted from the cache is never reused
+    return time.time_ns()
+
+
+def bump_card_version(*instructor_ids):
+    """Invalidate the cached cards of the given instructors."""
+    if instructor_ids:
+        card_cache.set_many({_version_key(pk): _new_version() for pk in instructor_ids}, VERSION_TIMEOUT)
+
+
+def render_instructor_cards(instructors, template_name, use_cache=True):
+    """
+    Render the card of each instructor (from the cache when possible) and
+    attach it as `instructor.card_html`. Returns the instructors as a list.
+    """
+    instructors = list(instructors)
+    if not use_cache:
+        for instructor in instructors:
+            instructor.card_html = render_to_string(template_name, {'instructor': instructor})
+        return instructors
+
+    version_keys = {inst.pk: _version_key(inst.pk) for inst in instructors}
+    versions = card_cache.get_many(version_keys.values())
+    missing_versions = {}
+    for pk, key in version_keys.items():
+        if key not in versions:
+            versions[key] = missing_versions[key] = _new_version()
+    if missing_versions:
+        card_cache.set_many(missing_versions, VERSION_TIMEOUT)
+
+    fragment_keys = {
+        inst.pk: _fragment_key(template_name, inst.pk, versions[version_keys[inst.pk]])
+        for inst in instructors
+    }
+    fragments = card_cache.get_many(fragment_keys.values())
+
+    rendered = {}
+    for instructor in instructors:
+        key = fragment_keys[instructor.pk]
+        html = fragments.get(key)
+        if html is None:
+            html = rendered[key] = render_to_string(template_name, {'instructor': instructor})
+        instructor.card_html = mark_safe(html)
+    if rendered:
+        card_cache.set_many(rendered)
+
+    if len(instructors) > len(rendered):
+        stats_cache.incr(STATS_HITS_KEY, len(instructors) - len(rendered))
+    if rendered:
+        stats_cache.incr(STATS_MISSES_KEY, len(rendered))
+    return instructors
+
+
+def card_cache_stats():
+    """{'hits', 'misses', 'hit_ratio'} since the last reset."""
+    values = stats_cache.get_many([STATS_HITS_KEY, STATS_MISSES_KEY])
+    hits = values.get(STATS_HITS_KEY, 0)
+    misses = values.get(STATS_MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def reset_card_cache_stats():
+    stats_cache.delete_many([STATS_HITS_KEY, STATS_MISSES_KEY])
@@ -0,0 +1,117 @@
+"""
+In-process coordinate cache in front of CityGeoCache.
+
+    coords = get('São José dos Campos', 'SP')          # (lat, lng) or None
+    found = get_many([('Campinas', 'SP'), ('Santos', 'SP')])
+
+Each process keeps up to COORDS_LRU_SIZE city keys (least recently used
+evicted first) for COORDS_TTL seconds. Misses are remembered only for
+COORDS_MISS_TTL seconds: enough to spare the query on every call of a busy
+page, short enough that a city geocoded by another process shows up on the
+map right away. get_many() resolves every uncached city in a single query.
+
+The signals in signals.py drop a city's entry when its CityGeoCache row is
+saved or deleted; other processes see a changed row within COORDS_TTL and a
+newly geocoded one within COORDS_MISS_TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from .models import CityGeoCache
+
+COORDS_LRU_SIZE = 4096
+COORDS_TTL = 60 * 10
+COORDS_MISS_TTL = 15
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire `ttl` seconds after being set."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_coords = TTLCache(COORDS_LRU_SIZE, COORDS_TTL)
+
+
+def get_many_by_key(city_keys):
+    """{city_key: (lat, lng)} for the geocoded keys; one query for the uncached ones."""
+    found = {}
+    missing = []
+    for city_key in set(city_keys):
+        coords = _coords.get(city_key)
+        if coords is _MISSING:
+            missing.append(city_key)
+        elif coords is not None:
+            found[city_key] = coords
+    if missing:
+        rows = {
+            city_key: (lat, lng)
+            for city_key, lat, lng in CityGeoCache.objects.filter(
+                city_key__in=missing, geocoded=True,
+                latitude__isnull=False, longitude__isnull=False,
+            ).values_list('city_key', 'latitude', 'longitude')
+        }
+        for city_key in missing:
+            coords = rows.get(city_key)
+            _coords.set(city_key, coords, ttl=None if coords is not None else COORDS_MISS_TTL)
+            if coords is not None:
+                found[city_key] = coords
+    return found
+
+
+def get_many(city_state_pairs):
+    """{(city_name, state_code): (lat, lng)} for the geocoded cities among the pairs."""
+    keys = {pair: CityGeoCache.normalize_city_key(*pair) for pair in city_state_pairs}
+    found = get_many_by_key(keys.values())
+    return {pair: found[city_key] for pair, city_key in keys.items() if city_key in found}
+
+
+def get(city_name, state_code):
+    """(lat, lng) of a geocoded city, or None."""
+    city_key = CityGeoCache.normalize_city_key(city_name, state_code)
+    return get_many_by_key([city_key]).get(city_key)
+
+
+def invalidate(city_key=None):
+    """Forget one city (or every city)."""
+    if city_key is None:
+        _coords.clear()
+    else:
+        _coords.delete(city_key)
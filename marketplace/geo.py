@@ -0,0 +1,149 @@
+"""
+Geohash grid and distance helpers for "instrutores perto de mim".
+
+InstructorProfile.geohash stores the geohash of the instructor's own
+coordinates (kept up to date in InstructorProfile.save). A radius search
+looks up the cell that contains the point plus its 8 neighbours with indexed
+prefix matches, then ranks the candidates by haversine distance.
+
+Instructors without coordinates of their own are placed on the map at their
+city (CityGeoCache fallback, see map_markers.py); the search uses their
+precomputed InstructorMapMarker coordinates, so they show up here too.
+"""
+import math
+
+from django.db.models import Q
+
+GEOHASH_PRECISION = 7  # ~150 m cells
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+NEAREST_MAX_RADIUS_KM = 200
+NEAREST_DEFAULT_LIMIT = 50
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """Encode a coordinate pair as a geohash string."""
+    lat, lng = float(lat), float(lng)
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # even bits encode longitude
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    """(lat span, lng span) in degrees of a geohash cell."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def precision_for_radius(lat, radius_km):
+    """
+    Longest geohash precision whose cells are at least radius_km on both
+    sides at this latitude, so the 3x3 block around a point covers the circle.
+    Returns 0 when not even a single-character cell is big enough.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(float(lat))), 0.01))
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_span, lng_span = cell_size_degrees(precision)
+        if lat_span >= dlat and lng_span >= dlng:
+            return precision
+    return 0
+
+
+def neighbor_cells(lat, lng, precision):
+    """The cell containing the point plus its 8 neighbours (deduplicated)."""
+    lat_span, lng_span = cell_size_degrees(precision)
+    cells = set()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            cell_lat = max(min(float(lat) + dy * lat_span, 89.999999), -89.999999)
+            cell_lng = (float(lng) + dx * lng_span + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(cell_lat, cell_lng, precision))
+    return sorted(cells)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def nearest_instructors(lat, lng, radius_km=25, limit=NEAREST_DEFAULT_LIMIT, queryset=None):
+    """
+    Instructors within radius_km of (lat, lng), closest first.
+
+    Candidates are narrowed with geohash prefix lookups on the indexed
+    column and a lat/lng bounding box; only those are ranked by haversine.
+    Instructors without own coordinates are ranked by their map marker
+    (city coordinates), found through the marker's lat/lng index.
+    Each returned instructor gets a `distance_km` attribute.
+
+    queryset: optional base queryset (e.g. already filtered by category);
+    defaults to visible + verified instructors.
+    """
+    from .models import InstructorMapMarker, InstructorProfile
+
+    radius_km = min(float(radius_km), NEAREST_MAX_RADIUS_KM)
+    if queryset is None:
+        queryset = InstructorProfile.objects.filter(is_visible=True, is_verified=True)
+
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(float(lat))), 0.01))
+    box = {
+        'latitude__gte': float(lat) - dlat, 'latitude__lte': float(lat) + dlat,
+        'longitude__gte': float(lng) - dlng, 'longitude__lte': float(lng) + dlng,
+    }
+    candidates = queryset.filter(**box)
+    precision = precision_for_radius(lat, radius_km)
+    if precision:
+        prefix_filter = Q()
+        for cell in neighbor_cells(lat, lng, precision):
+            prefix_filter |= Q(geohash__startswith=cell)
+        candidates = candidates.filter(prefix_filter)
+
+    # Placed by city on the map: rank them by their marker
+    without_coords = queryset.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+    marker_coords = {
+        pk: (marker_lat, marker_lng)
+        for pk, marker_lat, marker_lng in InstructorMapMarker.objects.filter(
+            instructor__in=without_coords.values('pk'), **box,
+        ).values_list('instructor_id', 'latitude', 'longitude')
+    }
+    fallback = queryset.filter(pk__in=list(marker_coords)) if marker_coords else []
+
+    ranked = []
+    for instructor in [*candidates, *fallback]:
+        point = marker_coords.get(instructor.pk) or (instructor.latitude, instructor.longitude)
+        distance = haversine_km(lat, lng, *point)
+        if distance <= radius_km:
+            instructor.distance_km = round(distance, 1)
+            ranked.append(instructor)
+    ranked.sort(key=lambda inst: inst.distance_km)
+    return ranked[:limit]
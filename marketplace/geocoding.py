@@ -1,16 +1,54 @@
 """
 Utility functions for geocoding addresses.
 Uses ViaCEP for Brazilian addresses and Nominatim (OpenStreetMap) for coordinates.
+
+Both are cached:
+
+- ViaCEP responses live in the shared cache (viacep_cache), CEPs that do
+  not exist for a shorter time;
+- address coordinates live in AddressGeoCache, keyed by the normalized
+  CEP/street/neighborhood/city/UF. Only an address Nominatim answered
+  "not found" for is cached as such (and retried after ADDRESS_RETRY_AFTER);
+  a timeout or service error is raised and nothing is written.
+
+instructor_profile_edit_view calls geocode_instructor_profile_async(): a
+cached address is applied right away, anything else is queued
+(geocoding_queue.enqueue_address) and resolved by the run_geocoding_queue
+worker, so the request never waits for Nominatim and a failed request is
+retried with backoff. Nominatim calls take tokens from the same shared
+bucket as the city geocoding (GeocodingService.bucket).
 """
-import requests
+import hashlib
 import logging
+import re
+import unicodedata
+from datetime import timedelta
 from decimal import Decimal
+
+import requests
+from django.utils import timezone
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-from time import sleep
+
+from core.cache import CacheNamespace
+from .geocoding_queue import enqueue_address
+from .geocoding_service import GeocodingService
+from .models import AddressGeoCache
 
 logger = logging.getLogger(__name__)
 
+VIACEP_CACHE_TIMEOUT = 60 * 60 * 24 * 30  # CEPs rarely change
+VIACEP_NOT_FOUND_TIMEOUT = 60 * 60 * 24
+viacep_cache = CacheNamespace('viacep', timeout=VIACEP_CACHE_TIMEOUT)
+
+ADDRESS_RETRY_AFTER = timedelta(days=7)
+
+# Outcomes of geocode_instructor_profile_async()
+ADDRESS_APPLIED = 'applied'
+ADDRESS_QUEUED = 'queued'
+ADDRESS_NOT_FOUND = 'not_found'
+
+_geolocator = None
+
 
 def get_address_from_cep(cep):
     """
@@ -19,135 +57,212 @@ def get_address_from_cep(cep):
     """
     # Clean CEP (remove dots and dashes)
     cep_clean = cep.replace('-', '').replace('.', '').strip()
-    
+
     if len(cep_clean) != 8:
         logger.warning(f'CEP inválido: {cep}')
         return None
-    
+
+    cached = viacep_cache.get(cep_clean)
+    if cached is not None:
+        return cached or None  # {} = CEP not found
+
     try:
         url = f'https://viacep.com.br/ws/{cep_clean}/json/'
         response = requests.get(url, timeout=5)
-        
+
         if response.status_code == 200:
             data = response.json()
-            
+
             # ViaCEP returns {'erro': True} for invalid CEPs
             if 'erro' in data:
                 logger.warning(f'CEP não encontrado: {cep}')
+                viacep_cache.set(cep_clean, {}, VIACEP_NOT_FOUND_TIMEOUT)
                 return None
-            
-            return {
+
+            address = {
                 'street': data.get('logradouro', ''),
                 'neighborhood': data.get('bairro', ''),
                 'city': data.get('localidade', ''),
                 'state': data.get('uf', ''),
                 'cep': cep_clean
             }
+            viacep_cache.set(cep_clean, address)
+            return address
         else:
             logger.error(f'Erro ao buscar CEP {cep}: HTTP {response.status_code}')
             return None
-            
+
     except requests.RequestException as e:
         logger.error(f'Erro de conexão ao buscar CEP {cep}: {str(e)}')
         return None
 
 
+def normalize_address(street, neighborhood, city, state, cep=None):
+    """Accent-folded, lowercased 'cep|street|neighborhood|city|UF'."""
+    def clean(value):
+        value = unicodedata.normalize('NFKD', value or '').encode('ASCII', 'ignore').decode('ASCII')
+        return re.sub(r'\s+', ' ', value).strip().lower()
+
+    cep_digits = re.sub(r'\D', '', cep or '')
+    return '|'.join([cep_digits, clean(street), clean(neighborhood), clean(city), (state or '').strip().upper()])
+
+
+def address_key(address):
+    return hashlib.sha1(address.encode('utf-8')).hexdigest()
+
+
+def _get_geolocator():
+    """Nominatim client shared by every lookup of the process."""
+    global _geolocator
+    if _geolocator is None:
+        _geolocator = Nominatim(user_agent='treinacnh_app', timeout=10)
+    return _geolocator
+
+
+def _geocode(query):
+    GeocodingService.bucket.acquire()  # Rate limiting, shared with the city geocoding
+    return _get_geolocator().geocode(query)
+
+
 def geocode_address(street, neighborhood, city, state, cep=None):
     """
     Get latitude and longitude from address using Nominatim (OpenStreetMap).
     Returns tuple (latitude, longitude) or (None, None) if not found.
+    Raises geopy's GeocoderServiceError (timeouts included) when Nominatim
+    does not answer, so that the caller can retry instead of caching a miss.
     """
-    try:
-        # Build address string (more specific to less specific)
-        address_parts = []
-        
-        if street:
-            address_parts.append(street)
-        if neighborhood:
-            address_parts.append(neighborhood)
-        if city:
-            address_parts.append(city)
-        if state:
-            address_parts.append(state)
-        address_parts.append('Brazil')
-        
-        address_string = ', '.join(address_parts)
-        
-        # Initialize geocoder with user agent
-        geolocator = Nominatim(user_agent='treinacnh_app', timeout=10)
-        
-        # Try to geocode with full address
-        logger.info(f'Tentando geocode: {address_string}')
-        location = geolocator.geocode(address_string)
-        
+    # Build address string (more specific to less specific)
+    address_parts = []
+
+    if street:
+        address_parts.append(street)
+    if neighborhood:
+        address_parts.append(neighborhood)
+    if city:
+        address_parts.append(city)
+    if state:
+        address_parts.append(state)
+    address_parts.append('Brazil')
+
+    address_string = ', '.join(address_parts)
+
+    # Try to geocode with full address
+    logger.info(f'Tentando geocode: {address_string}')
+    location = _geocode(address_string)
+
+    if location:
+        logger.info(f'Coordenadas encontradas: {location.latitude}, {location.longitude}')
+        return Decimal(str(location.latitude)), Decimal(str(location.longitude))
+
+    # If failed, try with less specific address (neighborhood + city + state)
+    if neighborhood and city and state:
+        simplified_address = f'{neighborhood}, {city}, {state}, Brazil'
+        logger.info(f'Tentando geocode simplificado: {simplified_address}')
+        location = _geocode(simplified_address)
+
+        if location:
+            logger.info(f'Coordenadas encontradas (simplificado): {location.latitude}, {location.longitude}')
+            return Decimal(str(location.latitude)), Decimal(str(location.longitude))
+
+    # Last resort: try just city + state
+    if city and state:
+        minimal_address = f'{city}, {state}, Brazil'
+        logger.info(f'Tentando geocode mínimo: {minimal_address}')
+        location = _geocode(minimal_address)
+
         if location:
-            logger.info(f'Coordenadas encontradas: {location.latitude}, {location.longitude}')
+            logger.info(f'Coordenadas encontradas (cidade): {location.latitude}, {location.longitude}')
             return Decimal(str(location.latitude)), Decimal(str(location.longitude))
-        
-        # If failed, try with less specific address (neighborhood + city + state)
-        if neighborhood and city and state:
-            simplified_address = f'{neighborhood}, {city}, {state}, Brazil'
-            logger.info(f'Tentando geocode simplificado: {simplified_address}')
-            sleep(1)  # Rate limiting
-            location = geolocator.geocode(simplified_address)
-            
-            if location:
-                logger.info(f'Coordenadas encontradas (simplificado): {location.latitude}, {location.longitude}')
-                return Decimal(str(location.latitude)), Decimal(str(location.longitude))
-        
-        # Last resort: try just city + state
-        if city and state:
-            minimal_address = f'{city}, {state}, Brazil'
-            logger.info(f'Tentando geocode mínimo: {minimal_address}')
-            sleep(1)  # Rate limiting
-            location = geolocator.geocode(minimal_address)
-            
-            if location:
-                logger.info(f'Coordenadas encontradas (cidade): {location.latitude}, {location.longitude}')
-                return Decimal(str(location.latitude)), Decimal(str(location.longitude))
-        
-        logger.warning(f'Não foi possível encontrar coordenadas para: {address_string}')
-        return None, None
-        
-    except GeocoderTimedOut:
-        logger.error('Timeout ao buscar coordenadas')
-        return None, None
-    except GeocoderServiceError as e:
-        logger.error(f'Erro do serviço de geocoding: {str(e)}')
-        return None, None
-    except Exception as e:
-        logger.error(f'Erro inesperado ao geocodificar: {str(e)}')
-        return None, None
+
+    logger.warning(f'Não foi possível encontrar coordenadas para: {address_string}')
+    return None, None
+
+
+def _profile_address(instructor_profile):
+    return normalize_address(
+        street=instructor_profile.address_street,
+        neighborhood=instructor_profile.address_neighborhood,
+        city=instructor_profile.city.name,
+        state=instructor_profile.city.state.code,
+        cep=instructor_profile.address_zip,
+    )
+
+
+def _cached_entry(address):
+    """Fresh AddressGeoCache entry of the address, or None (never seen / retry due)."""
+    entry = AddressGeoCache.objects.filter(address_key=address_key(address)).first()
+    if entry and (entry.geocoded or entry.updated_at > timezone.now() - ADDRESS_RETRY_AFTER):
+        return entry
+    return None
+
+
+def _apply_coordinates(instructor_profile, lat, lon):
+    if (instructor_profile.latitude, instructor_profile.longitude) == (lat, lon):
+        return
+    instructor_profile.latitude = lat
+    instructor_profile.longitude = lon
+    instructor_profile.save(update_fields=['latitude', 'longitude'])
+    logger.info(f'Coordenadas atualizadas para instrutor {instructor_profile.id}: {lat}, {lon}')
 
 
 def geocode_instructor_profile(instructor_profile):
     """
     Update instructor profile with coordinates based on their address.
-    Returns True if coordinates were updated, False otherwise.
+    Returns True if coordinates were updated, False otherwise. Nominatim
+    errors propagate (see geocode_address) and leave the cache untouched.
     """
     # Check if we have enough information
     if not instructor_profile.city:
         logger.warning(f'Instrutor {instructor_profile.id} sem cidade definida')
         return False
-    
-    city_name = instructor_profile.city.name
-    state_code = instructor_profile.city.state.code
-    
-    # Try to get coordinates
-    lat, lon = geocode_address(
-        street=instructor_profile.address_street,
-        neighborhood=instructor_profile.address_neighborhood,
-        city=city_name,
-        state=state_code,
-        cep=instructor_profile.address_zip
-    )
-    
-    if lat and lon:
-        instructor_profile.latitude = lat
-        instructor_profile.longitude = lon
-        instructor_profile.save(update_fields=['latitude', 'longitude'])
-        logger.info(f'Coordenadas atualizadas para instrutor {instructor_profile.id}: {lat}, {lon}')
+
+    address = _profile_address(instructor_profile)
+    entry = _cached_entry(address)
+    if entry is None:
+        city_name = instructor_profile.city.name
+        state_code = instructor_profile.city.state.code
+
+        # Try to get coordinates
+        lat, lon = geocode_address(
+            street=instructor_profile.address_street,
+            neighborhood=instructor_profile.address_neighborhood,
+            city=city_name,
+            state=state_code,
+            cep=instructor_profile.address_zip
+        )
+        entry, _ = AddressGeoCache.objects.update_or_create(
+            address_key=address_key(address),
+            defaults={
+                'address': address[:400],
+                'latitude': lat,
+                'longitude': lon,
+                'geocoded': bool(lat and lon),
+            },
+        )
+
+    if entry.geocoded:
+        _apply_coordinates(instructor_profile, entry.latitude, entry.longitude)
         return True
-    
+
     logger.warning(f'Não foi possível obter coordenadas para instrutor {instructor_profile.id}')
     return False
+
+
+def geocode_instructor_profile_async(instructor_profile):
+    """
+    Coordinates for a saved profile without blocking the request: a cached
+    address is applied right away (ADDRESS_APPLIED), a cached failure is
+    reported (ADDRESS_NOT_FOUND), anything else is queued for the
+    geocoding worker (ADDRESS_QUEUED).
+    """
+    if not instructor_profile.city_id:
+        return ADDRESS_NOT_FOUND
+
+    entry = _cached_entry(_profile_address(instructor_profile))
+    if entry is None:
+        enqueue_address(instructor_profile.pk)
+        return ADDRESS_QUEUED
+    if entry.geocoded:
+        _apply_coordinates(instructor_profile, entry.latitude, entry.longitude)
+        return ADDRESS_APPLIED
+    return ADDRESS_NOT_FOUND
@@ -0,0 +1,220 @@
+"""
+Geocoding job queue.
+
+Signals, admin actions and commands only enqueue cities:
+
+    enqueue_city('Campinas', 'SP')
+    enqueue_cities([('Campinas', 'SP'), ('Santos', 'SP')], force=True)
+
+Jobs live in GeocodingJob, one row per city_key: enqueueing a city that is
+already pending or running does nothing, and cities already geocoded are
+skipped unless `force` is given. `manage.py run_geocoding_queue` claims the
+due jobs one at a time (SELECT ... FOR UPDATE SKIP LOCKED, so several
+workers never take the same job) and geocodes them through
+GeocodingService.geocode(): the bundled IBGE dataset first, then Nominatim
+behind the shared token bucket that keeps every worker within its quota.
+
+Instructor addresses have a sibling queue, AddressGeocodingJob (one row
+per instructor, enqueue_address()), worked by the same command after the
+city jobs: it runs geocoding.geocode_instructor_profile(), which fills the
+AddressGeoCache.
+
+A failed request is retried with exponential backoff (RETRY_BASE_DELAY,
+doubled per attempt) up to MAX_ATTEMPTS; a city or address Nominatim does
+not know is marked failed right away. A running job's run_after is its
+lease: if the worker dies, the job becomes due again after JOB_LEASE.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import city_coords
+from .geocoding_service import GeocodingService
+from .models import AddressGeocodingJob, CityGeoCache, GeocodingJob, GeocodingJobStatus, InstructorProfile
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=6)
+JOB_LEASE = timedelta(minutes=5)
+
+FINISHED = (GeocodingJobStatus.DONE, GeocodingJobStatus.FAILED)
+
+
+def enqueue_cities(city_state_pairs, force=False):
+    """Queue the (city_name, state_code) pairs. Returns how many were (re)queued."""
+    cities = {
+        CityGeoCache.normalize_city_key(city_name, state_code): (city_name, state_code)
+        for city_name, state_code in city_state_pairs
+        if city_name and state_code
+    }
+    if not force and cities:
+        for city_key in city_coords.get_many_by_key(cities):
+            del cities[city_key]
+    if not cities:
+        return 0
+
+    now = timezone.now()
+    existing = dict(GeocodingJob.objects.filter(city_key__in=cities).values_list('city_key', 'status'))
+    new_jobs = [
+        GeocodingJob(city_key=city_key, city_name=city_name, state_code=state_code, run_after=now)
+        for city_key, (city_name, state_code) in cities.items()
+        if city_key not in existing
+    ]
+    GeocodingJob.objects.bulk_create(new_jobs, ignore_conflicts=True)
+    requeued = GeocodingJob.objects.filter(
+        city_key__in=[city_key for city_key, status in existing.items() if status in FINISHED],
+        status__in=FINISHED,
+    ).update(status=GeocodingJobStatus.PENDING, attempts=0, run_after=now, last_error='', updated_at=now)
+    return len(new_jobs) + requeued
+
+
+def enqueue_city(city_name, state_code, force=False):
+    return enqueue_cities([(city_name, state_code)], force=force) > 0
+
+
+def enqueue_address(instructor_id):
+    """
+    Queue the geocoding of an instructor's address. A pending or finished
+    job is due again right away (with fresh attempts); a running one is
+    left alone.
+    """
+    now = timezone.now()
+    requeued = AddressGeocodingJob.objects.filter(instructor_id=instructor_id).exclude(
+        status=GeocodingJobStatus.RUNNING,
+    ).update(status=GeocodingJobStatus.PENDING, attempts=0, run_after=now, last_error='', updated_at=now)
+    if not requeued:
+        AddressGeocodingJob.objects.bulk_create(
+            [AddressGeocodingJob(instructor_id=instructor_id, run_after=now)], ignore_conflicts=True,
+        )
+
+
+def claim_next_job(model=GeocodingJob):
+    """Take the next due job (pending, or running with an expired lease), or None."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = model.objects.select_for_update(skip_locked=True).filter(
+            status__in=(GeocodingJobStatus.PENDING, GeocodingJobStatus.RUNNING),
+            run_after__lte=now,
+        ).order_by('run_after', 'id').first()
+        if job is None:
+            return None
+        job.status = GeocodingJobStatus.RUNNING
+        job.attempts += 1
+        job.run_after = now + JOB_LEASE
+        job.save(update_fields=['status', 'attempts', 'run_after', 'updated_at'])
+    return job
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def _save_geocache(job, latitude=None, longitude=None, provider=''):
+    entry, _ = CityGeoCache.objects.get_or_create(
+        city_key=job.city_key,
+        defaults={'city_name': job.city_name, 'state_code': job.state_code},
+    )
+    entry.attempts += 1
+    if latitude is not None:
+        entry.latitude = latitude
+        entry.longitude = longitude
+        entry.geocoded = True
+        entry.failed = False
+        entry.provider = provider
+    else:
+        entry.failed = True
+    entry.save()
+
+
+def _retry_or_fail(job, name, exc):
+    """Reschedule a job whose request failed, with backoff; FAILED after MAX_ATTEMPTS."""
+    job.last_error = str(exc)[:255]
+    if job.attempts < MAX_ATTEMPTS:
+        job.status = GeocodingJobStatus.PENDING
+        job.run_after = timezone.now() + retry_delay(job.attempts)
+        logger.warning(f"Geocoding {name} failed (attempt {job.attempts}), retrying at {job.run_after}: {exc}")
+    else:
+        job.status = GeocodingJobStatus.FAILED
+        logger.error(f"Geocoding {name} failed after {job.attempts} attempts: {exc}")
+
+
+def run_job(job):
+    """Geocode a claimed city job. Returns its new status."""
+    try:
+        latitude, longitude, provider = GeocodingService.geocode(job.city_name, job.state_code)
+    except Exception as exc:
+        _retry_or_fail(job, job.city_key, exc)
+        if job.status == GeocodingJobStatus.FAILED:
+            _save_geocache(job)
+    else:
+        if latitude is not None and longitude is not None:
+            job.status = GeocodingJobStatus.DONE
+            job.last_error = ''
+            _save_geocache(job, latitude, longitude, provider)
+            logger.info(f"Geocoded {job.city_key} ({provider}): {latitude}, {longitude}")
+        else:
+            job.status = GeocodingJobStatus.FAILED
+            job.last_error = 'Cidade não encontrada'
+            _save_geocache(job)
+            logger.warning(f"Geocoding {job.city_key}: not found")
+    job.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+    return job.status
+
+
+def run_address_job(job):
+    """Geocode the address of a claimed instructor job. Returns its new status."""
+    from .geocoding import geocode_instructor_profile  # geocoding.py enqueues through this module
+
+    instructor = InstructorProfile.objects.select_related('city__state').filter(pk=job.instructor_id).first()
+    name = f'instructor {job.instructor_id}'
+    try:
+        found = instructor is not None and geocode_instructor_profile(instructor)
+    except Exception as exc:
+        _retry_or_fail(job, name, exc)
+    else:
+        if found:
+            job.status = GeocodingJobStatus.DONE
+            job.last_error = ''
+            logger.info(f"Geocoded address of {name}")
+        else:
+            job.status = GeocodingJobStatus.FAILED
+            job.last_error = 'Endereço não encontrado'
+            logger.warning(f"Geocoding address of {name}: not found")
+    job.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+    return job.status
+
+
+# Queues worked by run_due_jobs, in order
+QUEUES = (
+    (GeocodingJob, run_job),
+    (AddressGeocodingJob, run_address_job),
+)
+
+
+def run_due_jobs(max_jobs=None):
+    """Process due jobs until none is left (or max_jobs). Returns {status: count}."""
+    stats = {status: 0 for status in GeocodingJobStatus.values}
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        for model, run in QUEUES:
+            job = claim_next_job(model)
+            if job is not None:
+                break
+        else:
+            break
+        stats[run(job)] += 1
+        processed += 1
+    return stats
+
+
+def queue_counts():
+    """{status: count} of the whole queue (cities and addresses)."""
+    counts = dict.fromkeys(GeocodingJobStatus.values, 0)
+    for model, _ in QUEUES:
+        for row in model.objects.order_by().values('status').annotate(total=models.Count('id')):
+            counts[row['status']] += row['total']
+    return counts
@@ -1,5 +1,10 @@
 """
-Geocoding service with cache for city coordinates
+Geocoding service with cache for city coordinates.
+
+Municipalities in the bundled IBGE dataset (ibge_centroids.py) are
+resolved offline. Every Nominatim request takes a token from one shared bucket
+(RateLimitBucket row "nominatim"), so the API quota holds across threads,
+the queue workers (geocoding_queue.py) and one-off scripts alike.
 """
 import time
 import logging
@@ -7,17 +12,68 @@ from decimal import Decimal
 from typing import Tuple, Optional
 import requests
 from django.conf import settings
-from .models import CityGeoCache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from . import city_coords, ibge_centroids
+from .models import CityGeoCache, RateLimitBucket
 
 logger = logging.getLogger(__name__)
 
 
+class TokenBucket:
+    """
+    Token bucket stored in the database: `rate` tokens per second, at most
+    `capacity` saved up. The row is locked while it is updated, so all
+    processes share the same budget.
+
+    Call it outside transaction.atomic(): inside an outer transaction the
+    select_for_update lock is held until that transaction ends, so every
+    other process waits on the row while this one sleeps in acquire().
+    """
+
+    def __init__(self, name, rate, capacity=1):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    def try_acquire(self):
+        """Take a token. Returns 0 on success, else the seconds until one is available."""
+        with transaction.atomic():
+            bucket = RateLimitBucket.objects.select_for_update().filter(name=self.name).first()
+            if bucket is None:
+                try:
+                    with transaction.atomic():
+                        RateLimitBucket.objects.create(name=self.name, tokens=self.capacity - 1)
+                    return 0
+                except IntegrityError:
+                    # Created meanwhile by another process
+                    bucket = RateLimitBucket.objects.select_for_update().get(name=self.name)
+
+            now = timezone.now()
+            elapsed = max(0.0, (now - bucket.updated_at).total_seconds())
+            tokens = min(self.capacity, bucket.tokens + elapsed * self.rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not wait:
+                tokens -= 1
+            RateLimitBucket.objects.filter(pk=bucket.pk).update(tokens=tokens, updated_at=now)
+        return wait
+
+    def acquire(self):
+        """Block until a token is taken. Must not run inside atomic() (see the class)."""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
 class GeocodingService:
     """Service for geocoding cities with cache"""
     
     NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
     USER_AGENT = "TreinaCNH/1.0"
     RATE_LIMIT_DELAY = 1.5  # seconds between requests (Nominatim requires 1 req/sec max)
+    bucket = TokenBucket('nominatim', rate=1 / RATE_LIMIT_DELAY)
     
     @staticmethod
     def get_city_latlng(city_name: str, state_code: str) -> Tuple[Optional[Decimal], Optional[Decimal]]:
@@ -31,6 +87,11 @@ class GeocodingService:
         Returns:
             Tuple of (latitude, longitude) or (None, None) if not found
         """
+        # In-process LRU first (no query for recently seen cities)
+        coords = city_coords.get(city_name, state_code)
+        if coords:
+            return coords
+        
         # Normalize city key
         city_key = CityGeoCache.normalize_city_key(city_name, state_code)
         
@@ -58,7 +119,7 @@ class GeocodingService:
         
         # Attempt geocoding
         try:
-            lat, lng = GeocodingService._geocode_nominatim(city_name, state_code)
+            lat, lng, provider = GeocodingService.geocode(city_name, state_code)
             
             if lat and lng:
                 # Update cache with success
@@ -66,7 +127,7 @@ class GeocodingService:
                 cache_entry.longitude = lng
                 cache_entry.geocoded = True
                 cache_entry.failed = False
-                cache_entry.provider = 'nominatim'
+                cache_entry.provider = provider
                 cache_entry.attempts += 1
                 cache_entry.save()
                 
@@ -88,6 +149,24 @@ class GeocodingService:
             cache_entry.save()
             return None, None
     
+    @staticmethod
+    def geocode(city_name: str, state_code: str) -> Tuple[Optional[Decimal], Optional[Decimal], str]:
+        """
+        Resolve coordinates without touching the cache: bundled IBGE dataset
+        first, Nominatim only for municipalities missing from it.
+        
+        Returns:
+            Tuple of (latitude, longitude, provider) or (None, None, '') if not found
+
+        Raises:
+            requests.RequestException: Nominatim network/HTTP errors
+        """
+        centroid = ibge_centroids.lookup(city_name, state_code)
+        if centroid:
+            return centroid.latitude, centroid.longitude, ibge_centroids.PROVIDER
+        lat, lng = GeocodingService._geocode_nominatim(city_name, state_code)
+        return lat, lng, 'nominatim' if lat and lng else ''
+    
     @staticmethod
     def _geocode_nominatim(city_name: str, state_code: str) -> Tuple[Optional[Decimal], Optional[Decimal]]:
         """
@@ -99,9 +178,12 @@ class GeocodingService:
             
         Returns:
             Tuple of (latitude, longitude) or (None, None) if not found
+
+        Raises:
+            requests.RequestException: network/HTTP errors (worth retrying)
         """
-        # Respect rate limit
-        time.sleep(GeocodingService.RATE_LIMIT_DELAY)
+        # Respect rate limit (shared by all processes)
+        GeocodingService.bucket.acquire()
         
         # Build query
         query = f"{city_name}, {state_code}, Brasil"
@@ -140,38 +222,33 @@ class GeocodingService:
                 
         except requests.RequestException as e:
             logger.error(f"Nominatim request failed for {query}: {str(e)}")
-            return None, None
+            raise
         except (KeyError, ValueError, TypeError) as e:
             logger.error(f"Error parsing Nominatim response for {query}: {str(e)}")
             return None, None
     
     @staticmethod
-    def batch_geocode_cities(city_state_pairs: list, delay: float = 1.5) -> dict:
+    def batch_geocode_cities(city_state_pairs: list) -> dict:
         """
-        Geocode multiple cities in batch with rate limiting
+        Geocode multiple cities in batch (rate limited by the shared bucket)
         
         Args:
             city_state_pairs: List of tuples (city_name, state_code)
-            delay: Delay between requests in seconds
             
         Returns:
             Dict with stats: {'success': int, 'failed': int, 'cached': int}
         """
         stats = {'success': 0, 'failed': 0, 'cached': 0, 'total': len(city_state_pairs)}
+        # Already geocoded cities, resolved in one query
+        cached = city_coords.get_many(city_state_pairs)
         
         for i, (city_name, state_code) in enumerate(city_state_pairs, 1):
             logger.info(f"Processing {i}/{stats['total']}: {city_name}/{state_code}")
             
-            # Check if already in cache
-            city_key = CityGeoCache.normalize_city_key(city_name, state_code)
-            try:
-                cache_entry = CityGeoCache.objects.get(city_key=city_key)
-                if cache_entry.geocoded:
-                    stats['cached'] += 1
-                    logger.info(f"  → Already cached")
-                    continue
-            except CityGeoCache.DoesNotExist:
-                pass
+            if (city_name, state_code) in cached:
+                stats['cached'] += 1
+                logger.info(f"  → Already cached")
+                continue
             
             # Geocode
             lat, lng = GeocodingService.get_city_latlng(city_name, state_code)
@@ -182,9 +259,5 @@ class GeocodingService:
             else:
                 stats['failed'] += 1
                 logger.warning(f"  → Failed")
-            
-            # Rate limiting (except for last item)
-            if i < stats['total']:
-                time.sleep(delay)
         
         return stats
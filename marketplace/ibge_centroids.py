@@ -0,0 +1,145 @@
+"""
+Offline municipality coordinates (IBGE), consulted before any geocoding
+API call.
+
+The dataset is a CSV bundled with the app:
+
+    ibge_id,name,state_code,latitude,longitude
+    3550308,São Paulo,SP,-23.5329,-46.6395
+
+The bundled file (marketplace/data/ibge_centroids.csv) is the full national
+table: all 5,570 municipalities, with the coordinates of the municipal seat.
+Codes, names and coordinates come from the public IBGE municipality table
+(as packaged by ibge-utils); the two seats missing there (Jussiape/BA and
+Lapa/PR) were filled from GeoNames.
+
+DATASET_VERSION identifies the bundled file: bump it whenever the file is
+replaced (new municipalities, corrected coordinates; same columns), so that
+`manage.py load_ibge_centroids` refreshes the coordinates it loaded
+before (provider "ibge:<version>"). The public "municipios.csv" layout
+(codigo_ibge,nome,latitude,longitude,...) is accepted as well; the state
+comes from the first two digits of the IBGE code.
+"""
+import csv
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import city_coords
+from .map_cities import invalidate_map_cities
+from .map_markers import rebuild_all_markers
+from .models import City, CityGeoCache, GeocodingJob, GeocodingJobStatus
+
+DATASET_PATH = Path(__file__).resolve().parent / 'data' / 'ibge_centroids.csv'
+DATASET_VERSION = '2026.10'
+PROVIDER = f'ibge:{DATASET_VERSION}'
+
+# First two digits of an IBGE municipality code
+IBGE_STATE_CODES = {
+    '11': 'RO', '12': 'AC', '13': 'AM', '14': 'RR', '15': 'PA', '16': 'AP', '17': 'TO',
+    '21': 'MA', '22': 'PI', '23': 'CE', '24': 'RN', '25': 'PB', '26': 'PE', '27': 'AL',
+    '28': 'SE', '29': 'BA', '31': 'MG', '32': 'ES', '33': 'RJ', '35': 'SP', '41': 'PR',
+    '42': 'SC', '43': 'RS', '50': 'MS', '51': 'MT', '52': 'GO', '53': 'DF',
+}
+
+
+class Centroid(NamedTuple):
+    ibge_id: int
+    name: str
+    state_code: str
+    latitude: Decimal
+    longitude: Decimal
+
+
+def read_centroids(path=DATASET_PATH):
+    """Parse a centroid CSV. Returns {ibge_id: Centroid}; malformed rows are skipped."""
+    centroids = {}
+    with open(path, newline='', encoding='utf-8') as dataset:
+        for row in csv.DictReader(dataset):
+            try:
+                ibge_id = int(row.get('ibge_id') or row['codigo_ibge'])
+                state_code = row.get('state_code') or IBGE_STATE_CODES[str(ibge_id)[:2]]
+                centroids[ibge_id] = Centroid(
+                    ibge_id=ibge_id,
+                    name=(row.get('name') or row['nome']).strip(),
+                    state_code=state_code.strip().upper(),
+                    latitude=Decimal(row['latitude']).quantize(Decimal('0.000001')),
+                    longitude=Decimal(row['longitude']).quantize(Decimal('0.000001')),
+                )
+            except (KeyError, TypeError, ValueError, InvalidOperation):
+                continue
+    return centroids
+
+
+@lru_cache(maxsize=1)
+def _centroids_by_city_key():
+    return {
+        CityGeoCache.normalize_city_key(c.name, c.state_code): c
+        for c in read_centroids().values()
+    }
+
+
+def lookup(city_name, state_code):
+    """Centroid of a municipality from the bundled dataset, or None."""
+    return _centroids_by_city_key().get(CityGeoCache.normalize_city_key(city_name, state_code))
+
+
+def load_geocache(centroids, overwrite=False, batch_size=500):
+    """
+    Fill CityGeoCache from `centroids` ({ibge_id: Centroid}) in one
+    transaction: one entry per dataset row, plus one per City whose local
+    name differs from the dataset's. Entries geocoded by another provider
+    are kept unless `overwrite`. Pending geocoding jobs of the filled cities
+    are closed. Returns {'created': n, 'updated': n, 'kept': n}.
+    """
+    targets = {CityGeoCache.normalize_city_key(c.name, c.state_code): (c.name, c.state_code, c) for c in centroids.values()}
+    for ibge_id, name, state_code in City.objects.filter(
+        ibge_id__in=list(centroids),
+    ).values_list('ibge_id', 'name', 'state__code').iterator():
+        targets[CityGeoCache.normalize_city_key(name, state_code)] = (name, state_code, centroids[ibge_id])
+
+    now = timezone.now()
+    stats = {'created': 0, 'updated': 0, 'kept': 0}
+    with transaction.atomic():
+        existing = CityGeoCache.objects.in_bulk(list(targets), field_name='city_key')
+        to_create, to_update = [], []
+        for city_key, (name, state_code, centroid) in targets.items():
+            entry = existing.get(city_key)
+            if entry is None:
+                entry = CityGeoCache(city_key=city_key, city_name=name, state_code=state_code)
+                to_create.append(entry)
+            elif entry.geocoded and not entry.provider.startswith('ibge') and not overwrite:
+                stats['kept'] += 1
+                continue
+            else:
+                to_update.append(entry)
+            entry.latitude = centroid.latitude
+            entry.longitude = centroid.longitude
+            entry.geocoded = True
+            entry.failed = False
+            entry.provider = PROVIDER
+            entry.updated_at = now
+
+        CityGeoCache.objects.bulk_create(to_create, batch_size=batch_size)
+        CityGeoCache.objects.bulk_update(
+            to_update,
+            ['latitude', 'longitude', 'geocoded', 'failed', 'provider', 'updated_at'],
+            batch_size=batch_size,
+        )
+        filled = [entry.city_key for entry in to_create + to_update]
+        for start in range(0, len(filled), batch_size):
+            GeocodingJob.objects.filter(
+                city_key__in=filled[start:start + batch_size], status=GeocodingJobStatus.PENDING,
+            ).update(status=GeocodingJobStatus.DONE, last_error='', updated_at=now)
+        stats['created'], stats['updated'] = len(to_create), len(to_update)
+
+    # Bulk writes skip the CityGeoCache signals: refresh what they would have
+    if to_create or to_update:
+        city_coords.invalidate()
+        rebuild_all_markers()
+        invalidate_map_cities()
+    return stats
@@ -0,0 +1,135 @@
+"""
+Denormalized lead access for instructors.
+
+InstructorProfile.access_state / lead_access_until summarize the pioneer
+benefit, the trial and the paid subscriptions, so can_receive_leads() and
+listings don't have to query subscriptions per instructor.
+
+They are recomputed:
+- in InstructorProfile.save() when pioneer/trial fields change;
+- by the billing signals when a Subscription or Payment changes;
+- by the nightly sweep (manage.py refresh_lead_access), which catches
+  accesses that simply ran out and subscriptions that start later.
+
+Dates are compared on one basis everywhere (access_date(): the date of
+timezone.now(), i.e. UTC), the same the InstructorProfile methods and the
+billing code use, so the columns never disagree with them.
+"""
+import logging
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AccessStateChoices, InstructorProfile
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_ACCESS_STATES = (
+    AccessStateChoices.PIONEER_ACTIVE,
+    AccessStateChoices.TRIAL_ACTIVE,
+    AccessStateChoices.SUBSCRIPTION_ACTIVE,
+)
+
+# InstructorProfile fields the access depends on (subscriptions aside)
+ACCESS_SOURCE_FIELDS = {
+    'is_pioneer', 'pioneer_free_until',
+    'is_trial_active', 'trial_start_date', 'trial_end_date',
+}
+
+
+def access_date(now=None):
+    """Today for the access rules (pioneer, subscriptions)."""
+    return (now or timezone.now()).date()
+
+
+def _end_of_day(day):
+    """First moment after `day` (access granted until a date lasts all day)."""
+    return datetime.combine(day + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+
+
+def _active_subscriptions(instructor):
+    from billing.models import SubscriptionStatusChoices
+    if not instructor.pk:
+        return []
+    return list(instructor.subscriptions.filter(status=SubscriptionStatusChoices.ACTIVE))
+
+
+def compute_lead_access(instructor, subscriptions=None, now=None):
+    """
+    Return (access_state, lead_access_until) for an instructor.
+
+    The state follows the priority of get_access_status (pioneer, trial,
+    subscription); lead_access_until is the latest end among every active
+    source, or None when one of them has no end date.
+    """
+    now = now or timezone.now()
+    today = access_date(now)
+    if subscriptions is None:
+        subscriptions = _active_subscriptions(instructor)
+
+    sources = []
+    if instructor.is_pioneer and instructor.pioneer_free_until and instructor.pioneer_free_until >= today:
+        sources.append((AccessStateChoices.PIONEER_ACTIVE, _end_of_day(instructor.pioneer_free_until)))
+    if instructor.is_trial_active and (not instructor.trial_end_date or now <= instructor.trial_end_date):
+        sources.append((AccessStateChoices.TRIAL_ACTIVE, instructor.trial_end_date))
+    for sub in subscriptions:
+        if sub.start_date <= today and (sub.end_date is None or sub.end_date >= today):
+            until = _end_of_day(sub.end_date) if sub.end_date else None
+            sources.append((AccessStateChoices.SUBSCRIPTION_ACTIVE, until))
+
+    if not sources:
+        if instructor.trial_end_date and instructor.is_trial_active:
+            return AccessStateChoices.TRIAL_EXPIRED, None
+        return AccessStateChoices.NO_ACCESS, None
+
+    ends = [until for _, until in sources]
+    until = None if None in ends else max(ends)
+    return sources[0][0], until
+
+
+def lead_access_q(now=None):
+    """Q() for instructors that can receive leads right now (pure SQL)."""
+    now = now or timezone.now()
+    return Q(access_state__in=ACTIVE_ACCESS_STATES) & (
+        Q(lead_access_until__isnull=True) | Q(lead_access_until__gt=now)
+    )
+
+
+def refresh_lead_access(instructor_ids=None, batch_size=500):
+    """
+    Recompute the access of the given instructors (all when None) and write
+    only the rows that changed. Returns the number of changed rows.
+    """
+    from billing.models import Subscription, SubscriptionStatusChoices
+    from django.db.models import Prefetch
+
+    queryset = InstructorProfile.objects.only(
+        'pk', 'access_state', 'lead_access_until', *ACCESS_SOURCE_FIELDS
+    ).prefetch_related(Prefetch(
+        'subscriptions',
+        queryset=Subscription.objects.filter(status=SubscriptionStatusChoices.ACTIVE),
+        to_attr='active_subscriptions',
+    )).order_by('pk')
+    if instructor_ids is not None:
+        instructor_ids = [pk for pk in instructor_ids if pk]
+        if not instructor_ids:
+            return 0
+        queryset = queryset.filter(pk__in=instructor_ids)
+
+    now = timezone.now()
+    changed = []
+    total_changed = 0
+    for instructor in queryset.iterator(chunk_size=batch_size):
+        state, until = compute_lead_access(instructor, instructor.active_subscriptions, now)
+        if (state, until) != (instructor.access_state, instructor.lead_access_until):
+            instructor.access_state, instructor.lead_access_until = state, until
+            changed.append(instructor)
+        if len(changed) >= batch_size:
+            InstructorProfile.objects.bulk_update(changed, ['access_state', 'lead_access_until'])
+            total_changed += len(changed)
+            changed = []
+    if changed:
+        InstructorProfile.objects.bulk_update(changed, ['access_state', 'lead_access_until'])
+        total_changed += len(changed)
+    return total_changed
@@ -11,8 +11,8 @@ Usage:
 from datetime import timedelta, date
 
 from django.core.management.base import BaseCommand
-from django.utils import timezone
 
+from marketplace.lead_access import access_date
 from marketplace.models import InstructorProfile
 
 
@@ -58,7 +58,7 @@ class Command(BaseCommand):
     # ------------------------------------------------------------------
     def handle(self, *args, **options):
         apply = options['apply']
-        today = timezone.now().date()
+        today = access_date()
         free_until = today + timedelta(days=PIONEER_DAYS)
 
         self.stdout.write(self.style.HTTP_INFO(
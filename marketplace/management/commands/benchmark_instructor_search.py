@@ -0,0 +1,122 @@
+"""
+Benchmark for the instructor search index.
+
+Creates N synthetic instructors (with their search tokens) inside a
+transaction, times a set of typical marketplace queries and rolls
+everything back, so it is safe to run against any database.
+
+Usage:
+    python manage.py benchmark_instructor_search
+    python manage.py benchmark_instructor_search --instructors 50000 --rounds 20
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from marketplace.models import City, InstructorProfile, InstructorSearchToken
+from marketplace.search import document_weights, search_instructor_ids
+
+FIRST_NAMES = [
+    'João', 'Maria', 'Pedro', 'Ana', 'Carlos', 'Juliana', 'Rafael', 'Fernanda', 'Lucas',
+    'Camila', 'Ricardo', 'Patrícia', 'Bruno', 'Amanda', 'Felipe', 'Daniela', 'Gustavo',
+    'Letícia', 'Rodrigo', 'Beatriz', 'Marcelo', 'Gabriela', 'Thiago', 'Bruna', 'José',
+]
+LAST_NAMES = [
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira',
+    'Lima', 'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Araújo', 'Conceição',
+]
+NEIGHBORHOODS = [
+    'Centro', 'Jardim América', 'Vila Nova', 'Boa Vista', 'Santa Cruz', 'São José',
+    'Liberdade', 'Bela Vista', 'Copacabana', 'Moema', 'Savassi', 'Aldeota',
+]
+BIO_WORDS = (
+    'instrutor experiente paciente aulas práticas direção defensiva primeira habilitação '
+    'reciclagem habilitados medo de dirigir baliza rodovia câmbio automático manual moto '
+    'carro aprovação exame detran horários flexíveis'
+).split()
+CATEGORIES = ['A', 'B', 'AB', 'C', 'D', 'E']
+QUERIES = [
+    'joao', 'jo', 'maria silva', 'conceicao', 'centro', 'jardim america', 'moto',
+    'baliza', 'pedro b', 'araujo centro', 'sao paulo', 'habilitados',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the instructor search index with synthetic instructors (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--instructors', type=int, default=50000, help='Instrutores sintéticos')
+        parser.add_argument('--rounds', type=int, default=10, help='Repetições de cada consulta')
+
+    def handle(self, *args, **options):
+        cities = list(City.objects.select_related('state')[:200])
+        if not cities:
+            raise CommandError('Nenhuma cidade cadastrada (rode import_ibge_cities antes).')
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            self._create_synthetic(options['instructors'], cities)
+            self.stdout.write(
+                f'{options["instructors"]} instrutores sintéticos criados em '
+                f'{time.perf_counter() - started:.1f}s'
+            )
+            self._run_queries(options['rounds'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark concluído (dados sintéticos descartados)'))
+
+    def _create_synthetic(self, total, cities, batch_size=2000):
+        rng = random.Random(42)
+        # Explicit ids: bulk_create does not return them on MySQL
+        next_user_id = (User.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+        next_profile_id = (InstructorProfile.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+
+        for offset in range(0, total, batch_size):
+            users, profiles, tokens = [], [], []
+            for i in range(offset, min(offset + batch_size, total)):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                city = rng.choice(cities)
+                neighborhoods = ', '.join(rng.sample(NEIGHBORHOODS, 2))
+                bio = ' '.join(rng.sample(BIO_WORDS, 12))
+                user_id, profile_id = next_user_id + i, next_profile_id + i
+                users.append(User(id=user_id, username=f'bench_search_{user_id}', first_name=first, last_name=last))
+                profiles.append(InstructorProfile(
+                    id=profile_id, user_id=user_id, city=city,
+                    bio=bio, neighborhoods_text=neighborhoods,
+                    is_visible=True, is_verified=True,
+                ))
+                weights = document_weights(
+                    name=f'{first} {last}',
+                    city=f'{city.name} {city.state.code}',
+                    categories=rng.sample(CATEGORIES, 2),
+                    neighborhoods=neighborhoods,
+                    bio=bio,
+                )
+                tokens.extend(
+                    InstructorSearchToken(instructor_id=profile_id, token=token, weight=weight)
+                    for token, weight in weights.items()
+                )
+            User.objects.bulk_create(users)
+            InstructorProfile.objects.bulk_create(profiles)
+            InstructorSearchToken.objects.bulk_create(tokens, batch_size=5000)
+
+    def _run_queries(self, rounds):
+        self.stdout.write(f'{"consulta":<20}{"resultados":>12}{"p50 ms":>10}{"p95 ms":>10}{"máx ms":>10}')
+        for query in QUERIES:
+            timings = []
+            results = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                results = search_instructor_ids(query)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f'{query:<20}{len(results):>12}{statistics.median(timings):>10.2f}'
+                f'{p95:>10.2f}{timings[-1]:>10.2f}'
+            )
@@ -0,0 +1,27 @@
+"""
+Management command to show the hit/miss counters of the instructor card
+fragment cache (see marketplace/card_cache.py).
+
+Usage:
+    python manage.py card_cache_stats
+    python manage.py card_cache_stats --reset
+"""
+from django.core.management.base import BaseCommand
+from marketplace.card_cache import card_cache_stats, reset_card_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the hit/miss counters of the instructor card cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zera os contadores após exibir')
+
+    def handle(self, *args, **options):
+        stats = card_cache_stats()
+        self.stdout.write(
+            f"Hits: {stats['hits']}  Misses: {stats['misses']}  "
+            f"Taxa de acerto: {stats['hit_ratio']:.1%}"
+        )
+        if options['reset']:
+            reset_card_cache_stats()
+            self.stdout.write(self.style.SUCCESS('✓ Contadores zerados'))
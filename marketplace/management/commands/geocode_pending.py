@@ -2,13 +2,18 @@
 Management command to geocode pending cities.
 Run this via cron job to automatically geocode new cities.
 
+The cities are added to the geocoding queue (marketplace/geocoding_queue.py)
+and the due jobs are processed right away, unless --enqueue-only is given
+(then a run_geocoding_queue worker picks them up).
+
 Usage:
     python manage.py geocode_pending
     python manage.py geocode_pending --all  # Geocode all cities, including already processed
+    python manage.py geocode_pending --enqueue-only
 """
 from django.core.management.base import BaseCommand
-from marketplace.models import CityGeoCache, StudentLead
-from marketplace.geocoding_service import GeocodingService
+from marketplace.models import CityGeoCache, GeocodingJobStatus, StudentLead
+from marketplace.geocoding_queue import enqueue_cities, run_due_jobs
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,59 +33,59 @@ class Command(BaseCommand):
             action='store_true',
             help='Retry cities that previously failed',
         )
+        parser.add_argument(
+            '--enqueue-only',
+            action='store_true',
+            help='Only queue the cities; leave them to run_geocoding_queue',
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('Checking for cities to geocode...')
         
         # Get unique cities from StudentLead
-        students = StudentLead.objects.filter(
+        city_state_pairs = set(StudentLead.objects.filter(
             city__isnull=False,
             state__isnull=False
-        ).select_related('city', 'state').distinct()
-        
-        city_state_pairs = set()
-        for student in students:
-            city_state_pairs.add((student.city.name, student.state.code))
+        ).values_list('city__name', 'state__code').distinct())
         
         self.stdout.write(f'Found {len(city_state_pairs)} unique cities in StudentLead records')
         
-        # Filter based on options
+        # Filter based on options (one query for every cache entry)
+        keys = {pair: CityGeoCache.normalize_city_key(*pair) for pair in city_state_pairs}
+        entries = CityGeoCache.objects.in_bulk(list(keys.values()), field_name='city_key')
         to_geocode = []
-        for city_name, state_code in city_state_pairs:
-            city_key = CityGeoCache.normalize_city_key(city_name, state_code)
-            
-            try:
-                cache = CityGeoCache.objects.get(city_key=city_key)
-                
-                if options['all']:
-                    # Geocode all
-                    to_geocode.append((city_name, state_code))
-                elif options['retry_failed'] and cache.failed:
-                    # Retry failed
-                    to_geocode.append((city_name, state_code))
-                elif not cache.geocoded and not cache.failed:
-                    # Only pending
-                    to_geocode.append((city_name, state_code))
-                    
-            except CityGeoCache.DoesNotExist:
+        for (city_name, state_code), city_key in keys.items():
+            cache = entries.get(city_key)
+            if cache is None:
                 # Not in cache yet
                 to_geocode.append((city_name, state_code))
+            elif options['all']:
+                # Geocode all
+                to_geocode.append((city_name, state_code))
+            elif options['retry_failed'] and cache.failed:
+                # Retry failed
+                to_geocode.append((city_name, state_code))
+            elif not cache.geocoded and not cache.failed:
+                # Only pending
+                to_geocode.append((city_name, state_code))
         
         if not to_geocode:
             self.stdout.write(self.style.SUCCESS('✓ All cities are already geocoded!'))
             return
         
-        self.stdout.write(f'Will geocode {len(to_geocode)} cities...')
+        queued = enqueue_cities(to_geocode, force=options['all'] or options['retry_failed'])
+        self.stdout.write(f'Queued {queued} cities for geocoding')
+        if options['enqueue_only']:
+            return
         
-        # Geocode
-        stats = GeocodingService.batch_geocode_cities(to_geocode, delay=1.5)
+        stats = run_due_jobs()
         
         # Report results
         self.stdout.write('\n' + '='*60)
         self.stdout.write(self.style.SUCCESS('GEOCODING COMPLETED'))
         self.stdout.write('='*60)
-        self.stdout.write(f'Total processed: {stats["total"]}')
-        self.stdout.write(self.style.SUCCESS(f'  ✓ Success: {stats["success"]}'))
-        self.stdout.write(self.style.ERROR(f'  ✗ Failed: {stats["failed"]}'))
-        self.stdout.write(f'  ⚡ Cached (skipped): {stats["cached"]}')
+        self.stdout.write(f'Total processed: {sum(stats.values())}')
+        self.stdout.write(self.style.SUCCESS(f'  ✓ Success: {stats[GeocodingJobStatus.DONE]}'))
+        self.stdout.write(self.style.ERROR(f'  ✗ Failed: {stats[GeocodingJobStatus.FAILED]}'))
+        self.stdout.write(f'  ↻ Retry scheduled: {stats[GeocodingJobStatus.PENDING]}')
         self.stdout.write('='*60)
@@ -0,0 +1,40 @@
+"""
+Management command to fill CityGeoCache from the bundled IBGE municipality
+coordinates (marketplace/ibge_centroids.py), without any API call.
+Run it after import_ibge_cities and whenever DATASET_VERSION changes.
+
+Usage:
+    python manage.py load_ibge_centroids                         # bundled national table (5,570 municipalities)
+    python manage.py load_ibge_centroids --file municipios.csv   # another list, same columns
+    python manage.py load_ibge_centroids --overwrite             # also replace Nominatim/manual coordinates
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from marketplace.ibge_centroids import DATASET_PATH, DATASET_VERSION, load_geocache, read_centroids
+
+
+class Command(BaseCommand):
+    help = 'Load municipality coordinates from the bundled IBGE dataset into CityGeoCache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=str(DATASET_PATH), help='Centroid CSV (default: bundled dataset)')
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Replace coordinates geocoded by other providers',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            centroids = read_centroids(options['file'])
+        except OSError as exc:
+            raise CommandError(f'Não foi possível ler {options["file"]}: {exc}')
+        if not centroids:
+            raise CommandError(f'Nenhum município válido em {options["file"]}')
+
+        self.stdout.write(f'Dataset IBGE {DATASET_VERSION}: {len(centroids)} municípios')
+        stats = load_geocache(centroids, overwrite=options['overwrite'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ CityGeoCache: {stats['created']} criados, {stats['updated']} atualizados, "
+            f"{stats['kept']} mantidos (outro provedor)"
+        ))
@@ -0,0 +1,17 @@
+"""
+Management command to rebuild the precomputed instructor map markers.
+Signals keep the table in sync; run this after bulk imports or raw SQL edits.
+
+Usage:
+    python manage.py rebuild_map_markers
+"""
+from django.core.management.base import BaseCommand
+from marketplace.map_markers import rebuild_all_markers
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed instructor map markers (InstructorMapMarker)'
+
+    def handle(self, *args, **options):
+        total = rebuild_all_markers()
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} marcadores reconstruídos'))
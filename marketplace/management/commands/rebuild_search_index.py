@@ -0,0 +1,21 @@
+"""
+Management command to (re)build the instructor search index.
+Signals keep it in sync; run this after bulk imports or raw SQL edits.
+
+Usage:
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --batch-size 1000
+"""
+from django.core.management.base import BaseCommand
+from marketplace.search import reindex_instructors
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the instructor search index (InstructorSearchToken)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Instrutores por lote')
+
+    def handle(self, *args, **options):
+        total = reindex_instructors(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} instrutores indexados'))
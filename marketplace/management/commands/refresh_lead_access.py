@@ -0,0 +1,20 @@
+"""
+Management command to recompute the denormalized lead access of every
+instructor (InstructorProfile.access_state / lead_access_until).
+Saves and billing signals keep it current; this nightly sweep catches
+accesses that simply ran out and subscriptions whose start date arrived.
+Should be run daily via cron job.
+
+Usage:
+    python manage.py refresh_lead_access
+"""
+from django.core.management.base import BaseCommand
+from marketplace.lead_access import refresh_lead_access
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized lead access of all instructors'
+
+    def handle(self, *args, **options):
+        changed = refresh_lead_access()
+        self.stdout.write(self.style.SUCCESS(f'✓ {changed} instrutor(es) com acesso atualizado'))
@@ -0,0 +1,50 @@
+"""
+Management command that works through the geocoding queue
+(marketplace/geocoding_queue.py). Run it as a long-lived worker
+(supervisor/systemd) or from cron with --once.
+
+Usage:
+    python manage.py run_geocoding_queue              # worker: waits for new jobs
+    python manage.py run_geocoding_queue --once       # process the due jobs and exit
+    python manage.py run_geocoding_queue --max-jobs 100
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from marketplace.geocoding_queue import queue_counts, run_due_jobs
+from marketplace.models import GeocodingJobStatus
+
+
+class Command(BaseCommand):
+    help = 'Process the geocoding job queue (rate limited by the shared Nominatim bucket)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the due jobs and exit')
+        parser.add_argument('--max-jobs', type=int, default=None, help='Stop after this many jobs')
+        parser.add_argument('--idle-sleep', type=float, default=5.0, help='Seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        totals = dict.fromkeys(GeocodingJobStatus.values, 0)
+        remaining = options['max_jobs']
+        try:
+            while remaining is None or remaining > 0:
+                stats = run_due_jobs(max_jobs=remaining)
+                processed = sum(stats.values())
+                for status, count in stats.items():
+                    totals[status] += count
+                if remaining is not None:
+                    remaining -= processed
+                if not processed:
+                    if options['once']:
+                        break
+                    time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write('Interrompido.')
+
+        pending = queue_counts()[GeocodingJobStatus.PENDING]
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Geocoding: {totals[GeocodingJobStatus.DONE]} concluído(s), "
+            f"{totals[GeocodingJobStatus.PENDING]} reagendado(s), "
+            f"{totals[GeocodingJobStatus.FAILED]} falha(s); {pending} pendente(s) na fila"
+        ))
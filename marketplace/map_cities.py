@@ -0,0 +1,147 @@
+"""
+Student density per city for the home map (api/map/cities/).
+
+Everything is aggregated in the database with a fixed number of queries
+(per-city totals, per-city category histogram, one geocache lookup for the
+cities missing from the coordinate LRU in city_coords.py), so the cost does
+not grow with the number of StudentLead rows. The result is cached
+and dropped by the signals in signals.py whenever a lead or a city geocache
+entry changes.
+
+The payload carries counts only. Individual leads (names, categories) are
+served page by page by get_city_students(), to staff/support users only.
+"""
+import logging
+from collections import defaultdict
+
+from core.cache import CacheNamespace
+from django.db.models import Count, Q
+
+from . import city_coords
+from .models import StudentLead, CityGeoCache
+
+logger = logging.getLogger(__name__)
+
+MAP_CITIES_CACHE_TIMEOUT = 60 * 30  # 30 min safety net; signals invalidate on change
+CITY_STUDENTS_PAGE_SIZE = 50
+map_cities_cache = CacheNamespace('map_cities', timeout=MAP_CITIES_CACHE_TIMEOUT)
+
+
+def _located_leads():
+    return StudentLead.objects.filter(city__isnull=False, state__isnull=False)
+
+
+def build_map_cities():
+    """
+    Aggregate students per city. Runs at most three queries (two when every
+    city's coordinates are in the LRU).
+    Returns the payload served by get_map_cities ({"cities": [...], "stats": {...}}).
+    """
+    # 1) Totals per city
+    city_rows = _located_leads().values(
+        'city_id', 'city__name', 'state__code',
+    ).annotate(
+        total=Count('id'),
+        theory=Count('id', filter=Q(has_theory=True)),
+    ).order_by()
+
+    # 2) Category histogram per city
+    Through = StudentLead.categories.through
+    category_rows = Through.objects.filter(
+        studentlead__city__isnull=False,
+        studentlead__state__isnull=False,
+    ).values(
+        'studentlead__city_id', 'categorycnh__code',
+    ).annotate(total=Count('id')).order_by()
+
+    categories_by_city = defaultdict(dict)
+    for row in category_rows:
+        categories_by_city[row['studentlead__city_id']][row['categorycnh__code']] = row['total']
+
+    # Cities sharing the same normalized key (duplicated names) are merged,
+    # as the geocache is keyed by name|UF.
+    cities_data = {}
+    for row in city_rows:
+        city_key = CityGeoCache.normalize_city_key(row['city__name'], row['state__code'])
+        city_data = cities_data.setdefault(city_key, {
+            'city': row['city__name'],
+            'uf': row['state__code'],
+            'city_ids': [],
+            'lat': None,
+            'lng': None,
+            'count': 0,
+            'categories': defaultdict(int),
+            'with_theory': 0,
+        })
+        city_data['city_ids'].append(row['city_id'])
+        city_data['count'] += row['total']
+        city_data['with_theory'] += row['theory']
+        for code, total in categories_by_city.get(row['city_id'], {}).items():
+            city_data['categories'][code] += total
+
+    # 3) Coordinates, one lookup for every city not in the LRU
+    for city_key, (lat, lng) in city_coords.get_many_by_key(cities_data).items():
+        cities_data[city_key]['lat'] = float(lat)
+        cities_data[city_key]['lng'] = float(lng)
+
+    cities_list = []
+    cities_without_coords = 0
+    for city_data in cities_data.values():
+        if city_data['lat'] is not None and city_data['lng'] is not None:
+            city_data['categories'] = dict(city_data['categories'])
+            cities_list.append(city_data)
+        else:
+            cities_without_coords += 1
+
+    if cities_without_coords:
+        logger.warning(f"Map cities: {cities_without_coords} cities without coordinates")
+
+    return {
+        'cities': cities_list,
+        'stats': {
+            'total_cities': len(cities_list),
+            'total_students': sum(c['count'] for c in cities_list),
+            'cities_without_coords': cities_without_coords,
+        },
+    }
+
+
+def get_map_cities_data():
+    """Cached build_map_cities()."""
+    return map_cities_cache.get_or_set('data', build_map_cities)
+
+
+def invalidate_map_cities():
+    map_cities_cache.invalidate()
+
+
+def can_view_student_details(user):
+    """Only staff and support accounts may see individual leads on the map."""
+    if not user.is_authenticated:
+        return False
+    if user.is_staff:
+        return True
+    profile = getattr(user, 'profile', None)
+    return bool(profile and profile.is_admin_support)
+
+
+def get_city_students(city_ids, after=0, limit=CITY_STUDENTS_PAGE_SIZE):
+    """
+    One page of leads of the given cities (a map entry's "city_ids"),
+    ordered by id. Returns (rows, next_cursor).
+    """
+    leads = list(
+        _located_leads().filter(city_id__in=city_ids, id__gt=after)
+        .order_by('id').prefetch_related('categories')[:limit + 1]
+    )
+    rows = [
+        {
+            'id': lead.id,
+            'name': lead.name,
+            'categories': sorted(category.code for category in lead.categories.all()),
+            'has_theory': lead.has_theory,
+        }
+        for lead in leads[:limit]
+    ]
+    next_cursor = rows[-1]['id'] if len(leads) > limit else None
+    return rows, next_cursor
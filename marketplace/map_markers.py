@@ -0,0 +1,229 @@
+"""
+Precomputed instructor map markers.
+
+Markers live in InstructorMapMarker (one row per visible + verified instructor,
+coordinates already resolved) and are kept up to date by the signals in
+signals_map_markers.py. The serialized JSON blob is cached per table version,
+so the map views only embed a ready-made byte string.
+"""
+import json
+import logging
+from decimal import Decimal
+
+from core.cache import CacheNamespace
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Value
+from django.db.models.functions import Floor
+
+from .models import InstructorProfile, InstructorMapMarker, CityGeoCache
+
+logger = logging.getLogger(__name__)
+
+MARKERS_CACHE_TIMEOUT = 60 * 60  # 1 hour; the key already changes on every update
+markers_cache = CacheNamespace('map_markers', timeout=MARKERS_CACHE_TIMEOUT)
+
+# Viewport API (api_views.get_map_markers)
+CLUSTER_MAX_ZOOM = 8  # at this zoom level and below markers are grouped on a grid
+CLUSTER_CELLS_PER_TILE = 4  # grid cells per 256px map tile (~64px per cell)
+MARKER_FIELDS = ['id', 'lat', 'lng', 'first_name', 'last_name', 'city', 'uf', 'state']
+
+
+def eligible_instructors():
+    """Instructors that may appear on the map (same rule as cities_list_view)."""
+    return InstructorProfile.objects.filter(
+        is_visible=True,
+        is_verified=True,
+    ).select_related('user', 'city', 'city__state')
+
+
+def _load_geo_cache(instructors):
+    """Fetch the CityGeoCache rows needed by instructors without own coordinates."""
+    keys = {
+        CityGeoCache.normalize_city_key(inst.city.name, inst.city.state.code)
+        for inst in instructors
+        if inst.latitude is None or inst.longitude is None
+    }
+    if not keys:
+        return {}
+    return {
+        entry.city_key: entry
+        for entry in CityGeoCache.objects.filter(city_key__in=keys, geocoded=True)
+    }
+
+
+def resolve_coordinates(instructor, geo_cache):
+    """
+    Return (lat, lng) for an instructor: own address first, then the city
+    geocache. Returns (None, None) when neither is available.
+    """
+    lat, lng = instructor.latitude, instructor.longitude
+    if lat is None or lng is None:
+        key = CityGeoCache.normalize_city_key(instructor.city.name, instructor.city.state.code)
+        entry = geo_cache.get(key)
+        if entry and entry.latitude is not None and entry.longitude is not None:
+            return entry.latitude, entry.longitude
+        return None, None
+    return lat, lng
+
+
+def _marker_fields(instructor, lat, lng):
+    return {
+        'first_name': instructor.user.first_name,
+        'last_name': instructor.user.last_name,
+        'latitude': lat,
+        'longitude': lng,
+        'city_name': instructor.city.name,
+        'state_code': instructor.city.state.code,
+        'state_name': instructor.city.state.name,
+    }
+
+
+def refresh_instructor_markers(instructor_ids):
+    """
+    Recompute the markers of the given instructors.
+    Creates/updates rows for eligible instructors with coordinates and drops
+    the rows of everyone else in the list.
+    """
+    ids = set(instructor_ids)
+    if not ids:
+        return
+
+    instructors = list(eligible_instructors().filter(pk__in=ids))
+    geo_cache = _load_geo_cache(instructors)
+
+    kept = set()
+    for inst in instructors:
+        lat, lng = resolve_coordinates(inst, geo_cache)
+        if lat is None or lng is None:
+            continue
+        InstructorMapMarker.objects.update_or_create(
+            instructor=inst,
+            defaults=_marker_fields(inst, lat, lng),
+        )
+        kept.add(inst.pk)
+
+    stale = ids - kept
+    if stale:
+        InstructorMapMarker.objects.filter(instructor_id__in=stale).delete()
+
+
+def rebuild_all_markers(batch_size=500):
+    """Rebuild the whole marker table from scratch. Returns the marker count."""
+    instructors = list(eligible_instructors())
+    geo_cache = _load_geo_cache(instructors)
+
+    markers = []
+    for inst in instructors:
+        lat, lng = resolve_coordinates(inst, geo_cache)
+        if lat is None or lng is None:
+            continue
+        markers.append(InstructorMapMarker(instructor=inst, **_marker_fields(inst, lat, lng)))
+
+    with transaction.atomic():
+        InstructorMapMarker.objects.all().delete()
+        InstructorMapMarker.objects.bulk_create(markers, batch_size=batch_size)
+
+    logger.info(f"Map markers rebuilt: {len(markers)} markers")
+    return len(markers)
+
+
+def markers_stamp():
+    """Return (row count, last update) of the marker table."""
+    stats = InstructorMapMarker.objects.aggregate(total=Count('pk'), last=Max('updated_at'))
+    return stats['total'], stats['last']
+
+
+def markers_version(stamp=None):
+    """Cheap version stamp of the marker table (row count + last update)."""
+    total, last = stamp or markers_stamp()
+    last_ms = int(last.timestamp() * 1000) if last else 0
+    return f"{total}-{last_ms}"
+
+
+def serialize_markers(queryset):
+    """
+    Serialize markers to compact JSON bytes.
+    Keeps the legacy key names used by the map templates.
+    """
+    rows = queryset.values_list(
+        'instructor_id', 'first_name', 'last_name', 'latitude', 'longitude',
+        'city_name', 'state_code', 'state_name',
+    )
+    data = [
+        {
+            'id': pk,
+            'user__first_name': first_name,
+            'user__last_name': last_name,
+            'latitude': float(lat),
+            'longitude': float(lng),
+            'city__name': city_name,
+            'city__state__code': state_code,
+            'city__state__name': state_name,
+        }
+        for pk, first_name, last_name, lat, lng, city_name, state_code, state_name in rows
+    ]
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def get_markers_blob():
+    """Return the JSON bytes with every map marker, served from cache when possible."""
+    return markers_cache.get_or_set(
+        f'blob:{markers_version()}',
+        lambda: serialize_markers(InstructorMapMarker.objects.all()),
+    )
+
+
+def markers_in_bbox(west, south, east, north):
+    """Markers inside a viewport (uses the latitude/longitude index)."""
+    return InstructorMapMarker.objects.filter(
+        latitude__gte=south, latitude__lte=north,
+        longitude__gte=west, longitude__lte=east,
+    )
+
+
+def marker_rows(queryset):
+    """Compact rows in MARKER_FIELDS order."""
+    rows = queryset.values_list(
+        'instructor_id', 'latitude', 'longitude', 'first_name', 'last_name',
+        'city_name', 'state_code', 'state_name',
+    )
+    return [
+        [pk, float(lat), float(lng), first_name, last_name, city_name, state_code, state_name]
+        for pk, lat, lng, first_name, last_name, city_name, state_code, state_name in rows
+    ]
+
+
+def grid_cell_size(zoom):
+    """Grid cell size in degrees for a zoom level (a tile spans 360 / 2^zoom degrees)."""
+    return Decimal(360) / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+
+
+def cluster_markers(queryset, zoom):
+    """
+    Group markers on a fixed lat/lng grid in the database.
+    Returns (clusters, single_ids): clusters as [lat, lng, count] for cells with
+    more than one marker, and the instructor ids of cells holding just one.
+    """
+    cell = Value(grid_cell_size(zoom))
+    cells = queryset.annotate(
+        cell_y=Floor(F('latitude') / cell),
+        cell_x=Floor(F('longitude') / cell),
+    ).values('cell_y', 'cell_x').annotate(
+        total=Count('pk'),
+        avg_lat=Avg('latitude'),
+        avg_lng=Avg('longitude'),
+        any_id=Min('instructor_id'),
+    ).order_by()
+
+    clusters = []
+    single_ids = []
+    for row in cells:
+        if row['total'] == 1:
+            single_ids.append(row['any_id'])
+        else:
+            clusters.append([
+                round(float(row['avg_lat']), 5),
+                round(float(row['avg_lng']), 5),
+                row['total'],
+            ])
+    return clusters, single_ids
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.27 on 2026-10-16 22:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import unicodedata
+
+
+def _city_key(city_name, state_code):
+    # Same format as CityGeoCache.normalize_city_key
+    city_clean = unicodedata.normalize('NFKD', city_name).encode('ASCII', 'ignore').decode('ASCII')
+    return f"{city_clean.strip().lower()}|{state_code.strip().upper()}"
+
+
+def backfill_markers(apps, schema_editor):
+    InstructorProfile = apps.get_model('marketplace', 'InstructorProfile')
+    InstructorMapMarker = apps.get_model('marketplace', 'InstructorMapMarker')
+    CityGeoCache = apps.get_model('marketplace', 'CityGeoCache')
+
+    geo_cache = {
+        entry.city_key: entry
+        for entry in CityGeoCache.objects.filter(geocoded=True)
+    }
+    markers = []
+    instructors = InstructorProfile.objects.filter(
+        is_visible=True, is_verified=True
+    ).select_related('user', 'city', 'city__state')
+    for inst in instructors:
+        lat, lng = inst.latitude, inst.longitude
+        if lat is None or lng is None:
+            entry = geo_cache.get(_city_key(inst.city.name, inst.city.state.code))
+            if not entry or entry.latitude is None or entry.longitude is None:
+                continue
+            lat, lng = entry.latitude, entry.longitude
+        markers.append(InstructorMapMarker(
+            instructor=inst,
+            first_name=inst.user.first_name,
+            last_name=inst.user.last_name,
+            latitude=lat,
+            longitude=lng,
+            city_name=inst.city.name,
+            state_code=inst.city.state.code,
+            state_name=inst.city.state.name,
+        ))
+    InstructorMapMarker.objects.bulk_create(markers, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0018_remove_instructorprofile_marketplace_pioneer_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstructorMapMarker',
+            fields=[
+                ('instructor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='map_marker', serialize=False, to='marketplace.instructorprofile', verbose_name='Instrutor')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='Nome')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='Sobrenome')),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9, verbose_name='Latitude')),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9, verbose_name='Longitude')),
+                ('city_name', models.CharField(max_length=100, verbose_name='Cidade')),
+                ('state_code', models.CharField(max_length=2, verbose_name='UF')),
+                ('state_name', models.CharField(max_length=100, verbose_name='Estado')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Marcador do Mapa',
+                'verbose_name_plural': 'Marcadores do Mapa',
+                'ordering': ['instructor'],
+                'indexes': [models.Index(fields=['latitude', 'longitude'], name='marketplace_latitud_c2facb_idx'), models.Index(fields=['updated_at'], name='marketplace_updated_bee69b_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_markers, migrations.RunPython.noop),
+    ]
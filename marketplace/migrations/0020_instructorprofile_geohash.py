@@ -0,0 +1,32 @@
+# Generated by Django 4.2.27 on 2026-10-16 22:53
+
+from django.db import migrations, models
+
+from marketplace.geo import encode_geohash
+
+
+def backfill_geohash(apps, schema_editor):
+    InstructorProfile = apps.get_model('marketplace', 'InstructorProfile')
+    instructors = InstructorProfile.objects.filter(
+        latitude__isnull=False, longitude__isnull=False,
+    ).only('pk', 'latitude', 'longitude')
+    for instructor in instructors.iterator():
+        InstructorProfile.objects.filter(pk=instructor.pk).update(
+            geohash=encode_geohash(instructor.latitude, instructor.longitude)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0019_instructormapmarker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instructorprofile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Célula geohash das coordenadas (atualizada automaticamente)', max_length=12, verbose_name='Geohash'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.27 on 2026-10-16 22:55
+
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Frozen copy of marketplace.lead_access.compute_lead_access at this migration
+def _end_of_day(day):
+    return datetime.combine(day + timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+
+
+def compute_lead_access(instructor, subscriptions, now):
+    today = now.date()
+    sources = []
+    if instructor.is_pioneer and instructor.pioneer_free_until and instructor.pioneer_free_until >= today:
+        sources.append(('pioneer_active', _end_of_day(instructor.pioneer_free_until)))
+    if instructor.is_trial_active and (not instructor.trial_end_date or now <= instructor.trial_end_date):
+        sources.append(('trial_active', instructor.trial_end_date))
+    for sub in subscriptions:
+        if sub.start_date <= today and (sub.end_date is None or sub.end_date >= today):
+            sources.append(('subscription_active', _end_of_day(sub.end_date) if sub.end_date else None))
+
+    if not sources:
+        if instructor.trial_end_date and instructor.is_trial_active:
+            return 'trial_expired', None
+        return 'no_access', None
+    ends = [until for _, until in sources]
+    return sources[0][0], None if None in ends else max(ends)
+
+
+def backfill_lead_access(apps, schema_editor):
+    InstructorProfile = apps.get_model('marketplace', 'InstructorProfile')
+    Subscription = apps.get_model('billing', 'Subscription')
+    now = timezone.now()
+    active = {}
+    for sub in Subscription.objects.filter(status='ACTIVE'):
+        active.setdefault(sub.instructor_id, []).append(sub)
+    for instructor in InstructorProfile.objects.all().iterator():
+        state, until = compute_lead_access(instructor, active.get(instructor.pk, []), now)
+        InstructorProfile.objects.filter(pk=instructor.pk).update(
+            access_state=state, lead_access_until=until,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0020_instructorprofile_geohash'),
+        ('billing', '0002_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instructorprofile',
+            name='access_state',
+            field=models.CharField(choices=[('pioneer_active', 'Pioneiro'), ('trial_active', 'Trial'), ('subscription_active', 'Assinatura'), ('trial_expired', 'Trial expirado'), ('no_access', 'Sem acesso')], default='no_access', editable=False, max_length=20, verbose_name='Situação de Acesso'),
+        ),
+        migrations.AddField(
+            model_name='instructorprofile',
+            name='lead_access_until',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Fim do acesso atual (vazio = sem data de término)', null=True, verbose_name='Acesso a Leads até'),
+        ),
+        migrations.AddIndex(
+            model_name='instructorprofile',
+            index=models.Index(fields=['access_state', 'lead_access_until'], name='marketplace_access__fd8863_idx'),
+        ),
+        migrations.RunPython(backfill_lead_access, migrations.RunPython.noop),
+    ]
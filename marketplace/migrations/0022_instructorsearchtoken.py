@@ -0,0 +1,86 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:04
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Frozen copy of the marketplace.search tokenizer at this migration
+STOP_WORDS = {'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'na', 'no', 'a', 'o'}
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+BATCH_SIZE = 500
+
+
+def fold(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return text.encode('ASCII', 'ignore').decode('ASCII').lower()
+
+
+def tokenize(text):
+    return [token[:40] for token in _TOKEN_RE.findall(fold(text)) if len(token) >= 2 and token not in STOP_WORDS]
+
+
+def build_document(instructor):
+    weighted = {}
+
+    def add(tokens, weight, prefixes=True):
+        for token in tokens:
+            entries = [(token, weight * 2)]
+            if prefixes:
+                entries += [(token[:size], weight) for size in range(2, len(token))]
+            for key, value in entries:
+                if weighted.get(key, 0) < value:
+                    weighted[key] = value
+
+    add(tokenize(instructor.bio), 1, prefixes=False)
+    add(tokenize(instructor.neighborhoods_text), 3)
+    add([fold(cat.code) for cat in instructor.categories.all()], 4, prefixes=False)
+    add(tokenize(f"{instructor.city.name} {instructor.city.state.code}"), 5)
+    add(tokenize(f"{instructor.user.first_name} {instructor.user.last_name}"), 10)
+    return weighted
+
+
+def backfill_search_tokens(apps, schema_editor):
+    InstructorProfile = apps.get_model('marketplace', 'InstructorProfile')
+    InstructorSearchToken = apps.get_model('marketplace', 'InstructorSearchToken')
+    instructors = InstructorProfile.objects.select_related(
+        'user', 'city', 'city__state',
+    ).prefetch_related('categories').order_by('pk')
+    rows = []
+    for inst in instructors.iterator(chunk_size=BATCH_SIZE):
+        rows += [
+            InstructorSearchToken(instructor_id=inst.pk, token=token, weight=weight)
+            for token, weight in build_document(inst).items()
+        ]
+        if len(rows) >= 1000:
+            InstructorSearchToken.objects.bulk_create(rows)
+            rows = []
+    InstructorSearchToken.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0021_instructorprofile_lead_access'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstructorSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=40, verbose_name='Termo')),
+                ('weight', models.PositiveSmallIntegerField(default=1, verbose_name='Peso')),
+                ('instructor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='marketplace.instructorprofile', verbose_name='Instrutor')),
+            ],
+            options={
+                'verbose_name': 'Termo de Busca',
+                'verbose_name_plural': 'Termos de Busca',
+                'indexes': [models.Index(fields=['token', 'weight', 'instructor'], name='marketplace_token_0a97bb_idx')],
+                'unique_together': {('instructor', 'token')},
+            },
+        ),
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0022_instructorsearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='instructorprofile',
+            index=models.Index(fields=['city', 'is_visible', 'is_verified', 'created_at', 'id'], name='marketplace_city_id_1243c5_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='instructorprofile',
+            name='marketplace_city_id_06a90a_idx',
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:41
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0023_instructorprofile_listing_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Nome')),
+                ('tokens', models.FloatField(default=0, verbose_name='Tokens')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Limite de Requisições',
+                'verbose_name_plural': 'Limites de Requisições',
+            },
+        ),
+        migrations.CreateModel(
+            name='GeocodingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city_key', models.CharField(max_length=200, unique=True, verbose_name='Chave Cidade')),
+                ('city_name', models.CharField(max_length=100, verbose_name='Cidade')),
+                ('state_code', models.CharField(max_length=2, verbose_name='UF')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendente'), ('RUNNING', 'Em execução'), ('DONE', 'Concluído'), ('FAILED', 'Falhou')], default='PENDING', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Próxima tentativa (backoff) ou fim da reserva de um job em execução', verbose_name='Executar após')),
+                ('last_error', models.CharField(blank=True, max_length=255, verbose_name='Último erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Job de Geocoding',
+                'verbose_name_plural': 'Fila de Geocoding',
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='marketplace_status_054a50_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0024_geocoding_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressGeoCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address_key', models.CharField(help_text='SHA-1 do endereço normalizado', max_length=40, unique=True, verbose_name='Chave Endereço')),
+                ('address', models.CharField(max_length=400, verbose_name='Endereço normalizado')),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Latitude')),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Longitude')),
+                ('geocoded', models.BooleanField(default=False, verbose_name='Geocodificado')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Cache de Endereço',
+                'verbose_name_plural': 'Cache de Endereços',
+            },
+        ),
+    ]
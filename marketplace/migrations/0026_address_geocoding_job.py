@@ -0,0 +1,34 @@
+# Generated by Django 4.2.27 on 2026-10-17 00:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0025_addressgeocache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AddressGeocodingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendente'), ('RUNNING', 'Em execução'), ('DONE', 'Concluído'), ('FAILED', 'Falhou')], default='PENDING', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, help_text='Próxima tentativa (backoff) ou fim da reserva de um job em execução', verbose_name='Executar após')),
+                ('last_error', models.CharField(blank=True, max_length=255, verbose_name='Último erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('instructor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='address_geocoding_job', to='marketplace.instructorprofile', verbose_name='Instrutor')),
+            ],
+            options={
+                'verbose_name': 'Job de Geocoding de Endereço',
+                'verbose_name_plural': 'Fila de Geocoding de Endereços',
+                'ordering': ['run_after', 'id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='marketplace_status_0d61f7_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
 """
 Models for marketplace app - Cities, Instructors, Categories, and Leads.
 """
+import unicodedata
+from functools import lru_cache
+
 from django.db import models
 from django.db.models import Q
 from django.contrib.auth.models import User
@@ -138,9 +141,9 @@ class CityGeoCache(models.Model):
         return f"{status} {self.city_name}/{self.state_code}"
     
     @staticmethod
+    @lru_cache(maxsize=8192)
     def normalize_city_key(city_name, state_code):
-        """Create normalized key for city"""
-        import unicodedata
+        """Create normalized key for city (memoized: Brazil has ~5,570 municipalities)"""
         # Remove accents and lowercase
         city_clean = unicodedata.normalize('NFKD', city_name).encode('ASCII', 'ignore').decode('ASCII')
         city_clean = city_clean.strip().lower()
@@ -148,6 +151,129 @@ class CityGeoCache(models.Model):
         return f"{city_clean}|{state_clean}"
 
 
+class AddressGeoCache(models.Model):
+    """
+    Coordinates of instructor addresses (see geocoding.py), keyed by the
+    normalized CEP/street/neighborhood/city/UF, so an address is geocoded
+    once no matter how often the profile is saved.
+    """
+    address_key = models.CharField('Chave Endereço', max_length=40, unique=True, help_text='SHA-1 do endereço normalizado')
+    address = models.CharField('Endereço normalizado', max_length=400)
+    latitude = models.DecimalField('Latitude', max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField('Longitude', max_digits=9, decimal_places=6, null=True, blank=True)
+    geocoded = models.BooleanField('Geocodificado', default=False)
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Cache de Endereço'
+        verbose_name_plural = 'Cache de Endereços'
+
+    def __str__(self):
+        return f"{'✓' if self.geocoded else '✗'} {self.address}"
+
+
+class GeocodingJobStatus(models.TextChoices):
+    PENDING = 'PENDING', 'Pendente'
+    RUNNING = 'RUNNING', 'Em execução'
+    DONE = 'DONE', 'Concluído'
+    FAILED = 'FAILED', 'Falhou'
+
+
+class GeocodingJob(models.Model):
+    """
+    Geocoding queue (see geocoding_queue.py): one row per city_key, so a
+    city is never queued twice. Processed by `manage.py run_geocoding_queue`.
+    """
+    city_key = models.CharField('Chave Cidade', max_length=200, unique=True)
+    city_name = models.CharField('Cidade', max_length=100)
+    state_code = models.CharField('UF', max_length=2)
+    status = models.CharField(
+        'Status',
+        max_length=10,
+        choices=GeocodingJobStatus.choices,
+        default=GeocodingJobStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField('Tentativas', default=0)
+    run_after = models.DateTimeField(
+        'Executar após',
+        default=timezone.now,
+        help_text='Próxima tentativa (backoff) ou fim da reserva de um job em execução',
+    )
+    last_error = models.CharField('Último erro', max_length=255, blank=True)
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Job de Geocoding'
+        verbose_name_plural = 'Fila de Geocoding'
+        ordering = ['run_after', 'id']
+        indexes = [
+            # Covers the worker claim: WHERE status IN (...) AND run_after <= now ORDER BY run_after
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.city_name}/{self.state_code} ({self.get_status_display()})"
+
+
+class AddressGeocodingJob(models.Model):
+    """
+    Address geocoding queue (see geocoding_queue.py): one row per instructor,
+    for the address the profile has when the job runs. Processed by
+    `manage.py run_geocoding_queue` together with the city jobs.
+    """
+    instructor = models.OneToOneField(
+        'InstructorProfile',
+        on_delete=models.CASCADE,
+        related_name='address_geocoding_job',
+        verbose_name='Instrutor',
+    )
+    status = models.CharField(
+        'Status',
+        max_length=10,
+        choices=GeocodingJobStatus.choices,
+        default=GeocodingJobStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField('Tentativas', default=0)
+    run_after = models.DateTimeField(
+        'Executar após',
+        default=timezone.now,
+        help_text='Próxima tentativa (backoff) ou fim da reserva de um job em execução',
+    )
+    last_error = models.CharField('Último erro', max_length=255, blank=True)
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Job de Geocoding de Endereço'
+        verbose_name_plural = 'Fila de Geocoding de Endereços'
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"Instrutor {self.instructor_id} ({self.get_status_display()})"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Token bucket shared by every process calling a rate-limited external
+    API (e.g. Nominatim); see geocoding_service.TokenBucket.
+    """
+    name = models.CharField('Nome', max_length=50, unique=True)
+    tokens = models.FloatField('Tokens', default=0)
+    updated_at = models.DateTimeField('Atualizado em', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Limite de Requisições'
+        verbose_name_plural = 'Limites de Requisições'
+
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.2f}"
+
+
 class CategoryCNH(models.Model):
     """CNH categories (ACC, A, B, C, D, E, AB, AC, AD, AE, ...)"""
     code = models.CharField(
@@ -185,6 +311,15 @@ class GenderChoices(models.TextChoices):
     OTHER = 'O', 'Outro'
 
 
+class AccessStateChoices(models.TextChoices):
+    """Why an instructor can (or cannot) receive leads (see lead_access.py)"""
+    PIONEER_ACTIVE = 'pioneer_active', 'Pioneiro'
+    TRIAL_ACTIVE = 'trial_active', 'Trial'
+    SUBSCRIPTION_ACTIVE = 'subscription_active', 'Assinatura'
+    TRIAL_EXPIRED = 'trial_expired', 'Trial expirado'
+    NO_ACCESS = 'no_access', 'Sem acesso'
+
+
 class InstructorProfile(models.Model):
     """
     Extended profile for instructors with professional information.
@@ -209,6 +344,14 @@ class InstructorProfile(models.Model):
     address_zip = models.CharField('CEP', max_length=10, blank=True)
     latitude = models.DecimalField('Latitude', max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField('Longitude', max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(
+        'Geohash',
+        max_length=12,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text='Célula geohash das coordenadas (atualizada automaticamente)'
+    )
     
     # Professional Info
     bio = models.TextField('Sobre mim', max_length=1000, blank=True, help_text='Descreva sua experiência')
@@ -369,6 +512,22 @@ class InstructorProfile(models.Model):
         help_text='Data até a qual o pioneiro possui plano gratuito (60 dias)'
     )
     
+    # Lead access (denormalized from pioneer/trial/subscriptions, see lead_access.py)
+    access_state = models.CharField(
+        'Situação de Acesso',
+        max_length=20,
+        choices=AccessStateChoices.choices,
+        default=AccessStateChoices.NO_ACCESS,
+        editable=False,
+    )
+    lead_access_until = models.DateTimeField(
+        'Acesso a Leads até',
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Fim do acesso atual (vazio = sem data de término)'
+    )
+    
     # Metadata
     created_at = models.DateTimeField('Criado em', auto_now_add=True)
     updated_at = models.DateTimeField('Atualizado em', auto_now=True)
@@ -378,9 +537,11 @@ class InstructorProfile(models.Model):
         verbose_name_plural = 'Perfis de Instrutores'
         ordering = ['-is_verified', '-created_at']
         indexes = [
-            models.Index(fields=['city', 'is_visible', 'is_verified']),
+            # Also serves the keyset pagination of city listings (see pagination.py)
+            models.Index(fields=['city', 'is_visible', 'is_verified', 'created_at', 'id']),
             models.Index(fields=['gender']),
             models.Index(fields=['has_own_car']),
+            models.Index(fields=['access_state', 'lead_access_until']),
         ]
     
     def __str__(self):
@@ -390,6 +551,43 @@ class InstructorProfile(models.Model):
         """URL for instructor detail page"""
         return reverse('marketplace:instructor_detail', kwargs={'pk': self.pk})
     
+    def save(self, *args, **kwargs):
+        """Keep the geohash cell in sync with the coordinates."""
+        from .geo import encode_geohash
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'}.intersection(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        
+        # Keep the denormalized lead access in sync with pioneer/trial changes
+        # (subscription changes are handled by the billing signals)
+        from .lead_access import ACCESS_SOURCE_FIELDS, compute_lead_access
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            access_changed = self._state.adding or self._access_sources() != getattr(self, '_loaded_access_sources', None)
+        else:
+            access_changed = bool(ACCESS_SOURCE_FIELDS.intersection(update_fields))
+        if access_changed:
+            self.access_state, self.lead_access_until = compute_lead_access(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'access_state', 'lead_access_until'}
+        super().save(*args, **kwargs)
+        self._loaded_access_sources = self._access_sources()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_access_sources = instance._access_sources()
+        return instance
+
+    def _access_sources(self):
+        """Loaded values of the fields the lead access depends on (deferred ones left out)."""
+        from .lead_access import ACCESS_SOURCE_FIELDS
+        return {name: self.__dict__[name] for name in ACCESS_SOURCE_FIELDS if name in self.__dict__}
+    
     def activate_trial(self):
         """Activate 14-day free trial"""
         from django.utils import timezone
@@ -420,22 +618,23 @@ class InstructorProfile(models.Model):
     def has_active_subscription(self):
         """Check if instructor has an active paid subscription"""
         from billing.models import SubscriptionStatusChoices
-        from django.utils import timezone
+        from .lead_access import access_date
         
+        today = access_date()
         return self.subscriptions.filter(
             status=SubscriptionStatusChoices.ACTIVE,
-            start_date__lte=timezone.now().date()
+            start_date__lte=today
         ).filter(
-            Q(end_date__isnull=True) | Q(end_date__gte=timezone.now().date())
+            Q(end_date__isnull=True) | Q(end_date__gte=today)
         ).exists()
     
     def is_pioneer_active(self):
         """Return True if pioneer benefit is currently valid."""
-        from django.utils import timezone
+        from .lead_access import access_date
         return bool(
             self.is_pioneer
             and self.pioneer_free_until
-            and self.pioneer_free_until >= timezone.now().date()
+            and self.pioneer_free_until >= access_date()
         )
 
     def can_receive_leads(self):
@@ -445,27 +644,22 @@ class InstructorProfile(models.Model):
         - Pioneer benefit is active OR
         - Trial is active and not expired OR
         - Has an active paid subscription
-        """
-        # Pioneer benefit
-        if self.is_pioneer_active():
-            return True
-
-        # If trial is active and not expired
-        if self.is_trial_active and not self.is_trial_expired():
-            return True
         
-        # If has active subscription
-        if self.has_active_subscription():
-            return True
+        Reads the denormalized access_state / lead_access_until (no queries).
+        """
+        from django.utils import timezone
+        from .lead_access import ACTIVE_ACCESS_STATES
         
-        return False
+        if self.access_state not in ACTIVE_ACCESS_STATES:
+            return False
+        return self.lead_access_until is None or self.lead_access_until > timezone.now()
     
     def get_access_status(self):
         """
         Get detailed access status for instructor.
         Returns dict with status info.
         """
-        from django.utils import timezone
+        from .lead_access import access_date
         
         status = {
             'can_receive_leads': False,
@@ -475,39 +669,33 @@ class InstructorProfile(models.Model):
             'has_subscription': False,
             'is_pioneer': False,
         }
-
-        # Pioneer benefit takes priority
-        if self.is_pioneer_active():
-            delta = self.pioneer_free_until - timezone.now().date()
-            status['can_receive_leads'] = True
-            status['is_pioneer'] = True
-            status['days_remaining'] = delta.days
-            status['reason'] = 'pioneer_active'
-            return status
-
-        # Check trial
-        if self.is_trial_active and not self.is_trial_expired():
-            status['can_receive_leads'] = True
-            status['is_trial'] = True
-            status['days_remaining'] = self.days_until_trial_end()
-            status['reason'] = 'trial_active'
-            return status
         
-        # Check subscription
-        if self.has_active_subscription():
-            status['can_receive_leads'] = True
-            status['has_subscription'] = True
-            status['reason'] = 'subscription_active'
+        if not self.can_receive_leads():
+            # Trial expired and no subscription
+            if self.trial_end_date and self.is_trial_expired():
+                status['reason'] = AccessStateChoices.TRIAL_EXPIRED
+            else:
+                status['reason'] = AccessStateChoices.NO_ACCESS
             return status
         
-        # Trial expired and no subscription
-        if self.trial_end_date and self.is_trial_expired():
-            status['reason'] = 'trial_expired'
+        status['can_receive_leads'] = True
+        status['reason'] = self.access_state
+        if self.access_state == AccessStateChoices.PIONEER_ACTIVE:
+            status['is_pioneer'] = True
+            status['days_remaining'] = (self.pioneer_free_until - access_date()).days
+        elif self.access_state == AccessStateChoices.TRIAL_ACTIVE:
+            status['is_trial'] = True
+            status['days_remaining'] = self.days_until_trial_end()
         else:
-            status['reason'] = 'no_access'
-        
+            status['has_subscription'] = True
         return status
     
+    def refresh_lead_access(self):
+        """Recompute access_state / lead_access_until and store them."""
+        from .lead_access import refresh_lead_access
+        refresh_lead_access([self.pk])
+        self.refresh_from_db(fields=['access_state', 'lead_access_until'])
+    
     @property
     def profile_completion_score(self):
         """
@@ -656,6 +844,69 @@ class InstructorProfile(models.Model):
         return f"https://wa.me/{phone}?text={encoded_message}"
 
 
+class InstructorMapMarker(models.Model):
+    """
+    Denormalized map marker for a visible + verified instructor.
+    Coordinates already resolved (own address first, CityGeoCache fallback).
+    Maintained by signals in signals_map_markers.py — never edit by hand.
+    """
+    instructor = models.OneToOneField(
+        InstructorProfile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='map_marker',
+        verbose_name='Instrutor'
+    )
+    first_name = models.CharField('Nome', max_length=150, blank=True)
+    last_name = models.CharField('Sobrenome', max_length=150, blank=True)
+    latitude = models.DecimalField('Latitude', max_digits=9, decimal_places=6)
+    longitude = models.DecimalField('Longitude', max_digits=9, decimal_places=6)
+    city_name = models.CharField('Cidade', max_length=100)
+    state_code = models.CharField('UF', max_length=2)
+    state_name = models.CharField('Estado', max_length=100)
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Marcador do Mapa'
+        verbose_name_plural = 'Marcadores do Mapa'
+        ordering = ['instructor']
+        indexes = [
+            models.Index(fields=['latitude', 'longitude']),
+            models.Index(fields=['updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name} ({self.city_name}/{self.state_code})"
+
+
+class InstructorSearchToken(models.Model):
+    """
+    Inverted search index: one row per (instructor, token or token prefix).
+    Tokens are accent-folded and lowercased (see search.py) and are kept
+    in sync by signals_search.py.
+    """
+    instructor = models.ForeignKey(
+        InstructorProfile,
+        on_delete=models.CASCADE,
+        related_name='search_tokens',
+        verbose_name='Instrutor'
+    )
+    token = models.CharField('Termo', max_length=40)
+    weight = models.PositiveSmallIntegerField('Peso', default=1)
+
+    class Meta:
+        verbose_name = 'Termo de Busca'
+        verbose_name_plural = 'Termos de Busca'
+        unique_together = [['instructor', 'token']]
+        indexes = [
+            # Covers the ranked lookup: WHERE token = ? ORDER BY weight DESC
+            models.Index(fields=['token', 'weight', 'instructor']),
+        ]
+
+    def __str__(self):
+        return f"{self.token} ({self.weight})"
+
+
 class LeadStatusChoices(models.TextChoices):
     """Lead status options"""
     NEW = 'NEW', 'Novo'
@@ -0,0 +1,154 @@
+"""
+Keyset (cursor) pagination for instructor listings.
+
+Instead of COUNT(*) + OFFSET, each page continues from the sort key of the
+last (or first) row of the previous page:
+
+    WHERE (is_verified, created_at, id) "after" (True, '2024-05-01…', 42)
+
+so deep pages cost the same as the first one. Cursors are opaque
+URL-safe tokens; totals come from a short-lived cached COUNT.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db.models import Q
+
+from core.cache import CacheNamespace
+
+DEFAULT_ORDERING = ('-is_verified', '-created_at', 'id')
+COUNT_CACHE_TIMEOUT = 60 * 5  # totals may lag a few minutes behind
+count_cache = CacheNamespace('listing_counts', timeout=COUNT_CACHE_TIMEOUT)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, values):
+    payload = [direction] + [
+        {'dt': value.isoformat()} if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, *values = json.loads(raw)
+        values = [
+            datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+            for value in values
+        ]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(token)
+    if direction not in ('n', 'p'):
+        raise InvalidCursor(token)
+    return direction, values
+
+
+def cached_count(queryset, timeout=None):
+    """COUNT(*) of a queryset, cached for a few minutes per SQL statement."""
+    try:
+        sql = str(queryset.order_by().query)
+    except EmptyResultSet:  # queryset.none()
+        return 0
+    key = hashlib.md5(sql.encode('utf-8')).hexdigest()
+    return count_cache.get_or_set(key, queryset.count, timeout)
+
+
+class CursorPage:
+    """One page of results; iterable like a Django Page."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Cursor paginator over a queryset ordered by `ordering` (field names,
+    "-" for descending). The last field must be unique (e.g. "id") so the
+    sort key identifies a row.
+    """
+
+    def __init__(self, queryset, per_page=12, ordering=DEFAULT_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _after(self, values, reverse=False):
+        """Q() for rows strictly after `values` in the ordering (before when reverse)."""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            step = Q(**{f'{name}__lt' if descending else f'{name}__gt': values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def get_page(self, cursor=None):
+        """Page after/before the cursor; the first page for a missing or bad cursor."""
+        direction, values = 'n', None
+        queryset = self.queryset
+        if cursor:
+            try:
+                direction, values = decode_cursor(cursor)
+                if len(values) != len(self.fields):
+                    raise InvalidCursor(cursor)
+                queryset = queryset.filter(self._after(values, reverse=direction == 'p'))
+            except (InvalidCursor, ValidationError, ValueError, TypeError):
+                # Tampered or stale token: start over
+                direction, values, queryset = 'n', None, self.queryset
+
+        backwards = direction == 'p'
+        ordering = self.ordering
+        if backwards:
+            ordering = [f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering]
+        queryset = queryset.order_by(*ordering)
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return CursorPage([])
+
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else values is not None
+        return CursorPage(
+            rows,
+            next_cursor=encode_cursor('n', self._key(rows[-1])) if has_next else None,
+            previous_cursor=encode_cursor('p', self._key(rows[0])) if has_previous else None,
+        )
@@ -0,0 +1,208 @@
+"""
+Instructor full-text search.
+
+Each instructor's search document (name, city, categories, neighborhoods and
+bio) is accent-folded, lowercased and split into tokens stored in
+InstructorSearchToken. Name, city and neighborhood tokens are also stored
+with their prefixes ("joao" → "jo", "joa"), so prefix matching is an exact
+lookup on the (token, weight, instructor) index on MySQL and SQLite alike.
+Whole words weigh twice their prefixes.
+
+All query terms must match: the rarest term drives the lookup and the other
+terms are checked per candidate through the unique (instructor, token) index
+(or aggregated in one pass when every term is common). Instructors are ranked
+by the sum of the matched weights.
+
+Terms shorter than PREFIX_MIN_LENGTH are only in the index as category codes
+("b"); any other one is left out of the AND. A query with no term left falls
+back to the old icontains lookup on the instructor's name.
+"""
+import logging
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+
+from .models import InstructorProfile, InstructorSearchToken
+
+logger = logging.getLogger(__name__)
+
+TOKEN_MAX_LENGTH = 40
+PREFIX_MIN_LENGTH = 2
+MAX_QUERY_TERMS = 5
+MAX_RESULTS = 500
+PER_CANDIDATE_LIMIT = 2000  # above this, multi-term queries are aggregated in one pass
+STOP_WORDS = {'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'na', 'no', 'a', 'o'}
+
+# Field weights in the search document
+WEIGHT_NAME = 10
+WEIGHT_CITY = 5
+WEIGHT_CATEGORY = 4
+WEIGHT_NEIGHBORHOOD = 3
+WEIGHT_BIO = 1
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    """Lowercase and strip accents ("João" → "joao")."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return text.encode('ASCII', 'ignore').decode('ASCII').lower()
+
+
+def tokenize(text, min_length=2):
+    """Accent-folded tokens of a text, without stop words."""
+    return [
+        token[:TOKEN_MAX_LENGTH]
+        for token in _TOKEN_RE.findall(fold(text))
+        if len(token) >= min_length and token not in STOP_WORDS
+    ]
+
+
+def document_weights(name, city, categories=(), neighborhoods='', bio=''):
+    """
+    {token: weight} for a search document (keeps the highest weight per token).
+    Bio words are indexed whole only, to keep the index small.
+    """
+    weighted = {}
+
+    def add(tokens, weight, prefixes=True):
+        for token in tokens:
+            entries = [(token, weight * 2)]
+            if prefixes:
+                entries += [(token[:size], weight) for size in range(PREFIX_MIN_LENGTH, len(token))]
+            for key, value in entries:
+                if weighted.get(key, 0) < value:
+                    weighted[key] = value
+
+    add(tokenize(bio), WEIGHT_BIO, prefixes=False)
+    add(tokenize(neighborhoods), WEIGHT_NEIGHBORHOOD)
+    add([fold(code) for code in categories], WEIGHT_CATEGORY, prefixes=False)
+    add(tokenize(city), WEIGHT_CITY)
+    add(tokenize(name), WEIGHT_NAME)
+    return weighted
+
+
+def build_document(instructor):
+    """Search document of an instructor: name, city/UF, categories, neighborhoods and bio."""
+    return document_weights(
+        name=f"{instructor.user.first_name} {instructor.user.last_name}",
+        city=f"{instructor.city.name} {instructor.city.state.code}",
+        categories=[cat.code for cat in instructor.categories.all()],
+        neighborhoods=instructor.neighborhoods_text,
+        bio=instructor.bio,
+    )
+
+
+def reindex_instructors(instructor_ids=None, batch_size=500):
+    """
+    Rebuild the search tokens of the given instructors (all when None).
+    Returns the number of instructors indexed.
+    """
+    queryset = InstructorProfile.objects.select_related(
+        'user', 'city', 'city__state',
+    ).prefetch_related('categories').order_by('pk')
+    if instructor_ids is not None:
+        instructor_ids = list(instructor_ids)
+        if not instructor_ids:
+            return 0
+        queryset = queryset.filter(pk__in=instructor_ids)
+
+    total = 0
+    batch = []
+
+    def flush(instructors):
+        rows = [
+            InstructorSearchToken(instructor_id=inst.pk, token=token, weight=weight)
+            for inst in instructors
+            for token, weight in build_document(inst).items()
+        ]
+        with transaction.atomic():
+            InstructorSearchToken.objects.filter(instructor_id__in=[inst.pk for inst in instructors]).delete()
+            InstructorSearchToken.objects.bulk_create(rows, batch_size=1000)
+
+    for instructor in queryset.iterator(chunk_size=batch_size):
+        batch.append(instructor)
+        if len(batch) >= batch_size:
+            flush(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        flush(batch)
+        total += len(batch)
+    return total
+
+
+def search_instructor_ids(query, limit=MAX_RESULTS, within=None):
+    """
+    Ranked instructor ids matching every term of `query`, best first.
+    `within` optionally restricts the search to an InstructorProfile queryset.
+    """
+    terms = [
+        term for term in dict.fromkeys(tokenize(query, min_length=1))
+        if len(term) >= PREFIX_MIN_LENGTH or InstructorSearchToken.objects.filter(token=term).exists()
+    ][:MAX_QUERY_TERMS]
+    if not terms:
+        return _name_contains_ids(query, limit, within)
+
+    if len(terms) == 1:
+        driver = terms[0]
+    else:
+        counts = {term: InstructorSearchToken.objects.filter(token=term).count() for term in terms}
+        driver = min(terms, key=counts.get)
+        if not counts[driver]:
+            return []
+
+    if len(terms) > 1 and counts[driver] > PER_CANDIDATE_LIMIT:
+        # Every term is common: one grouped pass beats a lookup per candidate
+        rows = InstructorSearchToken.objects.filter(token__in=terms)
+        if within is not None:
+            rows = rows.filter(instructor_id__in=within.values('pk'))
+        rows = rows.values('instructor_id').annotate(
+            matched=Count('pk'), score=Sum('weight'),
+        ).filter(matched=len(terms)).order_by('-score', '-instructor_id')
+        return list(rows.values_list('instructor_id', flat=True)[:limit])
+
+    rows = InstructorSearchToken.objects.filter(token=driver)
+    if within is not None:
+        rows = rows.filter(instructor_id__in=within.values('pk'))
+
+    score = F('weight')
+    for i, term in enumerate(t for t in terms if t != driver):
+        rows = rows.annotate(**{f'w{i}': Subquery(
+            InstructorSearchToken.objects.filter(
+                instructor_id=OuterRef('instructor_id'), token=term,
+            ).values('weight')[:1]
+        )}).filter(**{f'w{i}__isnull': False})
+        score = score + F(f'w{i}')
+
+    rows = rows.annotate(score=score).order_by('-score', '-instructor_id')
+    return list(rows.values_list('instructor_id', flat=True)[:limit])
+
+
+def _name_contains_ids(query, limit, within=None):
+    """Newest instructors whose first or last name contains `query`."""
+    query = (query or '').strip()
+    if not query:
+        return []
+    queryset = within if within is not None else InstructorProfile.objects.all()
+    return list(queryset.filter(
+        Q(user__first_name__icontains=query) | Q(user__last_name__icontains=query)
+    ).order_by('-created_at', '-pk').values_list('pk', flat=True)[:limit])
+
+
+def search_instructors(queryset, query, limit=MAX_RESULTS):
+    """
+    Filter an InstructorProfile queryset by `query`, ordered by relevance.
+    The rank is exposed as `search_rank` (0 = best).
+    """
+    ranked_ids = search_instructor_ids(query, limit=limit, within=queryset)
+    if not ranked_ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ranked_ids).annotate(
+        search_rank=Case(
+            *[When(pk=pk, then=Value(rank)) for rank, pk in enumerate(ranked_ids)],
+            output_field=IntegerField(),
+        )
+    ).order_by('search_rank')
@@ -2,10 +2,12 @@
 Signals for marketplace app.
 Handles automatic notifications when instructors register and statistics updates.
 """
-from django.db.models.signals import pre_save, post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import InstructorProfile, StudentLead, Lead, LeadStatusChoices
+from .models import InstructorProfile, StudentLead, Lead, LeadStatusChoices, CityGeoCache
+from .map_cities import invalidate_map_cities
+from . import city_coords
 
 
 @receiver(pre_save, sender=InstructorProfile)
@@ -89,3 +91,29 @@ def update_instructor_stats_on_lead_delete(sender, instance, **kwargs):
     """
     if instance.status == LeadStatusChoices.COMPLETED:
         instance.instructor.update_statistics()
+
+
+@receiver(post_save, sender=StudentLead)
+@receiver(post_delete, sender=StudentLead)
+@receiver(post_save, sender=CityGeoCache)
+@receiver(post_delete, sender=CityGeoCache)
+def invalidate_map_cities_on_change(sender, **kwargs):
+    """
+    Drop the cached student map (api/map/cities/) when leads or city
+    coordinates change.
+    """
+    invalidate_map_cities()
+
+
+@receiver(post_save, sender=CityGeoCache)
+@receiver(post_delete, sender=CityGeoCache)
+def invalidate_city_coords(sender, instance, **kwargs):
+    """Drop the city from this process' coordinate LRU (city_coords.py)."""
+    city_coords.invalidate(instance.city_key)
+
+
+@receiver(m2m_changed, sender=StudentLead.categories.through)
+def invalidate_map_cities_on_categories_change(sender, action, **kwargs):
+    """Category histograms change when a lead's categories change."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_map_cities()
@@ -0,0 +1,73 @@
+"""
+Signals that invalidate the cached instructor cards (see card_cache.py)
+when anything shown on a card changes.
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from accounts.models import Profile
+from reviews.models import Review
+from .models import InstructorProfile, City
+from .card_cache import bump_card_version
+
+
+def _bump_user_instructors(user_id):
+    bump_card_version(*InstructorProfile.objects.filter(user_id=user_id).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=InstructorProfile)
+def bump_card_on_instructor_save(sender, instance, **kwargs):
+    bump_card_version(instance.pk)
+
+
+def _profile_card_fields(profile):
+    # Read __dict__ directly so deferred fields are not loaded (None when deferred)
+    avatar = profile.__dict__.get('avatar')
+    return (getattr(avatar, 'name', avatar), profile.__dict__.get('whatsapp_number'))
+
+
+@receiver(post_init, sender=Profile)
+def remember_profile_card_fields(sender, instance, **kwargs):
+    instance._card_fields = _profile_card_fields(instance)
+
+
+@receiver(post_save, sender=Profile)
+def bump_card_on_profile_save(sender, instance, created, **kwargs):
+    """Avatar and WhatsApp number (every User save also saves the profile)."""
+    current = _profile_card_fields(instance)
+    if created or current == instance._card_fields:
+        return
+    instance._card_fields = current
+    _bump_user_instructors(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def bump_card_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    """Instructor name changes (logins only touch last_login)."""
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    _bump_user_instructors(instance.pk)
+
+
+@receiver(m2m_changed, sender=InstructorProfile.categories.through)
+def bump_card_on_categories_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # instance is a CategoryCNH; pk_set holds instructor ids (None on clear)
+        ids = pk_set if pk_set is not None else instance.instructors.values_list('pk', flat=True)
+        bump_card_version(*ids)
+    else:
+        bump_card_version(instance.pk)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_card_on_review_change(sender, instance, **kwargs):
+    bump_card_version(instance.instructor_id)
+
+
+@receiver(post_save, sender=City)
+def bump_card_on_city_save(sender, instance, created, **kwargs):
+    if not created:
+        bump_card_version(*InstructorProfile.objects.filter(city=instance).values_list('pk', flat=True))
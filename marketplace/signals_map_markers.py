@@ -0,0 +1,80 @@
+"""
+Signals that keep InstructorMapMarker in sync with instructors, users,
+cities, states and the city geocache.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import InstructorProfile, InstructorMapMarker, City, State, CityGeoCache
+from .map_markers import refresh_instructor_markers
+
+# InstructorProfile fields that affect the marker
+MARKER_FIELDS = {'is_visible', 'is_verified', 'latitude', 'longitude', 'city', 'city_id', 'user', 'user_id'}
+
+
+@receiver(post_save, sender=InstructorProfile)
+def refresh_marker_on_instructor_save(sender, instance, update_fields=None, **kwargs):
+    """Recompute the instructor marker unless only unrelated fields changed."""
+    if update_fields and not MARKER_FIELDS.intersection(update_fields):
+        return
+    refresh_instructor_markers([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def refresh_marker_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the instructor name on the marker in sync."""
+    if created:
+        return
+    if update_fields and not {'first_name', 'last_name'}.intersection(update_fields):
+        return
+    InstructorMapMarker.objects.filter(instructor__user_id=instance.pk).update(
+        first_name=instance.first_name,
+        last_name=instance.last_name,
+        updated_at=timezone.now(),
+    )
+
+
+@receiver(post_save, sender=City)
+def refresh_markers_on_city_save(sender, instance, created, **kwargs):
+    """City rename (or move to another state) changes its instructors' markers."""
+    if created:
+        return
+    refresh_instructor_markers(
+        InstructorProfile.objects.filter(city=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_save, sender=State)
+def refresh_markers_on_state_save(sender, instance, created, **kwargs):
+    """State rename changes the state name shown on the markers."""
+    if created:
+        return
+    InstructorMapMarker.objects.filter(state_code=instance.code).update(
+        state_name=instance.name,
+        updated_at=timezone.now(),
+    )
+
+
+def _refresh_markers_for_geocache(entry):
+    """Instructors relying on this city geocache entry (no own coordinates)."""
+    instructor_ids = InstructorProfile.objects.filter(
+        city__state__code=entry.state_code,
+        city__name__iexact=entry.city_name,
+    ).filter(
+        Q(latitude__isnull=True) | Q(longitude__isnull=True)
+    ).values_list('pk', flat=True)
+    refresh_instructor_markers(instructor_ids)
+
+
+@receiver(post_save, sender=CityGeoCache)
+def refresh_markers_on_geocache_save(sender, instance, created, **kwargs):
+    if created and not instance.geocoded:
+        return
+    _refresh_markers_for_geocache(instance)
+
+
+@receiver(post_delete, sender=CityGeoCache)
+def refresh_markers_on_geocache_delete(sender, instance, **kwargs):
+    _refresh_markers_for_geocache(instance)
@@ -0,0 +1,49 @@
+"""
+Signals that keep the instructor search index (InstructorSearchToken) in
+sync with instructors, users, categories and cities.
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, m2m_changed
+from django.dispatch import receiver
+from .models import InstructorProfile, City
+from .search import reindex_instructors
+
+# InstructorProfile fields that are part of the search document
+SEARCH_FIELDS = {'bio', 'neighborhoods_text', 'city', 'city_id', 'user', 'user_id'}
+
+
+@receiver(post_save, sender=InstructorProfile)
+def reindex_on_instructor_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    reindex_instructors([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def reindex_on_user_save(sender, instance, created, update_fields=None, **kwargs):
+    """Instructor name changes."""
+    if created:
+        return
+    if update_fields and not {'first_name', 'last_name'}.intersection(update_fields):
+        return
+    reindex_instructors(InstructorProfile.objects.filter(user=instance).values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=InstructorProfile.categories.through)
+def reindex_on_categories_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # instance is a CategoryCNH; pk_set holds instructor ids (None on clear)
+        ids = pk_set if pk_set is not None else instance.instructors.values_list('pk', flat=True)
+        reindex_instructors(list(ids))
+    else:
+        reindex_instructors([instance.pk])
+
+
+@receiver(post_save, sender=City)
+def reindex_on_city_save(sender, instance, created, **kwargs):
+    """City rename changes the documents of its instructors."""
+    if created:
+        return
+    reindex_instructors(InstructorProfile.objects.filter(city=instance).values_list('pk', flat=True))
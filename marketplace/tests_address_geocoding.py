@@ -0,0 +1,131 @@
+"""
+Tests for the instructor address geocoding (marketplace/geocoding.py).
+
+Casos cobertos:
+1. Salvar o perfil sem mudar o endereço (e já com coordenadas) não geocodifica.
+2. Endereço novo: nada de Nominatim no request; vai para a fila (AddressGeocodingJob),
+   o worker resolve e o resultado fica no AddressGeoCache.
+3. Endereço já conhecido (mesmo com acentos/espaços diferentes): coordenadas aplicadas
+   na hora, sem chamada externa nem job.
+4. Timeout do Nominatim: job reagendado com backoff, nada gravado no AddressGeoCache;
+   "não encontrado" de verdade fica em cache e o job falha.
+5. ViaCEP: resposta e CEP inexistente ficam em cache.
+"""
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.forms.models import model_to_dict
+from django.test import TestCase
+from geopy.exc import GeocoderTimedOut
+
+from accounts.models import RoleChoices
+from marketplace import geocoding
+from marketplace.geocoding import get_address_from_cep
+from marketplace.geocoding_queue import claim_next_job, run_address_job
+from marketplace.models import (
+    AddressGeoCache, AddressGeocodingJob, City, GeocodingJobStatus, InstructorProfile, State,
+)
+
+URL = '/instrutores/meu-perfil/editar/'
+NOMINATIM = 'marketplace.geocoding._geocode'
+FORM_FIELDS = (
+    'city', 'address_street', 'address_neighborhood', 'address_zip', 'bio', 'gender',
+    'age', 'years_experience', 'base_price_per_hour',
+)
+
+
+class InstructorAddressGeocodingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(code='SP', name='São Paulo')
+        cls.city = City.objects.create(state=state, name='São José dos Campos')
+        user = User.objects.create_user('inst', password='x')
+        user.profile.role = RoleChoices.INSTRUCTOR
+        user.profile.is_profile_complete = True
+        user.profile.save()
+        cls.instructor = InstructorProfile.objects.create(
+            user=user, city=cls.city, address_street='Rua A, 10', address_neighborhood='Centro',
+            address_zip='12210-000',
+        )
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(username='inst'))
+
+    def _post(self, **changes):
+        profile = model_to_dict(InstructorProfile.objects.get(pk=self.instructor.pk), fields=FORM_FIELDS)
+        data = {key: value for key, value in profile.items() if value is not None}
+        data.update(changes)
+        return self.client.post(URL, data)
+
+    def test_unchanged_address_is_not_geocoded(self):
+        InstructorProfile.objects.filter(pk=self.instructor.pk).update(
+            latitude=Decimal('-23.1'), longitude=Decimal('-45.9'),
+        )
+        with mock.patch('marketplace.views.geocode_instructor_profile_async') as geocode:
+            response = self._post(bio='Nova bio')
+        self.assertEqual(response.status_code, 302)
+        geocode.assert_not_called()
+
+    def _run_address_job(self):
+        return run_address_job(claim_next_job(AddressGeocodingJob))
+
+    def test_new_address_queued_for_the_worker(self):
+        location = SimpleNamespace(latitude=-23.19, longitude=-45.88)
+        with mock.patch(NOMINATIM, return_value=location) as nominatim:
+            response = self._post(address_street='Rua B, 20')
+            self.assertEqual(response.status_code, 302)
+            nominatim.assert_not_called()
+            self.assertEqual(AddressGeocodingJob.objects.get().status, GeocodingJobStatus.PENDING)
+
+            self.assertEqual(self._run_address_job(), GeocodingJobStatus.DONE)
+        profile = InstructorProfile.objects.get(pk=self.instructor.pk)
+        self.assertEqual(profile.latitude, Decimal('-23.19'))
+        self.assertTrue(AddressGeoCache.objects.get().geocoded)
+
+    def test_known_address_applied_without_external_call(self):
+        AddressGeoCache.objects.create(
+            address_key=geocoding.address_key('12210000|rua b, 20|centro|sao jose dos campos|SP'),
+            address='12210000|rua b, 20|centro|sao jose dos campos|SP',
+            latitude=Decimal('-23.19'), longitude=Decimal('-45.88'), geocoded=True,
+        )
+        with mock.patch(NOMINATIM) as nominatim:
+            response = self._post(address_street='  Rua  B, 20 ', address_neighborhood='CENTRO')
+        self.assertEqual(response.status_code, 302)
+        nominatim.assert_not_called()
+        self.assertFalse(AddressGeocodingJob.objects.exists())
+        self.assertEqual(InstructorProfile.objects.get(pk=self.instructor.pk).latitude, Decimal('-23.19'))
+
+    def test_timeout_is_retried_not_cached(self):
+        self._post(address_street='Rua C, 30')
+        with mock.patch(NOMINATIM, side_effect=GeocoderTimedOut('timeout')):
+            self.assertEqual(self._run_address_job(), GeocodingJobStatus.PENDING)
+        job = AddressGeocodingJob.objects.get()
+        self.assertGreater(job.run_after, job.updated_at)
+        self.assertIn('timeout', job.last_error)
+        self.assertFalse(AddressGeoCache.objects.exists())
+
+        # Nominatim answers, but knows no such address
+        AddressGeocodingJob.objects.update(run_after=job.updated_at)
+        with mock.patch(NOMINATIM, return_value=None):
+            self.assertEqual(self._run_address_job(), GeocodingJobStatus.FAILED)
+        self.assertFalse(AddressGeoCache.objects.get().geocoded)
+
+
+class ViaCepCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_responses_are_cached(self):
+        found = mock.Mock(status_code=200, json=lambda: {
+            'logradouro': 'Rua A', 'bairro': 'Centro', 'localidade': 'São José dos Campos', 'uf': 'SP',
+        })
+        missing = mock.Mock(status_code=200, json=lambda: {'erro': True})
+        with mock.patch('marketplace.geocoding.requests.get', side_effect=[found, missing]) as get:
+            self.assertEqual(get_address_from_cep('12210-000')['city'], 'São José dos Campos')
+            self.assertEqual(get_address_from_cep('12210000')['street'], 'Rua A')
+            self.assertIsNone(get_address_from_cep('99999-999'))
+            self.assertIsNone(get_address_from_cep('99999-999'))
+        self.assertEqual(get.call_count, 2)
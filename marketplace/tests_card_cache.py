@@ -0,0 +1,103 @@
+"""
+Tests for the instructor card fragment cache.
+
+Casos cobertos:
+1. Segunda renderização vem do cache (hit) e conta nos contadores.
+2. Salvar instrutor, perfil (WhatsApp) ou usuário (nome) invalida o card.
+3. Alterar categorias e avaliações invalida o card.
+4. Login (last_login) não invalida.
+5. city_instructors_list_view renderiza os cards do cache.
+"""
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from marketplace.card_cache import card_cache_stats, render_instructor_cards
+from marketplace.models import CategoryCNH, City, InstructorProfile, State
+from reviews.models import Review
+
+CARD = 'marketplace/includes/instructor_card.html'
+
+
+class CardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(code='SP', name='São Paulo')
+        cls.city = City.objects.create(state=state, name='Santos', slug='santos')
+        cls.user = User.objects.create(username='joao', first_name='João', last_name='Silva')
+        cls.instructor = InstructorProfile.objects.create(
+            user=cls.user, city=cls.city, is_visible=True, is_verified=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _render(self):
+        instructor = InstructorProfile.objects.select_related('user__profile', 'city__state').get(pk=self.instructor.pk)
+        return render_instructor_cards([instructor], CARD)[0].card_html
+
+    def _assert_invalidated(self, change):
+        self._render()
+        change()
+        before = card_cache_stats()['misses']
+        self._render()
+        self.assertEqual(card_cache_stats()['misses'], before + 1)
+
+    def test_second_render_is_a_hit(self):
+        first = self._render()
+        self.assertIn('João Silva', first)
+        with self.assertNumQueries(1):  # only the instructor itself
+            second = self._render()
+        self.assertEqual(first, second)
+        self.assertEqual(card_cache_stats(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_instructor_save_invalidates(self):
+        def change():
+            self.instructor.bio = 'Nova bio'
+            self.instructor.save()
+        self._assert_invalidated(change)
+        self.assertIn('Nova bio', self._render())
+
+    def test_profile_and_user_invalidate(self):
+        def change_profile():
+            self.user.profile.whatsapp_number = '11999990000'
+            self.user.profile.save()
+        self._assert_invalidated(change_profile)
+        self.assertIn('wa.me/11999990000', self._render())
+
+        def change_name():
+            self.user.first_name = 'Joana'
+            self.user.save()
+        self._assert_invalidated(change_name)
+        self.assertIn('Joana Silva', self._render())
+
+    def test_categories_and_reviews_invalidate(self):
+        category, _ = CategoryCNH.objects.get_or_create(code='B', defaults={'name': 'Carro'})
+        self._assert_invalidated(lambda: self.instructor.categories.add(category))
+        self._assert_invalidated(lambda: Review.objects.create(
+            instructor=self.instructor, author_name='Ana', rating=5, comment='Ótimo',
+        ))
+
+    def test_login_does_not_invalidate(self):
+        self._render()
+        self.user.save(update_fields=['last_login'])
+        self._render()
+        self.assertEqual(card_cache_stats()['hits'], 1)
+
+    def test_listing_view_and_stats_command(self):
+        viewer = User.objects.create_user('viewer', password='x')
+        viewer.profile.is_profile_complete = True
+        viewer.profile.save()
+        self.client.force_login(viewer)
+        for _ in range(2):
+            response = self.client.get('/instrutores/SP/santos/')
+            self.assertContains(response, 'João Silva')
+        self.assertEqual(card_cache_stats()['hits'], 1)
+
+        out = StringIO()
+        call_command('card_cache_stats', '--reset', stdout=out)
+        self.assertIn('Hits: 1', out.getvalue())
+        self.assertEqual(card_cache_stats()['hits'], 0)
@@ -0,0 +1,211 @@
+"""
+Tests for the geocoding job queue.
+
+Casos cobertos:
+1. Criar instrutor/aluno enfileira a cidade uma única vez (dedup por city_key);
+   salvar de novo sem trocar de cidade não enfileira.
+2. Cidade já geocodificada não entra na fila (a não ser com force).
+3. Worker: sucesso grava o CityGeoCache; erro de rede reagenda com backoff e
+   falha após MAX_ATTEMPTS; cidade desconhecida falha de imediato.
+4. Job "em execução" com reserva vencida volta a ser processado.
+5. Token bucket compartilhado: 1 token disponível, o próximo espera 1/rate.
+6. Município do dataset IBGE embarcado: resolvido sem chamar o Nominatim; o
+   arquivo traz os 5.570 municípios das 27 UFs.
+7. load_ibge_centroids: preenche o CityGeoCache em lote, mantém coordenadas de
+   outro provedor (salvo --overwrite) e fecha os jobs pendentes.
+8. LRU de coordenadas: get_many resolve N cidades em uma query, lembra as
+   ausentes por pouco tempo (COORDS_MISS_TTL), expira pelo TTL e é
+   invalidado ao salvar o CityGeoCache.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+import requests
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from marketplace import city_coords
+from marketplace.ibge_centroids import IBGE_STATE_CODES, PROVIDER, read_centroids
+from marketplace.geocoding_queue import MAX_ATTEMPTS, RETRY_BASE_DELAY, enqueue_cities, run_due_jobs
+from marketplace.geocoding_service import GeocodingService, TokenBucket
+from marketplace.models import (
+    City, CityGeoCache, GeocodingJob, GeocodingJobStatus, InstructorProfile, RateLimitBucket, State, StudentLead,
+)
+
+NOMINATIM = 'marketplace.geocoding_service.GeocodingService._geocode_nominatim'
+
+
+class EnqueueTests(TestCase):
+    def setUp(self):
+        city_coords.invalidate()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = State.objects.create(code='SP', name='São Paulo')
+        cls.city = City.objects.create(state=cls.state, name='São José dos Campos')
+
+    def test_saves_queue_city_once(self):
+        user = User.objects.create(username='inst')
+        profile = InstructorProfile.objects.create(user=user, city=self.city)
+        StudentLead.objects.create(name='Aluno', phone='11999999999', email='aluno@example.com', state=self.state, city=self.city)
+        profile.bio = 'Nova bio'
+        profile.save()
+
+        job = GeocodingJob.objects.get()
+        self.assertEqual(job.city_key, 'sao jose dos campos|SP')
+        self.assertEqual(job.status, GeocodingJobStatus.PENDING)
+
+    def test_geocoded_city_is_skipped_unless_forced(self):
+        CityGeoCache.objects.create(
+            city_key='sao jose dos campos|SP', city_name='São José dos Campos', state_code='SP',
+            latitude=Decimal('-23.2'), longitude=Decimal('-45.9'), geocoded=True,
+        )
+        self.assertEqual(enqueue_cities([('São José dos Campos', 'SP')]), 0)
+        self.assertEqual(enqueue_cities([('São José dos Campos', 'SP')], force=True), 1)
+        # Already pending: not queued twice
+        self.assertEqual(enqueue_cities([('Sao Jose dos Campos', 'sp')], force=True), 0)
+        self.assertEqual(GeocodingJob.objects.count(), 1)
+
+
+@mock.patch.object(GeocodingService.bucket, 'acquire', lambda: None)
+class WorkerTests(TestCase):
+    def setUp(self):
+        city_coords.invalidate()
+        # A district, not a municipality: not in the IBGE table, so Nominatim is asked
+        enqueue_cities([('Barão Geraldo', 'SP')])
+
+    def test_success_fills_geocache(self):
+        with mock.patch(NOMINATIM, return_value=(Decimal('-22.9'), Decimal('-47.06'))):
+            stats = run_due_jobs()
+        self.assertEqual(stats[GeocodingJobStatus.DONE], 1)
+        entry = CityGeoCache.objects.get(city_key='barao geraldo|SP')
+        self.assertTrue(entry.geocoded)
+        self.assertEqual(entry.latitude, Decimal('-22.9'))
+        self.assertEqual(GeocodingJob.objects.get().status, GeocodingJobStatus.DONE)
+
+    def test_network_error_retries_with_backoff_then_fails(self):
+        with mock.patch(NOMINATIM, side_effect=requests.ConnectionError('timeout')) as geocode:
+            before = timezone.now()
+            self.assertEqual(run_due_jobs()[GeocodingJobStatus.PENDING], 1)
+            job = GeocodingJob.objects.get()
+            self.assertGreaterEqual(job.run_after, before + RETRY_BASE_DELAY)
+            self.assertEqual(job.last_error, 'timeout')
+            # Not due yet
+            self.assertEqual(sum(run_due_jobs().values()), 0)
+
+            for _ in range(MAX_ATTEMPTS - 1):
+                GeocodingJob.objects.update(run_after=timezone.now())
+                run_due_jobs()
+        self.assertEqual(geocode.call_count, MAX_ATTEMPTS)
+        self.assertEqual(GeocodingJob.objects.get().status, GeocodingJobStatus.FAILED)
+        self.assertTrue(CityGeoCache.objects.get(city_key='barao geraldo|SP').failed)
+
+    def test_unknown_city_fails_without_retry(self):
+        with mock.patch(NOMINATIM, return_value=(None, None)):
+            self.assertEqual(run_due_jobs()[GeocodingJobStatus.FAILED], 1)
+
+    def test_expired_lease_is_claimed_again(self):
+        GeocodingJob.objects.update(
+            status=GeocodingJobStatus.RUNNING, run_after=timezone.now() - timedelta(seconds=1),
+        )
+        with mock.patch(NOMINATIM, return_value=(Decimal('-22.9'), Decimal('-47.06'))):
+            self.assertEqual(run_due_jobs()[GeocodingJobStatus.DONE], 1)
+
+
+class IbgeCentroidTests(TestCase):
+    def test_dataset_city_resolved_offline(self):
+        enqueue_cities([('São Paulo', 'SP')])
+        with mock.patch(NOMINATIM) as geocode:
+            self.assertEqual(run_due_jobs()[GeocodingJobStatus.DONE], 1)
+        geocode.assert_not_called()
+        entry = CityGeoCache.objects.get(city_key='sao paulo|SP')
+        self.assertEqual(entry.provider, PROVIDER)
+        self.assertEqual(entry.latitude, Decimal('-23.532900'))
+
+    def test_bundled_table_is_complete(self):
+        centroids = read_centroids()
+        self.assertEqual(len(centroids), 5570)
+        self.assertEqual({c.state_code for c in centroids.values()}, set(IBGE_STATE_CODES.values()))
+
+    def test_bulk_load(self):
+        state = State.objects.create(code='RJ', name='Rio de Janeiro')
+        # Local name differs from the dataset: matched by IBGE code
+        City.objects.create(state=state, name='Rio De Janeiro (Capital)', ibge_id=3304557)
+        CityGeoCache.objects.create(
+            city_key='curitiba|PR', city_name='Curitiba', state_code='PR',
+            latitude=Decimal('-25.4'), longitude=Decimal('-49.2'), geocoded=True, provider='manual',
+        )
+        enqueue_cities([('Manaus', 'AM')])
+
+        call_command('load_ibge_centroids', stdout=mock.MagicMock())
+        total = len(read_centroids())
+        self.assertEqual(CityGeoCache.objects.filter(provider=PROVIDER).count(), total)  # + local name - Curitiba (kept)
+        self.assertTrue(CityGeoCache.objects.filter(city_key='rio de janeiro (capital)|RJ', geocoded=True).exists())
+        self.assertEqual(CityGeoCache.objects.get(city_key='curitiba|PR').provider, 'manual')
+        self.assertEqual(GeocodingJob.objects.get().status, GeocodingJobStatus.DONE)
+
+        call_command('load_ibge_centroids', '--overwrite', stdout=mock.MagicMock())
+        self.assertEqual(CityGeoCache.objects.get(city_key='curitiba|PR').latitude, Decimal('-25.419500'))
+
+
+class CityCoordsTests(TestCase):
+    def setUp(self):
+        city_coords.invalidate()
+        for name, lat in (('Campinas', '-22.9'), ('Santos', '-23.96')):
+            CityGeoCache.objects.create(
+                city_key=CityGeoCache.normalize_city_key(name, 'SP'), city_name=name, state_code='SP',
+                latitude=Decimal(lat), longitude=Decimal('-47'), geocoded=True,
+            )
+
+    def test_get_many_one_query_then_lru(self):
+        pairs = [('Campinas', 'SP'), ('Santos', 'SP'), ('Taubaté', 'SP')]
+        with self.assertNumQueries(1):
+            found = city_coords.get_many(pairs)
+        self.assertEqual(found, {
+            ('Campinas', 'SP'): (Decimal('-22.9'), Decimal('-47')),
+            ('Santos', 'SP'): (Decimal('-23.96'), Decimal('-47')),
+        })
+        with self.assertNumQueries(0):
+            self.assertEqual(city_coords.get_many(pairs), found)
+            self.assertIsNone(city_coords.get('Taubate', 'sp'))
+
+    def test_invalidated_by_geocache_save(self):
+        city_coords.get('Taubaté', 'SP')
+        CityGeoCache.objects.create(
+            city_key='taubate|SP', city_name='Taubaté', state_code='SP',
+            latitude=Decimal('-23.02'), longitude=Decimal('-45.55'), geocoded=True,
+        )
+        self.assertEqual(city_coords.get('Taubaté', 'SP'), (Decimal('-23.02'), Decimal('-45.55')))
+
+    def test_entries_expire(self):
+        city_coords.get('Campinas', 'SP')
+        with mock.patch('marketplace.city_coords.time.monotonic', return_value=10 ** 9):
+            with self.assertNumQueries(1):
+                city_coords.get('Campinas', 'SP')
+
+    def test_misses_expire_sooner(self):
+        now = time.monotonic()
+        city_coords.get_many([('Campinas', 'SP'), ('Taubaté', 'SP')])
+        # Geocoded by another process: no signal reaches this one
+        CityGeoCache.objects.bulk_create([CityGeoCache(
+            city_key='taubate|SP', city_name='Taubaté', state_code='SP',
+            latitude=Decimal('-23.02'), longitude=Decimal('-45.55'), geocoded=True,
+        )])
+        with mock.patch('marketplace.city_coords.time.monotonic', return_value=now + city_coords.COORDS_MISS_TTL + 1):
+            with self.assertNumQueries(1):
+                found = city_coords.get_many([('Campinas', 'SP'), ('Taubaté', 'SP')])
+        self.assertEqual(found[('Taubaté', 'SP')], (Decimal('-23.02'), Decimal('-45.55')))
+
+
+class TokenBucketTests(TestCase):
+    def test_second_token_waits(self):
+        bucket = TokenBucket('test', rate=0.5)
+        self.assertEqual(bucket.try_acquire(), 0)
+        self.assertAlmostEqual(bucket.try_acquire(), 2, delta=0.1)
+
+        RateLimitBucket.objects.update(updated_at=timezone.now() - timedelta(seconds=2))
+        self.assertEqual(bucket.try_acquire(), 0)
@@ -0,0 +1,114 @@
+"""
+Tests for the denormalized lead access (access_state / lead_access_until).
+
+Casos cobertos:
+1. Trial ativo → trial_active até trial_end_date; leitura sem queries.
+2. Assinatura criada/pausada → sinal recalcula o acesso.
+3. Acesso vencido sem sweep → can_receive_leads() já retorna False.
+4. Sweep (refresh_lead_access) corrige estados vencidos.
+5. lead_access_q filtra em SQL.
+6. save() completo só recalcula o acesso quando pioneiro/trial mudou.
+"""
+import datetime
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from billing.models import SubscriptionStatusChoices
+from billing.tests.factories import make_instructor_user, make_subscription
+from marketplace.lead_access import lead_access_q
+from marketplace.models import AccessStateChoices, InstructorProfile
+
+
+class LeadAccessTests(TestCase):
+    def setUp(self):
+        _, self.instructor = make_instructor_user()
+
+    def test_default_no_access(self):
+        self.assertEqual(self.instructor.access_state, AccessStateChoices.NO_ACCESS)
+        self.assertFalse(self.instructor.can_receive_leads())
+
+    def test_trial_sets_access_and_reads_without_queries(self):
+        self.instructor.activate_trial()
+        instructor = InstructorProfile.objects.get(pk=self.instructor.pk)
+        self.assertEqual(instructor.access_state, AccessStateChoices.TRIAL_ACTIVE)
+        self.assertEqual(instructor.lead_access_until, instructor.trial_end_date)
+        with self.assertNumQueries(0):
+            self.assertTrue(instructor.can_receive_leads())
+            status = instructor.get_access_status()
+        self.assertEqual(status['reason'], 'trial_active')
+        self.assertTrue(status['is_trial'])
+
+    def test_subscription_signal_updates_access(self):
+        sub = make_subscription(instructor=self.instructor, days_from_now=30)
+        self.instructor.refresh_from_db()
+        self.assertEqual(self.instructor.access_state, AccessStateChoices.SUBSCRIPTION_ACTIVE)
+        self.assertTrue(self.instructor.can_receive_leads())
+        self.assertEqual(self.instructor.get_access_status()['reason'], 'subscription_active')
+
+        sub.status = SubscriptionStatusChoices.PAUSED
+        sub.save()
+        self.instructor.refresh_from_db()
+        self.assertEqual(self.instructor.access_state, AccessStateChoices.NO_ACCESS)
+        self.assertFalse(self.instructor.can_receive_leads())
+
+    def test_expired_access_blocked_before_sweep(self):
+        make_subscription(instructor=self.instructor, days_from_now=30)
+        InstructorProfile.objects.filter(pk=self.instructor.pk).update(
+            lead_access_until=timezone.now() - timedelta(minutes=1)
+        )
+        self.instructor.refresh_from_db()
+        self.assertFalse(self.instructor.can_receive_leads())
+        self.assertFalse(InstructorProfile.objects.filter(lead_access_q(), pk=self.instructor.pk).exists())
+
+    def test_sweep_fixes_stale_state(self):
+        self.instructor.is_trial_active = True
+        self.instructor.trial_end_date = timezone.now() + timedelta(days=1)
+        self.instructor.save()
+        # Trial runs out without any save
+        InstructorProfile.objects.filter(pk=self.instructor.pk).update(
+            trial_end_date=timezone.now() - timedelta(days=1)
+        )
+        out = StringIO()
+        call_command('refresh_lead_access', stdout=out)
+        self.assertIn('1 instrutor', out.getvalue())
+        self.instructor.refresh_from_db()
+        self.assertEqual(self.instructor.access_state, AccessStateChoices.TRIAL_EXPIRED)
+        self.assertEqual(self.instructor.get_access_status()['reason'], 'trial_expired')
+
+    def test_open_ended_subscription(self):
+        sub = make_subscription(instructor=self.instructor)
+        sub.end_date = None
+        sub.save()
+        self.instructor.refresh_from_db()
+        self.assertIsNone(self.instructor.lead_access_until)
+        self.assertTrue(InstructorProfile.objects.filter(lead_access_q(), pk=self.instructor.pk).exists())
+
+    def test_trial_then_subscription_uses_latest_end(self):
+        self.instructor.activate_trial()
+        sub = make_subscription(instructor=self.instructor, days_from_now=60)
+        self.instructor.refresh_from_db()
+        self.assertEqual(self.instructor.access_state, AccessStateChoices.TRIAL_ACTIVE)
+        self.assertEqual(
+            self.instructor.lead_access_until,
+            datetime.datetime.combine(sub.end_date + datetime.timedelta(days=1), datetime.time.min, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_full_save_recomputes_only_on_access_changes(self):
+        make_subscription(instructor=self.instructor, days_from_now=30)
+        instructor = InstructorProfile.objects.get(pk=self.instructor.pk)
+        instructor.bio = 'Nova bio'
+        with CaptureQueriesContext(connection) as queries:
+            instructor.save()
+        self.assertFalse([q for q in queries.captured_queries if 'billing_subscription' in q['sql']])
+
+        instructor.is_trial_active = True
+        instructor.trial_end_date = timezone.now() + timedelta(days=90)
+        instructor.save()
+        instructor.refresh_from_db()
+        self.assertEqual(instructor.access_state, AccessStateChoices.TRIAL_ACTIVE)
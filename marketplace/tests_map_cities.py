@@ -0,0 +1,164 @@
+"""
+Tests for the student map aggregation (api/map/cities/).
+
+Casos cobertos:
+1. Contagem, histograma de categorias e has_theory por cidade.
+2. Cidades sem geocache ficam fora e entram em cities_without_coords.
+3. Número de queries fixo, independente do volume de alunos (uma a menos com as
+   coordenadas no LRU).
+4. Resultado em cache; salvar/remover aluno ou mudar categorias invalida.
+5. Payload público sem dados pessoais; detalhe por aluno só para staff/suporte, paginado.
+6. Home não embute mais a lista de alunos.
+"""
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from accounts.models import RoleChoices
+from marketplace import city_coords
+from marketplace.models import State, City, CityGeoCache, CategoryCNH, StudentLead
+from marketplace.map_cities import build_map_cities, get_map_cities_data
+
+URL = '/instrutores/api/map/cities/'
+STUDENTS_URL = '/instrutores/api/map/students/'
+
+
+class MapCitiesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = State.objects.create(code='SP', name='São Paulo')
+        cls.city = City.objects.create(state=cls.state, name='São José dos Campos')
+        cls.no_coords_city = City.objects.create(state=cls.state, name='Taubaté')
+        CityGeoCache.objects.create(
+            city_key=CityGeoCache.normalize_city_key(cls.city.name, 'SP'),
+            city_name=cls.city.name, state_code='SP',
+            latitude=Decimal('-23.2'), longitude=Decimal('-45.9'), geocoded=True,
+        )
+        cls.cat_a, _ = CategoryCNH.objects.get_or_create(code='A', defaults={'label': 'Moto'})
+        cls.cat_b, _ = CategoryCNH.objects.get_or_create(code='B', defaults={'label': 'Carro'})
+
+    def setUp(self):
+        cache.clear()
+        city_coords.invalidate()
+
+    def _create_leads(self, total, city=None, start=0):
+        city = city or self.city
+        leads = StudentLead.objects.bulk_create([
+            StudentLead(
+                name=f'Aluno {i}', phone='11999999999', email=f'aluno{i}@example.com',
+                state=self.state, city=city, has_theory=(i % 2 == 0),
+            )
+            for i in range(start, start + total)
+        ])
+        Through = StudentLead.categories.through
+        Through.objects.bulk_create(
+            [Through(studentlead_id=lead.pk, categorycnh_id=self.cat_b.pk) for lead in leads]
+            + [Through(studentlead_id=lead.pk, categorycnh_id=self.cat_a.pk) for lead in leads[::3]]
+        )
+        cache.clear()
+        return leads
+
+    def test_aggregates_per_city(self):
+        self._create_leads(6)
+        self._create_leads(2, city=self.no_coords_city, start=100)
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['cities']), 1)
+        city = data['cities'][0]
+        self.assertEqual(city['city'], 'São José dos Campos')
+        self.assertEqual(city['uf'], 'SP')
+        self.assertEqual(city['lat'], -23.2)
+        self.assertEqual(city['count'], 6)
+        self.assertEqual(city['with_theory'], 3)
+        self.assertEqual(city['categories'], {'A': 2, 'B': 6})
+        self.assertEqual(data['stats'], {
+            'total_cities': 1,
+            'total_students': 6,
+            'cities_without_coords': 1,
+        })
+
+    def test_query_count_is_fixed(self):
+        self._create_leads(5)
+        with self.assertNumQueries(3):
+            build_map_cities()
+        self._create_leads(500, start=5)
+        self._create_leads(50, city=self.no_coords_city, start=1000)
+        with self.assertNumQueries(3):
+            data = build_map_cities()
+        self.assertEqual(data['stats']['total_students'], 505)
+        # Both cities' coordinates (or their absence) now come from the LRU
+        with self.assertNumQueries(2):
+            build_map_cities()
+
+    def test_cached_and_invalidated_by_lead_changes(self):
+        self._create_leads(2)
+        self.assertEqual(get_map_cities_data()['stats']['total_students'], 2)
+        with self.assertNumQueries(0):
+            get_map_cities_data()
+
+        lead = StudentLead.objects.create(
+            name='Novo', phone='11988888888', email='novo@example.com',
+            state=self.state, city=self.city,
+        )
+        self.assertEqual(get_map_cities_data()['stats']['total_students'], 3)
+
+        lead.categories.add(self.cat_a)
+        self.assertEqual(get_map_cities_data()['cities'][0]['categories']['A'], 2)
+
+        lead.delete()
+        self.assertEqual(get_map_cities_data()['stats']['total_students'], 2)
+
+    def test_public_payload_has_no_student_detail(self):
+        self._create_leads(3)
+        response = self.client.get(URL)
+        self.assertNotContains(response, 'Aluno 0')
+        self.assertEqual(response.json()['cities'][0]['city_ids'], [self.city.pk])
+
+    def test_student_detail_requires_staff_or_support(self):
+        self._create_leads(3)
+        city_ids = f'?city_ids={self.city.pk}'
+        self.assertEqual(self.client.get(STUDENTS_URL + city_ids).status_code, 403)
+
+        instructor = User.objects.create_user('instrutor', password='x')
+        instructor.profile.role = RoleChoices.INSTRUCTOR
+        instructor.profile.is_profile_complete = True
+        instructor.profile.save()
+        self.client.force_login(instructor)
+        self.assertEqual(self.client.get(STUDENTS_URL + city_ids).status_code, 403)
+
+        support = User.objects.create_user('suporte', password='x')
+        support.profile.role = RoleChoices.ADMIN_SUPPORT
+        support.profile.is_profile_complete = True
+        support.profile.save()
+        self.client.force_login(support)
+        response = self.client.get(STUDENTS_URL + city_ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-store', response['Cache-Control'])
+        students = response.json()['students']
+        self.assertEqual([s['name'] for s in students], ['Aluno 0', 'Aluno 1', 'Aluno 2'])
+        self.assertEqual(students[0]['categories'], ['A', 'B'])
+        self.assertTrue(students[0]['has_theory'])
+        self.assertEqual(self.client.get(STUDENTS_URL).status_code, 400)
+
+    def test_student_detail_is_paginated(self):
+        self._create_leads(60)
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        staff.profile.is_profile_complete = True
+        staff.profile.save()
+        self.client.force_login(staff)
+        first = self.client.get(STUDENTS_URL, {'city_ids': self.city.pk}).json()
+        self.assertEqual(len(first['students']), 50)
+        second = self.client.get(STUDENTS_URL, {'city_ids': self.city.pk, 'after': first['next']}).json()
+        self.assertEqual(len(second['students']), 10)
+        self.assertIsNone(second['next'])
+
+    def test_home_does_not_embed_students(self):
+        self._create_leads(3)
+        response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('students_json', response.context)
+        self.assertNotContains(response, 'Aluno 0')
+        self.assertFalse(response.context['can_view_students'])
@@ -0,0 +1,164 @@
+"""
+Tests for the precomputed instructor map markers.
+
+Casos cobertos:
+1. Instrutor visível + verificado com coordenadas → marcador criado.
+2. Sem coordenadas próprias → usa CityGeoCache da cidade (inclusive nomes compostos).
+3. Instrutor oculto → marcador removido.
+4. Geocache criado depois → marcador aparece.
+5. Renomear usuário → marcador atualizado.
+6. get_markers_blob → JSON com as chaves usadas pelo template.
+7. cities_list sem filtros não embute marcadores; com filtros embute só os filtrados.
+8. API de viewport: bbox, paginação por cursor, clusters em zoom baixo, ETag/304.
+"""
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from marketplace.models import InstructorProfile, InstructorMapMarker, State, City, CityGeoCache
+from marketplace.map_markers import get_markers_blob, rebuild_all_markers
+
+
+def _create_instructor(username, city, **extra):
+    user = User.objects.create(username=username, first_name='Ana', last_name='Souza')
+    profile = InstructorProfile.objects.create(user=user, city=city, is_visible=True, is_verified=True, **extra)
+    return profile
+
+
+class MapMarkerSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = State.objects.create(code='SP', name='São Paulo')
+        cls.city = City.objects.create(state=cls.state, name='São José dos Campos')
+
+    def test_marker_created_with_own_coordinates(self):
+        p = _create_instructor('own', self.city, latitude=Decimal('-23.1'), longitude=Decimal('-45.9'))
+        marker = InstructorMapMarker.objects.get(instructor=p)
+        self.assertEqual(marker.latitude, Decimal('-23.1'))
+        self.assertEqual(marker.city_name, 'São José dos Campos')
+        self.assertEqual(marker.state_code, 'SP')
+
+    def test_marker_uses_city_geocache_fallback(self):
+        CityGeoCache.objects.create(
+            city_key=CityGeoCache.normalize_city_key(self.city.name, 'SP'),
+            city_name=self.city.name, state_code='SP',
+            latitude=Decimal('-23.2'), longitude=Decimal('-45.8'), geocoded=True,
+        )
+        p = _create_instructor('fallback', self.city)
+        marker = InstructorMapMarker.objects.get(instructor=p)
+        self.assertEqual(marker.latitude, Decimal('-23.2'))
+
+    def test_no_marker_without_any_coordinates(self):
+        p = _create_instructor('nocoords', self.city)
+        self.assertFalse(InstructorMapMarker.objects.filter(instructor=p).exists())
+
+    def test_geocache_saved_later_creates_marker(self):
+        p = _create_instructor('late', self.city)
+        CityGeoCache.objects.create(
+            city_key=CityGeoCache.normalize_city_key(self.city.name, 'SP'),
+            city_name=self.city.name, state_code='SP',
+            latitude=Decimal('-23.2'), longitude=Decimal('-45.8'), geocoded=True,
+        )
+        self.assertTrue(InstructorMapMarker.objects.filter(instructor=p).exists())
+
+    def test_hidden_instructor_marker_removed(self):
+        p = _create_instructor('hidden', self.city, latitude=Decimal('-23.1'), longitude=Decimal('-45.9'))
+        p.is_visible = False
+        p.save()
+        self.assertFalse(InstructorMapMarker.objects.filter(instructor=p).exists())
+
+    def test_user_rename_updates_marker(self):
+        p = _create_instructor('rename', self.city, latitude=Decimal('-23.1'), longitude=Decimal('-45.9'))
+        p.user.first_name = 'Beatriz'
+        p.user.save()
+        self.assertEqual(InstructorMapMarker.objects.get(instructor=p).first_name, 'Beatriz')
+
+    def test_blob_matches_template_keys(self):
+        p = _create_instructor('blob', self.city, latitude=Decimal('-23.1'), longitude=Decimal('-45.9'))
+        data = json.loads(get_markers_blob())
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], p.pk)
+        self.assertEqual(data[0]['city__state__code'], 'SP')
+        self.assertAlmostEqual(data[0]['latitude'], -23.1)
+
+    def test_blob_changes_after_update(self):
+        _create_instructor('first', self.city, latitude=Decimal('-23.1'), longitude=Decimal('-45.9'))
+        self.assertEqual(len(json.loads(get_markers_blob())), 1)
+        _create_instructor('second', self.city, latitude=Decimal('-23.3'), longitude=Decimal('-45.7'))
+        self.assertEqual(len(json.loads(get_markers_blob())), 2)
+
+    def test_rebuild_all_markers(self):
+        p = _create_instructor('rebuild', self.city, latitude=Decimal('-23.1'), longitude=Decimal('-45.9'))
+        InstructorMapMarker.objects.all().delete()
+        self.assertEqual(rebuild_all_markers(), 1)
+        self.assertTrue(InstructorMapMarker.objects.filter(instructor=p).exists())
+
+    def test_cities_list_embeds_only_filtered_markers(self):
+        p = _create_instructor('view', self.city, latitude=Decimal('-23.1'), longitude=Decimal('-45.9'))
+        viewer = User.objects.create_user('viewer', password='x')
+        viewer.profile.is_profile_complete = True
+        viewer.profile.save()
+        self.client.force_login(viewer)
+        response = self.client.get('/instrutores/cidades/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(f'"id":{p.pk}', response.content.decode())
+        response = self.client.get('/instrutores/cidades/', {'state': 'SP'})
+        self.assertIn(f'"id":{p.pk}', response.content.decode())
+        response = self.client.get('/instrutores/cidades/', {'state': 'RJ'})
+        self.assertNotIn(f'"id":{p.pk}', response.content.decode())
+
+
+class MapMarkersApiTests(TestCase):
+    url = '/instrutores/api/map/markers/'
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(code='SP', name='São Paulo')
+        city = City.objects.create(state=state, name='Campinas')
+        cls.near = [
+            _create_instructor(f'near{i}', city, latitude=Decimal('-22.90') - Decimal(i) / 1000,
+                               longitude=Decimal('-47.06'))
+            for i in range(3)
+        ]
+        cls.far = _create_instructor('far', city, latitude=Decimal('-3.1'), longitude=Decimal('-60.0'))
+
+    def test_bbox_filters_markers(self):
+        response = self.client.get(self.url, {'bbox': '-48,-24,-46,-22', 'zoom': 12})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        ids = [row[data['fields'].index('id')] for row in data['markers']]
+        self.assertEqual(sorted(ids), sorted(p.pk for p in self.near))
+        self.assertEqual(data['clusters'], [])
+        self.assertIsNone(data['next'])
+
+    def test_cursor_pagination(self):
+        params = {'bbox': '-48,-24,-46,-22', 'zoom': 12, 'limit': 2}
+        first = self.client.get(self.url, params).json()
+        self.assertEqual(len(first['markers']), 2)
+        self.assertIsNotNone(first['next'])
+        second = self.client.get(self.url, {**params, 'after': first['next']}).json()
+        self.assertEqual(len(second['markers']), 1)
+        self.assertIsNone(second['next'])
+
+    def test_low_zoom_clusters(self):
+        data = self.client.get(self.url, {'zoom': 4}).json()
+        self.assertEqual(len(data['clusters']), 1)
+        self.assertEqual(data['clusters'][0][2], 3)
+        # The isolated instructor stays a plain marker
+        self.assertEqual([row[0] for row in data['markers']], [self.far.pk])
+
+    def test_etag_not_modified(self):
+        response = self.client.get(self.url, {'zoom': 12})
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        cached = self.client.get(self.url, {'zoom': 12}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        _create_instructor('new', self.near[0].city, latitude=Decimal('-22.8'), longitude=Decimal('-47.0'))
+        fresh = self.client.get(self.url, {'zoom': 12}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+
+    def test_invalid_params(self):
+        response = self.client.get(self.url, {'bbox': '1,2,3'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,117 @@
+"""
+Tests for the geohash grid and "perto de mim" search.
+
+Casos cobertos:
+1. encode_geohash bate com o valor de referência.
+2. save() mantém o geohash (inclusive com update_fields).
+3. nearest_instructors respeita raio, ordem por distância e limite.
+4. Busca perto de uma borda de célula encontra o vizinho do outro lado.
+5. Instrutor sem coordenadas próprias entra pela coordenada do marcador (cidade).
+6. cities_list_view no modo "perto de mim"; Permissions-Policy libera a
+   geolocalização para o próprio site.
+"""
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from marketplace.geo import encode_geohash, haversine_km, nearest_instructors
+from marketplace.map_markers import refresh_instructor_markers
+from marketplace.models import CityGeoCache, InstructorMapMarker, InstructorProfile, State, City
+
+
+def _create_instructor(username, city, lat, lng, **extra):
+    user = User.objects.create(username=username, first_name=username.title())
+    return InstructorProfile.objects.create(
+        user=user, city=city, is_visible=True, is_verified=True,
+        latitude=Decimal(lat), longitude=Decimal(lng), **extra
+    )
+
+
+class GeohashTests(TestCase):
+    def test_reference_value(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    def test_haversine(self):
+        # São Paulo → Rio de Janeiro ≈ 361 km
+        self.assertAlmostEqual(haversine_km(-23.5505, -46.6333, -22.9068, -43.1729), 361, delta=3)
+
+
+class NearestInstructorsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(code='SP', name='São Paulo')
+        cls.city = City.objects.create(state=state, name='São Paulo')
+        # Praça da Sé and points at increasing distances
+        cls.center = (-23.5503, -46.6339)
+        cls.close = _create_instructor('close', cls.city, '-23.5510', '-46.6330')   # ~0.1 km
+        cls.mid = _create_instructor('mid', cls.city, '-23.5900', '-46.6800')       # ~6.5 km
+        cls.far = _create_instructor('far', cls.city, '-22.9068', '-47.0616')       # Campinas ~83 km
+
+    def test_geohash_kept_on_save(self):
+        self.assertEqual(self.close.geohash, encode_geohash(self.close.latitude, self.close.longitude))
+        self.close.latitude = Decimal('-22.9068')
+        self.close.longitude = Decimal('-43.1729')
+        self.close.save(update_fields=['latitude', 'longitude'])
+        self.close.refresh_from_db()
+        self.assertEqual(self.close.geohash, encode_geohash(-22.9068, -43.1729))
+
+    def test_geohash_cleared_without_coordinates(self):
+        self.mid.latitude = None
+        self.mid.save()
+        self.mid.refresh_from_db()
+        self.assertEqual(self.mid.geohash, '')
+
+    def test_radius_and_order(self):
+        result = nearest_instructors(*self.center, radius_km=10)
+        self.assertEqual([i.pk for i in result], [self.close.pk, self.mid.pk])
+        self.assertLess(result[0].distance_km, result[1].distance_km)
+
+        result = nearest_instructors(*self.center, radius_km=100)
+        self.assertEqual([i.pk for i in result], [self.close.pk, self.mid.pk, self.far.pk])
+
+        self.assertEqual(len(nearest_instructors(*self.center, radius_km=100, limit=1)), 1)
+
+    def test_hidden_instructors_excluded(self):
+        self.close.is_visible = False
+        self.close.save()
+        result = nearest_instructors(*self.center, radius_km=10)
+        self.assertEqual([i.pk for i in result], [self.mid.pk])
+
+    def test_neighbor_cell_across_border(self):
+        # Two points ~1 km apart on both sides of a precision-5 cell border
+        west = _create_instructor('west', self.city, '-23.50', '-45.7049')
+        east = _create_instructor('east', self.city, '-23.50', '-45.6951')
+        self.assertNotEqual(west.geohash[:5], east.geohash[:5])
+        result = nearest_instructors(-23.50, -45.7049, radius_km=2)
+        self.assertIn(east.pk, [i.pk for i in result])
+
+    def test_city_placed_instructor_found_by_marker(self):
+        CityGeoCache.objects.create(
+            city_key=CityGeoCache.normalize_city_key('São Paulo', 'SP'), city_name='São Paulo', state_code='SP',
+            latitude=Decimal('-23.5600'), longitude=Decimal('-46.6400'), geocoded=True,
+        )
+        user = User.objects.create(username='nocoords', first_name='Nocoords')
+        placed = InstructorProfile.objects.create(user=user, city=self.city, is_visible=True, is_verified=True)
+        refresh_instructor_markers([placed.pk])
+        self.assertTrue(InstructorMapMarker.objects.filter(instructor=placed).exists())
+
+        result = nearest_instructors(*self.center, radius_km=10)
+        self.assertEqual([i.pk for i in result], [self.close.pk, placed.pk, self.mid.pk])  # ~1.2 km
+
+    def test_cities_list_near_me(self):
+        viewer = User.objects.create_user('viewer', password='x')
+        viewer.profile.is_profile_complete = True
+        viewer.profile.save()
+        self.client.force_login(viewer)
+        response = self.client.get('/instrutores/cidades/', {
+            'lat': self.center[0], 'lng': self.center[1], 'radius': '10',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['near_me'])
+        self.assertEqual(
+            [i.pk for i in response.context['instructors_page']],
+            [self.close.pk, self.mid.pk],
+        )
+        self.assertContains(response, 'km de você')
+        self.assertIn('geolocation=(self)', response['Permissions-Policy'])
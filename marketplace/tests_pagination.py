@@ -0,0 +1,136 @@
+"""
+Tests for the keyset (cursor) pagination of instructor listings.
+
+Casos cobertos:
+1. Páginas seguidas cobrem todos os instrutores, sem repetição, na ordem certa.
+2. Cursor "anterior" volta exatamente à página anterior.
+3. Empates em created_at são desempatados pelo id.
+4. Cursor inválido ou adulterado volta à primeira página.
+5. city_instructors_list_view pagina por cursor e mantém os filtros nos links.
+6. cities_list_view pagina a listagem geral.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from marketplace.models import City, InstructorProfile, State
+from marketplace.pagination import KeysetPaginator, cached_count, encode_cursor
+
+
+def _create_instructors(city, total, **extra):
+    base = timezone.now()
+    instructors = []
+    for i in range(total):
+        user = User.objects.create(username=f'inst{city.pk}_{i}', first_name=f'Inst {i}')
+        instructor = InstructorProfile.objects.create(
+            user=user, city=city, is_visible=True, is_verified=i % 3 != 0, **extra
+        )
+        # Pairs share created_at to exercise the id tie-breaker
+        InstructorProfile.objects.filter(pk=instructor.pk).update(created_at=base - timedelta(hours=i // 2))
+        instructors.append(instructor)
+    return instructors
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(code='SP', name='São Paulo')
+        cls.city = City.objects.create(state=state, name='Santos', slug='santos')
+        _create_instructors(cls.city, 11)
+        cls.queryset = InstructorProfile.objects.filter(city=cls.city)
+        cls.expected = list(cls.queryset.order_by('-is_verified', '-created_at', 'id').values_list('pk', flat=True))
+
+    def _walk_forward(self, per_page):
+        paginator = KeysetPaginator(self.queryset, per_page=per_page)
+        pages, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            pages.append([inst.pk for inst in page])
+            if not page.has_next():
+                return paginator, pages
+            cursor = page.next_cursor
+
+    def test_pages_cover_everything_in_order(self):
+        _, pages = self._walk_forward(per_page=4)
+        self.assertEqual([len(p) for p in pages], [4, 4, 3])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_first_page_has_no_previous(self):
+        page = KeysetPaginator(self.queryset, per_page=4).get_page()
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_previous_cursor_returns_previous_page(self):
+        paginator = KeysetPaginator(self.queryset, per_page=4)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual([i.pk for i in back], [i.pk for i in second])
+        self.assertTrue(back.has_next())
+
+        back = paginator.get_page(back.previous_cursor)
+        self.assertEqual([i.pk for i in back], [i.pk for i in first])
+        self.assertFalse(back.has_previous())
+
+    def test_constant_queries_per_page(self):
+        paginator = KeysetPaginator(self.queryset, per_page=4)
+        cursor = paginator.get_page().next_cursor
+        with self.assertNumQueries(1):
+            list(paginator.get_page(cursor))
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(self.queryset, per_page=4)
+        first = [i.pk for i in paginator.get_page()]
+        for cursor in ['lixo', encode_cursor('x', [1]), encode_cursor('n', [True]),
+                       encode_cursor('n', ['abc', 'def', 'ghi'])]:
+            self.assertEqual([i.pk for i in paginator.get_page(cursor)], first)
+
+    def test_cached_count(self):
+        cache.clear()
+        self.assertEqual(cached_count(self.queryset), 11)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(self.queryset), 11)
+        self.assertEqual(cached_count(self.queryset.none()), 0)
+
+
+class ListingViewsPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(code='SP', name='São Paulo')
+        cls.city = City.objects.create(state=state, name='Santos', slug='santos')
+        _create_instructors(cls.city, 14, has_own_car=True)
+        InstructorProfile.objects.update(is_verified=True)
+
+    def setUp(self):
+        cache.clear()
+        viewer = User.objects.create_user('viewer', password='x')
+        viewer.profile.is_profile_complete = True
+        viewer.profile.save()
+        self.client.force_login(viewer)
+
+    def test_city_list_cursor_pages(self):
+        response = self.client.get('/instrutores/SP/santos/', {'has_own_car': 'yes'})
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 12)
+        self.assertEqual(response.context['total_instructors'], 14)
+        self.assertContains(response, f'?has_own_car=yes&cursor={page.next_cursor}')
+
+        response = self.client.get('/instrutores/SP/santos/', {'has_own_car': 'yes', 'cursor': page.next_cursor})
+        second = response.context['page_obj']
+        self.assertEqual(len(second), 2)
+        self.assertTrue(second.has_previous())
+        self.assertFalse(second.has_next())
+        self.assertFalse({i.pk for i in page} & {i.pk for i in second})
+
+    def test_cities_list_paginates(self):
+        response = self.client.get('/instrutores/cidades/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['instructors_page']), 14)
+        self.assertEqual(response.context['total_instructors'], 14)
+        self.assertFalse(response.context['instructors_page'].has_other_pages())
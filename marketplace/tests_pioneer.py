@@ -9,13 +9,15 @@ Casos cobertos:
 5. can_receive_leads() respeita o benefício pioneiro.
 6. badges property inclui a badge de pioneiro somente para is_pioneer=True.
 """
-from datetime import timedelta, date
+from datetime import datetime, timedelta, date, timezone as dt_timezone
+from unittest import mock
 
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.utils import timezone
 from io import StringIO
 
+from marketplace.lead_access import access_date
 from marketplace.models import InstructorProfile, State, City
 from marketplace.management.commands.activate_pioneers import (
     Command as ActivateCommand,
@@ -117,6 +119,18 @@ class PioneerModelTests(TestCase):
         p.save()
         self.assertFalse(p.can_receive_leads())
 
+    def test_expired_pioneer_same_answer_late_in_the_local_day(self):
+        """22h em Brasília já é o dia seguinte em UTC: coluna e is_pioneer_active() concordam."""
+        late_evening = datetime(2026, 10, 17, 1, 0, tzinfo=dt_timezone.utc)  # 16/10 22h BRT
+        with mock.patch('django.utils.timezone.now', return_value=late_evening):
+            p = _create_instructor('Late', 'Pioneer', self.city)
+            p.is_pioneer = True
+            p.pioneer_free_until = access_date() - timedelta(days=1)
+            p.is_trial_active = False
+            p.save()
+            self.assertFalse(p.is_pioneer_active())
+            self.assertFalse(p.can_receive_leads())
+
     def test_non_pioneer_default_no_access(self):
         """Instrutor sem trial, sem assinatura, sem pioneer não pode receber leads."""
         p = _create_instructor('Normal', 'Instructor', self.city)
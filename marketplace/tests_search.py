@@ -0,0 +1,92 @@
+"""
+Tests for the instructor search index.
+
+Casos cobertos:
+1. tokenize remove acentos, caixa e stop words.
+2. Índice criado/atualizado por sinais (perfil, nome do usuário, categorias).
+3. Busca por prefixo sem acento ("joa" → "João"), todos os termos obrigatórios.
+   Letra solta fora do índice sai do AND; sem termos → icontains no nome.
+4. Ranking: nome pesa mais que bio.
+5. cities_list_view usa o índice.
+6. rebuild_search_index reconstrói tudo.
+"""
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from marketplace.models import InstructorProfile, InstructorSearchToken, State, City, CategoryCNH
+from marketplace.search import tokenize, search_instructor_ids, search_instructors
+
+
+def _create_instructor(username, city, first_name, last_name='', **extra):
+    user = User.objects.create(username=username, first_name=first_name, last_name=last_name)
+    return InstructorProfile.objects.create(user=user, city=city, is_visible=True, is_verified=True, **extra)
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(code='SP', name='São Paulo')
+        cls.city = City.objects.create(state=state, name='São José dos Campos')
+        cls.joao = _create_instructor('joao', cls.city, 'João', 'Conceição', neighborhoods_text='Jardim América, Centro')
+        cls.maria = _create_instructor('maria', cls.city, 'Maria', 'Silva', bio='Aluna do instrutor João por anos')
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('João da Conceição, CENTRO'), ['joao', 'conceicao', 'centro'])
+
+    def test_prefix_match_ignores_accents(self):
+        self.assertEqual(search_instructor_ids('conceicao'), [self.joao.pk])
+        self.assertEqual(search_instructor_ids('CONCEI'), [self.joao.pk])
+        self.assertEqual(search_instructor_ids('jardim amer'), [self.joao.pk])
+
+    def test_all_terms_required(self):
+        self.assertEqual(search_instructor_ids('maria centro'), [])
+
+    def test_single_letters(self):
+        self.assertEqual(search_instructor_ids('i'), [self.maria.pk, self.joao.pk])  # icontains, newest first
+        self.assertEqual(search_instructor_ids('m'), [self.maria.pk])
+        self.assertEqual(search_instructor_ids('j conceicao'), [self.joao.pk])
+
+    def test_name_ranks_above_bio(self):
+        self.assertEqual(search_instructor_ids('joao'), [self.joao.pk, self.maria.pk])
+
+    def test_city_and_category(self):
+        cat_b, _ = CategoryCNH.objects.get_or_create(code='B', defaults={'label': 'Carro'})
+        self.maria.categories.add(cat_b)
+        self.assertEqual(search_instructor_ids('maria b'), [self.maria.pk])
+        self.assertEqual(len(search_instructor_ids('sao jose')), 2)
+
+    def test_user_rename_reindexes(self):
+        self.maria.user.first_name = 'Mariana'
+        self.maria.user.save()
+        self.assertEqual(search_instructor_ids('mariana'), [self.maria.pk])
+
+    def test_profile_edit_reindexes(self):
+        self.maria.neighborhoods_text = 'Vila Ema'
+        self.maria.save()
+        self.assertEqual(search_instructor_ids('ema'), [self.maria.pk])
+
+    def test_search_within_queryset(self):
+        qs = InstructorProfile.objects.filter(pk=self.maria.pk)
+        self.assertEqual(list(search_instructors(qs, 'joao')), [self.maria])
+
+    def test_cities_list_uses_index(self):
+        viewer = User.objects.create_user('viewer', password='x')
+        viewer.profile.is_profile_complete = True
+        viewer.profile.save()
+        self.client.force_login(viewer)
+        response = self.client.get('/instrutores/cidades/', {'search_name': 'Joao'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [i.pk for i in response.context['instructors_page']],
+            [self.joao.pk, self.maria.pk],
+        )
+
+    def test_rebuild_command(self):
+        InstructorSearchToken.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('2 instrutores indexados', out.getvalue())
+        self.assertEqual(search_instructor_ids('conceicao'), [self.joao.pk])
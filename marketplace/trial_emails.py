@@ -0,0 +1,87 @@
+"""
+Trial e-mails: warnings before the free trial ends and the notice that the
+profile was paused (sent by the lifecycle sweep, billing/lifecycle.py).
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+logger = logging.getLogger(__name__)
+
+
+def send_trial_warning_email(instructor, days_remaining, connection=None):
+    """Send warning email before trial expiration. Returns True when sent."""
+    subject = f'⚠️ Seu período de teste expira em {days_remaining} {"dia" if days_remaining == 1 else "dias"}!'
+
+    message = f'''
+Olá {instructor.user.first_name},
+
+Seu período de teste gratuito no TreinaCNH está chegando ao fim!
+
+⏰ Restam apenas {days_remaining} {"dia" if days_remaining == 1 else "dias"} até {instructor.trial_end_date.strftime("%d/%m/%Y")}
+
+O que acontece após o período de teste?
+• Seu perfil será pausado automaticamente
+• Você não receberá mais solicitações de alunos
+• Para continuar ativo, será necessário assinar um plano
+
+💡 Não perca seus alunos!
+Escolha um plano agora e continue recebendo solicitações:
+http://72.61.36.89:8080/planos/
+
+Dúvidas? Fale conosco pelo WhatsApp.
+
+Atenciosamente,
+Equipe TreinaCNH
+'''
+    return _send(subject, message, instructor, connection)
+
+
+def send_trial_expired_email(instructor, connection=None):
+    """Send email when trial has expired and profile is blocked. Returns True when sent."""
+    subject = '🔒 Seu período de teste expirou - Perfil pausado'
+
+    message = f'''
+Olá {instructor.user.first_name},
+
+Seu período de teste gratuito no TreinaCNH expirou.
+
+🔒 Seu perfil foi pausado automaticamente
+Você não está mais visível para novos alunos na plataforma.
+
+Para reativar seu perfil e continuar recebendo solicitações de alunos,
+escolha um de nossos planos:
+
+👉 Acesse: http://72.61.36.89:8080/planos/
+
+📊 Benefícios de assinar:
+• Perfil sempre ativo
+• Receba solicitações ilimitadas
+• Suporte prioritário
+• Sem compromisso (cancele quando quiser)
+
+Ficou com dúvidas? Estamos aqui para ajudar!
+WhatsApp: [seu número]
+E-mail: contato@treinacnh.com
+
+Atenciosamente,
+Equipe TreinaCNH
+'''
+    return _send(subject, message, instructor, connection)
+
+
+def _send(subject, message, instructor, connection):
+    try:
+        send_mail(
+            subject,
+            message,
+            settings.DEFAULT_FROM_EMAIL,
+            [instructor.user.email],
+            fail_silently=False,
+            connection=connection,
+        )
+    except Exception as e:
+        logger.error(f'Error sending email to {instructor.user.email}: {str(e)}')
+        return False
+    return True
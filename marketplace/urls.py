@@ -1,6 +1,6 @@
 from django.urls import path
 from . import views
-from .api_views import get_cities_by_state, get_map_cities
+from .api_views import get_cities_by_state, get_map_cities, get_map_markers, get_map_students
 
 app_name = 'marketplace'
 
@@ -9,6 +9,8 @@ urlpatterns = [
     path('api/cidades/<str:state_code>/', get_cities_by_state, name='api_cities_by_state'),
     path('api/cities-by-state/', views.get_cities_by_state, name='get_cities_by_state'),
     path('api/map/cities/', get_map_cities, name='api_map_cities'),
+    path('api/map/students/', get_map_students, name='api_map_students'),
+    path('api/map/markers/', get_map_markers, name='api_map_markers'),
     
     # Student registration
     path('cadastro-aluno/', views.student_register_view, name='student_register'),
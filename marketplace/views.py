@@ -5,11 +5,37 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q, Count, Prefetch
-from django.core.paginator import Paginator
 from django.views.decorators.http import require_http_methods
-from .models import State, City, InstructorProfile, Lead, CategoryCNH, StudentLead, CityGeoCache
+from .models import State, City, InstructorProfile, Lead, CategoryCNH, StudentLead, InstructorMapMarker
+from .map_markers import serialize_markers
+from .geo import nearest_instructors
+from .search import search_instructors
+from .pagination import CursorPage, KeysetPaginator, cached_count
+from .card_cache import render_instructor_cards
+from .geocoding import ADDRESS_APPLIED, ADDRESS_QUEUED, geocode_instructor_profile_async
 from .forms import InstructorProfileForm, LeadForm, InstructorSearchForm, StudentRegistrationForm
 from core.seo import build_seo
+from accounts.identity import get_identity
+
+# "Perto de mim" search on cities_list_view
+NEAR_ME_DEFAULT_RADIUS_KM = 25
+NEAR_ME_RADII_KM = [5, 10, 25, 50, 100]
+NEAR_ME_LIMIT = 60
+
+# InstructorProfileForm fields that feed the profile coordinates
+ADDRESS_FIELDS = {'city', 'address_street', 'address_neighborhood', 'address_zip'}
+
+# Keyset pagination (see pagination.py)
+CITIES_LIST_PAGE_SIZE = 24
+CITY_INSTRUCTORS_PAGE_SIZE = 12
+
+
+def _query_without_cursor(request):
+    """Current query string minus the cursor, to build next/previous links."""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    params.pop('page', None)
+    return params.urlencode()
 
 
 def cities_list_view(request):
@@ -29,17 +55,6 @@ def cities_list_view(request):
         next_url = request.get_full_path()
         return redirect(reverse('accounts:register') + '?' + urlencode({'next': next_url}))
     from django.db.models import OuterRef, Subquery, Avg, Exists
-    from django.utils import timezone
-    from billing.models import Subscription, SubscriptionStatusChoices
-    
-    # Subquery to check if instructor has active subscription
-    has_active_subscription = Subscription.objects.filter(
-        instructor=OuterRef('pk'),
-        status=SubscriptionStatusChoices.ACTIVE,
-        start_date__lte=timezone.now().date()
-    ).filter(
-        Q(end_date__isnull=True) | Q(end_date__gte=timezone.now().date())
-    )
     
     # Get instructor count per state (verified instructors)
     instructor_counts = InstructorProfile.objects.filter(
@@ -74,13 +89,6 @@ def cities_list_view(request):
     selected_state = request.GET.get('state', '').strip()
     selected_city = request.GET.get('city', '').strip()
     
-    # Filter by name (search in first_name or last_name)
-    if search_name:
-        all_instructors = all_instructors.filter(
-            Q(user__first_name__icontains=search_name) |
-            Q(user__last_name__icontains=search_name)
-        )
-    
     # Filter by price range
     if min_price:
         try:
@@ -132,8 +140,11 @@ def cities_list_view(request):
         except ValueError:
             pass
     
-    # Order results
-    all_instructors = all_instructors.order_by('-created_at')
+    # Order results (by relevance when searching; see search.py)
+    if search_name:
+        all_instructors = search_instructors(all_instructors, search_name)
+    else:
+        all_instructors = all_instructors.order_by('-created_at')
     
     # New instructors (last 30 days) for highlights section
     from django.utils import timezone
@@ -142,36 +153,54 @@ def cities_list_view(request):
         created_at__gte=timezone.now() - timedelta(days=30)
     )[:6]
     
-    # Get all instructors for map markers, falling back to city cache when needed
-    from django.utils.text import slugify as _slugify
-    _city_cache = {
-        c.city_key: c
-        for c in CityGeoCache.objects.filter(geocoded=True)
-    }
-
-    instructors_data = []
-    for inst in all_instructors:
-        lat = inst.latitude
-        lng = inst.longitude
-        if (lat is None or lng is None) and inst.city_id:
-            # Try city geocache fallback
-            _key = _slugify(inst.city.name) + '|' + inst.city.state.code
-            _cached = _city_cache.get(_key)
-            if _cached and _cached.latitude and _cached.longitude:
-                lat = _cached.latitude
-                lng = _cached.longitude
-        if lat is None or lng is None:
-            continue  # truly no coordinates — skip
-        instructors_data.append({
-            'id': inst.id,
-            'user__first_name': inst.user.first_name,
-            'user__last_name': inst.user.last_name,
-            'latitude': float(lat),
-            'longitude': float(lng),
-            'city__name': inst.city.name,
-            'city__state__code': inst.city.state.code,
-            'city__state__name': inst.city.state.name
-        })
+    # "Perto de mim": keep the other filters, then rank by distance
+    near_lat = request.GET.get('lat', '').strip()
+    near_lng = request.GET.get('lng', '').strip()
+    radius = request.GET.get('radius', '').strip() or str(NEAR_ME_DEFAULT_RADIUS_KM)
+    near_me = False
+    if near_lat and near_lng:
+        try:
+            all_instructors = nearest_instructors(
+                float(near_lat), float(near_lng), float(radius),
+                limit=NEAR_ME_LIMIT, queryset=all_instructors,
+            )
+            near_me = True
+        except ValueError:
+            pass
+    
+    # Map markers come precomputed (see map_markers.py). Unfiltered pages load
+    # them lazily from api/map/markers/ as the map moves; filtered pages embed
+    # the (small) filtered set directly.
+    filters_active = any([
+        search_name, min_price, max_price, category, has_car,
+        availability, selected_state, selected_city, near_me,
+    ])
+    markers_json = None
+    if filters_active:
+        if near_me:
+            instructor_ids = [inst.pk for inst in all_instructors]
+        else:
+            instructor_ids = all_instructors.values('id')
+        markers_json = serialize_markers(
+            InstructorMapMarker.objects.filter(instructor_id__in=instructor_ids)
+        ).decode('utf-8')
+    
+    # Listing: keyset pages over the filtered queryset ("perto de mim" is
+    # already a short, distance-ranked list)
+    if near_me:
+        instructors_page = CursorPage(all_instructors)
+        total_instructors = len(all_instructors)
+    else:
+        ordering = ('search_rank', 'id') if search_name else ('-created_at', 'id')
+        instructors_page = KeysetPaginator(
+            all_instructors, per_page=CITIES_LIST_PAGE_SIZE, ordering=ordering,
+        ).get_page(request.GET.get('cursor'))
+        total_instructors = cached_count(all_instructors)
+    # Cards come from the fragment cache (card_cache.py); distances are per request
+    instructors_page.object_list = render_instructor_cards(
+        instructors_page.object_list, 'marketplace/includes/instructor_card_compact.html',
+        use_cache=not near_me,
+    )
     
     # Prepare data for map
     import json
@@ -192,8 +221,10 @@ def cities_list_view(request):
     context = {
         'states': states,
         'states_json': json.dumps(states_data),
-        'instructors_json': json.dumps(instructors_data),
-        'all_instructors': all_instructors,
+        'instructors_json': markers_json,
+        'instructors_page': instructors_page,
+        'total_instructors': total_instructors,
+        'page_query': _query_without_cursor(request),
         'new_instructors': new_instructors,
         'seo_title': 'Encontre um Instrutor Credenciado | TreinaCNH',
         'seo_description': (
@@ -211,6 +242,11 @@ def cities_list_view(request):
         'selected_availability': availability,
         'selected_state': selected_state,
         'selected_city': selected_city,
+        'near_me': near_me,
+        'near_lat': near_lat,
+        'near_lng': near_lng,
+        'selected_radius': radius,
+        'near_me_radii': NEAR_ME_RADII_KM,
         'all_states': states,  # For state dropdown
         'cnh_categories': list(
             CategoryCNH.objects.values_list('code', flat=True).order_by('code')
@@ -227,21 +263,8 @@ def city_instructors_list_view(request, state_code, city_slug):
     Only shows instructors who can receive leads (trial active or paid subscription).
     Requires user authentication.
     """
-    from django.db.models import Exists
-    from django.utils import timezone
-    from billing.models import Subscription, SubscriptionStatusChoices
-    
     city = get_object_or_404(City, slug=city_slug, state__code=state_code.upper(), is_active=True)
     
-    # Subquery to check if instructor has active subscription
-    has_active_subscription = Subscription.objects.filter(
-        instructor=OuterRef('pk'),
-        status=SubscriptionStatusChoices.ACTIVE,
-        start_date__lte=timezone.now().date()
-    ).filter(
-        Q(end_date__isnull=True) | Q(end_date__gte=timezone.now().date())
-    )
-    
     # Base queryset - all verified instructors (will show in listing but may not receive leads)
     instructors = InstructorProfile.objects.filter(
         city=city,
@@ -278,19 +301,22 @@ def city_instructors_list_view(request, state_code, city_slug):
         if verified_only:
             instructors = instructors.filter(is_verified=True)
     
-    # Ordering: verified and highlighted first, then newest
-    instructors = instructors.order_by('-is_verified', '-created_at')
-    
-    # Pagination
-    paginator = Paginator(instructors, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: verified and highlighted first, then newest (id breaks ties)
+    paginator = KeysetPaginator(
+        instructors, per_page=CITY_INSTRUCTORS_PAGE_SIZE,
+        ordering=('-is_verified', '-created_at', 'id'),
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    page_obj.object_list = render_instructor_cards(
+        page_obj.object_list, 'marketplace/includes/instructor_card.html',
+    )
     
     context = {
         'city': city,
         'page_obj': page_obj,
+        'page_query': _query_without_cursor(request),
         'form': form,
-        'total_instructors': instructors.count(),
+        'total_instructors': cached_count(instructors),
         'page_title': f'Instrutores em {city.name}/{city.state.code}',
     }
     return render(request, 'marketplace/city_instructors_list.html', context)
@@ -342,12 +368,8 @@ def instructor_detail_view(request, pk):
 
     # Flag so the template can hide direct-contact buttons for students who haven't
     # finished their profile yet (same rule as the lead_create_view guard).
-    student_data_incomplete = (
-        request.user.is_authenticated
-        and hasattr(request.user, 'profile')
-        and request.user.profile.is_student
-        and not request.user.profile.is_student_data_complete
-    )
+    identity = get_identity(request)
+    student_data_incomplete = identity.is_student and not identity.profile.is_student_data_complete
 
     # Dynamic SEO: instructor name + city in title, bio as description
     full_name = instructor.user.get_full_name()
@@ -362,12 +384,7 @@ def instructor_detail_view(request, pk):
     )
 
     # Flag: visitor is an instructor (and NOT the owner of this profile)
-    viewer_is_instructor = (
-        request.user.is_authenticated
-        and request.user != instructor.user
-        and hasattr(request.user, 'profile')
-        and request.user.profile.is_instructor
-    )
+    viewer_is_instructor = identity.is_instructor and request.user.pk != instructor.user_id
 
     context = {
         'instructor': instructor,
@@ -500,24 +517,27 @@ def instructor_profile_edit_view(request):
     if request.method == 'POST':
         form = InstructorProfileForm(request.POST, instance=instructor_profile)
         if form.is_valid():
+            is_new = instructor_profile is None
             profile = form.save(commit=False)
             if not profile.user_id:
                 profile.user = request.user
             profile.save()
             form.save_m2m()  # Save many-to-many relationships
             
-            # Try to geocode address automatically
-            from .geocoding import geocode_instructor_profile
-            try:
-                if geocode_instructor_profile(profile):
+            # Coordinates: skipped when the address did not change, otherwise
+            # taken from the address cache or resolved in the background
+            address_changed = is_new or ADDRESS_FIELDS.intersection(form.changed_data)
+            if not address_changed and profile.latitude and profile.longitude:
+                messages.success(request, 'Perfil atualizado com sucesso!')
+            else:
+                outcome = geocode_instructor_profile_async(profile)
+                if outcome == ADDRESS_APPLIED:
                     messages.success(request, 'Perfil atualizado com sucesso! Suas coordenadas foram calculadas automaticamente.')
+                elif outcome == ADDRESS_QUEUED:
+                    messages.success(request, 'Perfil atualizado com sucesso! Suas coordenadas serão calculadas em instantes.')
                 else:
                     messages.success(request, 'Perfil atualizado com sucesso!')
-                    if not profile.latitude or not profile.longitude:
-                        messages.info(request, 'Não foi possível calcular suas coordenadas automaticamente. Verifique seu endereço.')
-            except Exception as e:
-                messages.success(request, 'Perfil atualizado com sucesso!')
-                messages.warning(request, f'Erro ao calcular coordenadas: {str(e)}')
+                    messages.info(request, 'Não foi possível calcular suas coordenadas automaticamente. Verifique seu endereço.')
             
             return redirect('accounts:dashboard')
         else:
@@ -545,12 +565,14 @@ def instructor_profile_edit_view(request):
 @login_required
 def my_leads_view(request):
     """View leads received (for instructors) or sent (for students)"""
-    profile = request.user.profile
+    identity = get_identity(request)
     
-    if profile.is_instructor:
+    if identity.is_instructor:
         # Show leads received
         try:
-            instructor_profile = InstructorProfile.objects.get(user=request.user)
+            instructor_profile = identity.instructor_profile
+            if instructor_profile is None:
+                raise InstructorProfile.DoesNotExist
             # FILTER ONLY WHATSAPP CONTACTS (status=CONTACTED)
             # These are students who clicked the WhatsApp button
             leads = Lead.objects.filter(
@@ -647,7 +669,7 @@ def lead_update_status_view(request, lead_pk):
     lead = get_object_or_404(Lead, pk=lead_pk)
     
     # Check permission
-    if not hasattr(request.user, 'instructor_profile') or lead.instructor != request.user.instructor_profile:
+    if lead.instructor_id != get_identity(request).instructor_profile_id:
         messages.error(request, 'Você não tem permissão para modificar este lead.')
         return redirect('marketplace:my_leads')
     
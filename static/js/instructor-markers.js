@@ -0,0 +1,118 @@
+/**
+ * Lazy instructor markers for Leaflet maps.
+ *
+ * Fetches only the markers inside the current viewport from
+ * /instrutores/api/map/markers/ and refreshes them when the map moves.
+ * At low zoom levels the server returns grid clusters instead of markers.
+ *
+ * Usage:
+ *     loadInstructorMarkers(map, {
+ *         markerClassName: 'instructor-marker',
+ *         markerHtml: '<i class="bi bi-person-fill"></i>',
+ *         markerSize: [30, 30]
+ *     });
+ */
+(function () {
+    const DEFAULT_ENDPOINT = '/instrutores/api/map/markers/';
+    const DEBOUNCE_MS = 250;
+
+    function escapeHtml(value) {
+        return String(value == null ? '' : value)
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;');
+    }
+
+    function rowToObject(fields, row) {
+        const obj = {};
+        fields.forEach(function (field, i) { obj[field] = row[i]; });
+        return obj;
+    }
+
+    function popupHtml(m) {
+        return `
+            <div class="text-center">
+                <h6 class="mb-2">${escapeHtml(m.first_name)} ${escapeHtml(m.last_name)}</h6>
+                <p class="mb-1 small"><i class="bi bi-geo-alt-fill me-1"></i>${escapeHtml(m.city)} - ${escapeHtml(m.state)}</p>
+                <a href="/instrutores/instrutor/${m.id}/" class="btn btn-sm btn-primary mt-2">
+                    Ver Perfil
+                </a>
+            </div>
+        `;
+    }
+
+    window.loadInstructorMarkers = function (map, options) {
+        options = options || {};
+        const endpoint = options.endpoint || DEFAULT_ENDPOINT;
+        const layer = L.layerGroup().addTo(map);
+        const markerIcon = L.divIcon({
+            className: options.markerClassName || 'instructor-marker',
+            html: options.markerHtml || '<i class="bi bi-person-fill"></i>',
+            iconSize: options.markerSize || [30, 30]
+        });
+        let controller = null;
+        let timer = null;
+
+        function render(fields, markers, clusters) {
+            layer.clearLayers();
+            markers.forEach(function (row) {
+                const m = rowToObject(fields, row);
+                L.marker([m.lat, m.lng], { icon: markerIcon })
+                    .bindPopup(popupHtml(m))
+                    .addTo(layer);
+            });
+            clusters.forEach(function (cluster) {
+                const count = cluster[2];
+                const size = count > 50 ? 44 : count > 10 ? 36 : 30;
+                L.marker([cluster[0], cluster[1]], {
+                    icon: L.divIcon({
+                        className: 'instructor-cluster',
+                        html: `<div>${count}</div>`,
+                        iconSize: [size, size]
+                    })
+                }).on('click', function () {
+                    map.setView([cluster[0], cluster[1]], map.getZoom() + 2);
+                }).addTo(layer);
+            });
+        }
+
+        async function refresh() {
+            if (controller) controller.abort();
+            controller = new AbortController();
+            const params = new URLSearchParams({
+                bbox: map.getBounds().toBBoxString(),
+                zoom: map.getZoom()
+            });
+            let fields = [];
+            const markers = [];
+            const clusters = [];
+            let next = null;
+            try {
+                do {
+                    if (next) params.set('after', next);
+                    const response = await fetch(`${endpoint}?${params}`, { signal: controller.signal });
+                    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                    const data = await response.json();
+                    fields = data.fields;
+                    markers.push(...data.markers);
+                    clusters.push(...data.clusters);
+                    next = data.next;
+                } while (next);
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    console.error('Erro ao carregar instrutores do mapa:', error);
+                }
+                return;
+            }
+            render(fields, markers, clusters);
+        }
+
+        map.on('moveend', function () {
+            clearTimeout(timer);
+            timer = setTimeout(refresh, DEBOUNCE_MS);
+        });
+        refresh();
+        return layer;
+    };
+})();